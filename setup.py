@@ -285,6 +285,7 @@ KWARGS = OrderedDict(
     wbia-convert-hsdb = wbia.cli.convert_hsdb:main
     wbia-migrate-sqlite-to-postgres = wbia.cli.migrate_sqlite_to_postgres:main
     wbia-compare-databases = wbia.cli.compare_databases:main
+    wbia-migrate-ndarray-codec = wbia.cli.migrate_ndarray_codec:main
     """,
 )
 
@@ -299,6 +299,10 @@ class SpatialVerifyConfig(ConfigBase):
         sv_cfg.refine_method = 'homog'
         # weight feature scores with sver errors
         sv_cfg.weight_inliers = True
+        # number of worker processes used to verify the shortlists of
+        # different queries (0 is serial). Results do not depend on it, so it
+        # is not part of the cfgstr.
+        sv_cfg.sver_workers = 0
         sv_cfg.update(**kwargs)
 
     def get_cfgstr_list(sv_cfg, **kwargs):
@@ -872,14 +876,14 @@ class OccurrenceConfig(ConfigBase):
             ut.ParamInfo('min_imgs_per_occurrence', 1, 'minper='),
             # ut.ParamInfo('cluster_algo', 'agglomerative', '', valid_values=['agglomerative', 'meanshift']),
             ut.ParamInfo(
-                'cluster_algo', 'agglomerative', '', valid_values=['agglomerative']
+                'cluster_algo', 'sweep', '', valid_values=['agglomerative', 'sweep']
             ),
             # ut.ParamInfo('quantile', .01, 'quant', hideif=lambda cfg: cfg['cluster_algo'] != 'meanshift'),
             ut.ParamInfo(
                 'seconds_thresh',
                 1600,
                 'sec',
-                hideif=lambda cfg: cfg['cluster_algo'] != 'agglomerative',
+                hideif=lambda cfg: cfg['cluster_algo'] not in ['agglomerative', 'sweep'],
             ),
             ut.ParamInfo('use_gps', True, hideif=False),
             ut.ParamInfo('km_per_sec', 0.002),
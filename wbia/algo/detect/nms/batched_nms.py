@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized non-maximum suppression over many groups of boxes at once.
+
+A group is any set of boxes that may suppress each other, for example the
+boxes of one class in one image. Boxes are sorted by group and by
+decreasing score and every group is shifted by a coordinate offset, so boxes
+of different groups never overlap. The IoU of the sorted boxes is then
+computed one block of rows at a time (each block is only compared to the
+boxes up to the end of its last group) and thresholded into a suppression
+mask. The greedy result within the block is found by a few vectorized passes
+over the mask and the kept rows suppress the later boxes in one update. The
+suppressed boxes are dropped before the next block, so every block is made of
+boxes that are still alive.
+
+Boxes are (x1, y1, x2, y2) with inclusive pixel coordinates, as in
+:func:`wbia.algo.detect.nms.py_cpu_nms.py_cpu_nms`.
+"""
+import logging
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+# Number of rows of the IoU matrix computed at once
+BLOCK_SIZE = 64
+
+
+def _sorted_boxes(dets, scores, groups):
+    """
+    Returns the order that sorts the boxes by group and decreasing score and
+    the sorted boxes shifted by a per-group offset.
+    """
+    dets = np.asarray(dets, dtype=np.float64)[:, 0:4]
+    scores = np.asarray(scores)
+    # Same order as py_cpu_nms within a group
+    order = scores.argsort()[::-1]
+    if groups is not None:
+        groups = np.asarray(groups)
+        order = order[np.argsort(groups[order], kind='stable')]
+        _, group_ids = np.unique(groups[order], return_inverse=True)
+        group_ids = group_ids.ravel()
+    else:
+        group_ids = np.zeros(len(order), dtype=np.int64)
+    boxes = dets[order]
+    if len(boxes) > 0:
+        # Shift each group past the extent of all boxes
+        extent = boxes.max() - boxes.min() + 2
+        boxes = boxes + (group_ids * extent)[:, None]
+    return order, boxes, group_ids
+
+
+def _group_ends(group_ids):
+    """For each sorted box, the index one past the last box of its group"""
+    num = len(group_ids)
+    starts = np.flatnonzero(np.diff(group_ids)) + 1
+    ends = np.append(starts, num)
+    return ends[np.searchsorted(ends, np.arange(num), side='right')]
+
+
+def _overlap_mask(boxes, areas, rows, cols, thresh):
+    """
+    Mask of the pairs of boxes at positions rows and cols with an IoU above
+    thresh, computed in place as ``inter * (1 + thresh) > thresh * (a1 + a2)``
+    """
+    rboxes = boxes[rows]
+    cboxes = boxes[cols]
+    w = np.minimum(rboxes[:, 2:3], cboxes[None, :, 2])
+    w -= np.maximum(rboxes[:, 0:1], cboxes[None, :, 0])
+    w += 1
+    np.maximum(w, 0, out=w)
+    h = np.minimum(rboxes[:, 3:4], cboxes[None, :, 3])
+    h -= np.maximum(rboxes[:, 1:2], cboxes[None, :, 1])
+    h += 1
+    np.maximum(h, 0, out=h)
+    w *= h
+    w *= 1 + thresh
+    np.add(areas[rows, None], areas[None, cols], out=h)
+    h *= thresh
+    return w > h
+
+
+def _iou(box, area, boxes, areas):
+    """IoU of one box with many boxes"""
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    w = np.maximum(0.0, xx2 - xx1 + 1)
+    h = np.maximum(0.0, yy2 - yy1 + 1)
+    inter = w * h
+    return inter / (area + areas - inter)
+
+
+def _greedy_keep(upper):
+    """
+    Greedy suppression within a block given the strictly upper triangular
+    suppression mask of its rows. A row is kept when no kept row before it
+    suppresses it; iterating this rule from all rows kept fixes at least one
+    more leading row every step and stops at the greedy result.
+    """
+    block_keep = np.ones(len(upper), dtype=bool)
+    while True:
+        next_keep = ~upper[block_keep].any(axis=0)
+        if np.array_equal(next_keep, block_keep):
+            return np.flatnonzero(block_keep)
+        block_keep = next_keep
+
+
+def _box_areas(boxes):
+    return (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+
+
+@profile
+def batched_nms(dets, scores, thresh, groups=None, block_size=BLOCK_SIZE):
+    r"""
+    Greedy non-maximum suppression of every group of boxes in one call.
+
+    Args:
+        dets (ndarray): N x 4 boxes (x1, y1, x2, y2), extra columns are ignored
+        scores (ndarray): N scores
+        thresh (float): boxes with an IoU above thresh with a higher scoring
+            box of their group are suppressed
+        groups (ndarray): N group labels (e.g. class or image ids); boxes
+            only suppress boxes of the same group. Defaults to one group.
+        block_size (int): number of IoU rows computed at once
+
+    Returns:
+        ndarray: indices of the kept boxes, sorted by group and decreasing
+            score (by decreasing score for a single group)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.detect.nms.batched_nms import *  # NOQA
+        >>> dets = np.array([
+        >>>     [0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30],
+        >>>     [0, 0, 10, 10], [50, 50, 60, 60]])
+        >>> scores = np.array([.9, .8, .7, .6, .5])
+        >>> groups = np.array([0, 0, 0, 1, 1])
+        >>> print(batched_nms(dets, scores, 0.3).tolist())
+        >>> print(batched_nms(dets, scores, 0.3, groups).tolist())
+        [0, 2, 4]
+        [0, 2, 3, 4]
+    """
+    order, boxes, group_ids = _sorted_boxes(dets, scores, groups)
+    areas = _box_areas(boxes)
+    group_ends = _group_ends(group_ids)
+    # Sorted positions of the boxes that are not suppressed yet
+    alive = np.arange(len(order))
+    keep = []
+    while len(alive) > 0:
+        rows = alive[:block_size]
+        # Columns are the alive boxes up to the end of the last row's group
+        num_cols = np.searchsorted(alive, group_ends[rows[-1]])
+        cols = alive[:num_cols]
+        over = _overlap_mask(boxes, areas, rows, cols, thresh)
+        num_rows = len(rows)
+        block_keep = _greedy_keep(np.triu(over[:, :num_rows], 1))
+        keep.extend(rows[block_keep])
+        # Suppress the columns after the block in one update
+        rest = alive[num_rows:num_cols]
+        rest = rest[~over[block_keep, num_rows:].any(axis=0)]
+        alive = np.concatenate((rest, alive[num_cols:]))
+    return order[np.array(keep, dtype=np.int64)]
+
+
+@profile
+def batched_soft_nms(
+    dets,
+    scores,
+    groups=None,
+    sigma=0.5,
+    thresh=0.3,
+    score_thresh=0.001,
+    method='gaussian',
+):
+    r"""
+    Soft non-maximum suppression (Bodla et al. 2017): instead of removing the
+    boxes that overlap a selected box their scores are decayed, by
+    ``exp(-iou ** 2 / sigma)`` (gaussian) or by ``1 - iou`` when the IoU is
+    above thresh (linear). Boxes whose score falls below score_thresh are
+    dropped.
+
+    Returns:
+        tuple: (keep, new_scores) indices of the kept boxes in the order they
+            were selected within each group and their decayed scores
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.detect.nms.batched_nms import *  # NOQA
+        >>> dets = np.array([
+        >>>     [0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30],
+        >>>     [0, 0, 10, 10], [50, 50, 60, 60]])
+        >>> scores = np.array([.9, .8, .7, .6, .5])
+        >>> groups = np.array([0, 0, 0, 1, 1])
+        >>> keep, new_scores = batched_soft_nms(dets, scores, groups)
+        >>> print(keep.tolist())
+        >>> print(ut.repr2(new_scores, precision=3))
+        [0, 2, 1, 3, 4]
+        np.array([0.9  , 0.7  , 0.297, 0.6  , 0.5  ])
+        >>> keep, new_scores = batched_soft_nms(dets, scores, method='linear')
+        >>> print(keep.tolist())
+        >>> print(ut.repr2(new_scores, precision=3))
+        [0, 2, 4, 1]
+        np.array([0.9  , 0.7  , 0.5  , 0.237])
+    """
+    assert method in ['gaussian', 'linear'], 'unknown soft-nms method'
+    order, boxes, group_ids = _sorted_boxes(dets, scores, groups)
+    scores = np.asarray(scores, dtype=np.float64)[order]
+    areas = _box_areas(boxes)
+    group_ends = _group_ends(group_ids)
+    keep = []
+    new_scores = []
+    start = 0
+    while start < len(order):
+        stop = group_ends[start]
+        group_boxes = boxes[start:stop]
+        group_areas = areas[start:stop]
+        group_scores = scores[start:stop].copy()
+        alive = np.ones(stop - start, dtype=bool)
+        for _ in range(stop - start):
+            if not alive.any():
+                break
+            best = np.flatnonzero(alive)[group_scores[alive].argmax()]
+            alive[best] = False
+            keep.append(start + best)
+            new_scores.append(group_scores[best])
+            iou = _iou(
+                group_boxes[best],
+                group_areas[best],
+                group_boxes[alive],
+                group_areas[alive],
+            )
+            if method == 'gaussian':
+                decay = np.exp(-(iou ** 2) / sigma)
+            else:
+                decay = np.where(iou > thresh, 1.0 - iou, 1.0)
+            group_scores[alive] *= decay
+            alive[alive] = group_scores[alive] >= score_thresh
+        start = stop
+    keep = order[np.array(keep, dtype=np.int64)]
+    return keep, np.array(new_scores, dtype=np.float64)
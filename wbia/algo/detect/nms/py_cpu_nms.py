@@ -7,7 +7,7 @@
 # --------------------------------------------------------
 import logging
 
-import numpy as np
+import numpy as np  # NOQA
 import utool as ut
 
 (print, rrr, profile) = ut.inject2(__name__)
@@ -15,30 +15,19 @@ logger = logging.getLogger('wbia')
 
 
 def py_cpu_nms(dets, scores, thresh):
-    """Pure Python NMS baseline."""
-    x1 = dets[:, 0]
-    y1 = dets[:, 1]
-    x2 = dets[:, 2]
-    y2 = dets[:, 3]
-
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    keep = []
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-        inter = w * h
-        ovr = inter / (areas[i] + areas[order[1:]] - inter)
-
-        inds = np.where(ovr <= thresh)[0]
-        order = order[inds + 1]
-
-    return keep
+    """
+    Greedy NMS of one set of boxes, returns the list of kept indices by
+    decreasing score. See :func:`wbia.algo.detect.nms.batched_nms.batched_nms`
+    to suppress many images or classes in one call.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.detect.nms.py_cpu_nms import *  # NOQA
+        >>> dets = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]])
+        >>> scores = np.array([.8, .9, .7])
+        >>> print(py_cpu_nms(dets, scores, 0.3))
+        [1, 2]
+    """
+    from wbia.algo.detect.nms.batched_nms import batched_nms
+
+    return batched_nms(dets, scores, thresh).tolist()
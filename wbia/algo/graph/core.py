@@ -26,6 +26,7 @@ from wbia.algo.graph import (
     mixin_viz,
     mixin_wbia,
     nx_dynamic_graph,
+    priority_queue,
 )
 from wbia.algo.graph import nx_utils as nxu
 from wbia.algo.graph.state import (
@@ -1287,7 +1288,7 @@ class AnnotInference(
 
         infr.print('__init__ structures', level=1)
         # Criterion
-        infr.queue = ut.PriorityQueue()
+        infr.queue = priority_queue.IndexedPriorityQueue()
         infr.refresh = None
 
         infr.review_counter = it.count(0)
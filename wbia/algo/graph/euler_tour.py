@@ -0,0 +1,642 @@
+# -*- coding: utf-8 -*-
+"""
+Fully dynamic graph connectivity.
+
+EulerTourForest stores each tree of a forest as the Euler tour of its arcs in a
+treap ordered by position, so linking and cutting trees, finding the tree of a
+vertex and reading its size or smallest vertex all take O(log(n)) expected
+time.
+
+DynamicConnectivity is the level based structure of Holm, de Lichtenberg and
+Thorup on top of one Euler tour forest per level. Edge insertions and
+deletions take O(log(n) ** 2) amortized time and connectivity queries
+O(log(n)).
+
+References:
+    https://courses.csail.mit.edu/6.851/spring14/lectures/L20.pdf
+    https://en.wikipedia.org/wiki/Dynamic_connectivity#Fully_dynamic_connectivity
+"""
+import logging
+import random
+
+import utool as ut
+
+from wbia.algo.graph.nx_utils import e_
+
+print, rrr, profile = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+# Node flags
+HAS_NONTREE = 1  # vertex with non-tree edges on the level of the forest
+IS_LEVEL_TREE = 2  # arc of a tree edge whose level is the level of the forest
+
+
+class _TourNode(object):
+    """
+    Treap node for one vertex occurrence or one arc of an Euler tour.
+
+    ``cnt`` counts all nodes in the subtree, ``size`` only the vertex nodes,
+    ``minkey`` is the smallest vertex key and ``subflags`` the union of flags
+    in the subtree.
+    """
+
+    __slots__ = (
+        'left',
+        'right',
+        'parent',
+        'prio',
+        'vertex',
+        'edge',
+        'key',
+        'weight',
+        'flags',
+        'cnt',
+        'size',
+        'minkey',
+        'subflags',
+    )
+
+    def __init__(self, vertex=None, edge=None, key=None):
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.prio = random.random()
+        self.vertex = vertex
+        self.edge = edge
+        self.key = key
+        self.weight = 0 if edge is not None else 1
+        self.flags = 0
+        self.cnt = 1
+        self.size = self.weight
+        self.minkey = key
+        self.subflags = 0
+
+
+def _update(node):
+    cnt = 1
+    size = node.weight
+    minkey = node.key
+    subflags = node.flags
+    for child in (node.left, node.right):
+        if child is not None:
+            cnt += child.cnt
+            size += child.size
+            subflags |= child.subflags
+            ckey = child.minkey
+            if ckey is not None and (minkey is None or ckey < minkey):
+                minkey = ckey
+    node.cnt = cnt
+    node.size = size
+    node.minkey = minkey
+    node.subflags = subflags
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.prio > right.prio:
+        child = _merge(left.right, right)
+        left.right = child
+        child.parent = left
+        _update(left)
+        return left
+    else:
+        child = _merge(left, right.left)
+        right.left = child
+        child.parent = right
+        _update(right)
+        return right
+
+
+def _split(node, k):
+    """Splits a treap into its first ``k`` nodes and the rest"""
+    if node is None:
+        return None, None
+    left_cnt = 0 if node.left is None else node.left.cnt
+    if k <= left_cnt:
+        left, right = _split(node.left, k)
+        node.left = right
+        if right is not None:
+            right.parent = node
+        if left is not None:
+            left.parent = None
+        _update(node)
+        node.parent = None
+        return left, node
+    else:
+        left, right = _split(node.right, k - left_cnt - 1)
+        node.right = left
+        if left is not None:
+            left.parent = node
+        if right is not None:
+            right.parent = None
+        _update(node)
+        node.parent = None
+        return node, right
+
+
+def _root(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
+
+
+def _rank(node):
+    """Returns the number of nodes before ``node`` in its tour"""
+    rank = 0 if node.left is None else node.left.cnt
+    while node.parent is not None:
+        parent = node.parent
+        if parent.right is node:
+            rank += 1 + (0 if parent.left is None else parent.left.cnt)
+        node = parent
+    return rank
+
+
+def _set_flags(node, flags):
+    node.flags = flags
+    while node is not None:
+        subflags = node.flags
+        if node.left is not None:
+            subflags |= node.left.subflags
+        if node.right is not None:
+            subflags |= node.right.subflags
+        if subflags == node.subflags:
+            # the ancestors are already up to date
+            break
+        node.subflags = subflags
+        node = node.parent
+
+
+def _iter_flagged(root, flag):
+    """Yields the nodes of a treap that have ``flag`` set"""
+    stack = [root] if root is not None and root.subflags & flag else []
+    while stack:
+        node = stack.pop()
+        if node.flags & flag:
+            yield node
+        for child in (node.left, node.right):
+            if child is not None and child.subflags & flag:
+                stack.append(child)
+
+
+def _iter_nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.left is not None:
+            stack.append(node.left)
+        if node.right is not None:
+            stack.append(node.right)
+
+
+def _build(nodes):
+    """Builds a treap over a sequence of detached nodes in linear time"""
+    stack = []
+    for node in nodes:
+        node.left = node.right = node.parent = None
+        last = None
+        while stack and stack[-1].prio < node.prio:
+            last = stack.pop()
+        if last is not None:
+            node.left = last
+            last.parent = node
+        if stack:
+            stack[-1].right = node
+            node.parent = stack[-1]
+        stack.append(node)
+    root = stack[0]
+    # Update the aggregates bottom up
+    order = [root]
+    for node in order:
+        if node.left is not None:
+            order.append(node.left)
+        if node.right is not None:
+            order.append(node.right)
+    for node in reversed(order):
+        _update(node)
+    return root
+
+
+def _iter_vertices(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.vertex is not None:
+            yield node.vertex
+        if node.left is not None:
+            stack.append(node.left)
+        if node.right is not None:
+            stack.append(node.right)
+
+
+class EulerTourForest(object):
+    """
+    A forest of Euler tour trees.
+
+    Args:
+        track_min (bool): if True the smallest vertex of each tree is
+            maintained (vertices must be orderable)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.graph.euler_tour import *  # NOQA
+        >>> forest = EulerTourForest(track_min=True)
+        >>> for u, v in [(1, 2), (2, 3), (3, 4), (5, 6)]:
+        >>>     forest.link(u, v)
+        >>> assert forest.connected(1, 4) and not forest.connected(1, 5)
+        >>> forest.cut(2, 3)
+        >>> assert not forest.connected(1, 4)
+        >>> print(forest.tree_size(4), forest.tree_min(4))
+        2 3
+        >>> print(sorted(forest.tree_vertices(1)))
+        [1, 2]
+    """
+
+    def __init__(self, track_min=False):
+        self.track_min = track_min
+        self.vertex_nodes = {}
+        self.arc_nodes = {}
+
+    def __len__(self):
+        return len(self.vertex_nodes)
+
+    def has_vertex(self, v):
+        return v in self.vertex_nodes
+
+    def vertex_node(self, v):
+        """Returns the tour node of a vertex, adding it as a new tree if needed"""
+        node = self.vertex_nodes.get(v, None)
+        if node is None:
+            node = _TourNode(vertex=v, key=v if self.track_min else None)
+            self.vertex_nodes[v] = node
+        return node
+
+    def remove_vertex(self, v):
+        """Removes a vertex that is not linked to any other vertex"""
+        node = self.vertex_nodes.pop(v)
+        assert node.parent is None and node.cnt == 1, 'vertex is not isolated'
+
+    def tree_root(self, v):
+        return _root(self.vertex_node(v))
+
+    def connected(self, u, v):
+        return self.tree_root(u) is self.tree_root(v)
+
+    def tree_size(self, v):
+        return self.tree_root(v).size
+
+    def tree_min(self, v):
+        return self.tree_root(v).minkey
+
+    def tree_vertices(self, v):
+        return _iter_vertices(self.tree_root(v))
+
+    def _reroot(self, v):
+        node = self.vertex_node(v)
+        left, right = _split(_root(node), _rank(node))
+        return _merge(right, left)
+
+    def link(self, u, v):
+        """Joins the trees of ``u`` and ``v`` (which must not be connected)"""
+        tour_u = self._reroot(u)
+        tour_v = self._reroot(v)
+        arc_uv = _TourNode(edge=(u, v))
+        arc_vu = _TourNode(edge=(v, u))
+        self.arc_nodes[(u, v)] = arc_uv
+        self.arc_nodes[(v, u)] = arc_vu
+        _merge(_merge(_merge(tour_u, arc_uv), tour_v), arc_vu)
+
+    def cut(self, u, v):
+        """Removes the tree edge between ``u`` and ``v``"""
+        arc1 = self.arc_nodes.pop((u, v))
+        arc2 = self.arc_nodes.pop((v, u))
+        root = _root(arc1)
+        rank1, rank2 = _rank(arc1), _rank(arc2)
+        if rank1 > rank2:
+            rank1, rank2 = rank2, rank1
+        # The tour is P arc Q arc R, where Q is the tour of one side
+        outer, rest = _split(root, rank1)
+        _, rest = _split(rest, 1)
+        _, rest = _split(rest, rank2 - rank1 - 1)
+        _, rest = _split(rest, 1)
+        _merge(outer, rest)
+
+    def arc_node(self, u, v):
+        return self.arc_nodes[(u, v)]
+
+    def rebuild(self, roots, new_edges):
+        """
+        Joins the trees of ``roots`` with the tree edges ``new_edges`` by
+        rebuilding one Euler tour from a depth first search. This takes time
+        linear in the size of the trees, which beats linking edge by edge when
+        many edges join small trees.
+
+        Returns:
+            list: the new arc nodes, one per edge, oriented like the edge
+        """
+        adjacency = {}
+        vertex_nodes = self.vertex_nodes
+        arc_nodes = self.arc_nodes
+        start = None
+        for root in roots:
+            for node in _iter_nodes(root):
+                if node.edge is not None:
+                    u, v = node.edge
+                    adjacency.setdefault(u, []).append(v)
+                elif start is None:
+                    start = node.vertex
+        new_arcs = []
+        for u, v in new_edges:
+            arc_uv = _TourNode(edge=(u, v))
+            arc_vu = _TourNode(edge=(v, u))
+            arc_nodes[(u, v)] = arc_uv
+            arc_nodes[(v, u)] = arc_vu
+            adjacency.setdefault(u, []).append(v)
+            adjacency.setdefault(v, []).append(u)
+            new_arcs.append(arc_uv)
+        # Euler tour of the joined tree
+        tour = [vertex_nodes[start]]
+        stack = [(start, iter(adjacency.get(start, ())))]
+        while stack:
+            v, nbr_iter = stack[-1]
+            for w in nbr_iter:
+                if len(stack) < 2 or w != stack[-2][0]:
+                    tour.append(arc_nodes[(v, w)])
+                    tour.append(vertex_nodes[w])
+                    stack.append((w, iter(adjacency.get(w, ()))))
+                    break
+            else:
+                stack.pop()
+                if stack:
+                    tour.append(arc_nodes[(v, stack[-1][0])])
+        _build(tour)
+        return new_arcs
+
+
+class DynamicConnectivity(object):
+    """
+    Fully dynamic connectivity of an undirected graph (Holm, de Lichtenberg,
+    Thorup).
+
+    Every edge has a level. The edges with level ``i`` or more are spanned by
+    the forest of level ``i``, whose trees have at most ``n / 2 ** i``
+    vertices. When a tree edge is removed the smaller of the two halves on
+    each level pushes its edges one level up while it looks for a replacement
+    edge, which bounds the amortized work per edge. Before that search, the
+    first ``num_samples`` non-tree edges of the smaller half are checked for a
+    replacement, which usually finds one without any level changes.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.graph.euler_tour import *  # NOQA
+        >>> conn = DynamicConnectivity()
+        >>> for u, v in [(1, 2), (2, 3), (3, 1), (3, 4)]:
+        >>>     conn.insert(u, v)
+        >>> # the cycle still connects 1 to 3 through 2
+        >>> print(conn.delete(1, 3), conn.label(1) == conn.label(3))
+        False True
+        >>> # removing the bridge splits the component
+        >>> print(conn.delete(3, 4), conn.label(4), conn.component_size(1))
+        True 4 3
+    """
+
+    def __init__(self, num_samples=16):
+        self.num_samples = num_samples
+        self.forests = [EulerTourForest(track_min=True)]
+        self.nontree = [{}]
+        self.edge_level = {}
+        self.tree_edges = set()
+
+    def __len__(self):
+        return len(self.forests[0])
+
+    def has_vertex(self, v):
+        return self.forests[0].has_vertex(v)
+
+    def has_edge(self, u, v):
+        return e_(u, v) in self.edge_level
+
+    def add_vertex(self, v):
+        """Returns True if the vertex was not yet known"""
+        if self.forests[0].has_vertex(v):
+            return False
+        self.forests[0].vertex_node(v)
+        return True
+
+    def remove_vertex(self, v):
+        """Removes a vertex whose edges have all been deleted"""
+        for level, forest in enumerate(self.forests):
+            if forest.has_vertex(v):
+                assert not self.nontree[level].get(v, None), 'vertex has edges'
+                forest.remove_vertex(v)
+
+    def connected(self, u, v):
+        return self.forests[0].connected(u, v)
+
+    def label(self, v):
+        """The smallest vertex of the component of ``v``"""
+        return self.forests[0].tree_min(v)
+
+    def component_size(self, v):
+        return self.forests[0].tree_size(v)
+
+    def component_vertices(self, v):
+        return self.forests[0].tree_vertices(v)
+
+    def _ensure_level(self, level):
+        while len(self.forests) <= level:
+            self.forests.append(EulerTourForest())
+            self.nontree.append({})
+
+    def _set_tree_flag(self, level, u, v, flag):
+        # only the first arc of the edge carries the flag
+        arc = self.forests[level].arc_node(u, v)
+        flags = arc.flags | IS_LEVEL_TREE if flag else arc.flags & ~IS_LEVEL_TREE
+        if flags != arc.flags:
+            _set_flags(arc, flags)
+
+    def _add_nontree(self, level, u, v):
+        nontree = self.nontree[level]
+        forest = self.forests[level]
+        for x, y in [(u, v), (v, u)]:
+            nbrs = nontree.get(x, None)
+            if nbrs is None:
+                nbrs = nontree[x] = set()
+                node = forest.vertex_node(x)
+                _set_flags(node, node.flags | HAS_NONTREE)
+            nbrs.add(y)
+
+    def _remove_nontree(self, level, u, v):
+        nontree = self.nontree[level]
+        forest = self.forests[level]
+        for x, y in [(u, v), (v, u)]:
+            nbrs = nontree[x]
+            nbrs.discard(y)
+            if not nbrs:
+                del nontree[x]
+                node = forest.vertex_node(x)
+                _set_flags(node, node.flags & ~HAS_NONTREE)
+
+    def insert(self, u, v):
+        """
+        Adds an edge. Returns True if it connected two components.
+        """
+        edge = e_(u, v)
+        if u == v or edge in self.edge_level:
+            self.add_vertex(u)
+            return False
+        self.edge_level[edge] = 0
+        forest = self.forests[0]
+        if forest.connected(u, v):
+            self._add_nontree(0, u, v)
+            return False
+        forest.link(u, v)
+        self.tree_edges.add(edge)
+        self._set_tree_flag(0, edge[0], edge[1], True)
+        return True
+
+    def insert_many(self, edges):
+        """
+        Adds a batch of edges. The forest trees joined by many of the new
+        tree edges are rebuilt at once instead of being linked edge by edge.
+        """
+        forest = self.forests[0]
+        # Union find over the current trees to tell tree from non-tree edges
+        tree_roots = {}
+        parents = {}
+
+        def tree_root(v):
+            root = tree_roots.get(v, None)
+            if root is None:
+                root = tree_roots[v] = forest.tree_root(v)
+            return root
+
+        def find(node):
+            parent = parents.get(node, node)
+            while parent is not node:
+                # path halving
+                grandparent = parents.get(parent, parent)
+                parents[node] = grandparent
+                node = grandparent
+                parent = parents.get(node, node)
+            return node
+
+        group_edges = []
+        for u, v in edges:
+            self.add_vertex(u)
+            self.add_vertex(v)
+            edge = e_(u, v)
+            if u == v or edge in self.edge_level:
+                continue
+            self.edge_level[edge] = 0
+            root_u = find(tree_root(u))
+            root_v = find(tree_root(v))
+            if root_u is root_v:
+                self._add_nontree(0, u, v)
+            else:
+                parents[root_v] = root_u
+                group_edges.append(edge)
+        groups = {}
+        for edge in group_edges:
+            root = find(tree_root(edge[0]))
+            groups.setdefault(id(root), []).append(edge)
+        log_n = max(len(forest), 2).bit_length()
+        for new_edges in groups.values():
+            roots = {
+                id(root): root
+                for root in (tree_root(v) for edge in new_edges for v in edge)
+            }.values()
+            num_nodes = sum(root.cnt for root in roots)
+            if num_nodes > 8 * log_n * len(new_edges):
+                # Only a few edges join big trees
+                for edge in new_edges:
+                    forest.link(*edge)
+                    self.tree_edges.add(edge)
+                    self._set_tree_flag(0, edge[0], edge[1], True)
+            else:
+                new_arcs = forest.rebuild(roots, new_edges)
+                for edge, arc in zip(new_edges, new_arcs):
+                    self.tree_edges.add(edge)
+                    _set_flags(arc, arc.flags | IS_LEVEL_TREE)
+
+    def delete(self, u, v):
+        """
+        Removes an edge. Returns True if it split a component.
+        """
+        edge = e_(u, v)
+        level = self.edge_level.pop(edge, None)
+        if level is None:
+            return False
+        if edge not in self.tree_edges:
+            self._remove_nontree(level, u, v)
+            return False
+        self.tree_edges.remove(edge)
+        for forest in self.forests[0 : level + 1]:
+            forest.cut(u, v)
+        for level_ in range(level, -1, -1):
+            replacement = self._find_replacement(level_, u, v)
+            if replacement is not None:
+                x, y = replacement
+                for forest in self.forests[0 : level_ + 1]:
+                    forest.link(x, y)
+                self.tree_edges.add(e_(x, y))
+                self._set_tree_flag(level_, *e_(x, y), True)
+                return False
+        return True
+
+    def _sample_replacement(self, level, root):
+        """
+        Checks the first few non-tree edges of a tree for one that leaves it.
+        Using such an edge needs no level changes, which avoids the cost of
+        pushing edges up when a replacement is easy to find.
+        """
+        forest = self.forests[level]
+        nontree = self.nontree[level]
+        num_checked = 0
+        for node in _iter_flagged(root, HAS_NONTREE):
+            x = node.vertex
+            for y in nontree[x]:
+                if forest.tree_root(y) is not root:
+                    edge = e_(x, y)
+                    self._remove_nontree(level, x, y)
+                    return edge
+                num_checked += 1
+                if num_checked >= self.num_samples:
+                    return None
+        return None
+
+    def _find_replacement(self, level, u, v):
+        forest = self.forests[level]
+        if forest.tree_size(u) > forest.tree_size(v):
+            u, v = v, u
+        root = forest.tree_root(u)
+        replacement = self._sample_replacement(level, root)
+        if replacement is not None:
+            return replacement
+        self._ensure_level(level + 1)
+        upper_forest = self.forests[level + 1]
+        # Push the tree edges of the smaller tree one level up
+        for arc in list(_iter_flagged(root, IS_LEVEL_TREE)):
+            x, y = arc.edge
+            _set_flags(arc, arc.flags & ~IS_LEVEL_TREE)
+            self.edge_level[e_(x, y)] = level + 1
+            upper_forest.link(x, y)
+            self._set_tree_flag(level + 1, *e_(x, y), True)
+        # Look for a non-tree edge leaving the smaller tree. Edges inside it
+        # are pushed one level up.
+        nontree = self.nontree[level]
+        for node in list(_iter_flagged(root, HAS_NONTREE)):
+            x = node.vertex
+            for y in list(nontree.get(x, ())):
+                edge = e_(x, y)
+                self._remove_nontree(level, x, y)
+                if forest.tree_root(y) is root:
+                    self.edge_level[edge] = level + 1
+                    self._add_nontree(level + 1, x, y)
+                else:
+                    return edge
+        return None
@@ -1498,7 +1498,7 @@ class NonDynamicUpdate(object):
         # TODO: Rebalance union find to ensure parents is a single lookup
         # infr.pos_graph._union_find.rebalance(nodes)
         # node_to_label = infr.pos_graph._union_find.parents
-        node_to_label = infr.pos_graph._union_find
+        node_to_label = infr.pos_graph.label_lookup()
 
         # Get reviewed edges using fast lookup structures
         ne_to_edges = {
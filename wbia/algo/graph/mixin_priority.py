@@ -8,6 +8,7 @@ import utool as ut
 from wbia import constants as const
 from wbia.algo.graph import mixin_loops
 from wbia.algo.graph import nx_utils as nxu
+from wbia.algo.graph import priority_queue
 from wbia.algo.graph.state import DIFF, NEGTV, NULL, POSTV, SAME  # NOQA
 
 print, rrr, profile = ut.inject2(__name__)
@@ -39,26 +40,52 @@ class Priority(object):
 
     def _push(infr, edge, priority):
         """Wraps queue so ordering is determenistic"""
+        infr._push_many([edge], [priority])
+
+    def _push_many(infr, edges, priorities):
+        """Pushes many edges into the queue at once"""
         PSEUDO_RANDOM_TIEBREAKER = False
-        if PSEUDO_RANDOM_TIEBREAKER:
-            # Make it so tiebreakers have a pseudo-random order
-            chaotic = int.from_bytes(ut.digest_data(edge, alg='sha1')[:8], 'big')
-            tiebreaker = (chaotic,) + edge
-        else:
-            tiebreaker = edge
-        infr.assert_edge(edge)
+        items = []
+        for edge, priority in zip(edges, priorities):
+            if PSEUDO_RANDOM_TIEBREAKER:
+                # Make it so tiebreakers have a pseudo-random order
+                chaotic = int.from_bytes(ut.digest_data(edge, alg='sha1')[:8], 'big')
+                tiebreaker = (chaotic,) + edge
+            else:
+                tiebreaker = edge
+            infr.assert_edge(edge)
+            items.append((edge, (-priority, tiebreaker)))
 
         if False and mixin_loops.PRINCETON_KAIA_EDGE_LIST is not None:
             # logger.info('[Priority._push] FILTERING EDGES FOR KAIA')
             # Sanity check, make sure that one of the edges is in the tier 1 dataset
             include_filter_set = set(mixin_loops.PRINCETON_KAIA_EDGE_LIST)
 
-            u, v = edge
-            if u not in include_filter_set and v not in include_filter_set:
-                return
+            items = [
+                (edge, value)
+                for edge, value in items
+                if edge[0] in include_filter_set or edge[1] in include_filter_set
+            ]
 
         # tiebreaker = (chaotic(chaotic(u) + chaotic(v)), u, v)
-        infr.queue[edge] = (-priority, tiebreaker)
+        infr.queue.bulk_push(items)
+
+    def save_queue(infr, fpath):
+        """
+        Saves the review queue, so a review session can restart from it with
+        load_queue instead of prioritizing every edge again
+        """
+        ut.save_data(fpath, infr.queue)
+
+    def load_queue(infr, fpath):
+        """
+        Restores a review queue saved by save_queue. Edges that are no longer
+        in the graph are dropped.
+        """
+        queue = ut.load_data(fpath)
+        stale_edges = [edge for edge in queue if not infr.graph.has_edge(*edge)]
+        queue.bulk_remove(stale_edges)
+        infr.queue = queue
 
     def _peek_many(infr, n):
         """Wraps queue so ordering is determenistic"""
@@ -67,10 +94,9 @@ class Priority(object):
     def _remove_edge_priority(infr, edges):
         if infr.queue is None:
             return
-        edges_ = [edge for edge in edges if edge in infr.queue]
-        if len(edges_) > 0:
-            infr.print('removed priority from {} edges'.format(len(edges_)), 5)
-            infr.queue.delete_items(edges_)
+        num_removed = infr.queue.bulk_remove(edges)
+        if num_removed > 0:
+            infr.print('removed priority from {} edges'.format(num_removed), 5)
 
     def _reinstate_edge_priority(infr, edges):
         if infr.queue is None:
@@ -81,8 +107,7 @@ class Priority(object):
             metric = 'prob_match'
             infr.print('reprioritize {} edges'.format(len(edges_)), 5)
             priorities = infr.gen_edge_values(metric, edges_, default=1e-9)
-            for edge, priority in zip(edges_, priorities):
-                infr._push(edge, priority)
+            infr._push_many(edges_, priorities)
 
     def _increase_priority(infr, edges, amount=10):
         if infr.queue is None:
@@ -90,8 +115,11 @@ class Priority(object):
         infr.print('increase priority of {} edges'.format(len(edges)), 5)
         metric = 'prob_match'
         priorities = infr.gen_edge_values(metric, edges, default=1e-9)
-        for edge, base in zip(edges, priorities):
-            infr.push(edge, base + amount)
+        priorities = [
+            infr._corrected_priority(edge, base + amount)
+            for edge, base in zip(edges, priorities)
+        ]
+        infr._push_many(edges, priorities)
 
     def remove_internal_priority(infr, cc):
         if infr.queue is not None:
@@ -148,6 +176,10 @@ class Priority(object):
 
         return corrected_priority
 
+    def _corrected_priority(infr, edge, priority):
+        corrected_priority = infr._correct_priorities(edge, priority)
+        return priority if corrected_priority is None else corrected_priority
+
     @profile
     def prioritize(
         infr, metric=None, edges=None, scores=None, force_inconsistent=True, reset=False
@@ -196,7 +228,7 @@ class Priority(object):
             logger.info(ut.repr4(infr.status()))
         """
         if reset or infr.queue is None:
-            infr.queue = ut.PriorityQueue()
+            infr.queue = priority_queue.IndexedPriorityQueue()
         low = 1e-9
         if metric is None:
             metric = 'prob_match'
@@ -248,14 +280,12 @@ class Priority(object):
             priorities[err_flags] += 10
 
         # Push new items into the priority queue
-        num_new = 0
-        for edge, priority in zip(edges, priorities):
-            if edge not in infr.queue:
-                num_new += 1
-            corrected_priority = infr._correct_priorities(edge, priority)
-            if corrected_priority is not None:
-                priority = corrected_priority
-            infr._push(edge, priority)
+        num_new = sum(edge not in infr.queue for edge in edges)
+        priorities = [
+            infr._corrected_priority(edge, priority)
+            for edge, priority in zip(edges, priorities)
+        ]
+        infr._push_many(edges, priorities)
 
         infr.print('added %d edges to the queue' % (num_new,), 1)
         return num_new
@@ -13,6 +13,7 @@ import ubelt as ub
 import utool as ut
 
 from wbia.algo.graph import nx_utils as nxu
+from wbia.algo.graph import priority_queue
 from wbia.algo.graph.state import INCMP, NEGTV, NULL, POSTV, UNKWN, UNREV
 
 print, rrr, profile = ut.inject2(__name__)
@@ -47,7 +48,7 @@ class SimulationHelpers(object):
         # keeps track of edges where the decision != the groundtruth
         infr.mistake_edges = set()
 
-        infr.queue = ut.PriorityQueue()
+        infr.queue = priority_queue.IndexedPriorityQueue()
 
         infr.oracle = UserOracle(oracle_accuracy, rng=infr.name)
 
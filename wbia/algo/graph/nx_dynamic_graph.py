@@ -5,11 +5,15 @@ import logging
 import networkx as nx
 import utool as ut
 
+from wbia.algo.graph import euler_tour
 from wbia.algo.graph.nx_utils import e_, edges_inside
 
 print, rrr, profile = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
 
+# Connectivity backend used by DynConnGraph ('euler_tour' or 'union_find')
+DYNCONN_BACKEND = ut.get_argval('--dynconn-backend', type_=str, default='euler_tour')
+
 
 class GraphHelperMixin(ut.NiceRepr):
     def __nice__(self):
@@ -118,6 +122,168 @@ class nx_UnionFind(object):
                 self.parents[x] = x
 
 
+class UnionFindConnectivity(object):
+    """
+    Connectivity backend based on union find. Insertions are fast, but
+    removing an edge rebuilds its entire component.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.ccs = {}
+        self.union_find = nx_UnionFind()
+
+    def clear(self):
+        self.ccs = {}
+        self.union_find.clear()
+
+    def label(self, node):
+        return self.union_find[node]
+
+    def cut(self, u, v):
+        """Decremental connectivity (slow)"""
+        old_nid1 = self.union_find[u]
+        old_nid2 = self.union_find[v]
+        if old_nid1 != old_nid2:
+            return
+        # Need to break appart entire component and then reconstruct it
+        old_cc = self.ccs[old_nid1]
+        del self.ccs[old_nid1]
+        self.union_find.remove_entire_cc(old_cc)
+        # Might be faster to just do DFS to find the CC
+        internal_edges = edges_inside(self.graph, old_cc)
+        # Add nodes in case there are no edges to it
+        for n in old_cc:
+            self.add_node(n)
+        for edge in internal_edges:
+            self.union(*edge)
+
+    def union(self, u, v):
+        """Incremental connectivity (fast)"""
+        self.add_node(u)
+        self.add_node(v)
+        old_nid1 = self.union_find[u]
+        old_nid2 = self.union_find[v]
+        self.union_find.union(u, v)
+        new_nid = self.union_find[u]
+        for old_nid in [old_nid1, old_nid2]:
+            if new_nid != old_nid:
+                parts = self.ccs.pop(old_nid)
+                self.ccs[new_nid].update(parts)
+
+    def union_many(self, edges):
+        for u, v in edges:
+            self.union(u, v)
+
+    def add_node(self, n):
+        if self.union_find.add_element(n):
+            self.ccs[n] = {n}
+
+    def remove_node(self, n):
+        if n in self.union_find.parents:
+            del self.union_find.weights[n]
+            del self.union_find.parents[n]
+            del self.ccs[n]
+
+
+class EulerTourConnectivity(object):
+    """
+    Fully dynamic connectivity backend (see :mod:`euler_tour`). Edge updates
+    take polylogarithmic amortized time and a split only touches the nodes of
+    the smaller side.
+
+    Labels and component sets behave like the union find backend: the label
+    of a component is its smallest node and a merge adds the nodes of the
+    other component to the set of the smallest label.
+    """
+
+    def __init__(self, graph):
+        self.ccs = {}
+        self.dynconn = euler_tour.DynamicConnectivity()
+
+    def clear(self):
+        self.ccs = {}
+        self.dynconn = euler_tour.DynamicConnectivity()
+
+    def label(self, node):
+        if not self.dynconn.has_vertex(node):
+            return node
+        return self.dynconn.label(node)
+
+    def cut(self, u, v):
+        dynconn = self.dynconn
+        if not dynconn.delete(u, v):
+            if dynconn.has_vertex(u) and dynconn.has_vertex(v):
+                label = dynconn.label(u)
+                if label == dynconn.label(v):
+                    # The union find backend rebuilds the component on every
+                    # cut, which moves it to the end of the component order
+                    self.ccs[label] = self.ccs.pop(label)
+            return
+        if dynconn.component_size(u) > dynconn.component_size(v):
+            u, v = v, u
+        label_u, label_v = dynconn.label(u), dynconn.label(v)
+        # The larger side keeps the set of the old component
+        cc = self.ccs.pop(min(label_u, label_v))
+        small_cc = set(dynconn.component_vertices(u))
+        cc.difference_update(small_cc)
+        new_ccs = {label_u: small_cc, label_v: cc}
+        for label in sorted(new_ccs):
+            self.ccs[label] = new_ccs[label]
+
+    def union(self, u, v):
+        self.add_node(u)
+        self.add_node(v)
+        label_u, label_v = self.dynconn.label(u), self.dynconn.label(v)
+        if not self.dynconn.insert(u, v):
+            return
+        new_label, old_label = sorted([label_u, label_v])
+        self.ccs[new_label].update(self.ccs.pop(old_label))
+
+    def union_many(self, edges):
+        edges = [(u, v) for u, v in edges]
+        for u, v in edges:
+            self.add_node(u)
+            self.add_node(v)
+        dynconn = self.dynconn
+        old_labels = {}
+        for edge in edges:
+            for n in edge:
+                if n not in old_labels:
+                    old_labels[n] = dynconn.label(n)
+        dynconn.insert_many(edges)
+        for n, old_label in old_labels.items():
+            if old_label in self.ccs:
+                new_label = dynconn.label(n)
+                if new_label != old_label:
+                    self.ccs[new_label].update(self.ccs.pop(old_label))
+
+    def add_node(self, n):
+        if self.dynconn.add_vertex(n):
+            self.ccs[n] = {n}
+
+    def remove_node(self, n):
+        if self.dynconn.has_vertex(n):
+            self.dynconn.remove_vertex(n)
+            del self.ccs[n]
+
+
+class _LabelLookup(object):
+    __slots__ = ('conn',)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getitem__(self, node):
+        return self.conn.label(node)
+
+
+CONNECTIVITY_BACKENDS = {
+    'euler_tour': EulerTourConnectivity,
+    'union_find': UnionFindConnectivity,
+}
+
+
 class DynConnGraph(nx.Graph, GraphHelperMixin):
     """
     Dynamically connected graph.
@@ -135,6 +301,9 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
 
     * it seems to be very quick
 
+    The backend is chosen with ``DYNCONN_BACKEND`` (``--dynconn-backend``):
+    'euler_tour' (EulerTourForest above) or 'union_find' (UnionFind2).
+
     References:
         https://courses.csail.mit.edu/6.851/spring14/lectures/L20.pdf
         https://courses.csail.mit.edu/6.851/spring14/lectures/L20.html
@@ -169,16 +338,19 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     # todo: check if nodes exist when adding
     """
 
-    def __init__(self, *args, **kwargs):
-        # raise NotImplementedError('unfinished')
-        self._ccs = {}
-        self._union_find = nx_UnionFind()
+    def __init__(self, *args, connectivity=None, **kwargs):
+        if connectivity is None:
+            connectivity = DYNCONN_BACKEND
+        self._conn = CONNECTIVITY_BACKENDS[connectivity](self)
         super(DynConnGraph, self).__init__(*args, **kwargs)
 
+    @property
+    def _ccs(self):
+        return self._conn.ccs
+
     def clear(self):
         super(DynConnGraph, self).clear()
-        self._ccs = {}
-        self._union_find.clear()
+        self._conn.clear()
 
     def __nice__(self):
         return 'nNodes={}, nEdges={}, nCCs={}'.format(
@@ -194,7 +366,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     component_nodes = component
 
     def connected_to(self, node):
-        return self._ccs[self._union_find[node]]
+        return self._ccs[self._conn.label(node)]
 
     def node_label(self, node):
         """
@@ -206,10 +378,14 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
             >>> assert self.node_label(2) == self.node_label(1)
             >>> assert self.node_label(2) != self.node_label(4)
         """
-        return self._union_find[node]
+        return self._conn.label(node)
 
     def node_labels(self, *nodes):
-        return [self._union_find[node] for node in nodes]
+        return [self._conn.label(node) for node in nodes]
+
+    def label_lookup(self):
+        """Returns an object that maps nodes to labels with ``__getitem__``"""
+        return _LabelLookup(self._conn)
 
     def are_nodes_connected(self, u, v):
         return ut.allsame(self.node_labels(u, v))
@@ -234,49 +410,16 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     # -----
 
     def _cut(self, u, v):
-        """Decremental connectivity (slow)"""
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        if old_nid1 != old_nid2:
-            return
-        # Need to break appart entire component and then reconstruct it
-        old_cc = self._ccs[old_nid1]
-        del self._ccs[old_nid1]
-        self._union_find.remove_entire_cc(old_cc)
-        # Might be faster to just do DFS to find the CC
-        internal_edges = edges_inside(self, old_cc)
-        # Add nodes in case there are no edges to it
-        for n in old_cc:
-            self._add_node(n)
-        for edge in internal_edges:
-            self._union(*edge)
+        self._conn.cut(u, v)
 
     def _union(self, u, v):
-        """Incremental connectivity (fast)"""
-        # logger.info('Union ({})'.format((u, v)))
-        self._add_node(u)
-        self._add_node(v)
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        self._union_find.union(u, v)
-        new_nid = self._union_find[u]
-        for old_nid in [old_nid1, old_nid2]:
-            if new_nid != old_nid:
-                parts = self._ccs.pop(old_nid)
-                # FIXME: this step can be quite bad for time complexity.
-                # An Euler Tour Tree might solve the issue
-                self._ccs[new_nid].update(parts)
+        self._conn.union(u, v)
 
     def _add_node(self, n):
-        if self._union_find.add_element(n):
-            # logger.info('Add ({})'.format((n)))
-            self._ccs[n] = {n}
+        self._conn.add_node(n)
 
     def _remove_node(self, n):
-        if n in self._union_find.parents:
-            del self._union_find.weights[n]
-            del self._union_find.parents[n]
-            del self._ccs[n]
+        self._conn.remove_node(n)
 
     def add_edge(self, u, v, **attr):
         """
@@ -295,8 +438,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     def add_edges_from(self, ebunch, **attr):
         ebunch = list(ebunch)
         # logger.info('add_edges_from %r' % (ebunch,))
-        for e in ebunch:
-            self._union(*e)
+        self._conn.union_many(e[0:2] for e in ebunch)
         super(DynConnGraph, self).add_edges_from(ebunch, **attr)
 
     # ----
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def benchmark_dynconn_updates(num_nodes=100000, num_updates=200, seed=0):
+    r"""
+    Measures edge insertions, edge deletions and label queries on one large
+    DynConnGraph component for each connectivity backend.
+
+    CommandLine:
+        python -m wbia.algo.graph.tests.bench benchmark_dynconn_updates
+        python -m wbia.algo.graph.tests.bench benchmark_dynconn_updates --num_nodes=10000
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.graph.tests.bench import *  # NOQA
+        >>> num_nodes = ut.get_argval('--num_nodes', default=100000)
+        >>> result = benchmark_dynconn_updates(num_nodes)
+        >>> print(ut.repr2(result, precision=4))
+    """
+    import random
+
+    from wbia.algo.graph.nx_dynamic_graph import DynConnGraph
+
+    rng = random.Random(seed)
+    # A path through all nodes with random chords
+    edges = [(i, i + 1) for i in range(num_nodes - 1)]
+    edges += [
+        (rng.randrange(num_nodes), rng.randrange(num_nodes))
+        for _ in range(num_nodes // 2)
+    ]
+    cut_edges = rng.sample(edges[: num_nodes - 1], num_updates)
+    add_edges = [
+        (rng.randrange(num_nodes), rng.randrange(num_nodes))
+        for _ in range(num_updates)
+    ]
+    query_nodes = [rng.randrange(num_nodes) for _ in range(num_updates)]
+    result = {}
+    for backend in ['union_find', 'euler_tour']:
+        graph = DynConnGraph(connectivity=backend)
+        with ut.Timer(verbose=False) as build_timer:
+            graph.add_edges_from(edges)
+        with ut.Timer(verbose=False) as cut_timer:
+            for edge in cut_edges:
+                graph.remove_edge(*edge)
+        with ut.Timer(verbose=False) as add_timer:
+            for edge in add_edges:
+                graph.add_edge(*edge)
+        with ut.Timer(verbose=False) as query_timer:
+            graph.node_labels(*query_nodes)
+        result[backend] = {
+            'build_sec': build_timer.ellapsed,
+            'cut_ms': 1000 * cut_timer.ellapsed / num_updates,
+            'add_ms': 1000 * add_timer.ellapsed / num_updates,
+            'label_ms': 1000 * query_timer.ellapsed / num_updates,
+            'num_ccs': graph.number_of_components(),
+        }
+    return result
+
+
+def benchmark_review_throughput(num_pccs=1000, size=20, num_reviews=500, seed=0):
+    r"""
+    Measures the number of reviews per second that AnnotInference can apply
+    with each DynConnGraph connectivity backend. Each positive edge is first
+    reviewed as negative (which may split its PCC) and then as positive again
+    (which merges it back), so the PCC sizes stay close to ``size``.
+
+    CommandLine:
+        python -m wbia.algo.graph.tests.bench benchmark_review_throughput
+        python -m wbia.algo.graph.tests.bench benchmark_review_throughput --num_pccs=5000 --size=20
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.graph.tests.bench import *  # NOQA
+        >>> num_pccs = ut.get_argval('--num_pccs', default=1000)
+        >>> size = ut.get_argval('--size', default=20)
+        >>> result = benchmark_review_throughput(num_pccs, size)
+        >>> print(ut.repr2(result, precision=1))
+    """
+    import random
+
+    from wbia.algo.graph import demo, nx_dynamic_graph
+    from wbia.algo.graph.state import NEGTV, POSTV
+
+    orig_backend = nx_dynamic_graph.DYNCONN_BACKEND
+    result = {}
+    try:
+        for backend in ['union_find', 'euler_tour']:
+            nx_dynamic_graph.DYNCONN_BACKEND = backend
+            infr = demo.demodata_infr(
+                num_pccs=num_pccs, size=size, size_std=0, p_incon=0, infer=True
+            )
+            infr.verbose = 0
+            rng = random.Random(seed)
+            pos_edges = sorted(infr.pos_graph.edges())
+            rng.shuffle(pos_edges)
+            reviews = []
+            for edge in pos_edges[: num_reviews // 2]:
+                reviews.append((edge, NEGTV))
+                reviews.append((edge, POSTV))
+            with ut.Timer(backend, verbose=False) as timer:
+                for edge, decision in reviews:
+                    infr.add_feedback(edge, decision)
+            result[backend] = {
+                'reviews_per_sec': len(reviews) / timer.ellapsed,
+                'num_pccs': infr.pos_graph.number_of_components(),
+            }
+    finally:
+        nx_dynamic_graph.DYNCONN_BACKEND = orig_backend
+    return result
+
+
+def benchmark_priority_queue(num_edges=200000, num_rounds=2000, k=50, seed=0):
+    r"""
+    Compares ut.PriorityQueue with IndexedPriorityQueue on the queue traffic
+    of a review session: each round removes the edges of a PCC, reinstates
+    edges between PCCs, re-keys some edges, peeks at the top of the queue and
+    pops the best edge.
+
+    CommandLine:
+        python -m wbia.algo.graph.tests.bench benchmark_priority_queue
+        python -m wbia.algo.graph.tests.bench benchmark_priority_queue --num_edges=1000000
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.graph.tests.bench import *  # NOQA
+        >>> num_edges = ut.get_argval('--num_edges', default=200000)
+        >>> result = benchmark_priority_queue(num_edges)
+        >>> print(ut.repr2(result, precision=4))
+    """
+    import random
+
+    from wbia.algo.graph.priority_queue import IndexedPriorityQueue
+
+    rng = random.Random(seed)
+    edges = [(idx, idx + 1 + rng.randrange(100)) for idx in range(num_edges)]
+    items = [(edge, (-rng.random(), edge)) for edge in edges]
+    rounds = []
+    for _ in range(num_rounds):
+        start = rng.randrange(num_edges - k)
+        remove = edges[start : start + k]
+        reinstate = [items[rng.randrange(num_edges)] for _ in range(k)]
+        rekey = [(edge, (-rng.random(), edge)) for edge in rng.sample(edges, k)]
+        rounds.append((remove, reinstate, rekey))
+
+    def run_ut(queue):
+        for remove, reinstate, rekey in rounds:
+            queue.delete_items([edge for edge in remove if edge in queue])
+            for edge, value in reinstate:
+                queue[edge] = value
+            for edge, value in rekey:
+                if edge in queue:
+                    queue[edge] = value
+            queue.peek_many(50)
+            queue.pop()
+
+    def run_indexed(queue):
+        for remove, reinstate, rekey in rounds:
+            queue.bulk_remove(remove)
+            queue.bulk_push(reinstate)
+            queue.bulk_update_priority(rekey)
+            queue.peek_many(50)
+            queue.pop()
+
+    result = {}
+    for name, queue_class, run in [
+        ('ut.PriorityQueue', ut.PriorityQueue, run_ut),
+        ('IndexedPriorityQueue', IndexedPriorityQueue, run_indexed),
+    ]:
+        with ut.Timer(verbose=False) as build_timer:
+            queue = queue_class(items)
+        with ut.Timer(verbose=False) as round_timer:
+            run(queue)
+        result[name] = {
+            'build_sec': build_timer.ellapsed,
+            'round_ms': 1000 * round_timer.ellapsed / num_rounds,
+            'top': queue.peek(),
+        }
+    return result
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m wbia.algo.graph.tests.bench
+    """
+    import xdoctest
+
+    xdoctest.doctest_module(__file__)
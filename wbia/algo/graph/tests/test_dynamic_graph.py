@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def assert_same_connectivity(graph1, graph2):
+    assert graph1._ccs == graph2._ccs
+    nodes = list(graph1.nodes())
+    assert graph1.node_labels(*nodes) == graph2.node_labels(*nodes)
+    for node in nodes:
+        assert graph1.connected_to(node) == graph2.connected_to(node)
+
+
+def test_dynamic_connectivity_backends_agree():
+    """
+    Applies the same random sequence of edge and node updates to a
+    DynConnGraph with each connectivity backend and checks that labels and
+    components always agree.
+    """
+    from wbia.algo.graph.nx_dynamic_graph import DynConnGraph
+
+    for seed in range(20):
+        rng = random.Random(seed)
+        num_nodes = rng.randint(2, 60)
+        nodes = list(range(num_nodes))
+        graph1 = DynConnGraph(connectivity='union_find')
+        graph2 = DynConnGraph(connectivity='euler_tour')
+        for step in range(400):
+            action = rng.random()
+            if action < 0.5 or graph1.number_of_edges() == 0:
+                edges = [
+                    (rng.choice(nodes), rng.choice(nodes))
+                    for _ in range(rng.choice([1, 1, 1, 5]))
+                ]
+                if len(edges) == 1:
+                    graph1.add_edge(*edges[0])
+                    graph2.add_edge(*edges[0])
+                else:
+                    graph1.add_edges_from(edges)
+                    graph2.add_edges_from(edges)
+            elif action < 0.9:
+                edge = rng.choice(list(graph1.edges()))
+                graph1.remove_edge(*edge)
+                graph2.remove_edge(*edge)
+            elif action < 0.95:
+                node = rng.choice(list(graph1.nodes()))
+                graph1.remove_node(node)
+                graph2.remove_node(node)
+            else:
+                node = rng.choice(nodes)
+                graph1.add_node(node)
+                graph2.add_node(node)
+            assert_same_connectivity(graph1, graph2)
+
+
+def test_dynamic_connectivity_split_large_component():
+    from wbia.algo.graph.nx_dynamic_graph import DynConnGraph
+
+    graph = DynConnGraph(connectivity='euler_tour')
+    # A path 0 - 1 - ... - 999 with a few chords
+    graph.add_edges_from((i, i + 1) for i in range(999))
+    graph.add_edges_from([(0, 500), (250, 750)])
+    assert graph.number_of_components() == 1
+    graph.remove_edges_from([(499, 500), (0, 500)])
+    assert graph.number_of_components() == 1
+    graph.remove_edge(749, 750)
+    assert graph.number_of_components() == 2
+    assert graph.component(500) == set(range(500, 750))
+    graph.remove_edge(250, 750)
+    assert graph.number_of_components() == 3
+    assert graph.component(0) == set(range(0, 500))
+    assert graph.component(750) == set(range(750, 1000))
+    assert graph.node_labels(10, 600, 999) == [0, 500, 750]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import copy
+import logging
+import pickle
+import random
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def assert_heap_invariant(queue):
+    heap = queue._heap
+    for pos in range(1, len(heap)):
+        assert not heap[pos] < heap[(pos - 1) // 2]
+    # Every item has a live entry in the heap
+    live = {key for val, key in heap if queue._index.get(key) == val}
+    assert live == set(queue._index)
+
+
+def test_indexed_priority_queue_matches_dict():
+    """
+    Applies the same random single and bulk operations to an
+    IndexedPriorityQueue and to a dict and checks that the queue always pops
+    and peeks the smallest items of the dict.
+    """
+    from wbia.algo.graph.priority_queue import IndexedPriorityQueue
+
+    for seed in range(20):
+        rng = random.Random(seed)
+        queue = IndexedPriorityQueue()
+        ref = {}
+        for step in range(300):
+            action = rng.random()
+            keys = [rng.randrange(200) for _ in range(rng.choice([1, 3, 50]))]
+            items = [(key, (rng.random(), key)) for key in keys]
+            if action < 0.3:
+                queue.bulk_push(items)
+                ref.update(items)
+            elif action < 0.45:
+                present = [(key, val) for key, val in items if key in ref]
+                assert queue.bulk_update_priority(items) == len(present)
+                ref.update(present)
+            elif action < 0.6:
+                assert queue.bulk_remove(keys) == len(set(keys) & set(ref))
+                ut.delete_dict_keys(ref, keys)
+            elif action < 0.7:
+                key, val = items[0]
+                queue[key] = ref[key] = val
+            elif action < 0.8 and ref:
+                key, val = min(ref.items(), key=lambda t: t[1])
+                assert queue.pop() == (key, val)
+                del ref[key]
+            elif action < 0.9 and keys[0] in ref:
+                assert queue.pop(keys[0]) == (keys[0], ref.pop(keys[0]))
+            else:
+                num = rng.choice([0, 1, 5, 1000])
+                expected = sorted(ref.items(), key=lambda t: t[1])[:num]
+                assert queue.peek_many(num) == expected
+            assert len(queue) == len(ref)
+            assert dict(queue.items()) == ref
+            assert_heap_invariant(queue)
+
+
+def test_indexed_priority_queue_pickle():
+    from wbia.algo.graph.priority_queue import IndexedPriorityQueue
+
+    rng = random.Random(0)
+    queue = IndexedPriorityQueue((key, rng.random()) for key in range(1000))
+    queue.bulk_remove(range(0, 1000, 3))
+    for queue2 in [pickle.loads(pickle.dumps(queue)), copy.deepcopy(queue)]:
+        assert queue2 == queue
+        assert len(queue2._heap) == len(queue2)
+        assert_heap_invariant(queue2)
+        assert queue2.peek_many(10) == queue.peek_many(10)
+        queue2.pop()
+        assert len(queue2) == len(queue) - 1
+
+
+def test_infr_queue_save_load(tmp_path):
+    from wbia.algo.graph import demo
+    from wbia.algo.graph.state import NEGTV
+
+    infr = demo.demodata_infr(num_pccs=10, size=4)
+    infr.refresh_candidate_edges()
+    infr.prioritize(reset=True)
+    assert_heap_invariant(infr.queue)
+    fpath = str(tmp_path / 'queue.pkl')
+    infr.save_queue(fpath)
+    top = infr._peek_many(5)
+    edge, _ = top[0]
+    infr.add_feedback(edge, NEGTV)
+    assert edge not in infr.queue
+    infr.load_queue(fpath)
+    assert infr._peek_many(5) == top
+    # Removing the edges inside a PCC removes all of them at once
+    cc = next(iter(infr.positive_components()))
+    infr.remove_internal_priority(cc)
+    assert not any(u in cc and v in cc for u, v in infr.queue)
+    assert_heap_invariant(infr.queue)
+
+
+def test_simulated_review_loop():
+    from wbia.algo.graph import demo
+    from wbia.algo.graph.priority_queue import IndexedPriorityQueue
+
+    infr = demo.demodata_infr(pcc_sizes=[5, 2, 4])
+    infr.ensure_cliques()
+    infr.ensure_full()
+    infr.init_simulation(oracle_accuracy=1.0, name='test_simulated_review_loop')
+    assert isinstance(infr.queue, IndexedPriorityQueue)
+    infr.clear_feedback()
+    infr.clear_name_labels()
+    infr.clear_edges()
+    infr.refresh_candidate_edges()
+    num_reviews = 0
+    while True:
+        item = infr.pop()
+        if item is None:
+            break
+        edge, _ = item
+        infr.add_feedback(edge, **infr.request_oracle_review(edge))
+        num_reviews += 1
+        assert num_reviews < 100
+    status = infr.status(extended=False)
+    assert num_reviews > 0
+    assert status['nCCs'] == 3
+    assert status['nPosRedunCCs'] == 3
+    assert status['nInconsistentCCs'] == 0
@@ -8,6 +8,7 @@ import utool
 from wbia.algo.hots import (
     _pipeline_helpers,
     chip_match,
+    chipmatch_store,
     exceptions,
     hstypes,
     match_chips4,
@@ -84,6 +85,7 @@ def reload_subs(verbose=True):
 
     get_rrr(_pipeline_helpers)(verbose=verbose)
     get_rrr(chip_match)(verbose=verbose)
+    get_rrr(chipmatch_store)(verbose=verbose)
     get_rrr(exceptions)(verbose=verbose)
     get_rrr(hstypes)(verbose=verbose)
     get_rrr(match_chips4)(verbose=verbose)
@@ -109,6 +111,7 @@ rrrr = reload_subs
 IMPORT_TUPLES = [
     ('_pipeline_helpers', None),
     ('chip_match', None),
+    ('chipmatch_store', None),
     ('exceptions', None),
     ('hstypes', None),
     ('match_chips4', None),
@@ -0,0 +1,617 @@
+# -*- coding: utf-8 -*-
+"""
+Packed storage for the chip matches computed with one query config.
+
+Instead of one ``ut.save_cPkl`` file per query, the chip matches of a config
+are appended to a few large segment files next to a SQLite index::
+
+    <qresdir>/cmstore_<cfg hashid>/segment0000.bin
+    <qresdir>/cmstore_<cfg hashid>/index.sqlite3
+
+A record keeps the per-annot columns of a ChipMatch (daid_list, score_list,
+...) as they are, and packs each per-annot list of arrays (fm_list, fsv_list,
+fk_list, ...) into one flat array plus the length of every item. The index
+maps (qaid, pipe hashid) to the segment, offset and size of the latest record
+of a query and to the query uuid it was computed for.
+
+Loading many results is a few index queries and one sequential read per
+segment. The returned :class:`PackedChipMatch` objects split the flat columns
+back into per-annot views only when they are first accessed.
+
+Segments are append-only. Once replaced or deleted records take up more than
+half of the segments (and at least ``min_dead_nbytes``), a save compacts the
+store: the live records are copied into new segments and the old ones are
+removed. Compaction holds an exclusive lock on the store, saves and loads hold
+a shared one.
+"""
+import itertools as it
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from os.path import basename, exists, join
+
+import numpy as np
+import utool as ut
+
+from wbia.algo.hots import chip_match
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+INDEX_FNAME = 'index.sqlite3'
+LOCK_FNAME = 'store.lock'
+SEGMENT_FNAME_FMT = 'segment{index:04d}.bin'
+SEGMENT_PATTERN = re.compile(r'segment(\d+)\.bin$')
+#: Start a new segment once the current one reaches this size
+DEFAULT_SEGMENT_NBYTES = 2 ** 30
+#: Compact once dead records take this many bytes and half of the segments
+DEFAULT_MIN_DEAD_NBYTES = 2 ** 26
+#: Seconds to wait for an index lock held by another process
+INDEX_TIMEOUT = 600
+# Index lookups are issued in chunks to stay below the SQLite variable limit
+INDEX_CHUNKSIZE = 500
+#: ChipMatch attributes that hold one array per database annotation
+PACKED_LIST_ATTRS = [
+    'fm_list',
+    'fsv_list',
+    'fk_list',
+    'fs_list',
+    'H_list',
+    'name_groupxs',
+]
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chipmatch (
+        qaid INTEGER NOT NULL,
+        pipe_hashid TEXT NOT NULL,
+        qauuid TEXT,
+        segment TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        nbytes INTEGER NOT NULL,
+        PRIMARY KEY (qaid, pipe_hashid)
+    )
+"""
+
+
+def pack_array_list(arr_list):
+    """
+    Packs a list of arrays with the same dtype and trailing shape into one
+    flat array and the length of each item.
+
+    Returns:
+        tuple: (flat, lens) or None if the list cannot be packed
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.chipmatch_store import *  # NOQA
+        >>> arr_list = [np.ones((2, 3)), np.zeros((0, 3)), np.ones((1, 3))]
+        >>> flat, lens = pack_array_list(arr_list)
+        >>> print(flat.shape, lens.tolist())
+        (3, 3) [2, 0, 1]
+        >>> print([arr.shape for arr in unpack_array_list(flat, lens)])
+        [(2, 3), (0, 3), (1, 3)]
+        >>> print(pack_array_list([np.eye(3), None]))
+        None
+    """
+    if arr_list is None or len(arr_list) == 0:
+        return None
+    first = arr_list[0]
+    for arr in arr_list:
+        if not isinstance(arr, np.ndarray) or arr.ndim == 0:
+            return None
+        if arr.dtype != first.dtype or arr.shape[1:] != first.shape[1:]:
+            return None
+    flat = np.concatenate(arr_list, axis=0)
+    lens = np.array([len(arr) for arr in arr_list], dtype=np.int64)
+    return flat, lens
+
+
+def unpack_array_list(flat, lens):
+    """Splits a packed column back into a list of views"""
+    return np.split(flat, np.cumsum(lens)[:-1])
+
+
+# Guards the move of a column from cm._packed to cm.__dict__
+_UNPACK_LOCK = threading.Lock()
+
+
+class _PackedColumn(object):
+    """Attribute that is unpacked from ``cm._packed`` when first accessed"""
+
+    def __init__(self, attr):
+        self.attr = attr
+
+    def __get__(self, cm, objtype=None):
+        if cm is None:
+            return self
+        state = cm.__dict__
+        if self.attr not in state:
+            with _UNPACK_LOCK:
+                if self.attr not in state:
+                    packed = state.get('_packed', {})
+                    if self.attr not in packed:
+                        raise AttributeError(self.attr)
+                    flat, lens = packed[self.attr]
+                    state[self.attr] = unpack_array_list(flat, lens)
+                    del packed[self.attr]
+        return state[self.attr]
+
+    def __set__(self, cm, value):
+        with _UNPACK_LOCK:
+            cm.__dict__.get('_packed', {}).pop(self.attr, None)
+            cm.__dict__[self.attr] = value
+
+
+class PackedChipMatch(chip_match.ChipMatch):
+    """
+    A ChipMatch loaded from a :class:`ChipMatchStore`. It behaves exactly like
+    a ChipMatch, but its per-annot lists are views into the packed columns
+    that are only created when they are used.
+    """
+
+    fm_list = _PackedColumn('fm_list')
+    fsv_list = _PackedColumn('fsv_list')
+    fk_list = _PackedColumn('fk_list')
+    fs_list = _PackedColumn('fs_list')
+    H_list = _PackedColumn('H_list')
+    name_groupxs = _PackedColumn('name_groupxs')
+
+    def materialize(cm):
+        """Unpacks all remaining columns, after which cm is a plain ChipMatch"""
+        for attr in list(cm.__dict__.get('_packed', {}).keys()):
+            getattr(cm, attr)
+        with _UNPACK_LOCK:
+            if not cm.__dict__.get('_packed', True):
+                del cm.__dict__['_packed']
+
+    def __getstate__(cm):
+        cm.materialize()
+        return dict(cm.__dict__)
+
+    def to_json(cm):
+        cm.materialize()
+        return super(PackedChipMatch, cm).to_json()
+
+    def get_rawinfostr(cm, colored=None):
+        cm.materialize()
+        return super(PackedChipMatch, cm).get_rawinfostr(colored=colored)
+
+
+def encode_chipmatch(cm):
+    """Serializes a ChipMatch into a store record"""
+    state_dict = dict(cm.__getstate__())
+    packed = {}
+    for attr in PACKED_LIST_ATTRS:
+        columns = pack_array_list(state_dict.get(attr, None))
+        if columns is not None:
+            packed[attr] = columns
+            del state_dict[attr]
+    return pickle.dumps((state_dict, packed), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_chipmatch(blob, cls=PackedChipMatch):
+    """Deserializes a store record without unpacking its columns"""
+    state_dict, packed = pickle.loads(blob)
+    cm = cls.__new__(cls)
+    cm.__dict__.update(state_dict)
+    cm.__dict__['_packed'] = packed
+    return cm
+
+
+class ChipMatchStore(object):
+    """
+    Append-only store of the chip matches of one query config.
+
+    Args:
+        dpath (str): directory of the store
+        segment_nbytes (int): size at which a new segment file is started
+        min_dead_nbytes (int): bytes of dead records that trigger a
+            compaction (if they are also half of the segments)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.chipmatch_store import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'test_chipmatch_store')
+        >>> ut.delete(dpath)
+        >>> store = ChipMatchStore(dpath, segment_nbytes=1000)
+        >>> rng = np.random.RandomState(0)
+        >>> def make_cm(qaid, num):
+        >>>     fm_list = [rng.randint(0, 100, (n, 2)).astype(np.int32)
+        >>>                for n in rng.randint(0, 10, num)]
+        >>>     fsv_list = [rng.rand(len(fm), 1) for fm in fm_list]
+        >>>     return chip_match.ChipMatch(
+        >>>         qaid=qaid, daid_list=np.arange(num) + 100, fm_list=fm_list,
+        >>>         fsv_list=fsv_list, fsv_col_lbls=['ratio'],
+        >>>         score_list=rng.rand(num))
+        >>> cm_list = [make_cm(qaid, num) for qaid, num in [(1, 5), (2, 0), (3, 7)]]
+        >>> store.save_many(cm_list, ['u1', 'u2', 'u3'], 'pipe')
+        >>> store.save(make_cm(4, 3), 'u4', 'pipe')
+        >>> print(len(store), len(store._segment_fpaths()))
+        4 2
+        >>> qauuid_list = ['u3', 'u1', 'u5', 'u2', 'x']
+        >>> loaded = store.load_many([3, 1, 5, 2, 4], qauuid_list, 'pipe')
+        >>> print([None if cm is None else cm.qaid for cm in loaded])
+        [3, 1, None, 2, None]
+        >>> assert loaded[0] == cm_list[2] and loaded[1] == cm_list[0]
+        >>> assert all(np.all(a == b) for a, b in zip(loaded[0].fsv_list, cm_list[2].fsv_list))
+        >>> assert store.load_many([1], None, 'other') == [None]
+        >>> store.delete_many([1], 'pipe')
+        >>> print(store.contains_many([1, 3], pipe_hashid='pipe'))
+        [False, True]
+        >>> store.clear()
+        >>> print(len(store))
+        0
+    """
+
+    def __init__(
+        self,
+        dpath,
+        segment_nbytes=DEFAULT_SEGMENT_NBYTES,
+        min_dead_nbytes=DEFAULT_MIN_DEAD_NBYTES,
+        timeout=INDEX_TIMEOUT,
+    ):
+        self.dpath = dpath
+        self.segment_nbytes = segment_nbytes
+        self.min_dead_nbytes = min_dead_nbytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pid = None
+        ut.ensuredir(dpath)
+        with self.connection as conn:
+            conn.execute(SCHEMA)
+
+    def __repr__(self):
+        return '<ChipMatchStore({!r})>'.format(self.dpath)
+
+    def __len__(self):
+        cursor = self.connection.execute('SELECT COUNT(*) FROM chipmatch')
+        return cursor.fetchone()[0]
+
+    @property
+    def connection(self):
+        if self._pid != os.getpid():
+            # Never reuse the connections of a parent process
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(join(self.dpath, INDEX_FNAME), timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def _store_lock(self, exclusive=False):
+        """
+        Shared lock of saves and loads, exclusive lock of compactions and
+        clears, held across processes
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(join(self.dpath, LOCK_FNAME), 'a') as file_:
+            fcntl.flock(file_, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(file_, fcntl.LOCK_UN)
+
+    def _segment_fpaths(self):
+        fnames = sorted(
+            fname for fname in os.listdir(self.dpath) if SEGMENT_PATTERN.match(fname)
+        )
+        return [join(self.dpath, fname) for fname in fnames]
+
+    def _last_segment_index(self):
+        fpath_list = self._segment_fpaths()
+        if len(fpath_list) == 0:
+            return -1
+        return int(SEGMENT_PATTERN.match(basename(fpath_list[-1])).group(1))
+
+    def _current_segment(self):
+        index = max(self._last_segment_index(), 0)
+        fpath = join(self.dpath, SEGMENT_FNAME_FMT.format(index=index))
+        if exists(fpath) and os.path.getsize(fpath) >= self.segment_nbytes:
+            fpath = join(self.dpath, SEGMENT_FNAME_FMT.format(index=index + 1))
+        return fpath
+
+    def save_many(self, cm_list, qauuid_list, pipe_hashid):
+        """
+        Appends chip matches to the current segment and points the index at
+        them, replacing older records of the same queries.
+        """
+        blob_list = [encode_chipmatch(cm) for cm in cm_list]
+        if len(blob_list) == 0:
+            return
+        with self._store_lock():
+            self._append(cm_list, qauuid_list, blob_list, pipe_hashid)
+        if self.needs_compaction():
+            with self._store_lock(exclusive=True):
+                # Another process may have compacted the store meanwhile
+                if self.needs_compaction():
+                    self._compact()
+
+    def _append(self, cm_list, qauuid_list, blob_list, pipe_hashid):
+        fpath = self._current_segment()
+        rows = []
+        with open(fpath, 'ab') as file_:
+            if fcntl is not None:
+                # Other processes may be appending to the same segment
+                fcntl.flock(file_, fcntl.LOCK_EX)
+            try:
+                file_.seek(0, os.SEEK_END)
+                offset = file_.tell()
+                for cm, qauuid, blob in zip(cm_list, qauuid_list, blob_list):
+                    file_.write(blob)
+                    row = (
+                        int(cm.qaid),
+                        pipe_hashid,
+                        str(qauuid),
+                        basename(fpath),
+                        offset,
+                        len(blob),
+                    )
+                    rows.append(row)
+                    offset += len(blob)
+                file_.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file_, fcntl.LOCK_UN)
+        with self.connection as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO chipmatch '
+                '(qaid, pipe_hashid, qauuid, segment, offset, nbytes) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def save(self, cm, qauuid, pipe_hashid):
+        self.save_many([cm], [qauuid], pipe_hashid)
+
+    def _lookup(self, qaid_list, pipe_hashid):
+        """Returns the index row of each stored query keyed by qaid"""
+        unique_qaids = sorted(set(map(int, qaid_list)))
+        qaid_to_row = {}
+        for chunk in ut.ichunks(unique_qaids, INDEX_CHUNKSIZE):
+            cursor = self.connection.execute(
+                'SELECT qaid, qauuid, segment, offset, nbytes FROM chipmatch '
+                'WHERE pipe_hashid = ? AND qaid IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                [pipe_hashid] + list(chunk),
+            )
+            for row in cursor:
+                qaid_to_row[row[0]] = row[1:]
+        return qaid_to_row
+
+    def _valid_rows(self, qaid_list, qauuid_list, pipe_hashid):
+        qaid_to_row = self._lookup(qaid_list, pipe_hashid)
+        if qauuid_list is None:
+            qauuid_list = [None] * len(qaid_list)
+        row_list = []
+        for qaid, qauuid in zip(qaid_list, qauuid_list):
+            row = qaid_to_row.get(int(qaid), None)
+            if row is not None and qauuid is not None and row[0] != str(qauuid):
+                # The query annotation changed since the result was stored
+                row = None
+            row_list.append(row)
+        return row_list
+
+    def contains_many(self, qaid_list, qauuid_list=None, pipe_hashid=''):
+        row_list = self._valid_rows(qaid_list, qauuid_list, pipe_hashid)
+        return [row is not None for row in row_list]
+
+    def load_many(self, qaid_list, qauuid_list=None, pipe_hashid=''):
+        """
+        Loads the stored chip matches of many queries at once.
+
+        Args:
+            qaid_list (list): query annotation rowids
+            qauuid_list (list): if given, records computed for a different
+                query uuid are treated as missing
+            pipe_hashid (str): pipeline config hashid
+
+        Returns:
+            list: PackedChipMatch (or None if missing) aligned with qaid_list
+        """
+        cm_list = [None] * len(qaid_list)
+        # A compaction cannot move the records between the lookup and the read
+        with self._store_lock():
+            row_list = self._valid_rows(qaid_list, qauuid_list, pipe_hashid)
+            # Read each segment once, in file order
+            read_list = sorted(
+                (row[1], row[2], row[3], idx)
+                for idx, row in enumerate(row_list)
+                if row is not None
+            )
+            for segment, group in it.groupby(read_list, key=lambda x: x[0]):
+                with open(join(self.dpath, segment), 'rb') as file_:
+                    for _, offset, nbytes, idx in group:
+                        file_.seek(offset)
+                        cm_list[idx] = decode_chipmatch(file_.read(nbytes))
+        return cm_list
+        with self._store_lock():
+            if self._pid == os.getpid() and len(read_list) < len(row_list):
+                pass
+            # A compaction may have moved the records since the lookup
+            row_list = self._valid_rows(qaid_list, qauuid_list, pipe_hashid)
+            read_list = sorted(
+                (row[1], row[2], row[3], idx)
+                for idx, row in enumerate(row_list)
+                if row is not None
+            )
+            for segment, group in it.groupby(read_list, key=lambda x: x[0]):
+                with open(join(self.dpath, segment), 'rb') as file_:
+                    for _, offset, nbytes, idx in group:
+                        file_.seek(offset)
+                        cm_list[idx] = decode_chipmatch(file_.read(nbytes))
+        return cm_list
+
+    def delete_many(self, qaid_list, pipe_hashid):
+        """Drops the index rows of queries (the records become garbage)"""
+        with self.connection as conn:
+            conn.executemany(
+                'DELETE FROM chipmatch WHERE qaid = ? AND pipe_hashid = ?',
+                [(int(qaid), pipe_hashid) for qaid in qaid_list],
+            )
+
+    def clear(self):
+        """Removes every record and reclaims the segment files"""
+        with self._store_lock(exclusive=True):
+            with self.connection as conn:
+                conn.execute('DELETE FROM chipmatch')
+            for fpath in self._segment_fpaths():
+                ut.delete(fpath, verbose=False)
+
+    def get_nbytes(self):
+        """
+        Returns:
+            tuple: (dead, total) bytes of the segments, where dead bytes are
+                taken by replaced or deleted records
+        """
+        cursor = self.connection.execute('SELECT COALESCE(SUM(nbytes), 0) FROM chipmatch')
+        live_nbytes = cursor.fetchone()[0]
+        total_nbytes = sum(os.path.getsize(fpath) for fpath in self._segment_fpaths())
+        return total_nbytes - live_nbytes, total_nbytes
+
+    def needs_compaction(self):
+        dead_nbytes, total_nbytes = self.get_nbytes()
+        return dead_nbytes > 0 and dead_nbytes >= max(
+            self.min_dead_nbytes, total_nbytes / 2
+        )
+
+    def compact(self):
+        """
+        Copies the live records into new segments, points the index at them
+        and removes the old segments
+        """
+        with self._store_lock(exclusive=True):
+            self._compact()
+
+    def _compact(self):
+        old_fpaths = self._segment_fpaths()
+        cursor = self.connection.execute(
+            'SELECT qaid, pipe_hashid, segment, offset, nbytes FROM chipmatch '
+            'ORDER BY segment, offset'
+        )
+        row_list = cursor.fetchall()
+        index = self._last_segment_index() + 1
+        new_rows = []
+        out_file = None
+        try:
+            for segment, group in it.groupby(row_list, key=lambda x: x[2]):
+                with open(join(self.dpath, segment), 'rb') as in_file:
+                    for qaid, pipe_hashid, _, offset, nbytes in group:
+                        if out_file is None or out_file.tell() >= self.segment_nbytes:
+                            if out_file is not None:
+                                out_file.close()
+                            fname = SEGMENT_FNAME_FMT.format(index=index)
+                            out_file = open(join(self.dpath, fname), 'wb')
+                            index += 1
+                        in_file.seek(offset)
+                        new_rows.append((fname, out_file.tell(), qaid, pipe_hashid))
+                        out_file.write(in_file.read(nbytes))
+        finally:
+            if out_file is not None:
+                out_file.close()
+        with self.connection as conn:
+            conn.executemany(
+                'UPDATE chipmatch SET segment = ?, offset = ? '
+                'WHERE qaid = ? AND pipe_hashid = ?',
+                new_rows,
+            )
+        for fpath in old_fpaths:
+            ut.delete(fpath, verbose=False)
+        logger.info('[cmstore] compacted %d records of %r' % (len(new_rows), self.dpath))
+
+
+# Open stores keyed by directory
+_CHIPMATCH_STORES = {}
+
+
+def get_chipmatch_store(qresdir, cfgstr):
+    """
+    Returns the (cached) packed store of the chip matches computed with
+    ``cfgstr`` inside ``qresdir``.
+    """
+    dpath = os.path.abspath(join(qresdir, 'cmstore_' + ut.hashstr27(cfgstr)))
+    store = _CHIPMATCH_STORES.get(dpath, None)
+    if store is None:
+        store = ChipMatchStore(dpath)
+        _CHIPMATCH_STORES[dpath] = store
+    return store
+
+
+def get_store_pipe_hashid(qreq_, super_qres_cache=False):
+    """The super cache ignores the pipeline config, like its file names"""
+    return 'supercache' if super_qres_cache else qreq_.get_pipe_hashid()
+
+
+def convert_qcache(qreq_, qaid_list=None, super_qres_cache=False, delete=False):
+    """
+    Moves the legacy one-file-per-query chip matches of a query request into
+    its packed store.
+
+    Args:
+        qreq_ (wbia.QueryRequest): query request whose qcache is converted
+        qaid_list (list): queries to convert (defaults to qreq_.qaids)
+        super_qres_cache (bool): convert the super cache instead
+        delete (bool): delete the legacy files that were converted
+
+    Returns:
+        int: number of converted chip matches
+
+    CommandLine:
+        python -m wbia.algo.hots.chipmatch_store convert_qcache
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.hots.chipmatch_store import *  # NOQA
+        >>> import wbia
+        >>> qreq_ = wbia.testdata_qreq_(defaultdb='testdb1')
+        >>> num = convert_qcache(qreq_)
+    """
+    if qaid_list is None:
+        qaid_list = qreq_.qaids
+    store = qreq_.get_chipmatch_store(super_qres_cache=super_qres_cache)
+    pipe_hashid = get_store_pipe_hashid(qreq_, super_qres_cache)
+    fpath_list = list(
+        qreq_.get_chipmatch_fpaths(qaid_list, super_qres_cache=super_qres_cache)
+    )
+    qauuid_list = list(qreq_.get_qreq_pcc_uuids(qaid_list))
+    cm_list, qauuids_, fpaths_ = [], [], []
+    _iter = zip(fpath_list, qauuid_list)
+    for fpath, qauuid in ut.ProgIter(_iter, length=len(fpath_list), label='convert'):
+        if not exists(fpath):
+            continue
+        try:
+            cm = chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
+        except chip_match.NeedRecomputeError:
+            continue
+        cm_list.append(cm)
+        qauuids_.append(qauuid)
+        fpaths_.append(fpath)
+    store.save_many(cm_list, qauuids_, pipe_hashid)
+    if delete:
+        for fpath in fpaths_:
+            ut.delete(fpath, verbose=False)
+    logger.info('[cmstore] converted %d chip matches' % (len(cm_list),))
+    return len(cm_list)
+
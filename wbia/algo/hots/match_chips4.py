@@ -8,7 +8,7 @@ from os.path import exists
 import ubelt as ub
 import utool as ut
 
-from wbia.algo.hots import chip_match, pipeline
+from wbia.algo.hots import chip_match, chipmatch_store, pipeline
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -25,6 +25,8 @@ USE_BIGCACHE = (
 )
 USE_SUPERCACHE = ut.USE_CACHE and ut.get_argflag('--supercache')
 SAVE_CACHE = not ut.get_argflag('--nocache-save')
+# Store chip matches in the packed per-config store instead of one file each
+USE_PACKED_QCACHE = not ut.get_argflag('--nopacked-qcache')
 MIN_BIGCACHE_BUNDLE = 64
 HOTS_BATCH_SIZE = ut.get_argval('--hots-batch-size', type_=int, default=None)
 
@@ -216,20 +218,14 @@ def execute_query_and_save_L1(
         >>> qaid2_cm = execute_query_and_save_L1(qreq_, use_cache,
         >>>                                      save_qcache, verbose,
         >>>                                      batch_size=3)
-        >>> cm = qaid2_cm[1]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[4]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[5]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[6]
-        >>> ut.delete(cm.get_fpath(qreq_))
+        >>> store = qreq_.get_chipmatch_store()
+        >>> store.delete_many([1, 4, 5, 6], qreq_.get_pipe_hashid())
         >>> print('Re-execute')
         >>> qaid2_cm_ = execute_query_and_save_L1(qreq_, use_cache,
         >>>                                       save_qcache, verbose,
         >>>                                       batch_size=3)
         >>> assert all([qaid2_cm_[qaid] == qaid2_cm[qaid] for qaid in qreq_.qaids])
-        >>> [ut.delete(fpath) for fpath in qreq_.get_chipmatch_fpaths(qreq_.qaids)]
+        >>> store.clear()
 
     Ignore:
         other = cm_ = qaid2_cm_[qaid]
@@ -240,6 +236,7 @@ def execute_query_and_save_L1(
         fpath_list = ut.glob('{}/*_cm_supercache_*'.format(dpath))
         for fpath in fpath_list:
             ut.delete(fpath)
+        qreq_.get_chipmatch_store(super_qres_cache=True).clear()
 
     if use_cache:
         if verbose:
@@ -249,11 +246,26 @@ def execute_query_and_save_L1(
         # Try loading as many cached results as possible
         qaid2_cm_hit = {}
         external_qaids = qreq_.qaids
+        if USE_PACKED_QCACHE:
+            store = qreq_.get_chipmatch_store(super_qres_cache=use_supercache)
+            pipe_hashid = chipmatch_store.get_store_pipe_hashid(qreq_, use_supercache)
+            qauuid_list = list(qreq_.get_qreq_pcc_uuids(external_qaids))
+            cm_list = store.load_many(external_qaids, qauuid_list, pipe_hashid)
+            qaid2_cm_packed = {
+                qaid: cm for qaid, cm in zip(external_qaids, cm_list) if cm is not None
+            }
+            # Fall back to chipmatch files written before the packed store
+            legacy_qaids = [
+                qaid for qaid in external_qaids if qaid not in qaid2_cm_packed
+            ]
+        else:
+            qaid2_cm_packed = {}
+            legacy_qaids = external_qaids
         fpath_list = list(
-            qreq_.get_chipmatch_fpaths(external_qaids, super_qres_cache=use_supercache)
+            qreq_.get_chipmatch_fpaths(legacy_qaids, super_qres_cache=use_supercache)
         )
         exists_flags = [exists(fpath) for fpath in fpath_list]
-        qaids_hit = ut.compress(external_qaids, exists_flags)
+        qaids_hit = ut.compress(legacy_qaids, exists_flags)
         fpaths_hit = ut.compress(fpath_list, exists_flags)
         fpath_iter = ut.ProgIter(
             fpaths_hit,
@@ -295,6 +307,15 @@ def execute_query_and_save_L1(
                 '%d / %d cached matches need to be recomputed'
                 % (len(qaids_hit) - len(qaid2_cm_hit), len(qaids_hit))
             )
+        if USE_PACKED_QCACHE and len(qaid2_cm_hit) > 0:
+            # Migrate the legacy hits into the packed store
+            migrated_qaids = list(qaid2_cm_hit.keys())
+            store.save_many(
+                ut.take(qaid2_cm_hit, migrated_qaids),
+                qreq_.get_qreq_pcc_uuids(migrated_qaids),
+                pipe_hashid,
+            )
+        qaid2_cm_hit.update(qaid2_cm_packed)
         if len(qaid2_cm_hit) == len(external_qaids):
             return qaid2_cm_hit
         else:
@@ -368,7 +389,14 @@ def execute_query2(qreq_, verbose, save_qcache, batch_size=None, use_supercache=
         assert all(
             [qaid == cm.qaid for qaid, cm in zip(sub_qreq_.qaids, sub_cm_list)]
         ), 'not corresonding'
-        if save_qcache:
+        if save_qcache and USE_PACKED_QCACHE:
+            store = qreq_.get_chipmatch_store(super_qres_cache=use_supercache)
+            store.save_many(
+                sub_cm_list,
+                qreq_.get_qreq_pcc_uuids(sub_qreq_.qaids),
+                chipmatch_store.get_store_pipe_hashid(qreq_, use_supercache),
+            )
+        elif save_qcache:
             fpath_list = list(
                 qreq_.get_chipmatch_fpaths(
                     sub_qreq_.qaids, super_qres_cache=use_supercache
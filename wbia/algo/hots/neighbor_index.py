@@ -6,8 +6,10 @@ multi_index.py as well
 
 https://github.com/spotify/annoy
 """
+import glob
 import logging
-from os.path import basename
+import os
+from os.path import basename, exists, join
 
 # import itertools as it
 import lockfile
@@ -18,6 +20,7 @@ from vtool._pyflann_backend import pyflann as pyflann
 
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
 from wbia.algo.hots import hstypes
+from wbia.dtool import shard_store
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -25,6 +28,12 @@ logger = logging.getLogger('wbia')
 USE_HOTSPOTTER_CACHE = not ut.get_argflag('--nocache-hs')
 NOSAVE_FLANN = ut.get_argflag('--nosave-flann')
 NOCACHE_FLANN = ut.get_argflag('--nocache-flann') and USE_HOTSPOTTER_CACHE
+# Bound on the size of the distance matrix computed per brute force chunk
+BRUTE_FORCE_CHUNK_NBYTES = 2 ** 26
+# Per-feature support arrays written by save_shared_support. Processes that
+# load them map the files copy-on-write, so the pages are shared
+SHARED_SUPPORT_ATTRS = ['idx2_vec', 'idx2_fgw', 'idx2_ax', 'idx2_fx']
+SHARED_SUPPORT_META_FNAME = 'support_meta.json'
 
 
 def get_support_data(qreq_, daid_list):
@@ -169,7 +178,8 @@ def invert_index(vecs_list, fgws_list, ax_list, fxs_list, verbose=ut.NOT_QUIET):
         nFeats = sum(nFeat_list)
         idx2_ax = np.fromiter(ut.iflatten(axs_list), np.int32, nFeats)
         idx2_fx = np.fromiter(ut.iflatten(fxs_list), np.int32, nFeats)
-        idx2_vec = np.vstack(vecs_list)
+        # A single mapped view when the vecs are consecutive rows of a shard
+        idx2_vec = shard_store.stack_rows(vecs_list)
         if fgws_list is None:
             idx2_fgw = None
         else:
@@ -200,6 +210,31 @@ def invert_index(vecs_list, fgws_list, ax_list, fxs_list, verbose=ut.NOT_QUIET):
     return idx2_vec, idx2_fgw, idx2_ax, idx2_fx
 
 
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_partial_supports(dpath):
+    """
+    Removes a shared support directory without meta and the temporary
+    directories of processes that exited before renaming or deleting theirs
+    """
+    if exists(dpath) and not exists(join(dpath, SHARED_SUPPORT_META_FNAME)):
+        ut.delete(dpath, verbose=False)
+    for tmp_dpath in glob.glob(dpath + '.*'):
+        suffix = tmp_dpath[len(dpath) + 1 :]
+        pid_str = suffix[3:]
+        if suffix[0:3] in {'tmp', 'del'} and pid_str.isdigit():
+            if not _pid_exists(int(pid_str)):
+                ut.delete(tmp_dpath, verbose=False)
+
+
 @ut.reloadable_class
 class NeighborIndex(object):
     r"""
@@ -242,6 +277,7 @@ class NeighborIndex(object):
         nnindexer.checks = flann_params.get('checks', 1028)
         nnindexer.num_indexed = None
         nnindexer.flann_fpath = None
+        nnindexer.support_dpath = None  # Shared support the data arrays are mapped from
         nnindexer.max_distance_sqrd = None  # max possible distance^2 for normalization
 
     def init_support(indexer, aid_list, vecs_list, fgws_list, fxs_list, verbose=True):
@@ -605,6 +641,144 @@ class NeighborIndex(object):
                     load_success = True
         return load_success
 
+    def save_shared_support(nnindexer, dpath, verbose=True):
+        r"""
+        Writes the support data and the location of the saved FLANN index to
+        ``dpath`` so other processes can attach to them with
+        :func:`NeighborIndex.load_shared_support` instead of rebuilding them.
+
+        The directory is written under a temporary name and renamed, so
+        readers never see a partial support. Partial directories left by
+        processes that died while writing are removed first.
+
+        Returns:
+            bool: True if the support was written
+        """
+        if nnindexer.flann_fpath is None or not exists(nnindexer.flann_fpath):
+            if verbose:
+                logger.info('[nnindex] cannot share support of an unsaved index')
+            return False
+        if exists(join(dpath, SHARED_SUPPORT_META_FNAME)):
+            return True
+        _remove_partial_supports(dpath)
+        tmp_dpath = '{}.tmp{}'.format(dpath, os.getpid())
+        ut.delete(tmp_dpath, verbose=False)
+        ut.ensuredir(tmp_dpath)
+        for attr in SHARED_SUPPORT_ATTRS:
+            arr = getattr(nnindexer, attr)
+            if arr is not None:
+                np.save(join(tmp_dpath, attr + '.npy'), arr)
+        meta = {
+            'ax2_aid': nnindexer.ax2_aid.tolist(),
+            'flann_fpath': nnindexer.flann_fpath,
+            'max_distance_sqrd': nnindexer.max_distance_sqrd,
+        }
+        ut.save_json(join(tmp_dpath, SHARED_SUPPORT_META_FNAME), meta)
+        try:
+            os.rename(tmp_dpath, dpath)
+        except OSError:
+            # Another process shared the same support first
+            ut.delete(tmp_dpath, verbose=False)
+        if verbose:
+            logger.info(
+                '[nnindex] shared support in %r' % (ut.path_ndir_split(dpath, n=2),)
+            )
+        return True
+
+    @classmethod
+    def load_shared_support(cls, dpath, flann_params, cfgstr, verbose=True):
+        r"""
+        Attaches to support data written by :func:`save_shared_support`.
+
+        The per-feature arrays are memory mapped copy-on-write, so every
+        process that loads the same support shares one copy of the pages.
+        The FLANN index is loaded on top of the mapped descriptors.
+
+        Returns:
+            NeighborIndex: nnindexer or None if there is no usable support
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+            >>> dpath = ut.ensure_app_resource_dir('wbia', 'test_shared_support')
+            >>> ut.delete(dpath)
+            >>> ut.ensuredir(dpath)
+            >>> rng = np.random.RandomState(0)
+            >>> vecs_list = [rng.randint(0, 255, (n, 128)).astype(np.uint8) for n in [40, 60]]
+            >>> fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+            >>> nnindexer = NeighborIndex({'algorithm': 'linear'}, 'cfg')
+            >>> nnindexer.init_support([1, 2], vecs_list, None, fxs_list, verbose=False)
+            >>> nnindexer.reindex(verbose=False)
+            >>> nnindexer.save(fpath=join(dpath, 'index.flann'), verbose=False)
+            >>> assert nnindexer.save_shared_support(join(dpath, 'support'), verbose=False)
+            >>> shared = NeighborIndex.load_shared_support(
+            >>>     join(dpath, 'support'), {'algorithm': 'linear'}, 'cfg', verbose=False)
+            >>> assert isinstance(shared.idx2_vec, np.memmap)
+            >>> assert np.all(shared.idx2_vec == nnindexer.idx2_vec)
+            >>> assert np.all(shared.ax2_aid == nnindexer.ax2_aid)
+            >>> qfx2_idx1, qfx2_dist1 = nnindexer.knn(vecs_list[0][0:5], 3)
+            >>> qfx2_idx2, qfx2_dist2 = shared.knn(vecs_list[0][0:5], 3)
+            >>> assert np.all(qfx2_idx1 == qfx2_idx2)
+            >>> assert NeighborIndex.load_shared_support(
+            >>>     join(dpath, 'missing'), None, 'cfg', verbose=False) is None
+        """
+        meta_fpath = join(dpath, SHARED_SUPPORT_META_FNAME)
+        if not exists(meta_fpath):
+            return None
+        meta = ut.load_json(meta_fpath)
+        nnindexer = cls(flann_params, cfgstr)
+        try:
+            for attr in SHARED_SUPPORT_ATTRS:
+                fpath = join(dpath, attr + '.npy')
+                arr = np.load(fpath, mmap_mode='c') if exists(fpath) else None
+                setattr(nnindexer, attr, arr)
+        except (IOError, OSError, ValueError):
+            # The support was removed while it was being loaded
+            return None
+        nnindexer.ax2_aid = np.array(meta['ax2_aid'])
+        nnindexer.aid2_ax = ut.make_index_lookup(nnindexer.ax2_aid)
+        nnindexer.num_indexed = nnindexer.idx2_vec.shape[0]
+        nnindexer.max_distance_sqrd = meta['max_distance_sqrd']
+        nnindexer.support_dpath = dpath
+        nnindexer.flann = pyflann.FLANN()
+        if not nnindexer.load(fpath=meta['flann_fpath'], verbose=verbose):
+            return None
+        if verbose:
+            logger.info(
+                '[nnindex] attached to shared support: %d vectors, %d annots'
+                % (nnindexer.num_indexed_vecs(), nnindexer.num_indexed_annots())
+            )
+        return nnindexer
+
+    @staticmethod
+    def remove_shared_support(dpath):
+        r"""
+        Removes support data written by :func:`save_shared_support`.
+
+        The directory is renamed before it is deleted, so readers never see a
+        partial support. Processes that already attached to it keep their
+        mappings.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+            >>> dpath = ut.ensure_app_resource_dir('wbia', 'test_remove_support')
+            >>> ut.delete(dpath)
+            >>> ut.ensuredir(join(dpath, 'support'))
+            >>> ut.save_json(join(dpath, 'support', SHARED_SUPPORT_META_FNAME), {})
+            >>> NeighborIndex.remove_shared_support(join(dpath, 'support'))
+            >>> NeighborIndex.remove_shared_support(join(dpath, 'missing'))
+            >>> print(os.listdir(dpath))
+            []
+        """
+        del_dpath = '{}.del{}'.format(dpath, os.getpid())
+        try:
+            os.rename(dpath, del_dpath)
+        except OSError:
+            # There is no support or another process removed it first
+            return
+        ut.delete(del_dpath, verbose=False)
+
     def get_prefix(nnindexer):
         return nnindexer.prefix1
 
@@ -681,6 +855,12 @@ class NeighborIndex(object):
     def get_dtype(nnindexer):
         return nnindexer.idx2_vec.dtype
 
+    def _nn_index(indexer, qfx2_vec, K):
+        r"""raw (unnormalized) approximate nearest neighbors from FLANN"""
+        return indexer.flann.nn_index(
+            qfx2_vec, K, checks=indexer.checks, cores=indexer.cores
+        )
+
     @profile
     def knn(indexer, qfx2_vec, K):
         r"""
@@ -757,9 +937,7 @@ class NeighborIndex(object):
         else:
             try:
                 # perform nearest neighbors
-                (qfx2_idx, qfx2_raw_dist) = indexer.flann.nn_index(
-                    qfx2_vec, K, checks=indexer.checks, cores=indexer.cores
-                )
+                (qfx2_idx, qfx2_raw_dist) = indexer._nn_index(qfx2_vec, K)
                 # TODO: catch case where K < dbsize
             except pyflann.FLANNException as ex:
                 ut.printex(
@@ -781,7 +959,7 @@ class NeighborIndex(object):
                 qfx2_dist = qfx2_raw_dist
             if ut.DEBUG2:
                 # Ensure distance calculations are correct
-                qfx2_dvec = indexer.idx2_vec[qfx2_idx.T]
+                qfx2_dvec = indexer.get_nn_vecs(qfx2_idx.T)
                 targetdist = vt.L2_sift(qfx2_vec, qfx2_dvec).T ** 2
                 rawdist = vt.L2_sqrd(qfx2_vec, qfx2_dvec).T
                 assert np.all(
@@ -836,9 +1014,7 @@ class NeighborIndex(object):
             # pad += (len(invalid_axs) * 2)
 
             def get_neighbors(vecs, temp_K):
-                return indexer.flann.nn_index(
-                    vecs, temp_K, checks=indexer.checks, cores=indexer.cores
-                )
+                return indexer._nn_index(vecs, temp_K)
 
             get_axs = indexer.get_nn_axs
             try:
@@ -1112,6 +1288,422 @@ class NeighborIndex2(NeighborIndex, ut.NiceRepr):
     #     return conditional_knn_(nnindexer, qfx2_vec, num_neighbors, invalid_axs)
 
 
+def brute_force_knn(qfx2_vec, data, K, data_sqrd=None):
+    r"""
+    Exact nearest neighbors by squared euclidean distance.
+
+    Args:
+        qfx2_vec (ndarray): (N x D) query vectors
+        data (ndarray): (M x D) data vectors
+        K (int): number of neighbors to find
+        data_sqrd (ndarray): (M,) squared norms of the data vectors. Rows with
+            an infinite norm are never returned as valid neighbors.
+
+    Returns:
+        tuple: (qfx2_idx, qfx2_raw_dist) each (N x min(K, M)). The distances
+            are not normalized.
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index brute_force_knn
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> data = rng.randint(0, 255, (50, 8)).astype(np.uint8)
+        >>> qfx2_vec = rng.randint(0, 255, (7, 8)).astype(np.uint8)
+        >>> qfx2_idx, qfx2_dist = brute_force_knn(qfx2_vec, data, 3)
+        >>> diff = qfx2_vec[:, None, :].astype(np.int64) - data[None, :, :]
+        >>> dists = (diff ** 2).sum(axis=2)
+        >>> assert np.all(qfx2_idx == dists.argsort(axis=1)[:, 0:3])
+        >>> assert np.allclose(qfx2_dist, np.sort(dists, axis=1)[:, 0:3])
+        >>> # Rows flagged with an infinite norm are skipped
+        >>> data_sqrd = (data.astype(np.float32) ** 2).sum(axis=1)
+        >>> data_sqrd[qfx2_idx[:, 0]] = np.inf
+        >>> qfx2_idx2, _ = brute_force_knn(qfx2_vec, data, 3, data_sqrd)
+        >>> assert not np.any(np.isin(qfx2_idx2, qfx2_idx[:, 0]))
+    """
+    num_data = len(data)
+    K_ = min(K, num_data)
+    qfx2_idx = np.empty((len(qfx2_vec), K_), dtype=np.int32)
+    qfx2_dist = np.empty((len(qfx2_vec), K_), dtype=np.float32)
+    if K_ == 0 or len(qfx2_vec) == 0:
+        return qfx2_idx, qfx2_dist
+    data = data.astype(np.float32, copy=False)
+    if data_sqrd is None:
+        data_sqrd = (data ** 2).sum(axis=1)
+    chunksize = max(1, BRUTE_FORCE_CHUNK_NBYTES // (4 * num_data))
+    for sl_ in ut.ichunk_slices(len(qfx2_vec), chunksize):
+        qvecs = qfx2_vec[sl_].astype(np.float32)
+        # |q - d|^2 = |q|^2 + |d|^2 - 2 q.d
+        dist = np.dot(qvecs, data.T)
+        dist *= -2
+        dist += data_sqrd[None, :]
+        dist += (qvecs ** 2).sum(axis=1)[:, None]
+        np.maximum(dist, 0, out=dist)
+        if K_ < num_data:
+            part = np.argpartition(dist, K_ - 1, axis=1)[:, 0:K_]
+        else:
+            part = np.tile(np.arange(num_data), (len(dist), 1))
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        sortx = np.argsort(part_dist, axis=1, kind='stable')
+        qfx2_idx[sl_] = np.take_along_axis(part, sortx, axis=1)
+        qfx2_dist[sl_] = np.take_along_axis(part_dist, sortx, axis=1)
+    return qfx2_idx, qfx2_dist
+
+
+@ut.reloadable_class
+class IncrementalNeighborIndex(NeighborIndex):
+    r"""
+    Neighbor index that can add and remove annotations without rebuilding
+    FLANN.
+
+    The FLANN structure and the ``idx2_*`` arrays of the base indexer are
+    shared and never modified or copied, so memory mapped support stays
+    shared between processes. Added descriptors are appended to separate
+    ``delta_*`` buffers that are searched exactly by brute force and removed
+    annotations are tombstoned (their ``ax2_aid`` becomes -1) and filtered
+    out of the base results. Neighbor indices below ``num_base_vecs`` address
+    the base rows and the others address the delta rows, so all ``get_nn_*``
+    lookups work as usual.
+
+    Use :func:`compact` to fold the delta and the tombstones into a new
+    :class:`NeighborIndex`.
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index IncrementalNeighborIndex
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> vecs_list = [rng.randint(0, 255, (n, 128)).astype(np.uint8)
+        >>>              for n in [40, 30, 50, 20, 10]]
+        >>> fxs_list = [np.arange(len(vecs)) for vecs in vecs_list]
+        >>> flann_params = {'algorithm': 'linear'}
+        >>> base = NeighborIndex(flann_params, 'base')
+        >>> base.init_support([1, 2, 3], vecs_list[0:3], None, fxs_list[0:3])
+        >>> base.reindex()
+        >>> nnindexer = IncrementalNeighborIndex.from_base(base, 'inc')
+        >>> nnindexer.remove_support([2])
+        >>> nnindexer.add_support([4, 5], vecs_list[3:5], None, fxs_list[3:5])
+        >>> print(nnindexer.num_indexed, nnindexer.num_delta_vecs())
+        120 30
+        >>> qfx2_vec = rng.randint(0, 255, (25, 128)).astype(np.uint8)
+        >>> qfx2_idx, qfx2_dist = nnindexer.knn(qfx2_vec, 4)
+        >>> assert not np.any(nnindexer.get_nn_aids(qfx2_idx) == 2)
+        >>> # Results agree with an index built from scratch
+        >>> full = nnindexer.compact([1, 3, 4, 5])
+        >>> qfx2_idx2, qfx2_dist2 = full.knn(qfx2_vec, 4)
+        >>> assert np.allclose(qfx2_dist, qfx2_dist2)
+        >>> qfx2_aid = nnindexer.get_nn_aids(qfx2_idx)
+        >>> qfx2_fx = nnindexer.get_nn_featxs(qfx2_idx)
+        >>> assert np.all(qfx2_aid == full.get_nn_aids(qfx2_idx2))
+        >>> assert np.all(qfx2_fx == full.get_nn_featxs(qfx2_idx2))
+        >>> # The base indexer is untouched and its support is not copied
+        >>> print(base.get_indexed_aids())
+        [1 2 3]
+        >>> assert nnindexer.idx2_vec is base.idx2_vec
+        >>> assert nnindexer.idx2_ax is base.idx2_ax
+    """
+
+    def __init__(nnindexer, flann_params, cfgstr):
+        super(IncrementalNeighborIndex, nnindexer).__init__(flann_params, cfgstr)
+        nnindexer.num_base_vecs = 0  # Rows [0, num_base_vecs) are in FLANN
+        nnindexer.delta_vec = None  # (M' x D) Descriptors added after the base
+        nnindexer.delta_fgw = None  # (M' x 1) Their forground weights
+        nnindexer.delta_ax = np.empty(0, dtype=np.int32)  # (M' x 1)
+        nnindexer.delta_fx = np.empty(0, dtype=np.int32)  # (M' x 1)
+        nnindexer._delta_cache = None
+
+    @classmethod
+    def from_base(cls, base, cfgstr=None):
+        r"""
+        Wraps a built :class:`NeighborIndex`. Only the FLANN structure and the
+        read-only data arrays are shared, so ``base`` can still be used.
+        """
+        if cfgstr is None:
+            cfgstr = base.cfgstr
+        nnindexer = cls(base.flann_params.copy(), cfgstr)
+        nnindexer.flann = base.flann
+        nnindexer.flann_fpath = base.flann_fpath
+        nnindexer.support_dpath = getattr(base, 'support_dpath', None)
+        nnindexer.cores = base.cores
+        nnindexer.checks = base.checks
+        nnindexer.max_distance_sqrd = base.max_distance_sqrd
+        nnindexer.ax2_aid = base.ax2_aid.copy()
+        nnindexer.aid2_ax = ut.make_index_lookup(nnindexer.ax2_aid)
+        nnindexer.idx2_vec = base.idx2_vec
+        nnindexer.idx2_fgw = base.idx2_fgw
+        nnindexer.idx2_ax = base.idx2_ax
+        nnindexer.idx2_fx = base.idx2_fx
+        nnindexer.num_base_vecs = base.num_indexed_vecs()
+        nnindexer.delta_vec = base.idx2_vec[0:0].copy()
+        if base.idx2_fgw is not None:
+            nnindexer.delta_fgw = base.idx2_fgw[0:0].copy()
+        nnindexer.num_indexed = int((base.ax2_aid[base.idx2_ax] != -1).sum())
+        return nnindexer
+
+    def num_delta_vecs(nnindexer):
+        return len(nnindexer.delta_ax)
+
+    def num_removed_vecs(nnindexer):
+        return nnindexer.num_indexed_vecs() - nnindexer.num_indexed
+
+    def add_support(
+        nnindexer,
+        new_daid_list,
+        new_vecs_list,
+        new_fgws_list,
+        new_fxs_list,
+        verbose=ut.NOT_QUIET,
+    ):
+        r"""
+        appends support data to the brute force delta buffer
+        """
+        is_new = ~np.isin(new_daid_list, nnindexer.get_indexed_aids())
+        if not np.all(is_new):
+            if verbose:
+                logger.info(
+                    '[nnindex] ignoring %d annots that are already indexed'
+                    % ((~is_new).sum(),)
+                )
+            new_daid_list = ut.compress(new_daid_list, is_new)
+            new_vecs_list = ut.compress(new_vecs_list, is_new)
+            if new_fgws_list is not None:
+                new_fgws_list = ut.compress(new_fgws_list, is_new)
+            new_fxs_list = ut.compress(new_fxs_list, is_new)
+        nAnnots = len(nnindexer.ax2_aid)
+        new_ax_list = np.arange(nAnnots, nAnnots + len(new_daid_list))
+        tup = invert_index(
+            new_vecs_list, new_fgws_list, new_ax_list, new_fxs_list, verbose=verbose
+        )
+        new_idx2_vec, new_idx2_fgw, new_idx2_ax, new_idx2_fx = tup
+        if verbose or ut.VERYVERBOSE:
+            logger.info(
+                '[nnindex] Adding %d vecs from %d annots to the delta of an '
+                'nnindex with %d annots'
+                % (len(new_idx2_vec), len(new_daid_list), nAnnots)
+            )
+        # Only the delta is restacked, the base arrays are never copied
+        nnindexer.ax2_aid = np.hstack((nnindexer.ax2_aid, new_daid_list))
+        nnindexer.delta_ax = np.hstack((nnindexer.delta_ax, new_idx2_ax))
+        nnindexer.delta_fx = np.hstack((nnindexer.delta_fx, new_idx2_fx))
+        nnindexer.delta_vec = np.vstack((nnindexer.delta_vec, new_idx2_vec))
+        if nnindexer.delta_fgw is not None:
+            nnindexer.delta_fgw = np.hstack((nnindexer.delta_fgw, new_idx2_fgw))
+        nnindexer.aid2_ax = ut.make_index_lookup(nnindexer.ax2_aid)
+        nnindexer.num_indexed += len(new_idx2_vec)
+        nnindexer._delta_cache = None
+
+    def remove_support(nnindexer, remove_daid_list, verbose=ut.NOT_QUIET):
+        r"""
+        tombstones the annotations. Their descriptors stay in the index until
+        it is compacted.
+        """
+        remove_ax_list = np.nonzero(np.isin(nnindexer.ax2_aid, remove_daid_list))[0]
+        num_remove_vecs = np.isin(nnindexer.idx2_ax, remove_ax_list).sum()
+        num_remove_vecs += np.isin(nnindexer.delta_ax, remove_ax_list).sum()
+        if verbose:
+            logger.info(
+                '[nnindex] Tombstoning %d / %d annots with %d indexed features'
+                % (len(remove_ax_list), len(remove_daid_list), num_remove_vecs)
+            )
+        nnindexer.ax2_aid[remove_ax_list] = -1
+        nnindexer.aid2_ax = ut.make_index_lookup(nnindexer.ax2_aid)
+        nnindexer.num_indexed -= num_remove_vecs
+        nnindexer._delta_cache = None
+
+    def _take_support(nnindexer, base_arr, delta_arr, qfx2_nnidx):
+        r"""
+        looks up rows of a support array. Indices below ``num_base_vecs`` read
+        the base array and the others read the delta array.
+        """
+        qfx2_nnidx = np.asarray(qfx2_nnidx)
+        num_base = nnindexer.num_base_vecs
+        if num_base == 0:
+            return delta_arr.take(qfx2_nnidx, axis=0)
+        is_delta = qfx2_nnidx >= num_base
+        if not np.any(is_delta):
+            return base_arr.take(qfx2_nnidx, axis=0)
+        qfx2_data = base_arr.take(np.where(is_delta, 0, qfx2_nnidx), axis=0)
+        qfx2_data[is_delta] = delta_arr.take(qfx2_nnidx[is_delta] - num_base, axis=0)
+        return qfx2_data
+
+    def num_indexed_vecs(nnindexer):
+        return nnindexer.num_base_vecs + nnindexer.num_delta_vecs()
+
+    def get_indexed_vecs(nnindexer):
+        base_valid = nnindexer.ax2_aid[nnindexer.idx2_ax] != -1
+        delta_valid = nnindexer.ax2_aid[nnindexer.delta_ax] != -1
+        return np.vstack(
+            (
+                nnindexer.idx2_vec.compress(base_valid, axis=0),
+                nnindexer.delta_vec.compress(delta_valid, axis=0),
+            )
+        )
+
+    def get_removed_idxs(nnindexer):
+        base_invalid = np.nonzero(nnindexer.ax2_aid[nnindexer.idx2_ax] == -1)[0]
+        delta_invalid = np.nonzero(nnindexer.ax2_aid[nnindexer.delta_ax] == -1)[0]
+        return np.hstack((base_invalid, delta_invalid + nnindexer.num_base_vecs))
+
+    def get_nn_vecs(nnindexer, qfx2_nnidx):
+        r"""gets matching vectors"""
+        return nnindexer._take_support(
+            nnindexer.idx2_vec, nnindexer.delta_vec, qfx2_nnidx
+        )
+
+    def get_nn_axs(nnindexer, qfx2_nnidx):
+        r"""gets matching internal annotation indices"""
+        return nnindexer._take_support(nnindexer.idx2_ax, nnindexer.delta_ax, qfx2_nnidx)
+
+    def get_nn_aids(nnindexer, qfx2_nnidx):
+        return nnindexer.ax2_aid.take(nnindexer.get_nn_axs(qfx2_nnidx))
+
+    def get_nn_featxs(nnindexer, qfx2_nnidx):
+        return nnindexer._take_support(nnindexer.idx2_fx, nnindexer.delta_fx, qfx2_nnidx)
+
+    def get_nn_fgws(nnindexer, qfx2_nnidx):
+        if nnindexer.idx2_fgw is None:
+            return np.ones(np.shape(qfx2_nnidx))
+        return nnindexer._take_support(
+            nnindexer.idx2_fgw, nnindexer.delta_fgw, qfx2_nnidx
+        )
+
+    def _get_delta(nnindexer):
+        r"""delta vectors as floats and their squared norms (inf if removed)"""
+        if nnindexer._delta_cache is None:
+            delta_vecs = nnindexer.delta_vec.astype(np.float32)
+            delta_sqrd = (delta_vecs ** 2).sum(axis=1)
+            is_removed = nnindexer.ax2_aid[nnindexer.delta_ax] == -1
+            delta_sqrd[is_removed] = np.inf
+            nnindexer._delta_cache = (delta_vecs, delta_sqrd)
+        return nnindexer._delta_cache
+
+    def _base_nn_index(nnindexer, qfx2_vec, K):
+        r"""
+        FLANN neighbors in the base rows that skip tombstoned annotations. K is
+        doubled for the queries that hit too many tombstones.
+        """
+        num_base = nnindexer.num_base_vecs
+        qfx2_idx = np.full((len(qfx2_vec), K), -1, dtype=np.int32)
+        qfx2_dist = np.full((len(qfx2_vec), K), np.inf, dtype=np.float32)
+        if K == 0 or num_base == 0:
+            return qfx2_idx, qfx2_dist
+        index = np.arange(len(qfx2_vec))
+        temp_K = min(K, num_base)
+        while len(index) > 0:
+            _idxs, _dists = nnindexer.flann.nn_index(
+                qfx2_vec.take(index, axis=0),
+                temp_K,
+                checks=nnindexer.checks,
+                cores=nnindexer.cores,
+            )
+            idxs = _idxs.reshape(len(index), temp_K)
+            dists = _dists.reshape(len(index), temp_K)
+            validflags = nnindexer.ax2_aid[nnindexer.idx2_ax.take(idxs)] != -1
+            done_flags = validflags.sum(axis=1) >= K
+            if temp_K >= num_base:
+                done_flags[:] = True
+            # Move the first K valid neighbors of each finished query
+            done_valid = validflags[done_flags]
+            sortx = np.argsort(~done_valid, axis=1, kind='stable')[:, 0:K]
+            num_found = sortx.shape[1]
+            found = np.take_along_axis(done_valid, sortx, axis=1)
+            done_idxs = np.take_along_axis(idxs[done_flags], sortx, axis=1)
+            done_dists = np.take_along_axis(dists[done_flags], sortx, axis=1)
+            done_idxs[~found] = -1
+            done_dists[~found] = np.inf
+            qfx2_idx[index[done_flags], 0:num_found] = done_idxs
+            qfx2_dist[index[done_flags], 0:num_found] = done_dists
+            index = index[~done_flags]
+            temp_K = min(temp_K * 2, num_base)
+        return qfx2_idx, qfx2_dist
+
+    def _nn_index(nnindexer, qfx2_vec, K):
+        r"""
+        merges the FLANN neighbors of the base with the exact neighbors in the
+        delta. Asking for more neighbors than are indexed returns fewer columns.
+        """
+        K = min(K, nnindexer.num_indexed)
+        base_idx, base_dist = nnindexer._base_nn_index(qfx2_vec, K)
+        if nnindexer.num_delta_vecs() == 0:
+            return base_idx, base_dist
+        delta_vecs, delta_sqrd = nnindexer._get_delta()
+        delta_idx, delta_dist = brute_force_knn(qfx2_vec, delta_vecs, K, delta_sqrd)
+        delta_idx += nnindexer.num_base_vecs
+        cand_idx = np.hstack((base_idx, delta_idx))
+        cand_dist = np.hstack((base_dist, delta_dist))
+        sortx = np.argsort(cand_dist, axis=1, kind='stable')[:, 0:K]
+        qfx2_idx = np.take_along_axis(cand_idx, sortx, axis=1)
+        qfx2_dist = np.take_along_axis(cand_dist, sortx, axis=1)
+        return qfx2_idx, qfx2_dist
+
+    def compact(nnindexer, aid_order=None, cfgstr=None, verbose=ut.NOT_QUIET):
+        r"""
+        Builds a new :class:`NeighborIndex` over the live support data.
+
+        Args:
+            aid_order (list): order of the annotations in the new index
+                (default = indexed order). Using the order of the daid list
+                makes the data (and the FLANN cache file) identical to an
+                index built from scratch with ``init_support``.
+            cfgstr (str): cfgstr of the new indexer (default = same)
+
+        Returns:
+            NeighborIndex: compacted
+        """
+        if aid_order is None:
+            aid_order = nnindexer.get_indexed_aids()
+        if cfgstr is None:
+            cfgstr = nnindexer.cfgstr
+        assert set(aid_order).issubset(set(nnindexer.get_indexed_aids())), (
+            'can only compact indexed annotations'
+        )
+        num_vecs = nnindexer.num_indexed_vecs()
+        ax2_newax = np.full(len(nnindexer.ax2_aid), -1, dtype=np.int32)
+        ax2_newax[ut.take(nnindexer.aid2_ax, aid_order)] = np.arange(len(aid_order))
+        idx2_newax = ax2_newax.take(nnindexer.get_nn_axs(np.arange(num_vecs)))
+        keep_idxs = np.nonzero(idx2_newax != -1)[0]
+        # Group rows by annotation, rows of an annotation stay in fx order
+        keep_idxs = keep_idxs.take(
+            np.argsort(idx2_newax.take(keep_idxs), kind='stable')
+        )
+        compacted = NeighborIndex(nnindexer.flann_params.copy(), cfgstr)
+        compacted.flann = pyflann.FLANN()
+        compacted.ax2_aid = np.array(aid_order)
+        compacted.aid2_ax = ut.make_index_lookup(compacted.ax2_aid)
+        compacted.idx2_vec = nnindexer.get_nn_vecs(keep_idxs)
+        if nnindexer.idx2_fgw is not None:
+            compacted.idx2_fgw = nnindexer.get_nn_fgws(keep_idxs)
+        compacted.idx2_ax = idx2_newax.take(keep_idxs)
+        compacted.idx2_fx = nnindexer.get_nn_featxs(keep_idxs)
+        compacted.num_indexed = len(keep_idxs)
+        compacted.max_distance_sqrd = nnindexer.max_distance_sqrd
+        compacted.reindex(verbose=verbose)
+        return compacted
+
+    def save(nnindexer, cachedir=None, fpath=None, verbose=True):
+        r"""
+        The FLANN structure only covers the base rows, so it is not saved
+        under this indexer's data. Save the compacted indexer instead.
+        """
+        if ut.VERYVERBOSE or verbose:
+            logger.info('[nnindex] incremental nnindex is not saved, compact it first')
+        return False
+
+    def debug_nnindexer(nnindexer):
+        logger.info(
+            '[nnindex] incremental nnindex: %d base vecs, %d delta vecs, %d removed'
+            % (
+                nnindexer.num_base_vecs,
+                nnindexer.num_delta_vecs(),
+                nnindexer.num_removed_vecs(),
+            )
+        )
+
+
 def testdata_nnindexer(*args, **kwargs):
     from wbia.algo.hots.neighbor_index_cache import testdata_nnindexer
 
@@ -3,12 +3,17 @@
 NEEDS CLEANUP
 """
 import logging
-from os.path import join
+import threading
+from os.path import dirname, exists, join
 
 import utool as ut
 
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
-from wbia.algo.hots.neighbor_index import NeighborIndex, get_support_data
+from wbia.algo.hots.neighbor_index import (
+    IncrementalNeighborIndex,
+    NeighborIndex,
+    get_support_data,
+)
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -22,6 +27,19 @@ NOCACHE_UUIDS = ut.get_argflag('--nocache-uuids') and USE_HOTSPOTTER_CACHE
 MAX_NEIGHBOR_CACHE_SIZE = ut.get_argval('--max-neighbor-cachesize', type_=int, default=1)
 # Background process for building indexes
 CURRENT_THREAD = None
+# Background thread for compacting incremental indexes
+COMPACT_THREAD = None
+# A cached indexer is used as the base of an incremental indexer when the
+# requested daids differ from it by at most this fraction of its annots (or
+# by at most min_reindex_thresh annots)
+MAX_DELTA_FRAC = ut.get_argval('--max-delta-frac', type_=float, default=0.1)
+# Number of brute force delta vectors that triggers a background compaction
+DELTA_COMPACT_NUM_VECS = ut.get_argval(
+    '--delta-compact-vecs', type_=int, default=int(5e5)
+)
+# Share the support data of disk cached indexers between processes through
+# memory mapped files (enabled in the web engine workers)
+USE_SHARED_SUPPORT = ut.get_argflag('--shared-nnindex')
 # Global map to keep track of UUID lists with prebuild indexers.
 UUID_MAP = ut.ddict(dict)
 NEIGHBOR_CACHE = ut.get_lru_cache(MAX_NEIGHBOR_CACHE_SIZE)
@@ -32,12 +50,14 @@ class UUIDMapHyrbridCache(object):
     Class that lets multiple ways of writing to the uuid_map
     be swapped in and out interchangably
 
-    TODO: the global read / write should periodically sync itself to disk and it
-    should be loaded from disk initially
+    The maps are kept in memory. The first read of a uuid map loads the maps
+    saved in its flann cachedir and every write saves them back, so prebuilt
+    indexers can be found again by other processes.
     """
 
     def __init__(self):
         self.uuid_maps = ut.ddict(dict)
+        self._loaded_dpaths = set()
         # self.uuid_map_fpath = uuid_map_fpath
         # self.init(uuid_map_fpath, min_reindex_thresh)
 
@@ -50,19 +70,47 @@ class UUIDMapHyrbridCache(object):
         self.write_func = self.write_uuid_map_dict
 
     def dump(self, cachedir):
-        # TODO: DUMP AND LOAD THIS HYBRID CACHE TO DISK
-        # write_uuid_map_cpkl
+        """
+        Saves the uuid maps that live in ``cachedir``
+        """
         fname = 'uuid_maps_hybrid_cache.cPkl'
         cpkl_fpath = join(cachedir, fname)
-        ut.lock_and_save_cPkl(cpkl_fpath, self.uuid_maps)
+        uuid_maps = {
+            uuid_map_fpath: uuid_map
+            for uuid_map_fpath, uuid_map in self.uuid_maps.items()
+            if dirname(uuid_map_fpath) == cachedir
+        }
+        ut.lock_and_save_cPkl(cpkl_fpath, uuid_maps)
 
     def load(self, cachedir):
         """
-        Returns a cache UUIDMap
+        Merges the uuid maps saved in ``cachedir`` into the in memory maps
         """
         fname = 'uuid_maps_hybrid_cache.cPkl'
         cpkl_fpath = join(cachedir, fname)
-        self.uuid_maps = ut.lock_and_load_cPkl(cpkl_fpath)
+        self._loaded_dpaths.add(cachedir)
+        if not exists(cpkl_fpath):
+            return
+        uuid_maps = ut.lock_and_load_cPkl(cpkl_fpath)
+        for uuid_map_fpath, uuid_map in uuid_maps.items():
+            for daids_hashid, visual_uuid_list in uuid_map.items():
+                self.uuid_maps[uuid_map_fpath].setdefault(
+                    daids_hashid, visual_uuid_list
+                )
+
+    def _ensure_loaded(self, uuid_map_fpath):
+        cachedir = dirname(uuid_map_fpath)
+        if not NOCACHE_UUIDS and cachedir not in self._loaded_dpaths:
+            try:
+                self.load(cachedir)
+            except Exception as ex:
+                ut.printex(ex, 'cannot load uuid maps', iswarning=True)
+
+    def clear(self, uuid_map_fpath):
+        """forgets the prebuilt indexers of one uuid map"""
+        self._ensure_loaded(uuid_map_fpath)
+        self.uuid_maps.pop(uuid_map_fpath, None)
+        self.dump(dirname(uuid_map_fpath))
 
     # def __call__(self):
     #    return  self.read_func(*self.args, **self.kwargs)
@@ -122,6 +170,7 @@ class UUIDMapHyrbridCache(object):
     @profile
     def read_uuid_map_dict(self, uuid_map_fpath, min_reindex_thresh):
         """uses in memory dictionary instead of disk"""
+        self._ensure_loaded(uuid_map_fpath)
         uuid_map = self.uuid_maps[uuid_map_fpath]
         candidate_uuids = {
             key: val for key, val in uuid_map.items() if len(val) >= min_reindex_thresh
@@ -141,8 +190,12 @@ class UUIDMapHyrbridCache(object):
             logger.info('uuid cache is off')
             return
         # with ut.EmbedOnException():
+        cachedir = dirname(uuid_map_fpath)
+        # Pick up indexers that other processes have written since
+        self.load(cachedir)
         uuid_map = self.uuid_maps[uuid_map_fpath]
         uuid_map[daids_hashid] = visual_uuid_list
+        self.dump(cachedir)
 
 
 UUID_MAP_CACHE = UUIDMapHyrbridCache()
@@ -235,7 +288,32 @@ def build_nnindex_cfgstr(qreq_, daid_list):
 
 def clear_memcache():
     global NEIGHBOR_CACHE
+    support_dpaths = _get_memcache_support_dpaths()
     NEIGHBOR_CACHE.clear()
+    for support_dpath in support_dpaths:
+        NeighborIndex.remove_shared_support(support_dpath)
+
+
+def write_memcache(nnindex_cfgstr, nnindexer):
+    """
+    Writes nnindexer to the memcache. The shared supports that were only used
+    by the indexers it evicts or replaces are removed from disk, so the flann
+    cachedir does not grow without bound.
+    """
+    global NEIGHBOR_CACHE
+    old_support_dpaths = _get_memcache_support_dpaths()
+    NEIGHBOR_CACHE[nnindex_cfgstr] = nnindexer
+    unused_support_dpaths = old_support_dpaths - _get_memcache_support_dpaths()
+    for support_dpath in unused_support_dpaths:
+        NeighborIndex.remove_shared_support(support_dpath)
+
+
+def _get_memcache_support_dpaths():
+    support_dpaths = {
+        getattr(nnindexer, 'support_dpath', None) for nnindexer in NEIGHBOR_CACHE.values()
+    }
+    support_dpaths.discard(None)
+    return support_dpaths
 
 
 def clear_uuid_cache(qreq_):
@@ -254,6 +332,7 @@ def clear_uuid_cache(qreq_):
     """
     logger.info('[nnindex] clearing uuid cache')
     uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
+    UUID_MAP_CACHE.clear(uuid_map_fpath)
     ut.delete(uuid_map_fpath)
     ut.delete(uuid_map_fpath + '.lock')
     logger.info('[nnindex] finished uuid cache clear')
@@ -302,7 +381,7 @@ def request_wbia_nnindexer(qreq_, verbose=True, **kwargs):
     daid_list = qreq_.get_internal_daids()
     if not hasattr(qreq_.qparams, 'use_augmented_indexer'):
         qreq_.qparams.use_augmented_indexer = True
-    if False and qreq_.qparams.use_augmented_indexer:
+    if qreq_.qparams.use_augmented_indexer:
         nnindexer = request_augmented_wbia_nnindexer(qreq_, daid_list, **kwargs)
     else:
         nnindexer = request_memcached_wbia_nnindexer(qreq_, daid_list, **kwargs)
@@ -310,21 +389,31 @@ def request_wbia_nnindexer(qreq_, verbose=True, **kwargs):
 
 
 def request_augmented_wbia_nnindexer(
-    qreq_, daid_list, verbose=True, use_memcache=True, force_rebuild=False, memtrack=None
+    qreq_,
+    daid_list,
+    verbose=True,
+    use_memcache=True,
+    force_rebuild=False,
+    memtrack=None,
+    prog_hook=None,
 ):
     r"""
-    DO NOT USE. THIS FUNCTION CAN CURRENTLY CAUSE A SEGFAULT
-
     tries to give you an indexer for the requested daids using the least amount
-    of computation possible. By loading and adding to a partially build nnindex
-    if possible and if that fails fallbs back to request_memcache.
+    of computation possible.
+
+    If a prebuilt indexer is close to the requested daids it is loaded as the
+    base of an IncrementalNeighborIndex. The new daids go into a brute force
+    delta buffer and the daids that are no longer requested are tombstoned, so
+    nothing is rebuilt in the foreground. Once the delta is large a compacted
+    indexer is built in a background thread and replaces the incremental one
+    in the memcache. If no indexer is close it falls back to request_memcache.
 
     Args:
         qreq_ (QueryRequest):  query request object with hyper-parameters
         daid_list (list):
 
     Returns:
-        str: nnindex_cfgstr
+        NeighborIndex: nnindexer
 
     CommandLine:
         python -m wbia.algo.hots.neighbor_index_cache --test-request_augmented_wbia_nnindexer
@@ -337,95 +426,48 @@ def request_augmented_wbia_nnindexer(
         >>> # build test data
         >>> ZEB_PLAIN = const.TEST_SPECIES.ZEB_PLAIN
         >>> ibs = wbia.opendb('testdb1')
-        >>> use_memcache, max_covers, verbose = True, None, True
         >>> daid_list = sorted(ibs.get_valid_aids(species=ZEB_PLAIN))[0:6]
         >>> qreq_ = ibs.new_query_request(daid_list, daid_list)
         >>> qreq_.qparams.min_reindex_thresh = 1
-        >>> min_reindex_thresh = qreq_.qparams.min_reindex_thresh
         >>> # CLEAR CACHE for clean test
         >>> clear_uuid_cache(qreq_)
-        >>> # LOAD 3 AIDS INTO CACHE
-        >>> aid_list = sorted(ibs.get_valid_aids(species=ZEB_PLAIN))[0:3]
-        >>> # Should fallback
-        >>> nnindexer = request_augmented_wbia_nnindexer(qreq_, aid_list)
-        >>> # assert the fallback
-        >>> uncovered_aids, covered_aids_list = group_daids_by_cached_nnindexer(
-        ...     qreq_, daid_list, min_reindex_thresh, max_covers)
-        >>> result2 = uncovered_aids, covered_aids_list
-        >>> ut.assert_eq(result2, ([4, 5, 6], [[1, 2, 3]]), 'pre augment')
-        >>> # Should augment
-        >>> nnindexer = request_augmented_wbia_nnindexer(qreq_, daid_list)
-        >>> uncovered_aids, covered_aids_list = group_daids_by_cached_nnindexer(
-        ...     qreq_, daid_list, min_reindex_thresh, max_covers)
-        >>> result3 = uncovered_aids, covered_aids_list
-        >>> ut.assert_eq(result3, ([], [[1, 2, 3, 4, 5, 6]]), 'post augment')
+        >>> clear_memcache()
+        >>> # LOAD 5 AIDS INTO CACHE
+        >>> aid_list = daid_list[0:5]
         >>> # Should fallback
+        >>> nnindexer1 = request_augmented_wbia_nnindexer(qreq_, aid_list)
+        >>> assert not isinstance(nnindexer1, IncrementalNeighborIndex)
+        >>> # Should add one annot to the delta
         >>> nnindexer2 = request_augmented_wbia_nnindexer(qreq_, daid_list)
-        >>> assert nnindexer is nnindexer2
+        >>> assert isinstance(nnindexer2, IncrementalNeighborIndex)
+        >>> assert nnindexer2.flann is nnindexer1.flann
+        >>> assert nnindexer2.num_delta_vecs() > 0
+        >>> # Should tombstone one annot
+        >>> nnindexer3 = request_augmented_wbia_nnindexer(qreq_, aid_list[1:])
+        >>> assert list(nnindexer3.get_indexed_aids()) == aid_list[1:]
+        >>> # Should hit the memcache
+        >>> nnindexer4 = request_augmented_wbia_nnindexer(qreq_, aid_list[1:])
+        >>> assert nnindexer3 is nnindexer4
     """
     global NEIGHBOR_CACHE
-    min_reindex_thresh = qreq_.qparams.min_reindex_thresh
-    if not force_rebuild:
-        new_daid_list, covered_aids_list = group_daids_by_cached_nnindexer(
-            qreq_, daid_list, min_reindex_thresh, max_covers=1
-        )
-        can_augment = len(covered_aids_list) > 0 and not ut.list_set_equal(
-            covered_aids_list[0], daid_list
-        )
-    else:
-        can_augment = False
+    check_compaction_process()
     if verbose:
         logger.info('[aug] Requesting augmented nnindexer')
-    if can_augment:
-        covered_aids = covered_aids_list[0]
-        if verbose:
-            logger.info(
-                '[aug] Augmenting index %r old daids with %d new daids'
-                % (len(covered_aids), len(new_daid_list))
-            )
-        # Load the base covered indexer
-        # THIS SHOULD LOAD NOT REBUILD IF THE UUIDS ARE COVERED
-        base_nnindexer = request_memcached_wbia_nnindexer(
-            qreq_, covered_aids, verbose=verbose, use_memcache=use_memcache
-        )
-        # Remove this indexer from the memcache because we are going to change it
-        if NEIGHBOR_CACHE.has_key(  # NOQA (has_key is for a lru cache)
-            base_nnindexer.cfgstr
-        ):
-            logger.info('Removing key from memcache')
-            NEIGHBOR_CACHE[base_nnindexer.cfgstr] = None
-            del NEIGHBOR_CACHE[base_nnindexer.cfgstr]
-
-        support_data = get_support_data(qreq_, new_daid_list)
-        (new_vecs_list, new_fgws_list, new_fxs_list) = support_data
-        base_nnindexer.add_support(
-            new_daid_list, new_vecs_list, new_fgws_list, new_fxs_list, verbose=True
-        )
-        # FIXME: pointer issues
-        nnindexer = base_nnindexer
-        # Change to the new cfgstr
-        nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
-        nnindexer.cfgstr = nnindex_cfgstr
-        cachedir = qreq_.ibs.get_flann_cachedir()
-        nnindexer.save(cachedir)
-        # Write to inverse uuid
-        if len(daid_list) > min_reindex_thresh:
-            uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
-            daids_hashid = get_data_cfgstr(qreq_.ibs, daid_list)
-            visual_uuid_list = qreq_.ibs.get_annot_visual_uuids(daid_list)
-            UUID_MAP_CACHE.write_uuid_map_dict(
-                uuid_map_fpath, visual_uuid_list, daids_hashid
-            )
-        # Write to memcache
-        if ut.VERBOSE:
-            logger.info('[aug] Wrote to memcache={!r}'.format(nnindex_cfgstr))
-        NEIGHBOR_CACHE[nnindex_cfgstr] = nnindexer
-        return nnindexer
+    nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
+    if (
+        not force_rebuild
+        and use_memcache
+        and NEIGHBOR_CACHE.has_key(nnindex_cfgstr)  # NOQA (has_key is for a lru cache)
+    ):
+        return NEIGHBOR_CACHE[nnindex_cfgstr]
+    min_reindex_thresh = qreq_.qparams.min_reindex_thresh
+    if force_rebuild:
+        base_tup = None
     else:
-        # if ut.VERBOSE:
+        base_tup = find_incremental_base(qreq_, daid_list, min_reindex_thresh)
+    if base_tup is None:
         if verbose:
             logger.info('[aug] Nothing to augment, fallback to memcache')
-        # Fallback
         nnindexer = request_memcached_wbia_nnindexer(
             qreq_,
             daid_list,
@@ -433,8 +475,110 @@ def request_augmented_wbia_nnindexer(
             use_memcache=use_memcache,
             force_rebuild=force_rebuild,
             memtrack=memtrack,
+            prog_hook=prog_hook,
         )
         return nnindexer
+    base_aids, add_aids, remove_aids = base_tup
+    if verbose:
+        logger.info(
+            '[aug] Augmenting index of %d daids with %d new daids and %d removed daids'
+            % (len(base_aids), len(add_aids), len(remove_aids))
+        )
+    # Load the base covered indexer. It is shared, not modified.
+    base_nnindexer = request_memcached_wbia_nnindexer(
+        qreq_,
+        base_aids,
+        verbose=verbose,
+        use_memcache=use_memcache,
+        memtrack=memtrack,
+        prog_hook=prog_hook,
+    )
+    nnindexer = IncrementalNeighborIndex.from_base(base_nnindexer, nnindex_cfgstr)
+    if len(remove_aids) > 0:
+        nnindexer.remove_support(remove_aids, verbose=verbose)
+    if len(add_aids) > 0:
+        new_vecs_list, new_fgws_list, new_fxs_list = get_support_data(qreq_, add_aids)
+        nnindexer.add_support(
+            add_aids, new_vecs_list, new_fgws_list, new_fxs_list, verbose=verbose
+        )
+    # Write to memcache
+    if ut.VERBOSE:
+        logger.info('[aug] Wrote to memcache={!r}'.format(nnindex_cfgstr))
+    write_memcache(nnindex_cfgstr, nnindexer)
+    needs_compaction = nnindexer.num_delta_vecs() > DELTA_COMPACT_NUM_VECS or (
+        nnindexer.num_removed_vecs() > MAX_DELTA_FRAC * nnindexer.num_base_vecs
+    )
+    if needs_compaction:
+        request_background_compaction(qreq_, daid_list, nnindexer)
+    return nnindexer
+
+
+def find_incremental_base(
+    qreq_, daid_list, min_reindex_thresh, max_delta_frac=MAX_DELTA_FRAC
+):
+    r"""
+    Finds the prebuilt indexer that needs the fewest added and removed
+    annotations to index ``daid_list``.
+
+    Returns:
+        tuple: (base_aids, add_aids, remove_aids) or None if there is no
+            prebuilt indexer close enough (or if the exact one exists)
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index_cache find_incremental_base
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> import wbia
+        >>> from wbia import constants as const
+        >>> ibs = wbia.opendb('testdb1')
+        >>> ZEB_PLAIN = const.TEST_SPECIES.ZEB_PLAIN
+        >>> daid_list = sorted(ibs.get_valid_aids(species=ZEB_PLAIN))[0:6]
+        >>> qreq_ = ibs.new_query_request(daid_list, daid_list)
+        >>> clear_uuid_cache(qreq_)
+        >>> assert find_incremental_base(qreq_, daid_list, 1) is None
+        >>> nnindexer = request_memcached_wbia_nnindexer(qreq_, daid_list[0:5])
+        >>> base_tup = find_incremental_base(qreq_, daid_list[1:], 2)
+        >>> print(base_tup)
+        ([1, 2, 3, 4, 5], [6], [1])
+    """
+    ibs = qreq_.ibs
+    uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
+    candidate_uuids = UUID_MAP_CACHE.read_uuid_map_dict(
+        uuid_map_fpath, min_reindex_thresh
+    )
+    daids_hashid = get_data_cfgstr(ibs, daid_list)
+    if len(candidate_uuids) == 0 or daids_hashid in candidate_uuids:
+        return None
+    annot_vuuid_list = ibs.get_annot_visual_uuids(daid_list)
+    annot_vuuid_set = set(annot_vuuid_list)
+    best_key, best_cost = None, None
+    for key, base_vuuid_list in candidate_uuids.items():
+        num_common = len(annot_vuuid_set.intersection(base_vuuid_list))
+        cost = len(annot_vuuid_set) + len(base_vuuid_list) - 2 * num_common
+        max_cost = max(min_reindex_thresh, max_delta_frac * len(base_vuuid_list))
+        if cost <= max_cost and (best_cost is None or cost < best_cost):
+            best_key, best_cost = key, cost
+    if best_key is None:
+        return None
+    base_vuuid_list = candidate_uuids[best_key]
+    base_aids = ibs.get_annot_aids_from_visual_uuid(base_vuuid_list)
+    if any(aid is None for aid in base_aids):
+        # The base indexes annotations that no longer exist
+        return None
+    base_vuuid_set = set(base_vuuid_list)
+    add_aids = [
+        aid
+        for aid, vuuid in zip(daid_list, annot_vuuid_list)
+        if vuuid not in base_vuuid_set
+    ]
+    remove_aids = [
+        aid
+        for aid, vuuid in zip(base_aids, base_vuuid_list)
+        if vuuid not in annot_vuuid_set
+    ]
+    return base_aids, add_aids, remove_aids
 
 
 def request_memcached_wbia_nnindexer(
@@ -514,7 +658,7 @@ def request_memcached_wbia_nnindexer(
             # Write to memcache
             if ut.VERBOSE or ut.VERYVERBOSE:
                 logger.info('[disk] Write to memcache={!r}'.format(nnindex_cfgstr))
-            NEIGHBOR_CACHE[nnindex_cfgstr] = nnindexer
+            write_memcache(nnindex_cfgstr, nnindexer)
         else:
             if ut.VERBOSE or ut.VERYVERBOSE:
                 logger.info(
@@ -571,34 +715,54 @@ def request_diskcached_wbia_nnindexer(
     cachedir = qreq_.ibs.get_flann_cachedir()
     flann_params = qreq_.qparams.flann_params
     flann_params['checks'] = qreq_.qparams.checks
-    # if memtrack is not None:
-    #    memtrack.report('[PRE SUPPORT]')
-    # Get annot descriptors to index
-    if prog_hook is not None:
-        prog_hook.set_progress(1, 3, 'Loading support data for indexer')
-    logger.info('[nnindex] Loading support data for indexer')
-    vecs_list, fgws_list, fxs_list = get_support_data(qreq_, daid_list)
-    if memtrack is not None:
-        memtrack.report('[AFTER GET SUPPORT DATA]')
-    try:
-        nnindexer = new_neighbor_index(
-            daid_list,
-            vecs_list,
-            fgws_list,
-            fxs_list,
-            flann_params,
-            cachedir,
-            cfgstr=cfgstr,
-            verbose=verbose,
-            force_rebuild=force_rebuild,
-            memtrack=memtrack,
-            prog_hook=prog_hook,
-        )
-    except Exception as ex:
-        ut.printex(
-            ex, True, msg_='cannot build inverted index', key_list=['ibs.get_infostr()']
-        )
-        raise
+    nnindexer = None
+    if USE_SHARED_SUPPORT:
+        support_dpath = get_shared_support_dpath(cachedir, cfgstr)
+        if not force_rebuild:
+            nnindexer = NeighborIndex.load_shared_support(
+                support_dpath, flann_params, cfgstr, verbose=verbose
+            )
+    if nnindexer is None:
+        # if memtrack is not None:
+        #    memtrack.report('[PRE SUPPORT]')
+        # Get annot descriptors to index
+        if prog_hook is not None:
+            prog_hook.set_progress(1, 3, 'Loading support data for indexer')
+        logger.info('[nnindex] Loading support data for indexer')
+        vecs_list, fgws_list, fxs_list = get_support_data(qreq_, daid_list)
+        if memtrack is not None:
+            memtrack.report('[AFTER GET SUPPORT DATA]')
+        try:
+            nnindexer = new_neighbor_index(
+                daid_list,
+                vecs_list,
+                fgws_list,
+                fxs_list,
+                flann_params,
+                cachedir,
+                cfgstr=cfgstr,
+                verbose=verbose,
+                force_rebuild=force_rebuild,
+                memtrack=memtrack,
+                prog_hook=prog_hook,
+            )
+        except Exception as ex:
+            ut.printex(
+                ex,
+                True,
+                msg_='cannot build inverted index',
+                key_list=['ibs.get_infostr()'],
+            )
+            raise
+        if USE_SHARED_SUPPORT and nnindexer.save_shared_support(
+            support_dpath, verbose=verbose
+        ):
+            # Swap the private support for the shared mapping
+            shared_nnindexer = NeighborIndex.load_shared_support(
+                support_dpath, flann_params, cfgstr, verbose=verbose
+            )
+            if shared_nnindexer is not None:
+                nnindexer = shared_nnindexer
     # Record these uuids in the disk based uuid map so they can be augmented if
     # needed
     min_reindex_thresh = qreq_.qparams.min_reindex_thresh
@@ -612,6 +776,20 @@ def request_diskcached_wbia_nnindexer(
     return nnindexer
 
 
+def get_shared_support_dpath(cachedir, nnindex_cfgstr):
+    """
+    Directory with the memory mappable support data of a disk cached indexer
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> dpath = get_shared_support_dpath('flann', '_VUUIDS((6)ylydksaqdigdecdd)')
+        >>> print(ut.relpath_unix(dpath, 'flann'))
+        nnsupport_...
+    """
+    return join(cachedir, 'nnsupport_' + ut.hashstr27(nnindex_cfgstr))
+
+
 def group_daids_by_cached_nnindexer(
     qreq_, daid_list, min_reindex_thresh, max_covers=None
 ):
@@ -898,3 +1076,80 @@ def background_flann_func(
     if len(visual_uuid_list) > min_reindex_thresh:
         UUID_MAP_CACHE.write_uuid_map_dict(uuid_map_fpath, visual_uuid_list, daids_hashid)
     logger.info('[BG] Finished Background FLANN')
+
+
+def check_compaction_process():
+    r"""
+    Replaces the incremental indexer in the memcache with its compacted
+    version once the background compaction has finished.
+    """
+    global COMPACT_THREAD
+    if COMPACT_THREAD is None or COMPACT_THREAD.is_alive():
+        return False
+    thread = COMPACT_THREAD
+    COMPACT_THREAD = None
+    thread.join()
+    if thread.compacted is None:
+        return False
+    compacted = thread.compacted
+    (uuid_map_fpath, daids_hashid, visual_uuid_list, min_reindex_thresh) = (
+        thread.finishtup
+    )
+    # The compacted flann is on disk now, so this indexer can be a base
+    if len(visual_uuid_list) > min_reindex_thresh:
+        UUID_MAP_CACHE.write_uuid_map_dict(
+            uuid_map_fpath, visual_uuid_list, daids_hashid
+        )
+    if NEIGHBOR_CACHE.has_key(compacted.cfgstr):  # NOQA (has_key is for a lru cache)
+        write_memcache(compacted.cfgstr, compacted)
+    logger.info('[nnindex] swapped in compacted nnindex')
+    return True
+
+
+def request_background_compaction(qreq_, daid_list, nnindexer):
+    r"""
+    Compacts an IncrementalNeighborIndex into a regular NeighborIndex in a
+    background thread (FLANN releases the GIL while it builds).
+
+    Returns:
+        bool: True if the compaction was started
+    """
+    global COMPACT_THREAD
+    if COMPACT_THREAD is not None and COMPACT_THREAD.is_alive():
+        logger.info('[nnindex] compaction is already running')
+        return False
+    logger.info('[nnindex] Requesting background compaction')
+    cachedir = qreq_.ibs.get_flann_cachedir()
+    uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
+    daids_hashid = get_data_cfgstr(qreq_.ibs, daid_list)
+    visual_uuid_list = qreq_.ibs.get_annot_visual_uuids(daid_list)
+    min_reindex_thresh = qreq_.qparams.min_reindex_thresh
+    thread = threading.Thread(
+        target=background_compact_func,
+        args=(nnindexer, list(daid_list), cachedir),
+        name='nnindex_compaction',
+    )
+    thread.daemon = True
+    thread.compacted = None
+    finishtup = (uuid_map_fpath, daids_hashid, visual_uuid_list, min_reindex_thresh)
+    thread.finishtup = finishtup
+    COMPACT_THREAD = thread
+    thread.start()
+    return True
+
+
+def background_compact_func(nnindexer, daid_list, cachedir):
+    r"""
+    Builds and saves the compacted indexer. Uses the daid order so the flann
+    file is the same one request_diskcached_wbia_nnindexer would build.
+    """
+    thread = threading.current_thread()
+    logger.info('[BG] Starting nnindex compaction')
+    try:
+        compacted = nnindexer.compact(daid_list, verbose=False)
+        compacted.save(cachedir, verbose=False)
+    except Exception as ex:
+        ut.printex(ex, '[BG] nnindex compaction failed', iswarning=True)
+    else:
+        thread.compacted = compacted
+        logger.info('[BG] Finished nnindex compaction')
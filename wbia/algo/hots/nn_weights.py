@@ -64,8 +64,97 @@ def _register_misc_weight_func(func):
     return func
 
 
+class NeighborBatch(object):
+    r"""
+    The neighbors of several queries stacked into flat buffers.
+
+    All queries in a batch have the same number of neighbors per feature.
+    Rows ``offsets[i]:offsets[i + 1]`` of the flat arrays belong to the
+    ``i``-th query of the batch, which is ``nns_list[index_list[i]]``.
+
+    Args:
+        nns_list (list): list of Neighbors objects
+        index_list (list): positions of the batch queries in nns_list
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.nn_weights import *  # NOQA
+        >>> from wbia.algo.hots.pipeline import Neighbors
+        >>> nns_list = [
+        >>>     Neighbors(1, np.arange(6).reshape(2, 3), np.ones((2, 3)), np.arange(2)),
+        >>>     Neighbors(2, np.arange(4).reshape(1, 4), np.ones((1, 4)), np.arange(1)),
+        >>>     Neighbors(3, np.arange(9).reshape(3, 3), np.ones((3, 3)), np.arange(3)),
+        >>> ]
+        >>> batches = make_neighbor_batches(nns_list)
+        >>> print([(batch.index_list, batch.width) for batch in batches])
+        [([0, 2], 3), ([1], 4)]
+        >>> print(batches[0].offsets)
+        [0 2 5]
+        >>> print(batches[0].neighb_idxs.shape)
+        (5, 3)
+        >>> rowsums = [batch.neighb_idxs.sum(axis=1) for batch in batches]
+        >>> print(unbatch(batches, rowsums))
+        [array([ 3, 12]), array([6]), array([ 3, 12, 21])]
+    """
+
+    def __init__(self, nns_list, index_list):
+        self.index_list = index_list
+        self.nns_list = ut.take(nns_list, index_list)
+        self.qaids = [nn.qaid for nn in self.nns_list]
+        self.lens = np.array([len(nn.neighb_idxs) for nn in self.nns_list])
+        self.offsets = np.hstack([[0], np.cumsum(self.lens)])
+        self.neighb_idxs = np.vstack([nn.neighb_idxs for nn in self.nns_list])
+        self.neighb_dists = np.vstack([nn.neighb_dists for nn in self.nns_list])
+        self._normk_cache = {}
+
+    @property
+    def width(self):
+        return self.neighb_idxs.shape[1]
+
+    def split(self, arr):
+        """Splits rows of a flat array back into one array per query"""
+        return np.split(arr, self.offsets[1:-1])
+
+    def repeat(self, values):
+        """Expands one value per query into one value per row"""
+        return np.repeat(values, self.lens, axis=0)
+
+    def get_normk(self, qreq_, Knorm, normalizer_rule):
+        """Positions of the normalizers of every row (computed once per rule)"""
+        key = (Knorm, normalizer_rule)
+        if key not in self._normk_cache:
+            self._normk_cache[key] = get_batch_normk(
+                qreq_, self, Knorm, normalizer_rule
+            )
+        return self._normk_cache[key]
+
+
+def make_neighbor_batches(nns_list):
+    """
+    Groups the queries by their number of neighbors (which depends on the
+    k-padding) and stacks each group into a :class:`NeighborBatch`.
+    """
+    widths = [nn.neighb_idxs.shape[1] for nn in nns_list]
+    width_to_idxs = ut.group_items(list(range(len(nns_list))), widths)
+    batches = [
+        NeighborBatch(nns_list, width_to_idxs[width])
+        for width in sorted(width_to_idxs.keys())
+    ]
+    return batches
+
+
+def unbatch(batches, batch_results):
+    """Splits one flat result per batch back into nns_list order"""
+    num = sum(len(batch.index_list) for batch in batches)
+    result_list = [None] * num
+    for batch, flat_result in zip(batches, batch_results):
+        for index, result in zip(batch.index_list, batch.split(flat_result)):
+            result_list[index] = result
+    return result_list
+
+
 @_register_nn_simple_weight_func
-def const_match_weighter(nns_list, nnvalid0_list, qreq_):
+def const_match_weighter(nns_list, nnvalid0_list, qreq_, batches=None):
     r"""
     Example:
         >>> # DISABLE_DOCTEST
@@ -78,22 +167,21 @@ def const_match_weighter(nns_list, nnvalid0_list, qreq_):
         >>> result = ('constvote_weight_list = %s' % (str(constvote_weight_list),))
         >>> print(result)
     """
-    constvote_weight_list = []
     # K = qreq_.qparams.K  # Dont use K because K is dynamic per query
     # Subtract Knorm from size instead
     Knorm = qreq_.qparams.Knorm
-
-    for nns in nns_list:
-        (neighb_idx, neighb_dist) = nns
-        neighb_constvote = np.ones(
-            (len(neighb_idx), len(neighb_idx.T) - Knorm), dtype=np.float
-        )
-        constvote_weight_list.append(neighb_constvote)
+    if batches is None:
+        batches = make_neighbor_batches(nns_list)
+    constvote_list = [
+        np.ones((len(batch.neighb_idxs), batch.width - Knorm), dtype=np.float64)
+        for batch in batches
+    ]
+    constvote_weight_list = unbatch(batches, constvote_list)
     return constvote_weight_list
 
 
 @_register_nn_simple_weight_func
-def fg_match_weighter(nns_list, nnvalid0_list, qreq_):
+def fg_match_weighter(nns_list, nnvalid0_list, qreq_, batches=None):
     r"""
     foreground feature match weighting
 
@@ -114,33 +202,48 @@ def fg_match_weighter(nns_list, nnvalid0_list, qreq_):
     """
     Knorm = qreq_.qparams.Knorm
     config2_ = qreq_.get_internal_query_config2()
-    # Database feature index to chip index
-    fgvotes_list = []
-    for nn in nns_list:
+    if batches is None:
+        batches = make_neighbor_batches(nns_list)
+    fgvote_list = []
+    for batch in batches:
         # database forground weights
-        neighb_dfgws = qreq_.indexer.get_nn_fgws(nn.neighb_idxs.T[0:-Knorm].T)
+        neighb_dfgws = qreq_.indexer.get_nn_fgws(batch.neighb_idxs.T[0:-Knorm].T)
         # query forground weights
-        qfx2_qfgw = qreq_.ibs.get_annot_fgweights(
-            [nn.qaid], ensure=False, config2_=config2_
-        )[0]
-        qfgws = qfx2_qfgw.take(nn.qfx_list, axis=0)
+        qfx2_qfgw_list = qreq_.ibs.get_annot_fgweights(
+            batch.qaids, ensure=False, config2_=config2_
+        )
+        qfgws = np.hstack(
+            [
+                np.asarray(qfx2_qfgw).take(nn.qfx_list, axis=0)
+                for qfx2_qfgw, nn in zip(qfx2_qfgw_list, batch.nns_list)
+            ]
+        )
         # feature match forground weight is geometric mean
         neighb_fgvote_weight = np.sqrt(qfgws[:, None] * neighb_dfgws)
-        fgvotes_list.append(neighb_fgvote_weight)
+        fgvote_list.append(neighb_fgvote_weight)
+    fgvotes_list = unbatch(batches, fgvote_list)
     return fgvotes_list
 
 
-def nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_):
+def nn_normalized_weight(
+    normweight_fn, nns_list, nnvalid0_list, qreq_, batches=None
+):
     r"""
     Generic function to weight nearest neighbors
 
     ratio, lnbnn, and other nearest neighbor based functions use this
 
+    The weights of all queries are computed at once on the stacked neighbors
+    of each :class:`NeighborBatch` and then split back into nns_list order.
+
     Args:
         normweight_fn (func): chosen weight function e.g. lnbnn
         nns_list (dict): query descriptor nearest neighbors and distances.
         nnvalid0_list (list): list of neighbors preflagged as valid
         qreq_ (QueryRequest): hyper-parameters
+        batches (list): stacked neighbors from make_neighbor_batches.
+            Passing them shares the stacking and normalizers between
+            weight functions.
 
     Returns:
         list: weights_list
@@ -184,19 +287,45 @@ def nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_):
     """
     Knorm = qreq_.qparams.Knorm
     normalizer_rule = qreq_.qparams.normalizer_rule
-    # Database feature index to chip index
-    qaid_list = qreq_.get_internal_qaids()
-    normk_list = [
-        get_normk(qreq_, qaid, neighb_idx, Knorm, normalizer_rule)
-        for qaid, (neighb_idx, neighb_dist) in zip(qaid_list, nns_list)
+    if batches is None:
+        batches = make_neighbor_batches(nns_list)
+    flat_normk_list = [
+        batch.get_normk(qreq_, Knorm, normalizer_rule) for batch in batches
     ]
-    weight_list = [
-        apply_normweight(normweight_fn, neighb_normk, neighb_idx, neighb_dist, Knorm)
-        for neighb_normk, (neighb_idx, neighb_dist) in zip(normk_list, nns_list)
+    flat_weight_list = [
+        apply_normweight(
+            normweight_fn, flat_normk, batch.neighb_idxs, batch.neighb_dists, Knorm
+        )
+        for flat_normk, batch in zip(flat_normk_list, batches)
     ]
+    weight_list = unbatch(batches, flat_weight_list)
+    normk_list = unbatch(batches, flat_normk_list)
     return weight_list, normk_list
 
 
+def get_batch_normk(qreq_, batch, Knorm, normalizer_rule):
+    """
+    Positions of the LNBNN/ratio tests normalizers for all rows of a batch.
+    Equivalent to stacking the result of :func:`get_normk` for each query.
+    """
+    K = batch.width - Knorm
+    assert K > 0, 'K={!r} cannot be 0'.format(K)
+    if normalizer_rule == 'last':
+        neighb_normk = np.full(
+            len(batch.neighb_idxs), K + Knorm - 1, dtype=hstypes.FK_DTYPE
+        )
+    elif normalizer_rule == 'name':
+        neighb_normk = get_batch_name_normalizers(qreq_, batch, Knorm)
+    else:
+        neighb_normk = np.hstack(
+            [
+                get_normk(qreq_, qaid, nn.neighb_idxs, Knorm, normalizer_rule)
+                for qaid, nn in zip(batch.qaids, batch.nns_list)
+            ]
+        )
+    return neighb_normk
+
+
 def get_normk(qreq_, qaid, neighb_idx, Knorm, normalizer_rule):
     """
     Get positions of the LNBNN/ratio tests normalizers
@@ -332,6 +461,34 @@ def get_name_normalizers(qaid, qreq_, Knorm, neighb_idx):
     return neighb_normk
 
 
+def get_batch_name_normalizers(qreq_, batch, Knorm):
+    """
+    Batched version of :func:`get_name_normalizers`. Name ids are looked up
+    once per unique annotation instead of once per neighbor.
+    """
+    assert Knorm == qreq_.qparams.Knorm, 'inconsistency in qparams'
+    K = batch.width - Knorm
+    assert K > 0, 'K cannot be 0'
+    neighb_topidx = batch.neighb_idxs.T[0:K].T
+    neighb_normidx = batch.neighb_idxs.T[-Knorm:].T
+    neighb_topaid = qreq_.indexer.get_nn_aids(neighb_topidx)
+    neighb_normaid = qreq_.indexer.get_nn_aids(neighb_normidx)
+    neighb_topnid = _take_annot_nids(qreq_, neighb_topaid)
+    neighb_normnid = _take_annot_nids(qreq_, neighb_normaid)
+    neighb_qnid = batch.repeat(np.asarray(qreq_.get_qreq_annot_nids(batch.qaids)))
+    neighb_selnorm = mark_name_valid_normalizers(
+        neighb_qnid, neighb_topnid, neighb_normnid
+    )
+    neighb_normk = neighb_selnorm + (K + Knorm)  # convert form negative to pos indexes
+    return neighb_normk
+
+
+def _take_annot_nids(qreq_, aids):
+    unique_aids, inverse = np.unique(aids, return_inverse=True)
+    unique_nids = np.array(qreq_.get_qreq_annot_nids(unique_aids.tolist()), dtype=int)
+    return unique_nids[inverse].reshape(np.shape(aids))
+
+
 def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     r"""
     Helper func that allows matches only to the first result for a name
@@ -346,7 +503,7 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     Args:
         neighb_topnid (ndarray): marks the names a feature matches
         neighb_normnid (ndarray): marks the names of the feature normalizers
-        qnid (int): query name id
+        qnid (int or ndarray): query name id (or one query name id per row)
 
     Returns:
         neighb_selnorm - index of the selected normalizer for each query feature
@@ -381,6 +538,10 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
         >>> result = str(neighb_normk_)
         >>> print(result)
         [2 1 2 0 0 0 2 0]
+        >>> # One query name per row gives the same result
+        >>> neighb_qnid = np.full(len(neighb_topnid), qnid)
+        >>> neighb_selnorm2 = mark_name_valid_normalizers(neighb_qnid, neighb_topnid, neighb_normnid)
+        >>> assert np.all(neighb_selnorm == neighb_selnorm2)
 
     Ignore:
         logger.info(ut.doctest_repr(neighb_normnid, 'neighb_normnid', verbose=False))
@@ -392,14 +553,17 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
         [col1[:, None] != neighb_normnid for col1 in neighb_topnid.T]
     )
     # Mark self as invalid, if given that information
+    qnid = np.asarray(qnid)
+    if qnid.ndim == 1:
+        qnid = qnid[:, None]
     neighb_valid = np.logical_and(neighb_normnid != qnid, neighb_valid)
     # For each query feature find its best normalizer (using negative indices)
     Knorm = neighb_normnid.shape[1]
-    neighb_validxs = [np.nonzero(normrow)[0] for normrow in neighb_valid]
-    neighb_selnorm = np.array(
-        [validxs[0] - Knorm if len(validxs) != 0 else -1 for validxs in neighb_validxs],
-        hstypes.FK_DTYPE,
-    )
+    neighb_hasvalid = neighb_valid.any(axis=1)
+    neighb_firstvalid = neighb_valid.argmax(axis=1)
+    neighb_selnorm = np.where(
+        neighb_hasvalid, neighb_firstvalid - Knorm, -1
+    ).astype(hstypes.FK_DTYPE)
     return neighb_selnorm
 
 
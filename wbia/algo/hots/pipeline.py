@@ -50,6 +50,7 @@ import vtool as vt
 
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
 from wbia.algo.hots import chip_match, hstypes, nn_weights, scoring
+from wbia.dtool import tracing
 
 print, rrr, profile = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -129,6 +130,72 @@ class Neighbors(ut.NiceRepr):
         return self.__dict__.update(**state)
 
 
+class NeighborShare(ut.NiceRepr):
+    """
+    Nearest neighbors shared by query requests whose configs only differ
+    after the nearest neighbor step (e.g. the pipeline configs of one
+    experiment, see wbia.expt.harness). Set it as ``qreq_.neighbor_share``
+    and nearest_neighbors looks neighbors up here before computing them.
+
+    Neighbors are keyed by (qaid, nn_mid_cacheid), where the cacheid of
+    nearest_neighbor_cacheid2 covers everything the neighbors depend on.
+    Lookups return new Neighbors objects, because weight_neighbors replaces
+    their distances.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.pipeline import *  # NOQA
+        >>> share = NeighborShare()
+        >>> def compute_fn(flags_list, qaids):
+        >>>     qaids = ut.compress(qaids, flags_list)
+        >>>     return [Neighbors(qaid, np.zeros((2, 3)), np.ones((2, 3)), None)
+        >>>             for qaid in qaids]
+        >>> nns_list1 = share.get_many([(1, 'a'), (2, 'a')], compute_fn, [1, 2])
+        >>> nns_list2 = share.get_many([(2, 'a'), (3, 'a')], compute_fn, [2, 3])
+        >>> assert nns_list1[1] is not nns_list2[0]
+        >>> assert nns_list1[1].neighb_dists is nns_list2[0].neighb_dists
+        >>> print(share)
+        <NeighborShare(nKeys=3, hits=1, misses=3)>
+    """
+
+    def __init__(share):
+        share._nn_tups = {}
+        share.hits = 0
+        share.misses = 0
+
+    def __nice__(share):
+        return 'nKeys={}, hits={}, misses={}'.format(
+            len(share._nn_tups), share.hits, share.misses
+        )
+
+    def __len__(share):
+        return len(share._nn_tups)
+
+    def get_many(share, key_list, compute_fn, *args):
+        """
+        Returns the neighbors of each key. The missing neighbors are computed
+        by ``compute_fn(flags_list, *args)``, like the cache miss function of
+        ut.tryload_cache_list_with_compute.
+        """
+        flags_list = [key not in share._nn_tups for key in key_list]
+        num_miss = sum(flags_list)
+        if num_miss > 0:
+            miss_keys = ut.compress(key_list, flags_list)
+            for key, nn in zip(miss_keys, compute_fn(flags_list, *args)):
+                share._nn_tups[key] = (
+                    nn.qaid,
+                    nn.neighb_idxs,
+                    nn.neighb_dists,
+                    nn.qfx_list,
+                )
+        share.misses += num_miss
+        share.hits += len(key_list) - num_miss
+        return [Neighbors(*share._nn_tups[key]) for key in key_list]
+
+    def clear(share):
+        share._nn_tups.clear()
+
+
 # @profile
 def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
     r"""Driver logic of query pipeline
@@ -196,49 +263,57 @@ def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
 
         # qreq_.lazy_load(verbose=(verbose and ut.NOT_QUIET))
         qreq_.lazy_preload(verbose=(verbose and ut.NOT_QUIET))
-        impossible_daids_list, Kpad_list = build_impossible_daids_list(qreq_)
+        with tracing.stage('query.impossible_daids'):
+            impossible_daids_list, Kpad_list = build_impossible_daids_list(qreq_)
 
         # Nearest neighbors (nns_list)
         # a nns object is a tuple(ndarray, ndarray) - (qfx2_dx, qfx2_dist)
         # * query descriptors assigned to database descriptors
         # * FLANN used here
-        nns_list = nearest_neighbors(
-            qreq_, Kpad_list, impossible_daids_list, verbose=verbose
-        )
+        with tracing.stage('query.knn'):
+            nns_list = nearest_neighbors(
+                qreq_, Kpad_list, impossible_daids_list, verbose=verbose
+            )
 
         # Remove Impossible Votes
         # a nnfilt object is an ndarray qfx2_valid
         # * marks matches to the same image as invalid
-        nnvalid0_list = baseline_neighbor_filter(
-            qreq_, nns_list, impossible_daids_list, verbose=verbose
-        )
+        with tracing.stage('query.filter'):
+            nnvalid0_list = baseline_neighbor_filter(
+                qreq_, nns_list, impossible_daids_list, verbose=verbose
+            )
 
         # Nearest neighbors weighting / scoring (filtweights_list)
         # filtweights_list maps qaid to filtweights which is a dict
         # that maps a filter name to that query's weights for that filter
-        weight_ret = weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=verbose)
+        with tracing.stage('query.weighting'):
+            weight_ret = weight_neighbors(
+                qreq_, nns_list, nnvalid0_list, verbose=verbose
+            )
         filtkey_list, filtweights_list, filtvalids_list, filtnormks_list = weight_ret
 
         # Nearest neighbors to chip matches (cm_list)
         # * Initial scoring occurs
         # * vsone un-swapping occurs here
-        cm_list_FILT = build_chipmatches(
-            qreq_,
-            nns_list,
-            nnvalid0_list,
-            filtkey_list,
-            filtweights_list,
-            filtvalids_list,
-            filtnormks_list,
-            verbose=verbose,
-        )
+        with tracing.stage('query.chipmatch'):
+            cm_list_FILT = build_chipmatches(
+                qreq_,
+                nns_list,
+                nnvalid0_list,
+                filtkey_list,
+                filtweights_list,
+                filtvalids_list,
+                filtnormks_list,
+                verbose=verbose,
+            )
     else:
         logger.info('invalid pipeline root %r' % (qreq_.qparams.pipeline_root))
 
     # Spatial verification (cm_list) (TODO: cython)
     # * prunes chip results and feature matches
     # TODO: allow for reweighting of feature matches to happen.
-    cm_list_SVER = spatial_verification(qreq_, cm_list_FILT, verbose=verbose)
+    with tracing.stage('query.sver'):
+        cm_list_SVER = spatial_verification(qreq_, cm_list_FILT, verbose=verbose)
     if cm_list_FILT[0].filtnorm_aids is not None:
         pass
         # assert cm_list_SVER[0].filtnorm_aids is not None
@@ -246,7 +321,8 @@ def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
     cm_list = cm_list_SVER
     # Final Scoring
     score_method = qreq_.qparams.score_method
-    scoring.score_chipmatch_list(qreq_, cm_list, score_method)
+    with tracing.stage('query.scoring'):
+        scoring.score_chipmatch_list(qreq_, cm_list, score_method)
 
     if VERB_PIPELINE:
         logger.info('[hs] L___ FINISHED HOTSPOTTER PIPELINE ___')
@@ -357,6 +433,41 @@ def build_impossible_daids_list(qreq_, verbose=VERB_PIPELINE):
 # ============================
 
 
+def _nearest_neighbor_mid_cacheid(qreq_, HACK_KCFG=True):
+    """
+    Returns the part of the nearest neighbor cacheids shared by all queries:
+    the database annotations and the nn, chip, feature and flann configs
+    """
+    from wbia.algo import Config
+
+    chip_cfgstr = qreq_.qparams.chip_cfgstr
+    feat_cfgstr = qreq_.qparams.feat_cfgstr
+    flann_cfgstr = qreq_.qparams.flann_cfgstr
+    requery = qreq_.qparams.requery
+
+    internal_daids = qreq_.get_internal_daids()
+    if requery:
+        assert qreq_.qparams.vsmany
+        data_hashid = qreq_.get_data_hashid()
+    else:
+        data_hashid = qreq_.ibs.get_annot_hashid_visual_uuid(internal_daids, prefix='D')
+
+    if HACK_KCFG:
+        # hack config so we consolidate different k values
+        # (ie, K=2,Knorm=1 == K=1,Knorm=2)
+        nn_cfgstr = Config.NNConfig(**qreq_.qparams).get_cfgstr(
+            ignore_keys={'K', 'Knorm', 'use_k_padding'}
+        )
+    else:
+        nn_cfgstr = qreq_.qparams.nn_cfgstr
+
+    aug_cfgstr = 'aug_quryside' if qreq_.qparams.query_rotation_heuristic else ''
+    nn_mid_cacheid = ''.join(
+        [data_hashid, nn_cfgstr, chip_cfgstr, feat_cfgstr, flann_cfgstr, aug_cfgstr]
+    )
+    return nn_mid_cacheid
+
+
 @profile
 def nearest_neighbor_cacheid2(qreq_, Kpad_list):
     r"""
@@ -411,21 +522,10 @@ def nearest_neighbor_cacheid2(qreq_, Kpad_list):
             'nnobj_a2aef668-20c1-1897-d8f3-09a47a73f26a_DVUUIDS((5)oavtblnlrtocnrpm)_NN(single,cks800)_Chip(sz700,maxwh)_Feat(hesaff+sift)_FLANN(8_kdtrees)_truek6',
         ]
     """
-    from wbia.algo import Config
-
-    chip_cfgstr = qreq_.qparams.chip_cfgstr
-    feat_cfgstr = qreq_.qparams.feat_cfgstr
-    flann_cfgstr = qreq_.qparams.flann_cfgstr
     requery = qreq_.qparams.requery
     # assert requery is False, 'can not be on yet'
 
-    internal_daids = qreq_.get_internal_daids()
     internal_qaids = qreq_.get_internal_qaids()
-    if requery:
-        assert qreq_.qparams.vsmany
-        data_hashid = qreq_.get_data_hashid()
-    else:
-        data_hashid = qreq_.ibs.get_annot_hashid_visual_uuid(internal_daids, prefix='D')
     if requery:
         query_hashid_list = qreq_.get_qreq_pcc_uuids(internal_qaids)
     else:
@@ -433,19 +533,7 @@ def nearest_neighbor_cacheid2(qreq_, Kpad_list):
         query_hashid_list = qreq_.get_qreq_annot_visual_uuids(internal_qaids)
 
     HACK_KCFG = True
-    if HACK_KCFG:
-        # hack config so we consolidate different k values
-        # (ie, K=2,Knorm=1 == K=1,Knorm=2)
-        nn_cfgstr = Config.NNConfig(**qreq_.qparams).get_cfgstr(
-            ignore_keys={'K', 'Knorm', 'use_k_padding'}
-        )
-    else:
-        nn_cfgstr = qreq_.qparams.nn_cfgstr
-
-    aug_cfgstr = 'aug_quryside' if qreq_.qparams.query_rotation_heuristic else ''
-    nn_mid_cacheid = ''.join(
-        [data_hashid, nn_cfgstr, chip_cfgstr, feat_cfgstr, flann_cfgstr, aug_cfgstr]
-    )
+    nn_mid_cacheid = _nearest_neighbor_mid_cacheid(qreq_, HACK_KCFG)
     logger.info('nn_mid_cacheid = {!r}'.format(nn_mid_cacheid))
 
     if HACK_KCFG:
@@ -469,6 +557,25 @@ def nearest_neighbor_cacheid2(qreq_, Kpad_list):
     return nn_cachedir, nn_mid_cacheid_list
 
 
+def nearest_neighbor_groupid(qreq_):
+    """
+    Returns a string that is equal for query requests that compute the same
+    nearest neighbors, or None if the request cannot use a NeighborShare
+    (pipelines other than vsmany and requery, whose neighbors depend on the
+    impossible daids).
+    """
+    qparams = getattr(qreq_, 'qparams', None)
+    if getattr(qparams, 'pipeline_root', None) != 'vsmany' or qparams.requery:
+        return None
+    query_hashid = qreq_.ibs.get_annot_hashid_visual_uuid(
+        qreq_.get_internal_qaids(), prefix='Q'
+    )
+    kcfgstr = '_truek{}_kpad{}'.format(
+        qparams.K + int(qparams.Knorm), qparams.use_k_padding
+    )
+    return query_hashid + _nearest_neighbor_mid_cacheid(qreq_) + kcfgstr
+
+
 @profile
 def cachemiss_nn_compute_fn(
     flags_list, qreq_, Kpad_list, impossible_daids_list, K, Knorm, requery, verbose
@@ -701,6 +808,23 @@ def nearest_neighbors(
     # USE_NN_MID_CACHE = ut.is_developer()
 
     use_cache = USE_NN_MID_CACHE
+    neighbor_share = getattr(qreq_, 'neighbor_share', None)
+    if neighbor_share is not None and not requery:
+        # Neighbors computed by another config of the same experiment
+        _, nn_mid_cacheid_list = nearest_neighbor_cacheid2(qreq_, Kpad_list)
+        key_list = list(zip(qreq_.get_internal_qaids(), nn_mid_cacheid_list))
+        nns_list = neighbor_share.get_many(
+            key_list,
+            cachemiss_nn_compute_fn,
+            qreq_,
+            Kpad_list,
+            impossible_daids_list,
+            K,
+            Knorm,
+            requery,
+            verbose,
+        )
+        return nns_list
     if use_cache:
         nn_cachedir, nn_mid_cacheid_list = nearest_neighbor_cacheid2(qreq_, Kpad_list)
     else:
@@ -883,10 +1007,14 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
         #              for neighb_idx, neighb_dist in nns_list]
         # nns_list = nns_list_
 
+    # Stack the neighbors of all queries once. Every weight function runs on
+    # the stacked arrays and the normalizers are shared between them.
+    batches = nn_weights.make_neighbor_batches(nns_list)
+
     if config2_.lnbnn_on:
         filtname = 'lnbnn'
         lnbnn_weight_list, normk_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
 
         if config2_.lnbnn_normer is not None:
@@ -925,7 +1053,7 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
     if config2_.normonly_on:
         filtname = 'normonly'
         normonly_weight_list, normk_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
         _filtweight_list.append(normonly_weight_list)
         _filtvalid_list.append(None)  # None means all valid
@@ -934,7 +1062,7 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
     if config2_.bar_l2_on:
         filtname = 'bar_l2'
         bar_l2_weight_list, normk_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
         _filtweight_list.append(bar_l2_weight_list)
         _filtvalid_list.append(None)  # None means all valid
@@ -943,7 +1071,7 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
     if config2_.ratio_thresh:
         filtname = 'ratio'
         ratio_weight_list, normk_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
         ratio_isvalid = [
             neighb_ratio <= qreq_.qparams.ratio_thresh
@@ -961,7 +1089,7 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
     if config2_.const_on:
         filtname = 'const'
         constvote_weight_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
         _filtweight_list.append(constvote_weight_list)
         _filtvalid_list.append(None)  # None means all valid
@@ -970,7 +1098,7 @@ def weight_neighbors(qreq_, nns_list, nnvalid0_list, verbose=VERB_PIPELINE):
     if config2_.fg_on:
         filtname = 'fg'
         fgvote_weight_list = nn_weights.NN_WEIGHT_FUNC_DICT[filtname](
-            nns_list, nnvalid0_list, qreq_
+            nns_list, nnvalid0_list, qreq_, batches=batches
         )
         _filtweight_list.append(fgvote_weight_list)
         _filtvalid_list.append(None)  # None means all valid
@@ -1342,11 +1470,45 @@ def _spatial_verification(qreq_, cm_list, verbose=VERB_PIPELINE):
         **PROGKW,
     )
 
-    cm_list_SVER = [sver_single_chipmatch(qreq_, cm) for cm in cm_progiter]
+    sver_workers = qreq_.qparams.sver_workers
+    if sver_workers:
+        cm_list_SVER = _parallel_sver_chipmatches(qreq_, cm_progiter, sver_workers)
+    else:
+        cm_list_SVER = [sver_single_chipmatch(qreq_, cm) for cm in cm_progiter]
     # rescore after verification?
     return cm_list_SVER
 
 
+def _parallel_sver_chipmatches(qreq_, cm_iter, sver_workers):
+    """
+    Spatially verifies chipmatches in a process pool.
+
+    The keypoints and matches of each query are gathered in this process and
+    sent to the workers as arrays. The workers only return the inliers,
+    homographies and inlier errors, and the verified chipmatches are built
+    here in the input order, so the result is identical to the serial path.
+    """
+    from wbia.dtool.executors import ProcessExecutor
+
+    cm_list = []
+    dlen_sqrd_lists = []
+
+    def _sver_args_iter():
+        for cm in cm_iter:
+            sver_args = _sver_chipmatch_inputs(qreq_, cm)
+            cm_list.append(cm)
+            dlen_sqrd_lists.append(sver_args[3])
+            yield sver_args
+
+    with ProcessExecutor(max_workers=sver_workers) as executor:
+        svres_lists = list(executor.imap(_sver_shortlist_compact, _sver_args_iter()))
+    cm_list_SVER = [
+        _finish_sver_chipmatch(qreq_, cm, svres_list, dlen_sqrd_list)
+        for cm, svres_list, dlen_sqrd_list in zip(cm_list, svres_lists, dlen_sqrd_lists)
+    ]
+    return cm_list_SVER
+
+
 # @profile
 def sver_single_chipmatch(qreq_, cm, verbose=False):
     r"""
@@ -1452,15 +1614,35 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
         >>>                    refine_method=refine_method)
         >>> ut.show_if_requested()
     """
+    sver_args = _sver_chipmatch_inputs(qreq_, cm)
+    svtup_list = _sver_shortlist(*sver_args, verbose=verbose)
+
+    # <SENTINAL>
+
+    svres_list = [_compact_svtup(sv_tup) for sv_tup in svtup_list]
+    dlen_sqrd_list = sver_args[3]
+    cmSV = _finish_sver_chipmatch(qreq_, cm, svres_list, dlen_sqrd_list)
+    return cmSV
+
+
+def _sver_chipmatch_inputs(qreq_, cm):
+    """
+    Gathers everything needed to spatially verify the shortlist of a
+    chipmatch as plain arrays (so they can be sent to worker processes).
+
+    Only the database keypoints that participate in a match are kept and the
+    feature matches are remapped to index into them.
+    """
     qaid = cm.qaid
     use_chip_extent = qreq_.qparams.use_chip_extent
-    xy_thresh = qreq_.qparams.xy_thresh
-    scale_thresh = qreq_.qparams.scale_thresh
-    ori_thresh = qreq_.qparams.ori_thresh
-    min_nInliers = qreq_.qparams.min_nInliers
-    full_homog_checks = qreq_.qparams.full_homog_checks
-    refine_method = qreq_.qparams.refine_method
-    sver_output_weighting = qreq_.qparams.sver_output_weighting
+    sver_params = dict(
+        xy_thresh=qreq_.qparams.xy_thresh,
+        scale_thresh=qreq_.qparams.scale_thresh,
+        ori_thresh=qreq_.qparams.ori_thresh,
+        min_nInliers=qreq_.qparams.min_nInliers,
+        full_homog_checks=qreq_.qparams.full_homog_checks,
+        refine_method=qreq_.qparams.refine_method,
+    )
     # Precompute sver cmtup_old
     kpts1 = qreq_.get_qreq_qannot_kpts(qaid).astype(np.float64)
     kpts2_list = qreq_.get_qreq_dannot_kpts(cm.daid_list)
@@ -1485,42 +1667,59 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
     else:
         match_weight_list = [np.ones(len(fm), dtype=np.float64) for fm in cm.fm_list]
 
-    # Make an svtup for every daid in the shortlist
-    _iter1 = zip(
-        cm.daid_list,
-        cm.fm_list,
-        cm.fsv_list,
-        kpts2_list,
-        top_dlen_sqrd_list,
+    # Keep only the matched database keypoints
+    fm_list = []
+    matched_kpts2_list = []
+    for fm, kpts2 in zip(cm.fm_list, kpts2_list):
+        fx2_list, fm_fx2 = np.unique(fm.T[1], return_inverse=True)
+        fm_ = np.empty(fm.shape, dtype=fm.dtype)
+        fm_.T[0] = fm.T[0]
+        fm_.T[1] = fm_fx2.ravel()
+        fm_list.append(fm_)
+        matched_kpts2_list.append(kpts2.take(fx2_list, axis=0))
+
+    sver_args = (
+        kpts1,
+        matched_kpts2_list,
+        fm_list,
+        list(top_dlen_sqrd_list),
         match_weight_list,
+        sver_params,
     )
+    return sver_args
+
+
+def _sver_shortlist(
+    kpts1,
+    kpts2_list,
+    fm_list,
+    dlen_sqrd_list,
+    match_weight_list,
+    sver_params,
+    verbose=False,
+):
+    """
+    Spatially verifies one query against each database annotation in its
+    shortlist. Returns one vt.spatially_verify_kpts tuple (or None) per
+    database annotation.
+    """
+    xy_thresh = sver_params['xy_thresh']
+    scale_thresh = sver_params['scale_thresh']
+    ori_thresh = sver_params['ori_thresh']
+    min_nInliers = sver_params['min_nInliers']
+    full_homog_checks = sver_params['full_homog_checks']
+    refine_method = sver_params['refine_method']
+
+    # Make an svtup for every daid in the shortlist
+    _iter1 = zip(fm_list, kpts2_list, dlen_sqrd_list, match_weight_list)
     if verbose:
-        _iter1 = ut.ProgIter(
-            _iter1, length=len(cm.daid_list), lbl='sver shortlist', freq=1
-        )
+        _iter1 = ut.ProgIter(_iter1, length=len(fm_list), lbl='sver shortlist', freq=1)
     svtup_list = []
-    for daid, fm, fsv, kpts2, dlen_sqrd2, match_weights in _iter1:
+    for fm, kpts2, dlen_sqrd2, match_weights in _iter1:
         if len(fm) == 0:
             # skip results without any matches
             sv_tup = None
         else:
-
-            # sver_testdata = dict(
-            #     kpts1=kpts1,
-            #     kpts2=kpts2,
-            #     fm=fm,
-            #     xy_thresh=xy_thresh,
-            #     scale_thresh=scale_thresh,
-            #     ori_thresh=ori_thresh,
-            #     dlen_sqrd2=dlen_sqrd2,
-            #     min_nInliers=min_nInliers,
-            #     match_weights=match_weights,
-            #     full_homog_checks=full_homog_checks,
-            #     refine_method=refine_method
-            # )
-
-            # locals().update(ut.load_data('sver_testdata.pkl'))
-
             try:
                 # Compute homography from chip2 to chip1 returned homography
                 # maps image1 space into image2 space image1 is a query chip
@@ -1555,17 +1754,35 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
                 )
                 sv_tup = None
         svtup_list.append(sv_tup)
+    return svtup_list
+
+
+def _compact_svtup(sv_tup):
+    """
+    Keeps the parts of a spatial verification tuple used to build the
+    verified chipmatch: (homog_inliers, H, homog_xy_errors of the inliers)
+    """
+    if sv_tup is None:
+        return None
+    (homog_inliers, homog_errors, H) = sv_tup[0:3]
+    homog_xy_errors = homog_errors[0].take(homog_inliers, axis=0)
+    return (homog_inliers, H, homog_xy_errors)
+
+
+def _sver_shortlist_compact(*sver_args):
+    """Worker function of the parallel spatial verification"""
+    svtup_list = _sver_shortlist(*sver_args)
+    svres_list = [_compact_svtup(sv_tup) for sv_tup in svtup_list]
+    return svres_list
 
-    # <SENTINAL>
+
+def _finish_sver_chipmatch(qreq_, cm, svres_list, dlen_sqrd_list):
+    """Builds the spatially verified chipmatch from the compact sver results"""
+    xy_thresh = qreq_.qparams.xy_thresh
+    sver_output_weighting = qreq_.qparams.sver_output_weighting
 
     # New way
-    inliers_list = []
-    for sv_tup in svtup_list:
-        if sv_tup is None:
-            inliers_list.append(None)
-        else:
-            (homog_inliers, homog_errors, H, aff_inliers, aff_errors, Aff) = sv_tup
-            inliers_list.append(homog_inliers)
+    inliers_list = [None if svres is None else svres[0] for svres in svres_list]
 
     indicies_list = inliers_list
     cmSV = cm.take_feature_matches(indicies_list, keepscores=False)
@@ -1573,16 +1790,17 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
     # NOTE: It is not very clear explicitly, but the way H_list and
     # homog_err_weight_list are built will correspond with the daid_list in
     # cmSV returned by cm.take_feature_matches
-    svtup_list_ = ut.filter_Nones(svtup_list)
-    H_list_SV = ut.get_list_column(svtup_list_, 2)
+    svres_list_ = ut.filter_Nones(svres_list)
+    H_list_SV = ut.get_list_column(svres_list_, 1)
     cmSV.H_list = H_list_SV
 
     if sver_output_weighting:
         homog_err_weight_list = []
-        xy_thresh_sqrd = dlen_sqrd2 * xy_thresh
-        for sv_tup in svtup_list_:
-            (homog_inliers, homog_errors) = sv_tup[0:2]
-            homog_xy_errors = homog_errors[0].take(homog_inliers, axis=0)
+        if len(dlen_sqrd_list) > 0:
+            # The threshold uses the extent of the last shortlisted annotation
+            xy_thresh_sqrd = dlen_sqrd_list[-1] * xy_thresh
+        for svres in svres_list_:
+            homog_xy_errors = svres[2]
             homog_err_weight = 1.0 - np.sqrt(homog_xy_errors / xy_thresh_sqrd)
             homog_err_weight_list.append(homog_err_weight)
         # Rescore based on homography errors
@@ -22,7 +22,12 @@ from wbia import dtool
 # from wbia.algo.hots import scorenorm
 # from wbia.algo.hots import distinctiveness_normalizer
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
-from wbia.algo.hots import chip_match, neighbor_index_cache, query_params
+from wbia.algo.hots import (
+    chip_match,
+    chipmatch_store,
+    neighbor_index_cache,
+    query_params,
+)
 
 # import warnings
 (print, rrr, profile) = ut.inject2(__name__)
@@ -366,6 +371,8 @@ class QueryRequest(ut.NiceRepr):
         qreq_.qresdir = None
         qreq_.prog_hook = None
         qreq_.lnbnn_normer = None
+        # Nearest neighbors shared with other requests (see NeighborShare)
+        qreq_.neighbor_share = None
 
         # Keeps internal name state
         qreq_.unique_aids = None
@@ -610,6 +617,7 @@ class QueryRequest(ut.NiceRepr):
         state['dstcnvs_normer'] = None
         state['hasloaded'] = False
         state['lnbnn_normer'] = False
+        state['neighbor_share'] = None
         state['_internal_dannots'] = None
         state['_internal_qannots'] = None
         state['_unique_annots'] = None
@@ -1293,6 +1301,17 @@ class QueryRequest(ut.NiceRepr):
             fpath = join(dpath, fname)
             yield fpath
 
+    def get_chipmatch_store(qreq_, super_qres_cache=False):
+        r"""
+        Returns the packed chip match store that replaces the chipmatch files
+        of this config (see :mod:`wbia.algo.hots.chipmatch_store`)
+        """
+        if super_qres_cache:
+            cfgstr = 'supercache'
+        else:
+            cfgstr = qreq_.get_cfgstr(with_input=False, with_data=True, with_pipe=True)
+        return chipmatch_store.get_chipmatch_store(qreq_.get_qresdir(), cfgstr)
+
     def execute(
         qreq_,
         qaids=None,
@@ -36,3 +36,65 @@ def benchmark_knn():
     nns_list1 = nearest_neighbors(  # NOQA
         qreq_, Kpad_list, impossible_daids_list, verbose=verbose
     )
+
+
+def benchmark_shared_neighbors(num_cfgs=20, pipe_workers=2):
+    r"""
+    Reports the seconds spent running a sweep of pipeline configs that only
+    differ after the nearest neighbor step, without sharing the neighbors
+    between configs, sharing them in the calling process and sharing them
+    with ``pipe_workers`` worker processes.
+
+    CommandLine:
+        python ~/code/wbia/wbia/algo/hots/tests/bench.py benchmark_shared_neighbors
+        python ~/code/wbia/wbia/algo/hots/tests/bench.py benchmark_shared_neighbors --pipe-workers=4
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from bench import *  # NOQA
+        >>> pipe_workers = ut.get_argval('--pipe-workers', type_=int, default=2)
+        >>> result = benchmark_shared_neighbors(pipe_workers=pipe_workers)
+        >>> print(ut.repr2(result, precision=2))
+    """
+    import time
+
+    import wbia
+    from wbia.expt import experiment_helpers, harness
+
+    ibs = wbia.opendb(defaultdb='PZ_MTEST')
+    qaids = daids = ibs.get_valid_aids()
+    # Vary the spatial verification shortlist and the scoring only
+    shortlist_sizes = [10 * (index + 1) for index in range(num_cfgs // 2)]
+    test_cfg_name_list = [
+        'default:nNameShortlistSVER=[%s],sv_on=[True,False]'
+        % (','.join(map(str, shortlist_sizes)),)
+    ]
+    cfgdict_list, pipecfg_list = experiment_helpers.get_pipecfg_list(
+        test_cfg_name_list, ibs=ibs
+    )
+    cfgx2_lbl = experiment_helpers.get_varied_pipecfg_lbls(cfgdict_list)
+    result = {}
+    for key, share_neighbors, pipe_workers_ in [
+        ('independent', False, None),
+        ('shared', True, 1),
+        ('shared_pooled', True, pipe_workers),
+    ]:
+        start = time.time()
+        testres = harness.make_single_testres(
+            ibs,
+            qaids,
+            daids,
+            pipecfg_list,
+            cfgx2_lbl,
+            cfgdict_list,
+            'bench',
+            'bench',
+            use_cache=False,
+            share_neighbors=share_neighbors,
+            pipe_workers=pipe_workers_,
+        )
+        result[key] = {
+            'seconds': time.time() - start,
+            'num_cfgs': len(testres.cfgx2_qreq_),
+        }
+    return result
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import pickle
+import threading
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _make_cm(qaid, num, seed=0):
+    from wbia.algo.hots import chip_match
+
+    rng = np.random.RandomState(seed + qaid)
+    fm_list = [
+        rng.randint(0, 100, (n, 2)).astype(np.int32) for n in rng.randint(1, 10, num)
+    ]
+    fsv_list = [rng.rand(len(fm), 2) for fm in fm_list]
+    H_list = [rng.rand(3, 3) for _ in fm_list]
+    return chip_match.ChipMatch(
+        qaid=qaid,
+        daid_list=np.arange(num) + 100,
+        fm_list=fm_list,
+        fsv_list=fsv_list,
+        H_list=H_list,
+        fsv_col_lbls=['ratio', 'fg'],
+        score_list=rng.rand(num),
+    )
+
+
+def _assert_same_columns(cm1, cm2, check_dtype=True):
+    for attr in ['fm_list', 'fsv_list', 'H_list']:
+        list1, list2 = getattr(cm1, attr), getattr(cm2, attr)
+        assert len(list1) == len(list2)
+        for arr1, arr2 in zip(list1, list2):
+            if check_dtype:
+                assert arr1.dtype == arr2.dtype
+                assert np.all(arr1 == arr2)
+            else:
+                assert np.allclose(arr1, arr2)
+    assert np.all(cm1.daid_list == cm2.daid_list)
+    assert np.all(cm1.score_list == cm2.score_list)
+
+
+def test_packed_chipmatch_round_trip(tmp_path):
+    from wbia.algo.hots.chip_match import ChipMatch
+    from wbia.algo.hots.chipmatch_store import ChipMatchStore
+
+    store = ChipMatchStore(str(tmp_path / 'store'))
+    cm = _make_cm(1, 5)
+    store.save(cm, 'u1', 'pipe')
+
+    loaded = store.load_many([1], ['u1'], 'pipe')[0]
+    _assert_same_columns(loaded, cm)
+
+    # Serializing materializes the packed columns instead of emitting them
+    loaded = store.load_many([1], ['u1'], 'pipe')[0]
+    data = ut.from_json(loaded.to_json())
+    assert '_packed' not in data
+    assert all(attr in data for attr in ['fm_list', 'fsv_list', 'H_list'])
+    # JSON does not keep the integer width
+    _assert_same_columns(ChipMatch.from_json(loaded.to_json()), cm, check_dtype=False)
+
+    loaded = store.load_many([1], ['u1'], 'pipe')[0]
+    assert '_packed' not in loaded.get_rawinfostr(colored=False)
+    assert '_packed' not in loaded.__dict__
+
+    loaded = store.load_many([1], ['u1'], 'pipe')[0]
+    _assert_same_columns(pickle.loads(pickle.dumps(loaded)), cm)
+    _assert_same_columns(loaded.copy(), cm)
+
+
+def test_packed_chipmatch_concurrent_unpack(tmp_path):
+    from wbia.algo.hots.chipmatch_store import ChipMatchStore
+
+    store = ChipMatchStore(str(tmp_path / 'store'))
+    cm = _make_cm(1, 50)
+    store.save(cm, 'u1', 'pipe')
+    for _ in range(20):
+        loaded = store.load_many([1], ['u1'], 'pipe')[0]
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def _worker():
+            try:
+                barrier.wait()
+                _assert_same_columns(loaded, cm)
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=_worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+
+def test_chipmatch_store_compaction(tmp_path):
+    from wbia.algo.hots.chipmatch_store import ChipMatchStore
+
+    dpath = str(tmp_path / 'store')
+    store = ChipMatchStore(dpath, segment_nbytes=2000, min_dead_nbytes=0)
+    qaid_list = [1, 2, 3]
+    cm_list = [_make_cm(qaid, 4) for qaid in qaid_list]
+    store.save_many(cm_list, ['u1', 'u2', 'u3'], 'pipe')
+    _, live_nbytes = store.get_nbytes()
+    for seed in range(1, 20):
+        # Recomputed results replace the stored ones
+        cm_list[0] = _make_cm(1, 4, seed=seed)
+        store.save(cm_list[0], 'u1', 'pipe')
+        dead_nbytes, total_nbytes = store.get_nbytes()
+        # The store never keeps more dead bytes than live ones
+        assert dead_nbytes < total_nbytes / 2 or dead_nbytes == 0
+    assert total_nbytes < 2 * live_nbytes + 2000
+    store.delete_many([2], 'pipe')
+    store.save(cm_list[0], 'u1', 'pipe')
+    loaded = store.load_many(qaid_list, ['u1', 'u2', 'u3'], 'pipe')
+    assert loaded[1] is None
+    _assert_same_columns(loaded[0], cm_list[0])
+    _assert_same_columns(loaded[2], cm_list[2])
+    # Another store object (e.g. of another process) reads the moved records
+    other = ChipMatchStore(dpath)
+    _assert_same_columns(other.load_many([3], None, 'pipe')[0], cm_list[2])
+    # Old segments are removed
+    fname_list = [
+        fname
+        for fname in os.listdir(dpath)
+        if not fname.startswith(('index.sqlite3', 'store.lock'))
+    ]
+    assert len(fname_list) == len(store._segment_fpaths()) <= 2
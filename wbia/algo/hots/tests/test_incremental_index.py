@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from os.path import join
+
+import numpy as np
+
+from wbia.algo.hots.neighbor_index import IncrementalNeighborIndex, NeighborIndex
+
+
+def _support(rng, sizes):
+    vecs_list = [rng.randint(0, 255, (n, 128)).astype(np.uint8) for n in sizes]
+    fgws_list = [rng.rand(n).astype(np.float32) for n in sizes]
+    fxs_list = [np.arange(n) for n in sizes]
+    return vecs_list, fgws_list, fxs_list
+
+
+def test_added_support_does_not_copy_shared_base(tmp_path):
+    rng = np.random.RandomState(0)
+    vecs_list, fgws_list, fxs_list = _support(rng, [40, 30, 50, 20, 10])
+    base = NeighborIndex({'algorithm': 'linear'}, 'base')
+    base.init_support([1, 2, 3], vecs_list[0:3], fgws_list[0:3], fxs_list[0:3])
+    base.reindex(verbose=False)
+    dpath = str(tmp_path)
+    base.save(fpath=join(dpath, 'index.flann'), verbose=False)
+    assert base.save_shared_support(join(dpath, 'support'), verbose=False)
+    shared = NeighborIndex.load_shared_support(
+        join(dpath, 'support'), {'algorithm': 'linear'}, 'base', verbose=False
+    )
+    nnindexer = IncrementalNeighborIndex.from_base(shared, 'inc')
+    nnindexer.remove_support([2], verbose=False)
+    nnindexer.add_support([4, 5], vecs_list[3:5], fgws_list[3:5], fxs_list[3:5])
+    # The mapped base arrays are still the ones of the shared indexer
+    assert nnindexer.idx2_vec is shared.idx2_vec
+    assert isinstance(nnindexer.idx2_vec, np.memmap)
+    assert nnindexer.num_indexed_vecs() == 150
+    assert len(nnindexer.get_removed_idxs()) == 30
+    assert len(nnindexer.get_indexed_vecs()) == 120
+    qfx2_vec = vecs_list[4][0:5]
+    qfx2_idx, qfx2_dist = nnindexer.knn(qfx2_vec, 3)
+    assert np.all(nnindexer.get_nn_aids(qfx2_idx[:, 0]) == 5)
+    assert np.all(nnindexer.get_nn_vecs(qfx2_idx[:, 0]) == qfx2_vec)
+    assert np.all(nnindexer.get_nn_featxs(qfx2_idx[:, 0]) == np.arange(5))
+    assert np.all(nnindexer.get_nn_fgws(qfx2_idx[:, 0]) == fgws_list[4][0:5])
+    full = nnindexer.compact([1, 3, 4, 5], verbose=False)
+    qfx2_idx2, qfx2_dist2 = full.knn(qfx2_vec, 3)
+    assert np.allclose(qfx2_dist, qfx2_dist2)
+    assert np.all(nnindexer.get_nn_fgws(qfx2_idx) == full.get_nn_fgws(qfx2_idx2))
+
+
+def _shared_base(dpath, cfgstr='base'):
+    rng = np.random.RandomState(0)
+    vecs_list, fgws_list, fxs_list = _support(rng, [40, 30])
+    base = NeighborIndex({'algorithm': 'linear'}, cfgstr)
+    base.init_support([1, 2], vecs_list, fgws_list, fxs_list)
+    base.reindex(verbose=False)
+    base.save(fpath=join(dpath, cfgstr + '.flann'), verbose=False)
+    return base
+
+
+def test_save_shared_support_replaces_partial_dirs(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    dpath = str(tmp_path)
+    support_dpath = join(dpath, 'support')
+    # A support without meta and the temporary dir of an exited process
+    os.makedirs(support_dpath)
+    np.save(join(support_dpath, 'idx2_vec.npy'), np.zeros(3))
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    dead_tmp_dpath = '{}.tmp{}'.format(support_dpath, proc.pid)
+    os.makedirs(dead_tmp_dpath)
+    base = _shared_base(dpath)
+    assert base.save_shared_support(support_dpath, verbose=False)
+    assert not os.path.exists(dead_tmp_dpath)
+    shared = NeighborIndex.load_shared_support(
+        support_dpath, {'algorithm': 'linear'}, 'base', verbose=False
+    )
+    assert np.all(shared.idx2_vec == base.idx2_vec)
+    assert shared.support_dpath == support_dpath
+    NeighborIndex.remove_shared_support(support_dpath)
+    assert sorted(os.listdir(dpath)) == ['base.flann']
+
+
+def test_evicted_shared_support_is_removed(tmp_path, monkeypatch):
+    import os
+
+    import utool as ut
+
+    from wbia.algo.hots import neighbor_index_cache
+
+    monkeypatch.setattr(neighbor_index_cache, 'NEIGHBOR_CACHE', ut.get_lru_cache(1))
+    dpath = str(tmp_path)
+    shared_list = []
+    for cfgstr in ['base1', 'base2']:
+        base = _shared_base(dpath, cfgstr)
+        support_dpath = join(dpath, 'support_' + cfgstr)
+        assert base.save_shared_support(support_dpath, verbose=False)
+        shared_list.append(
+            NeighborIndex.load_shared_support(
+                support_dpath, {'algorithm': 'linear'}, cfgstr, verbose=False
+            )
+        )
+    shared1, shared2 = shared_list
+    neighbor_index_cache.write_memcache('base1', shared1)
+    # The incremental indexer replacing base1 still uses its support
+    nnindexer = IncrementalNeighborIndex.from_base(shared1, 'inc')
+    nnindexer.remove_support([2], verbose=False)
+    neighbor_index_cache.write_memcache('inc', nnindexer)
+    assert os.path.exists(shared1.support_dpath)
+    neighbor_index_cache.write_memcache('base2', shared2)
+    assert not os.path.exists(shared1.support_dpath)
+    assert os.path.exists(shared2.support_dpath)
+    # Evicted indexers keep their mapped data
+    assert len(nnindexer.get_indexed_vecs()) == 40
+    neighbor_index_cache.clear_memcache()
+    assert not os.path.exists(shared2.support_dpath)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+import pickle
+import sys  # noqa
+
+import numpy as np
+import pytest
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _compute_fn(calls):
+    def compute_fn(flags_list, qaids):
+        qaids = ut.compress(qaids, flags_list)
+        calls.append(qaids)
+        return [
+            Neighbors(qaid, np.full((4, 3), qaid), np.arange(12.0).reshape(4, 3), None)
+            for qaid in qaids
+        ]
+
+    from wbia.algo.hots.pipeline import Neighbors
+
+    return compute_fn
+
+
+def test_neighbor_share():
+    from wbia.algo.hots.pipeline import NeighborShare
+
+    share = NeighborShare()
+    calls = []
+    keys = [(1, 'nnobj_a'), (2, 'nnobj_a')]
+    nns_list1 = share.get_many(keys, _compute_fn(calls), [1, 2])
+    nns_list2 = share.get_many(keys[::-1], _compute_fn(calls), [2, 1])
+    assert calls == [[1, 2]]
+    assert (share.hits, share.misses) == (2, 2)
+    assert [nn.qaid for nn in nns_list2] == [2, 1]
+    # weight_neighbors replaces the distances of the neighbors it gets
+    nns_list1[0].neighb_dists = np.sqrt(nns_list1[0].neighb_dists)
+    assert nns_list2[1].neighb_dists[-1, -1] == 11.0
+    # Pipe workers receive a pickled share
+    share2 = pickle.loads(pickle.dumps(share))
+    nns_list3 = share2.get_many(keys, _compute_fn(calls), [1, 2])
+    assert len(calls) == 1
+    assert np.all(nns_list3[1].neighb_idxs == nns_list2[0].neighb_idxs)
+    # Only the missing neighbors are computed
+    share.get_many([(3, 'nnobj_a'), (1, 'nnobj_a')], _compute_fn(calls), [3, 1])
+    assert calls[-1] == [3]
+    share.clear()
+    assert len(share) == 0
+
+
+@pytest.mark.skipif("'--slow' not in sys.argv")
+def test_shared_neighbors_match():
+    import wbia
+    from wbia.expt import harness
+
+    ibs = wbia.opendb('testdb1')
+    aids = ibs.get_valid_aids()
+    cfgdict_list = [{}, {'sv_on': False}, {'fg_on': False}, {'K': 5}]
+    cfgx2_qreq_ = [
+        ibs.new_query_request(aids, aids, cfgdict=cfgdict) for cfgdict in cfgdict_list
+    ]
+    assert harness.group_pipecfgs(cfgx2_qreq_) == [[0, 1, 2], [3]]
+    share = wbia.algo.hots.pipeline.NeighborShare()
+    for qreq_ in cfgx2_qreq_[0:3]:
+        cm_list1 = qreq_.execute(use_cache=False)
+        qreq_.neighbor_share = share
+        cm_list2 = qreq_.execute(use_cache=False)
+        qreq_.neighbor_share = None
+        for cm1, cm2 in zip(cm_list1, cm_list2):
+            assert np.allclose(cm1.score_list, cm2.score_list)
+    assert share.misses == len(aids)
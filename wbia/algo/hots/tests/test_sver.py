@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import logging
+import types
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+class _SverRequest(object):
+    """The parts of a QueryRequest used by spatial verification"""
+
+    def __init__(self, kpts_dict):
+        self.kpts_dict = kpts_dict
+        self.extern_query_config2 = {}
+        self.qparams = types.SimpleNamespace(
+            xy_thresh=0.01,
+            scale_thresh=2.0,
+            ori_thresh=np.pi / 2,
+            min_nInliers=4,
+            full_homog_checks=True,
+            refine_method='homog',
+            use_chip_extent=False,
+            weight_inliers=False,
+            sver_output_weighting=True,
+        )
+
+    def get_qreq_qannot_kpts(self, qaid):
+        return self.kpts_dict[qaid]
+
+    def get_qreq_dannot_kpts(self, daid_list):
+        return [self.kpts_dict[daid] for daid in daid_list]
+
+
+def _testdata_sver(num_queries=4, num_daids=5, seed=0):
+    """
+    Chipmatches whose database keypoints are a similarity transform of the
+    query keypoints, with 0 to 30 correct matches and 10 outlier matches each
+    """
+    from wbia.algo.hots import chip_match
+
+    rng = np.random.RandomState(seed)
+    num_kpts = 60
+    kpts_dict = {}
+    cm_list = []
+    for qaid in range(1, num_queries + 1):
+        kpts1 = np.zeros((num_kpts, 6))
+        kpts1[:, 0:2] = rng.rand(num_kpts, 2) * 400
+        kpts1[:, 2] = kpts1[:, 4] = rng.rand(num_kpts) * 5 + 3
+        kpts_dict[qaid] = kpts1
+        daid_list = np.arange(num_daids) + 100 * qaid
+        fm_list = []
+        for daid in daid_list:
+            # The keypoint fx of daid corresponds to the keypoint fx of qaid
+            scale = rng.rand() + 0.5
+            kpts2 = kpts1.copy()
+            kpts2[:, 0:2] = kpts1[:, 0:2] * scale + rng.rand(2) * 100
+            kpts2[:, 0:2] += rng.randn(num_kpts, 2) * 0.5
+            kpts2[:, 2:5] *= scale
+            kpts_dict[daid] = kpts2
+            num_inliers = rng.choice([0, 3, 10, 30])
+            fx1 = rng.choice(num_kpts, num_inliers + 10, replace=False)
+            fx2 = fx1.copy()
+            fx2[num_inliers:] = rng.randint(0, num_kpts, 10)
+            fm_list.append(np.vstack([fx1, fx2]).T.astype(np.int32))
+        fsv_list = [rng.rand(len(fm), 1) for fm in fm_list]
+        cm = chip_match.ChipMatch(
+            qaid=qaid,
+            daid_list=daid_list,
+            dnid_list=daid_list,
+            fm_list=fm_list,
+            fsv_list=fsv_list,
+            fsv_col_lbls=['lnbnn'],
+        )
+        cm_list.append(cm)
+    return _SverRequest(kpts_dict), cm_list
+
+
+def _assert_same_chipmatches(cm_list1, cm_list2):
+    assert len(cm_list1) == len(cm_list2)
+    for cm1, cm2 in zip(cm_list1, cm_list2):
+        assert np.all(cm1.daid_list == cm2.daid_list)
+        for attr in ['fm_list', 'fsv_list', 'H_list']:
+            list1, list2 = getattr(cm1, attr), getattr(cm2, attr)
+            assert len(list1) == len(list2)
+            for arr1, arr2 in zip(list1, list2):
+                assert np.all(arr1 == arr2)
+        cm1.evaluate_csum_annot_score()
+        cm2.evaluate_csum_annot_score()
+        assert np.all(cm1.algo_annot_scores['csum'] == cm2.algo_annot_scores['csum'])
+
+
+def test_parallel_sver_matches_serial():
+    from wbia.algo.hots import pipeline
+
+    # Verification appends a column to the fsv labels shared with its input,
+    # so each run gets fresh chipmatches
+    qreq_, cm_list = _testdata_sver()
+    serial = [pipeline.sver_single_chipmatch(qreq_, cm) for cm in cm_list]
+    # Some daids are verified and some are dropped
+    num_verified = sum(cm.num_daids for cm in serial)
+    assert 0 < num_verified < sum(cm.num_daids for cm in cm_list)
+    qreq_, cm_list = _testdata_sver()
+    parallel1 = pipeline._parallel_sver_chipmatches(qreq_, iter(cm_list), 1)
+    qreq_, cm_list = _testdata_sver()
+    parallel2 = pipeline._parallel_sver_chipmatches(qreq_, iter(cm_list), 2)
+    _assert_same_chipmatches(parallel1, serial)
+    _assert_same_chipmatches(parallel2, parallel1)
@@ -37,6 +37,9 @@ logger = logging.getLogger('wbia')
 
 
 KM_PER_SEC = 0.002
+EARTH_RADIUS_KM = 6367
+#: Maximum number of candidate pairs the sweep engine holds in memory at once
+SWEEP_MAX_PAIRS = 2 ** 22
 
 
 def haversine(latlon1, latlon2):
@@ -500,6 +503,213 @@ def _chunk_time(X_part, thresh_sec):
         yield idxs
 
 
+def cluster_timespace_sweep(
+    posixtimes, latlons, thresh_sec=5, km_per_sec=KM_PER_SEC, max_pairs=SWEEP_MAX_PAIRS
+):
+    """
+    Sweep line version of :func:`cluster_timespace_sec`.
+
+    Single linkage clusters cut at ``thresh_sec`` are the connected components
+    of the graph that links every pair with a distance ``<= thresh_sec``. The
+    time (or latitude) difference is a lower bound on that distance, so the
+    points are sorted along that axis and only pairs inside the sweep window
+    are scored with a vectorized haversine. Candidate pairs are generated in
+    batches of at most ``max_pairs`` and merged with
+    ``scipy.sparse.csgraph.connected_components``, so no N x N distance matrix
+    is built.
+
+    Gives the same clusters as :func:`cluster_timespace_sec`, although the
+    label numbering may differ.
+
+    Args:
+        posixtimes (ndarray): N posix times (may contain nans)
+        latlons (ndarray): Nx2 array of (lat, lon) (may contain nans)
+        thresh_sec (float): threshold in seconds
+        km_per_sec (float): reasonable animal walking speed
+        max_pairs (int): maximum number of candidate pairs per batch
+
+    Returns:
+        ndarray: X_labels - cluster labels starting at 1 (or None if there is
+            no data)
+
+    Doctest:
+        >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
+        >>> X_data = np.array([
+        >>>     (0, 42.727985, -73.683994),  # MRC
+        >>>     (0, 42.657414, -73.774448),  # Park1
+        >>>     (0, 42.658333, -73.770993),  # Park2
+        >>>     (0, 42.654384, -73.768919),  # Park3
+        >>>     (0, 42.655039, -73.769048),  # Park4
+        >>>     (0, 42.657872, -73.764148),  # Park5
+        >>>     (0, 42.876974, -73.819311),  # CP1
+        >>>     (0, 42.862946, -73.804977),  # CP2
+        >>>     (0, 42.849809, -73.758486),  # CP3
+        >>> ])
+        >>> posixtimes = X_data.T[0]
+        >>> latlons = X_data.T[1:3].T
+        >>> X_labels = cluster_timespace_sweep(posixtimes, latlons, thresh_sec=250)
+        >>> result = ('X_labels = %r' % (X_labels,))
+        >>> print(result)
+        X_labels = array([1, 2, 2, 2, 2, 3, 4, 5, 6])
+
+    Doctest:
+        >>> # Compare with the agglomerative implementation
+        >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> num = 400
+        >>> posixtimes = rng.randint(0, 60 * 60 * 5, num).astype(np.float64)
+        >>> latlons = np.array([42.7, -73.7]) + rng.randn(num, 2) * 0.01
+        >>> posixtimes[rng.rand(num) < .1] = np.nan
+        >>> latlons[rng.rand(num) < .1] = np.nan
+        >>> thresh_sec = 600
+        >>> labels1 = cluster_timespace_sec(posixtimes, latlons, thresh_sec)
+        >>> labels2 = cluster_timespace_sweep(posixtimes, latlons, thresh_sec, max_pairs=512)
+        >>> def partition(labels):
+        >>>     return sorted(map(sorted, ut.group_items(range(num), labels).values()))
+        >>> assert partition(labels1) == partition(labels2)
+    """
+    num = None
+    if posixtimes is not None:
+        posixtimes = np.asarray(posixtimes, dtype=np.float64).ravel()
+        num = len(posixtimes)
+    if latlons is not None:
+        latlons = np.asarray(latlons, dtype=np.float64).reshape(-1, 2)
+        num = len(latlons)
+    if num is None:
+        return None
+    if posixtimes is None:
+        posixtimes = np.full(num, np.nan)
+    if latlons is None:
+        latlons = np.full((num, 2), np.nan)
+    if np.all(np.isnan(posixtimes)) and np.all(np.isnan(latlons)):
+        # There is no data, so there is nothing to do
+        return None
+
+    # Cluster nan distributions differently
+    X_bools = ~np.isnan(np.hstack([posixtimes[:, None], latlons]))
+    group_id = (X_bools * np.power(2, [2, 1, 0])).sum(axis=1)
+    X_labels = np.empty(num, dtype=np.int64)
+    offset = 0
+    for gid in np.unique(group_id):
+        xs = np.where(group_id == gid)[0]
+        has_time = bool(gid & 4)
+        has_gps = bool(gid & 2) and bool(gid & 1)
+        times = posixtimes[xs] if has_time else None
+        latlons_rad = np.radians(latlons[xs]) if has_gps else None
+        labels = _sweep_components(
+            len(xs), times, latlons_rad, thresh_sec, km_per_sec, max_pairs
+        )
+        X_labels[xs] = labels + offset + 1
+        offset += labels.max() + 1
+    return X_labels
+
+
+def _sweep_components(num, times, latlons_rad, thresh_sec, km_per_sec, max_pairs):
+    """
+    Returns 0-based component labels of the ``num`` points linked by a
+    time-space distance ``<= thresh_sec``
+    """
+    if times is None and latlons_rad is None:
+        # Points without data are never linked
+        return np.arange(num)
+    if latlons_rad is None:
+        # In one dimension the components are split by the gaps
+        sortx = times.argsort(kind='mergesort')
+        is_break = np.diff(times[sortx]) > thresh_sec
+        sorted_labels = np.hstack([[0], np.cumsum(is_break)])
+        labels = np.empty(num, dtype=np.int64)
+        labels[sortx] = sorted_labels
+        return labels
+
+    if times is not None:
+        # time differences are a lower bound on the distance
+        sweep_key = times
+        radius = thresh_sec
+    else:
+        # the distance along a meridian is a lower bound on the distance
+        sweep_key = latlons_rad[:, 0]
+        radius = thresh_sec * km_per_sec / EARTH_RADIUS_KM
+    # Slack so rounding never excludes a candidate, distances are exact
+    radius = radius * (1 + 1e-9) + 1e-9
+
+    sortx = sweep_key.argsort(kind='mergesort')
+    key = sweep_key[sortx]
+    times_ = None if times is None else times[sortx]
+    lats = latlons_rad[sortx, 0]
+    lons = latlons_rad[sortx, 1]
+
+    # labels are component representatives in sorted order
+    labels = np.arange(num)
+    for idx1, idx2 in _sweep_window_pairs(key, radius, max_pairs):
+        # Skip pairs that are already connected
+        flags = labels[idx1] != labels[idx2]
+        idx1 = idx1[flags]
+        idx2 = idx2[flags]
+        if len(idx1) == 0:
+            continue
+        dist = haversine_rad(lats[idx1], lons[idx1], lats[idx2], lons[idx2])
+        dist = dist / km_per_sec
+        if times_ is not None:
+            dist = dist + np.abs(times_[idx1] - times_[idx2])
+        is_linked = dist <= thresh_sec
+        if np.any(is_linked):
+            labels = _merge_components(labels, idx1[is_linked], idx2[is_linked])
+
+    # Number components in sorted order and undo the sort
+    _, sorted_labels = np.unique(labels, return_inverse=True)
+    X_labels = np.empty(num, dtype=np.int64)
+    X_labels[sortx] = sorted_labels
+    return X_labels
+
+
+def _sweep_window_pairs(key, radius, max_pairs):
+    """
+    Yields batches of index pairs (i, j), i < j, of the sorted ``key`` where
+    ``key[j] - key[i] <= radius``. Each batch has at most ``max_pairs`` pairs
+    unless a single point has more partners than that.
+
+    Example:
+        >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
+        >>> key = np.array([0, 1, 2, 10, 11])
+        >>> pairs = list(_sweep_window_pairs(key, 1.5, max_pairs=2))
+        >>> print(np.hstack([np.vstack(p) for p in pairs]).T.tolist())
+        [[0, 1], [1, 2], [3, 4]]
+    """
+    num = len(key)
+    # Exclusive end of each window
+    stops = np.searchsorted(key, key + radius, side='right')
+    counts = stops - np.arange(num) - 1
+    cumcounts = np.cumsum(counts)
+    start = 0
+    while start < num:
+        base = cumcounts[start - 1] if start > 0 else 0
+        stop = int(np.searchsorted(cumcounts, base + max_pairs, side='right'))
+        stop = max(stop, start + 1)
+        counts_ = counts[start:stop]
+        total = int(counts_.sum())
+        if total > 0:
+            idx1 = np.repeat(np.arange(start, stop), counts_)
+            # Position of each pair within its window
+            row_offsets = np.repeat(np.cumsum(counts_) - counts_, counts_)
+            idx2 = idx1 + 1 + (np.arange(total) - row_offsets)
+            yield idx1, idx2
+        start = stop
+
+
+def _merge_components(labels, idx1, idx2):
+    """Merges the components of the linked pairs (idx1, idx2)"""
+    import scipy.sparse
+    import scipy.sparse.csgraph
+
+    num = len(labels)
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(idx1), dtype=np.bool_), (labels[idx1], labels[idx2])),
+        shape=(num, num),
+    )
+    _, components = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    return components[labels]
+
+
 # def _chunk_lat(X_chunk, thresh_sec, km_per_sec):
 #     # X_time = X_chunk.T[0]
 #     X_lats = X_chunk.T[-2]
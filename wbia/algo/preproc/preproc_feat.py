@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming feature extraction in a process pool.
+
+``imap_shared`` maps a worker over a lazy stream of arguments in a persistent
+:class:`wbia.dtool.executors.ProcessExecutor` and yields the results in input
+order. At most ``lookahead`` calls are computed ahead of the consumer, so
+memory stays flat however long the stream is (e.g. a feature backfill of 100k
+chips computed one depcache chunk at a time). The executors are shut down
+when the interpreter exits.
+
+Array results are not pickled back to the parent. The worker writes them to
+a file in shared memory (``/dev/shm`` when it exists) and returns their
+dtypes and shapes. The parent maps the file, unlinks it, and yields arrays
+backed by the mapping. The pages are freed when the depcache writer drops
+the arrays.
+
+Example:
+    >>> # ENABLE_DOCTEST
+    >>> from wbia.algo.preproc.preproc_feat import *  # NOQA
+    >>> args_iter = ((num,) for num in range(1, 6))
+    >>> results = list(imap_shared(np.arange, args_iter, max_workers=2))
+    >>> print([result.tolist() for result in results])
+    [[0], [0, 1], [0, 1, 2], [0, 1, 2, 3], [0, 1, 2, 3, 4]]
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import utool as ut
+
+from wbia.dtool.executors import ProcessExecutor
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+#: Number of feature extraction processes (0 or 1 computes in the caller)
+FEAT_WORKERS = ut.get_argval('--feat-workers', type_=int, default=None)
+#: Maximum number of chips being computed ahead of the consumer per worker
+FEAT_LOOKAHEAD_PER_WORKER = 2
+
+# Persistent executors keyed by (max_workers, lookahead)
+_EXECUTORS = {}
+
+
+def get_shared_dpath():
+    """Directory of the result files, in memory when possible"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _write_shared_arrays(dpath, arrays):
+    """
+    Writes arrays back to back into a new file and returns its path and the
+    (dtype, shape) of each array
+    """
+    fd, fpath = tempfile.mkstemp(prefix='wbia_shared_', suffix='.bin', dir=dpath)
+    specs = []
+    with os.fdopen(fd, 'wb') as file_:
+        for arr in arrays:
+            arr = np.ascontiguousarray(arr)
+            file_.write(arr.data)
+            specs.append((arr.dtype.str, arr.shape))
+    return fpath, specs
+
+
+def _read_shared_arrays(fpath, specs):
+    """
+    Maps the arrays written by _write_shared_arrays and unlinks the file.
+    The mapping stays valid until the arrays are garbage collected.
+    """
+    arrays = []
+    offset = 0
+    try:
+        for dtype, shape in specs:
+            dtype = np.dtype(dtype)
+            nbytes = dtype.itemsize * int(np.prod(shape))
+            if nbytes == 0:
+                arr = np.empty(shape, dtype=dtype)
+            else:
+                mmap = np.memmap(fpath, dtype, mode='r', offset=offset, shape=shape)
+                # Plain ndarray view, the memmap base keeps the mapping alive
+                arr = mmap.view(np.ndarray)
+            arrays.append(arr)
+            offset += nbytes
+    finally:
+        os.remove(fpath)
+    return arrays
+
+
+def _shared_call(func, args, dpath):
+    """
+    Worker side of imap_shared: calls func and moves the arrays of its
+    result into a shared memory file
+    """
+    result = func(*args)
+    is_tuple = isinstance(result, tuple)
+    items = result if is_tuple else (result,)
+    flags = [isinstance(item, np.ndarray) for item in items]
+    arrays = [item for item, flag in zip(items, flags) if flag]
+    others = [item for item, flag in zip(items, flags) if not flag]
+    fpath, specs = _write_shared_arrays(dpath, arrays)
+    return is_tuple, flags, others, fpath, specs
+
+
+def _unpack_shared_result(packed):
+    is_tuple, flags, others, fpath, specs = packed
+    arrays = iter(_read_shared_arrays(fpath, specs))
+    others = iter(others)
+    items = tuple(next(arrays) if flag else next(others) for flag in flags)
+    return items if is_tuple else items[0]
+
+
+def _discard_shared_result(packed):
+    """Removes the file of a result that will never be read"""
+    fpath = packed[3]
+    ut.delete(fpath, verbose=False)
+
+
+def get_process_executor(max_workers, lookahead):
+    """
+    Returns a persistent process executor, so its workers are not restarted
+    for every depcache chunk
+    """
+    key = (max_workers, lookahead)
+    executor = _EXECUTORS.get(key, None)
+    if executor is None:
+        executor = ProcessExecutor(max_workers=max_workers, lookahead=lookahead)
+        _EXECUTORS[key] = executor
+    return executor
+
+
+@atexit.register
+def shutdown_executors():
+    for executor in _EXECUTORS.values():
+        executor.shutdown()
+    _EXECUTORS.clear()
+
+
+def imap_shared(func, args_iter, max_workers=None, lookahead=None):
+    """
+    Yields ``func(*args)`` for each args in args_iter, in order, computed in a
+    process pool. ndarrays in the results are returned through shared memory.
+
+    Args:
+        func (callable): picklable module-level function
+        args_iter (iterable): argument tuples, consumed lazily
+        max_workers (int): number of processes (default = number of cpus).
+            With 1 or fewer workers, or inside a daemon process, func is
+            called serially in the caller.
+        lookahead (int): maximum number of calls computed ahead of the
+            consumer (default = FEAT_LOOKAHEAD_PER_WORKER * max_workers)
+    """
+    if max_workers is None:
+        max_workers = ut.num_cpus()
+    if max_workers <= 1 or multiprocessing.current_process().daemon:
+        for args in args_iter:
+            yield func(*args)
+        return
+    if lookahead is None:
+        lookahead = FEAT_LOOKAHEAD_PER_WORKER * max_workers
+    lookahead = max(int(lookahead), 1)
+    executor = get_process_executor(max_workers, lookahead)
+    dpath = get_shared_dpath()
+    shared_args_iter = ((func, args, dpath) for args in args_iter)
+    packed_iter = executor.imap(
+        _shared_call, shared_args_iter, discard=_discard_shared_result
+    )
+    try:
+        for packed in packed_iter:
+            yield _unpack_shared_result(packed)
+    finally:
+        # Discards the results computed ahead if the consumer stopped early
+        packed_iter.close()
+
+
+def stream_feats(
+    chip_fpath_list,
+    probchip_fpath_list,
+    hesaff_params,
+    max_workers=None,
+    lookahead=None,
+):
+    """
+    Computes (num_kpts, kpts, vecs) for each chip file with
+    :func:`wbia.core_annots.gen_feat_worker`, in input order. The workers
+    read the chip images themselves.
+
+    Args:
+        chip_fpath_list (iterable): chip image paths
+        probchip_fpath_list (iterable): probability chip paths or Nones
+        hesaff_params (dict): pyhesaff parameters
+        max_workers (int): defaults to --feat-workers or the number of cpus
+        lookahead (int): maximum number of chips in flight
+    """
+    from wbia.core_annots import gen_feat_worker
+
+    if max_workers is None:
+        max_workers = FEAT_WORKERS
+    args_iter = (
+        (chip_fpath, probchip_fpath, hesaff_params)
+        for chip_fpath, probchip_fpath in zip(chip_fpath_list, probchip_fpath_list)
+    )
+    return imap_shared(
+        gen_feat_worker, args_iter, max_workers=max_workers, lookahead=lookahead
+    )
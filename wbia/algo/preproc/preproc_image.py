@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import io
 import logging
+import multiprocessing
 import os
+import uuid
 import warnings
 from os.path import basename, isabs, splitext
 
@@ -17,6 +21,20 @@ EXIF_NORMAL = ORIENTATION_DICT_INVERSE[ORIENTATION_000]
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
 
+#: Parse new images from their headers by default (see parse_imageinfo)
+HEADER_ONLY = ut.get_argflag('--header-only-ingest')
+#: Number of image parsing processes for header-only ingestion
+INGEST_WORKERS = ut.get_argval('--ingest-workers', type_=int, default=None)
+#: Number of images parsed by one header-only ingestion task
+INGEST_CHUNKSIZE = 64
+
+# Formats read from their headers and the marker that ends a complete file.
+# For these formats the header size is the size decoded by cv2.imread.
+HEADER_END_MARKERS = {
+    'JPEG': b'\xff\xd9',
+    'PNG': b'IEND\xaeB`\x82',
+}
+
 
 def parse_exif(pil_img):
     """Image EXIF helper"""
@@ -35,12 +53,49 @@ def get_standard_ext(gpath):
     return '.jpg' if ext == '.jpeg' else ext
 
 
+def _parse_imageinfo_header(gpath_):
+    """
+    Reads the size, EXIF tags and UUID of an image with one read of the file
+    and without decoding its pixels.
+
+    Returns None when the image needs the full decode of parse_imageinfo:
+    formats other than JPEG and PNG, incomplete files, RGBA images and EXIF
+    orientations that are normalized by rewriting the image.
+    """
+    from PIL import Image
+
+    try:
+        with open(gpath_, 'rb') as file_:
+            data = file_.read()
+        with Image.open(io.BytesIO(data), 'r') as pil_img:
+            end_marker = HEADER_END_MARKERS.get(pil_img.format, None)
+            if end_marker is None or pil_img.mode == 'RGBA':
+                return None
+            # Truncated uploads are only caught by decoding
+            if not data.rstrip(b'\x00\r\n').endswith(end_marker):
+                return None
+            time, lat, lon, orient = parse_exif(pil_img)  # Read exif tags
+            width, height = pil_img.size
+    except Exception:
+        return None
+    if orient not in [EXIF_UNDEFINED, EXIF_NORMAL]:
+        return None
+    # Same UUID as ut.get_file_uuid, hashed from the bytes already read
+    image_uuid = uuid.UUID(bytes=hashlib.sha1(data).digest()[0:16])
+    return image_uuid, width, height, time, lat, lon, orient
+
+
 @profile
-def parse_imageinfo(gpath, cleanup=False):
+def parse_imageinfo(gpath, cleanup=False, header_only=False):
     """Worker function: gpath must be in UNIX-PATH format!
 
     Args:
         gpath (str): image path
+        header_only (bool): read the size and EXIF tags of complete JPEG and
+            PNG files from their headers and hash the bytes of the same
+            read, instead of decoding the image. Images that need their
+            orientation normalized or their alpha channel removed are still
+            decoded. Corrupt pixel data is not detected in this mode.
 
     Returns:
         tuple: param_tup -
@@ -172,43 +227,48 @@ def parse_imageinfo(gpath, cleanup=False):
             #     logger.info(warnstr)
             logger.info('%d warnings issued by %r' % (len(w), gpath))
 
-    try:
-        # Open image with EXIF support to get time, GPS, and the original orientation
-        pil_img = Image.open(gpath_, 'r')
-
-        # Convert 16-bit RGBA images on disk to 8-bit RGB
-        if pil_img.mode == 'RGBA':
-            pil_img.load()
-            canvas = Image.new('RGB', pil_img.size, (255, 255, 255))
-            canvas.paste(pil_img, mask=pil_img.split()[3])  # 3 is the alpha channel
-            canvas.save(gpath_)
-            pil_img.close()
-
-            # Reload image
+    header_info = _parse_imageinfo_header(gpath_) if header_only else None
+    if header_info is not None:
+        image_uuid, width, height, time, lat, lon, orient = header_info
+    else:
+        try:
+            # Open image with EXIF support to get time, GPS, and the original
+            # orientation
             pil_img = Image.open(gpath_, 'r')
 
-        time, lat, lon, orient = parse_exif(pil_img)  # Read exif tags
-        pil_img.close()
-
-        # OpenCV >= 3.1 supports EXIF tags, which will load correctly
-        img = cv2.imread(gpath_)
-        assert img is not None
-
-        if orient not in [EXIF_UNDEFINED, EXIF_NORMAL]:
-            try:
-                # Sanitize weird behavior and standardize EXIF orientation to 1
-                cv2.imwrite(gpath_, img)
-                orient = EXIF_NORMAL
-            except AssertionError:
-                return None, None
-    except (FileNotFoundError):
-        return None, None
+            # Convert 16-bit RGBA images on disk to 8-bit RGB
+            if pil_img.mode == 'RGBA':
+                pil_img.load()
+                canvas = Image.new('RGB', pil_img.size, (255, 255, 255))
+                canvas.paste(pil_img, mask=pil_img.split()[3])  # 3 is the alpha channel
+                canvas.save(gpath_)
+                pil_img.close()
 
-    # Parse out the data
-    height, width = img.shape[:2]  # Read width, height
+                # Reload image
+                pil_img = Image.open(gpath_, 'r')
 
-    # We cannot use pixel data as libjpeg is not deterministic (even for reads!)
-    image_uuid = ut.get_file_uuid(gpath_)  # Read file ]-hash-> guid = gid
+            time, lat, lon, orient = parse_exif(pil_img)  # Read exif tags
+            pil_img.close()
+
+            # OpenCV >= 3.1 supports EXIF tags, which will load correctly
+            img = cv2.imread(gpath_)
+            assert img is not None
+
+            if orient not in [EXIF_UNDEFINED, EXIF_NORMAL]:
+                try:
+                    # Sanitize weird behavior and standardize EXIF orientation to 1
+                    cv2.imwrite(gpath_, img)
+                    orient = EXIF_NORMAL
+                except AssertionError:
+                    return None, None
+        except (FileNotFoundError):
+            return None, None
+
+        # Parse out the data
+        height, width = img.shape[:2]  # Read width, height
+
+        # We cannot use pixel data as libjpeg is not deterministic (even for reads!)
+        image_uuid = ut.get_file_uuid(gpath_)  # Read file ]-hash-> guid = gid
 
     # orig_gpath = gpath
     orig_gname = basename(gpath)
@@ -240,5 +300,64 @@ def parse_imageinfo(gpath, cleanup=False):
     return temp_filepath, param_tup
 
 
+def parse_imageinfo_chunk(gpath_list, cleanup=False, header_only=False):
+    """Worker function: parses a chunk of images in one task"""
+    return [
+        parse_imageinfo(gpath, cleanup=cleanup, header_only=header_only)
+        for gpath in gpath_list
+    ]
+
+
+def parse_imageinfo_list(
+    gpath_list, cleanup=False, header_only=True, max_workers=None, chunksize=None
+):
+    """
+    Parses many images in a process pool, in chunks of images.
+
+    Args:
+        gpath_list (list): image paths in UNIX-PATH format
+        header_only (bool): see parse_imageinfo
+        max_workers (int): number of processes (default = --ingest-workers
+            or the number of cpus). 1 parses in the calling process.
+        chunksize (int): images per task (default = INGEST_CHUNKSIZE)
+
+    Returns:
+        list: (temp_filepath, param_tup) for each image, in order
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.preproc.preproc_image import *  # NOQA
+        >>> gpath_list = [ut.grab_test_imgpath('patsy.jpg'), 'doesnotexist.jpg']
+        >>> result = parse_imageinfo_list(gpath_list, max_workers=2, chunksize=1)
+        >>> assert result[0] == parse_imageinfo(gpath_list[0])
+        >>> assert result[1] == (None, None)
+    """
+    from wbia.dtool import executors
+
+    if max_workers is None:
+        max_workers = INGEST_WORKERS
+    if max_workers is None:
+        max_workers = ut.num_cpus()
+    if chunksize is None:
+        chunksize = INGEST_CHUNKSIZE
+    chunks = list(ut.ichunks(gpath_list, chunksize))
+    if len(chunks) <= 1 or multiprocessing.current_process().daemon:
+        # Daemon processes (e.g. pool workers) cannot start a pool
+        max_workers = 1
+    mode = 'serial' if max_workers <= 1 else 'process'
+    executor = executors.make_executor(mode, max_workers=max_workers)
+    args_iter = ((chunk, cleanup, header_only) for chunk in chunks)
+    params_list = []
+    with executor:
+        prog = ut.ProgIter(
+            executor.imap(parse_imageinfo_chunk, args_iter),
+            length=len(chunks),
+            lbl='parsing image chunks',
+        )
+        for chunk_params in prog:
+            params_list.extend(chunk_params)
+    return params_list
+
+
 def on_delete(ibs, featweight_rowid_list, qreq_=None):
     logger.info('Warning: Not Implemented')
@@ -97,24 +97,31 @@ def compute_occurrence_groups(ibs, gid_list, config={}, use_gps=False, verbose=N
 
     from wbia.algo.preproc import occurrence_blackbox
 
-    cluster_algo = config.get('cluster_algo', 'agglomerative')
+    cluster_algo = config.get('cluster_algo', 'sweep')
     km_per_sec = config.get('km_per_sec', occurrence_blackbox.KM_PER_SEC)
     thresh_sec = config.get('seconds_thresh', 30 * 60.0)
     min_imgs_per_occurence = config.get('min_imgs_per_occurence', 1)
     # 30 minutes = 3.6 kilometers
     # 5 minutes = 0.6 kilometers
 
-    assert cluster_algo == 'agglomerative', 'only agglomerative is supported'
+    # Both give the same single linkage clusters, the sweep engine never
+    # builds the pairwise distance matrix and scales to large imports
+    cluster_funcs = {
+        'agglomerative': occurrence_blackbox.cluster_timespace_sec,
+        'sweep': occurrence_blackbox.cluster_timespace_sweep,
+    }
+    assert cluster_algo in cluster_funcs, 'unsupported cluster_algo=%r' % (
+        cluster_algo,
+    )
+    cluster_func = cluster_funcs[cluster_algo]
 
     # Group datas with different values separately
     all_gids = []
     all_labels = []
     for key in datas.keys():
         val = datas[key]
-        gids, latlons, posixtimes = val
-        labels = occurrence_blackbox.cluster_timespace_sec(
-            latlons, posixtimes, thresh_sec, km_per_sec=km_per_sec
-        )
+        gids, posixtimes, latlons = val
+        labels = cluster_func(posixtimes, latlons, thresh_sec, km_per_sec=km_per_sec)
         if labels is None:
             labels = np.zeros(len(gids), dtype=np.int)
         all_gids.append(gids)
@@ -348,10 +355,30 @@ def timespace_distance(pt1, pt2):
 
 
 def timespace_pdist(X_data):
+    """
+    Condensed pairwise distances, same as ``pdist(X_data, timespace_distance)``
+    but computed on whole arrays instead of one python call per pair.
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.preproc.preproc_occurrence import *  # NOQA
+        >>> X_name, X_data = testdata_gps()
+        >>> dists1 = timespace_pdist(X_data)
+        >>> dists2 = distance.pdist(X_data, timespace_distance)
+        >>> assert np.allclose(dists1, dists2)
+    """
     if X_data.shape[1] == 3:
-        return distance.pdist(X_data, timespace_distance)
+        from wbia.algo.preproc.occurrence_blackbox import haversine_rad
+
+        idx1, idx2 = np.triu_indices(len(X_data), k=1)
+        secs = X_data.T[0]
+        lats, lons = np.radians(X_data.T[1:3])
+        km_dist = haversine_rad(lats[idx1], lons[idx1], lats[idx2], lons[idx2])
+        km_per_sec = 0.002  # conversion ratio for reasonable animal walking speed
+        sec_dist = np.abs(secs[idx1] - secs[idx2]) * km_per_sec
+        return km_dist + sec_dist
     if X_data.shape[1] == 1:
-        return distance.pdist(X_data, 'euclidian')
+        return distance.pdist(X_data, 'euclidean')
 
 
 def cluster_timespace(X_data, thresh):
@@ -376,7 +403,7 @@ def cluster_timespace(X_data, thresh):
         >>> ut.show_if_requested()
 
     """
-    condenced_dist_mat = distance.pdist(X_data, timespace_distance)
+    condenced_dist_mat = timespace_pdist(X_data)
     # Compute heirarchical linkages
     linkage_mat = scipy.cluster.hierarchy.linkage(condenced_dist_mat, method='centroid')
     # Cluster linkages
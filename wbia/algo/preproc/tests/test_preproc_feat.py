@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+import types
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+class _ChipDepc(object):
+    """The parts of the annotation depcache used by compute_feats"""
+
+    def __init__(self, chip_fpath_list, force_serial):
+        self.chip_fpath_list = chip_fpath_list
+        self.controller = types.SimpleNamespace(force_serial=force_serial)
+
+    def get_native(self, tablename, rowid_list, colname, read_extern=True):
+        assert (tablename, colname, read_extern) == ('chips', 'img', False)
+        return [self.chip_fpath_list[rowid] for rowid in rowid_list]
+
+
+def _write_chips(dpath, num):
+    import cv2
+
+    rng = np.random.RandomState(0)
+    chip_fpath_list = []
+    for index in range(num):
+        chip = np.full((120, 160, 3), 128, dtype=np.uint8)
+        for _ in range(12):
+            center = tuple(int(v) for v in rng.randint(10, 110, 2))
+            color = tuple(int(v) for v in rng.randint(0, 255, 3))
+            cv2.circle(chip, center, int(rng.randint(3, 12)), color, -1)
+        fpath = os.path.join(dpath, 'chip{}.png'.format(index))
+        cv2.imwrite(fpath, chip)
+        chip_fpath_list.append(fpath)
+    return chip_fpath_list
+
+
+def test_compute_feats_streamed_matches_serial(tmp_path, monkeypatch):
+    from wbia import core_annots
+    from wbia.algo.preproc import preproc_feat
+
+    chip_fpath_list = _write_chips(str(tmp_path), 6)
+    cid_list = list(range(len(chip_fpath_list)))
+    config = core_annots.FeatConfig()
+    serial_depc = _ChipDepc(chip_fpath_list, force_serial=True)
+    serial = list(core_annots.compute_feats(serial_depc, cid_list, config))
+    monkeypatch.setattr(preproc_feat, 'FEAT_WORKERS', 2)
+    streamed_depc = _ChipDepc(chip_fpath_list, force_serial=False)
+    streamed = list(core_annots.compute_feats(streamed_depc, cid_list, config))
+    assert len(streamed) == len(serial)
+    for (num1, kpts1, vecs1), (num2, kpts2, vecs2) in zip(serial, streamed):
+        assert num1 == num2
+        assert kpts1.dtype == kpts2.dtype and np.all(kpts1 == kpts2)
+        assert vecs1.dtype == vecs2.dtype and np.all(vecs1 == vecs2)
+    preproc_feat.shutdown_executors()
+
+
+def test_imap_shared_removes_unread_files(tmp_path, monkeypatch):
+    from wbia.algo.preproc import preproc_feat
+
+    monkeypatch.setattr(preproc_feat, 'get_shared_dpath', lambda: str(tmp_path))
+    args_iter = ((1000 * num,) for num in range(1, 21))
+    results = preproc_feat.imap_shared(np.arange, args_iter, max_workers=2, lookahead=4)
+    first = next(results)
+    assert np.all(first == np.arange(1000))
+    # Let the calls computed ahead finish and write their files
+    time.sleep(0.5)
+    assert len(os.listdir(str(tmp_path))) > 0
+    results.close()
+    preproc_feat.shutdown_executors()
+    assert os.listdir(str(tmp_path)) == []
+    # The first result stays readable after its file was removed
+    assert first.sum() == np.arange(1000).sum()
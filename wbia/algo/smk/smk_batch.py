@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Batched SMK scoring on sparse inverted files.
+
+``SMK.match_single`` finds the database annots of one query through the
+inverted lists and evaluates the kernel pair by pair. Here the query and the
+database inverted files are sparse (annots x words) matrices whose entries
+point into a stacked array of aggregated residual vectors, one row per
+(annot, word). The kernel of every query x database pair in a block of
+queries is computed at once: the shared (query entry, database entry) pairs
+of each word are enumerated with array arithmetic, scored in fixed size
+vectorized passes and summed into a dense block of scores.
+"""
+import logging
+
+import numpy as np
+import scipy.sparse
+import utool as ut
+
+from wbia.algo.smk import smk_funcs
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+# Words with at least this many pairs in a query block are scored with a
+# matrix product over their inverted list
+DENSE_MIN_PAIRS = 1024
+# Number of pairs of the other words scored per pass
+PAIR_CHUNKSIZE = 2 ** 18
+
+
+class SparseInvertedAnnots(ut.NiceRepr):
+    """
+    Inverted file of a set of annotations as a sparse matrix over words.
+
+    The aggregated residual vectors are stacked in word major order, so the
+    vectors of the annots in the inverted list of a word are one contiguous
+    slice of ``phis``.
+
+    Attributes:
+        aids (ndarray): annotation rowids, one per matrix row
+        csr (scipy.sparse.csr_matrix): entry (idx, wx) is one plus the row of
+            the aggregated residual vector of ``aids[idx]`` for word ``wx``
+        csc (scipy.sparse.csc_matrix): the same matrix by word (the inverted
+            lists), whose entries are in the order of ``phis``
+        phis (ndarray): stacked aggregated residual vectors (int8 if int_rvec)
+        flags (ndarray): stacked residual error flags
+        gammas (ndarray): self-consistency weight of each annot
+    """
+
+    def __init__(sinva, aids, csr, csc, phis, flags, gammas, int_rvec):
+        sinva.aids = aids
+        sinva.csr = csr
+        sinva.csc = csc
+        sinva.phis = phis
+        sinva.flags = flags
+        sinva.gammas = gammas
+        sinva.int_rvec = int_rvec
+
+    def __nice__(sinva):
+        return 'annots={}, words={}, entries={}'.format(
+            sinva.csr.shape[0], sinva.csr.shape[1], sinva.csr.nnz
+        )
+
+    @classmethod
+    def from_inva(cls, inva, num_words):
+        """
+        Stacks the per-annot word lists and aggregated vectors of an
+        :class:`InvertedAnnots` (whose gammas must already be computed).
+        """
+        num_annots = len(inva.aids)
+        indptr = np.zeros(num_annots + 1, dtype=np.int64)
+        np.cumsum([len(wxs) for wxs in inva.wx_lists], out=indptr[1:])
+        num_entries = int(indptr[-1])
+        if num_entries > 0:
+            indices = np.concatenate(inva.wx_lists).astype(np.int32)
+            phis = np.vstack(inva.agg_rvecs)
+            flags = np.concatenate([f.ravel() for f in inva.agg_flags]).astype(bool)
+        else:
+            indices = np.zeros(0, dtype=np.int32)
+            phis = np.zeros((0, 0), dtype=np.float32)
+            flags = np.zeros(0, dtype=bool)
+        data = np.arange(num_entries, dtype=np.int64)
+        csc = scipy.sparse.csr_matrix(
+            (data, indices, indptr), shape=(num_annots, num_words)
+        ).tocsc()
+        # Reorder the stacked vectors by word
+        annot_major_pos = csc.data
+        phis = phis.take(annot_major_pos, axis=0)
+        flags = flags.take(annot_major_pos)
+        csc.data = np.arange(1, num_entries + 1, dtype=np.int64)
+        csr = csc.tocsr()
+        aids = np.array(inva.aids)
+        gammas = np.array(inva.gamma_list, dtype=np.float64)
+        return cls(aids, csr, csc, phis, flags, gammas, inva.int_rvec)
+
+    def Phis_flags(sinva, pos):
+        """Aggregated residual vectors and flags at stacked positions"""
+        Phis = sinva.phis.take(pos, axis=0)
+        flags = sinva.flags.take(pos)
+        if sinva.int_rvec:
+            Phis = smk_funcs.uncast_residual_integer(Phis)
+        return Phis, flags
+
+    def word_Phis_flags(sinva, wx):
+        """Aggregated residual vectors and flags of the inverted list of a word"""
+        start, stop = sinva.csc.indptr[wx : wx + 2]
+        Phis = sinva.phis[start:stop]
+        flags = sinva.flags[start:stop]
+        if sinva.int_rvec:
+            Phis = smk_funcs.uncast_residual_integer(Phis)
+        return Phis, flags
+
+
+def get_num_words(*invas):
+    return 1 + max(
+        [int(wxs.max()) for inva in invas for wxs in inva.wx_lists if len(wxs)] + [-1]
+    )
+
+
+def get_word_weights(wx_to_weight, num_words):
+    return np.array([wx_to_weight[wx] for wx in range(num_words)], dtype=np.float64)
+
+
+@profile
+def score_block(sqinva, sdinva, qxs, weights, alpha, thresh):
+    """
+    Computes the aggregated selective match kernel between the query annots
+    ``qxs`` and all database annots.
+
+    The query entries of words with long inverted lists are scored against
+    the whole list with one matrix product per word. The remaining (query
+    entry, database entry) pairs are enumerated with array arithmetic and
+    scored in passes of PAIR_CHUNKSIZE pairs.
+
+    Returns:
+        tuple: (scores, hits) dense (len(qxs), num_daids) arrays of kernel
+            values and of flags marking the pairs that share a word
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.smk.smk_batch import *  # NOQA
+        >>> from wbia.algo.smk import smk_pipeline
+        >>> qinva, dinva = testdata_invas()
+        >>> num_words = get_num_words(qinva, dinva)
+        >>> weights = get_word_weights(dinva.wx_to_weight, num_words)
+        >>> sqinva = SparseInvertedAnnots.from_inva(qinva, num_words)
+        >>> sdinva = SparseInvertedAnnots.from_inva(dinva, num_words)
+        >>> qxs = np.arange(len(qinva.aids))
+        >>> scores, hits = score_block(sqinva, sdinva, qxs, weights, 3.0, 0.0)
+        >>> # Compare to the pairwise kernel
+        >>> for qx, qaid in enumerate(qinva.aids):
+        >>>     X = qinva.get_annot(qaid)
+        >>>     for dx, daid in enumerate(dinva.aids):
+        >>>         Y = dinva.get_annot(daid)
+        >>>         item = smk_pipeline.match_kernel_agg(
+        >>>             X, Y, dinva.wx_to_weight, 3.0, 0.0)
+        >>>         assert hits[qx, dx] == (len(X.words & Y.words) > 0)
+        >>>         assert np.isclose(scores[qx, dx], item[0], atol=1e-6)
+        >>> assert hits.sum() > len(qinva.aids)
+    """
+    csc = sdinva.csc
+    num_daids = len(sdinva.aids)
+    scores = np.zeros((len(qxs), num_daids), dtype=np.float64)
+    hits = np.zeros((len(qxs), num_daids), dtype=bool)
+    block = sqinva.csr[qxs]
+    # One entry per (query annot, word)
+    entry_qxs = np.repeat(np.arange(len(qxs)), np.diff(block.indptr))
+    entry_wxs = block.indices
+    entry_pos = block.data - 1
+    # Number of database entries that share the word of each query entry
+    entry_npairs = np.diff(csc.indptr)[entry_wxs]
+
+    # Words with long inverted lists
+    word_order = np.argsort(entry_wxs, kind='stable')
+    block_wxs, word_starts, word_counts = np.unique(
+        entry_wxs[word_order], return_index=True, return_counts=True
+    )
+    word_npairs = word_counts * np.diff(csc.indptr)[block_wxs]
+    is_dense = word_npairs >= DENSE_MIN_PAIRS
+    for wx, start, count in zip(
+        block_wxs[is_dense], word_starts[is_dense], word_counts[is_dense]
+    ):
+        ents = word_order[start : start + count]
+        PhisX, flagsX = sqinva.Phis_flags(entry_pos[ents])
+        PhisY, flagsY = sdinva.word_Phis_flags(wx)
+        word_scores = smk_funcs.selective_match_score(
+            PhisX, PhisY, flagsX, flagsY, alpha, thresh
+        )
+        word_scores *= weights[wx]
+        idx = np.ix_(entry_qxs[ents], csc.indices[csc.indptr[wx] : csc.indptr[wx + 1]])
+        scores[idx] += word_scores
+        hits[idx] = True
+
+    # Remaining pairs
+    sparse_ents = np.flatnonzero(~np.isin(entry_wxs, block_wxs[is_dense]))
+    cum_npairs = np.cumsum(entry_npairs[sparse_ents])
+    total = int(cum_npairs[-1]) if len(cum_npairs) else 0
+    splits = np.searchsorted(
+        cum_npairs, np.arange(PAIR_CHUNKSIZE, total, PAIR_CHUNKSIZE), side='right'
+    )
+    flat_scores = scores.reshape(-1)
+    flat_hits = hits.reshape(-1)
+    for ents in np.split(sparse_ents, splits):
+        npairs = entry_npairs[ents]
+        num = int(npairs.sum())
+        if num == 0:
+            continue
+        # Expand each query entry into its pairs with the database entries
+        pair_ents = np.repeat(ents, npairs)
+        within = np.arange(num) - np.repeat(np.cumsum(npairs) - npairs, npairs)
+        pair_dents = csc.indptr[entry_wxs[pair_ents]] + within
+        PhisX, flagsX = sqinva.Phis_flags(entry_pos[pair_ents])
+        PhisY, flagsY = sdinva.Phis_flags(pair_dents)
+        score_list = smk_funcs.match_scores_agg(
+            PhisX, PhisY, flagsX[:, None], flagsY[:, None], alpha, thresh
+        )
+        score_list *= weights[entry_wxs[pair_ents]]
+        keys = entry_qxs[pair_ents] * num_daids + csc.indices[pair_dents]
+        flat_scores += np.bincount(keys, score_list, minlength=len(flat_scores))
+        flat_hits[keys] = True
+    scores *= sqinva.gammas[qxs][:, None]
+    scores *= sdinva.gammas[None, :]
+    return scores, hits
+
+
+def score_blocks(sqinva, sdinva, weights, alpha, thresh, qblock=64):
+    """
+    Yields (qxs, scores, hits) from :func:`score_block` for consecutive
+    blocks of ``qblock`` queries.
+    """
+    num_qaids = len(sqinva.aids)
+    for start in range(0, num_qaids, qblock):
+        qxs = np.arange(start, min(start + qblock, num_qaids))
+        scores, hits = score_block(sqinva, sdinva, qxs, weights, alpha, thresh)
+        yield qxs, scores, hits
+
+
+def select_shortlist(scores, shortsize=None):
+    """
+    Returns the indices of the ``shortsize`` largest scores (all of them
+    if shortsize is None) in ascending order of score.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.smk.smk_batch import *  # NOQA
+        >>> scores = np.array([.3, .1, .9, .0, .5])
+        >>> print(select_shortlist(scores, 3).tolist())
+        >>> print(select_shortlist(scores).tolist())
+        [0, 4, 2]
+        [3, 1, 0, 4, 2]
+    """
+    if shortsize is not None and len(scores) > shortsize:
+        idxs = np.argpartition(-scores, shortsize - 1)[:shortsize]
+    else:
+        idxs = np.arange(len(scores))
+    return idxs[np.argsort(scores[idxs], kind='stable')]
+
+
+def testdata_invas(num_qaids=5, num_daids=20, num_words=12, dim=8, seed=0):
+    """
+    Random query and database :class:`InvertedAnnots` with int8 aggregated
+    residuals, idf word weights and gammas.
+    """
+    from wbia.algo.smk.inverted_index import InvertedAnnots
+
+    rng = np.random.RandomState(seed)
+
+    def make_inva(aids):
+        inva = InvertedAnnots()
+        inva.aids = aids
+        inva.wx_lists = []
+        inva.fxs_lists = []
+        inva.maws_lists = []
+        inva.agg_rvecs = []
+        inva.agg_flags = []
+        for aid in aids:
+            nwords = rng.randint(1, 6)
+            wxs = np.sort(rng.choice(num_words, nwords, replace=False)).astype(np.int32)
+            rvecs = rng.randn(nwords, dim)
+            rvecs /= np.linalg.norm(rvecs, axis=1)[:, None]
+            inva.wx_lists.append(wxs)
+            inva.fxs_lists.append(
+                [np.array([fx], dtype=np.uint16) for fx in range(nwords)]
+            )
+            inva.maws_lists.append([np.ones(1, dtype=np.float32)] * nwords)
+            inva.agg_rvecs.append(smk_funcs.cast_residual_integer(rvecs))
+            inva.agg_flags.append(rng.rand(nwords, 1) < 0.1)
+        inva.aid_to_idx = ut.make_index_lookup(aids)
+        inva.int_rvec = True
+        return inva
+
+    qinva = make_inva(list(range(1, num_qaids + 1)))
+    dinva = make_inva(list(range(num_qaids + 1, num_qaids + num_daids + 1)))
+    dinva.wx_to_aids = dinva.compute_inverted_list()
+    wx_to_weight = dinva.compute_word_weights('idf')
+    for inva in [qinva, dinva]:
+        inva.wx_to_weight = wx_to_weight
+        inva.gamma_list = inva.compute_gammas(3.0, 0.0)
+    return qinva, dinva
@@ -52,6 +52,8 @@ class SMKRequestConfig(dtool.Config):
             'word_weight_method', 'idf', shortprefix='wwm'
         ),  # hack for query only multiple assignment
         ut.ParamInfo('smk_version', 3),
+        # score all queries at once on sparse inverted files (same results)
+        ut.ParamInfo('smk_batch', True, hideif=True),
     ]
     _sub_config_list = [
         core_annots.ChipConfig,
@@ -351,6 +353,8 @@ class SMK(ut.NiceRepr):
         # X_list = qreq_.qinva.inverted_annots(qreq_.qaids)
         # Y_list = qreq_.dinva.inverted_annots(qreq_.daids)
         # verbose = 2
+        if qreq_.qparams['agg'] and qreq_.qparams['smk_batch']:
+            return smk.match_batch(qreq_, verbose=verbose)
         _prog = ut.ProgPartial(lbl='smk query', bs=verbose <= 1, enabled=verbose)
         daids = np.array(qreq_.daids)
         cm_list = [
@@ -359,6 +363,81 @@ class SMK(ut.NiceRepr):
         ]
         return cm_list
 
+    @profile
+    def match_batch(smk, qreq_, verbose=True):
+        """
+        Scores every query against the database with the sparse inverted
+        files of :mod:`smk_batch`, then builds chip matches (and spatially
+        verifies) only the shortlist of each query. Gives the same results
+        as calling match_single on each query with agg=True.
+
+        CommandLine:
+            python -m wbia.algo.smk.smk_pipeline SMK.match_batch --profile
+
+        Example:
+            >>> # DISABLE_DOCTEST
+            >>> from wbia.algo.smk.smk_pipeline import *  # NOQA
+            >>> ibs, smk, qreq_ = testdata_smk()
+            >>> qreq_.ensure_data()
+            >>> cm_list = smk.match_batch(qreq_)
+            >>> daids = np.array(qreq_.daids)
+            >>> for cm in cm_list[0:3]:
+            >>>     cm1 = smk.match_single(cm.qaid, daids, qreq_, verbose=False)
+            >>>     assert sorted(cm.daid_list) == sorted(cm1.daid_list)
+        """
+        from wbia.algo.smk import smk_batch
+
+        alpha = qreq_.qparams['smk_alpha']
+        thresh = qreq_.qparams['smk_thresh']
+        if qreq_.qparams.sv_on:
+            shortsize = qreq_.qparams.nNameShortlistSVER
+        else:
+            shortsize = None
+
+        qinva, dinva = qreq_.qinva, qreq_.dinva
+        num_words = smk_batch.get_num_words(qinva, dinva)
+        weights = smk_batch.get_word_weights(dinva.wx_to_weight, num_words)
+        sqinva = smk_batch.SparseInvertedAnnots.from_inva(qinva, num_words)
+        sdinva = smk_batch.SparseInvertedAnnots.from_inva(dinva, num_words)
+
+        qblock = 64
+        _prog = ut.ProgPartial(
+            lbl='smk batch query',
+            length=int(np.ceil(len(qinva.aids) / qblock)),
+            bs=True,
+            enabled=verbose,
+        )
+        qaid_to_cm = {}
+        blocks = smk_batch.score_blocks(
+            sqinva, sdinva, weights, alpha, thresh, qblock=qblock
+        )
+        for qxs, scores, hits in _prog(blocks):
+            for qx, block_scores, block_hits in zip(qxs, scores, hits):
+                qaid = sqinva.aids[qx]
+                hit_dxs = np.flatnonzero(block_hits)
+                valid_flags = check_can_match(qaid, sdinva.aids[hit_dxs], qreq_)
+                valid_dxs = hit_dxs.compress(valid_flags)
+                if thresh >= 0:
+                    # Kernel values are non-negative, so a zero score has no
+                    # feature matches and would be dropped from the chipmatch
+                    valid_dxs = valid_dxs.compress(block_scores[valid_dxs] > 0)
+                short_dxs = valid_dxs.take(
+                    smk_batch.select_shortlist(block_scores[valid_dxs], shortsize)
+                )
+                # Rescore the shortlist pairwise to get the matching words
+                X = qinva.get_annot(qaid)
+                shortlist = ut.Shortlist(shortsize)
+                for daid in sdinva.aids[short_dxs]:
+                    Y = dinva.get_annot(daid)
+                    shortlist.insert(
+                        match_kernel_agg(X, Y, dinva.wx_to_weight, alpha, thresh)
+                    )
+                qaid_to_cm[qaid] = smk.build_chipmatch(
+                    qaid, X, shortlist, qreq_, agg=True, verbose=False
+                )
+        cm_list = ut.take(qaid_to_cm, qreq_.qaids)
+        return cm_list
+
     @profile
     def match_single(smk, qaid, daids, qreq_, verbose=True):
         """
@@ -392,8 +471,6 @@ class SMK(ut.NiceRepr):
             >>> cm.ishow_analysis(qreq_)
             >>> ut.show_if_requested()
         """
-        from wbia.algo.hots import chip_match, pipeline
-
         alpha = qreq_.qparams['smk_alpha']
         thresh = qreq_.qparams['smk_thresh']
         agg = qreq_.qparams['agg']
@@ -448,6 +525,17 @@ class SMK(ut.NiceRepr):
                 item = match_kernel_sep(X, Y, wx_to_weight, alpha, thresh)
                 shortlist.insert(item)
 
+        cm = smk.build_chipmatch(qaid, X, shortlist, qreq_, agg, verbose=verbose)
+        return cm
+
+    def build_chipmatch(smk, qaid, X, shortlist, qreq_, agg, verbose=True):
+        """
+        Builds the chip match of the scored shortlist of a query and
+        spatially verifies it if sv_on.
+        """
+        from wbia.algo.hots import chip_match, pipeline
+
+        sv_on = qreq_.qparams.sv_on
         # Build chipmatches for the shortlist results
 
         # with ut.Timer('build cms', verbose=verbose):
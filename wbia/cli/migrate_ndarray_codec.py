@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Rewrites np.save encoded array columns with the raw ndarray codec"""
+import logging
+from pathlib import Path
+
+import click
+
+from wbia.dtool.copy_sqlite_to_postgres import (
+    _sqlite_path_to_uri,
+    get_schema_name_from_uri,
+    get_sqlite_db_paths,
+)
+from wbia.dtool.sql_control import BATCH_SIZE, SQLDatabaseController
+
+logger = logging.getLogger('wbia')
+
+
+@click.command()
+@click.option(
+    '--db-dir',
+    type=click.Path(exists=True),
+    multiple=True,
+    help='database location, all of its sqlite databases are migrated',
+)
+@click.option(
+    '--db-uri',
+    multiple=True,
+    help='SQLite or Postgres connection URI (e.g. sqlite:////path.sqlite3)',
+)
+@click.option(
+    '--schema',
+    multiple=True,
+    help='Postgres schema(s) to migrate when using a postgres --db-uri (e.g. main)',
+)
+@click.option(
+    '--table',
+    multiple=True,
+    help='only migrate these tables (default is all tables)',
+)
+@click.option(
+    '--batch-size',
+    type=int,
+    default=BATCH_SIZE,
+    help=f'rows per transaction, default {BATCH_SIZE}',
+)
+@click.option(
+    '-v',
+    '--verbose',
+    is_flag=True,
+    default=False,
+    help='Show debug messages',
+)
+def main(db_dir, db_uri, schema, table, batch_size, verbose):
+    """Re-encodes NDARRAY / NUMPY columns so they can be read without unpickling"""
+    if verbose:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+    if len(db_dir) + len(db_uri) == 0:
+        raise click.BadParameter('at least one --db-dir or --db-uri must be given')
+
+    # (uri, name) pairs, the name is the schema when using postgres
+    targets = []
+    for db_dir_ in db_dir:
+        for db_path, _ in get_sqlite_db_paths(Path(db_dir_)):
+            uri = _sqlite_path_to_uri(db_path)
+            targets.append((uri, get_schema_name_from_uri(uri)))
+    for db_uri_ in db_uri:
+        if db_uri_.startswith('postgresql://'):
+            if not schema:
+                raise click.BadParameter('--schema is required for postgres URIs')
+            targets.extend([(db_uri_, schema_) for schema_ in schema])
+        else:
+            targets.append((db_uri_, get_schema_name_from_uri(db_uri_)))
+
+    tablenames = list(table) if table else None
+    total = 0
+    for uri, name in targets:
+        logger.info(f'migrating {uri} ({name}) ...')
+        db = SQLDatabaseController(uri, name)
+        if tablenames is None:
+            tablenames_ = None
+        else:
+            tablenames_ = [t for t in tablenames if db.has_table(t)]
+        counts = db.reencode_ndarray_columns(tablenames_, batch_size=batch_size)
+        for (tablename, colname), num in sorted(counts.items()):
+            if num:
+                logger.info(f'  {tablename}.{colname}: {num} values rewritten')
+        total += sum(counts.values())
+        if db.is_using_sqlite:
+            db.vacuum()
+
+    logger.info(f'{total} values rewritten in {len(targets)} database(s)')
+
+
+if __name__ == '__main__':
+    main()
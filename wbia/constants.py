@@ -19,6 +19,8 @@ logger = logging.getLogger('wbia')
 
 CONTAINERIZED = ut.get_argflag('--containerized')
 PRODUCTION = ut.get_argflag('--production')
+# Store feat keypoints and descriptors in memory mapped shard files
+FEAT_MMAP = ut.get_argflag('--feat-mmap')
 HTTPS = ut.get_argflag('--https')
 
 
@@ -484,10 +484,7 @@ class IBEISController(BASE_CLASS):
         if tablename is None:
             self.reset_table_cache()
         else:
-            try:
-                del self.table_cache[tablename]
-            except KeyError:
-                pass
+            self.table_cache.clear(tablename)
 
     def show_depc_graph(self, depc, reduced=False):
         depc.show_graph(reduced=reduced)
@@ -546,17 +543,19 @@ class IBEISController(BASE_CLASS):
 
     def get_cachestats_str(self):
         """
-        Returns info about the underlying SQL cache memory
+        Returns info about the underlying SQL cache memory and its hit rates
         """
         total_size_str = ut.get_object_size_str(
             self.table_cache, lbl='size(table_cache): '
         )
-        total_size_str = '\nlen(table_cache) = %r' % (len(self.table_cache))
-        table_size_str_list = [
-            ut.get_object_size_str(val, lbl='size(table_cache[{}]): '.format(key))
-            for key, val in self.table_cache.items()
+        stats_str = 'table_cache stats = ' + ut.repr2(self.table_cache.get_stats())
+        column_stats_str_list = [
+            '%s.%s: %d hits / %d misses' % (key + tuple(colstats))
+            for key, colstats in self.table_cache.column_stats.items()
         ]
-        cachestats_str = total_size_str + ut.indentjoin(table_size_str_list, '\n  * ')
+        cachestats_str = (
+            total_size_str + '\n' + stats_str
+        ) + ut.indentjoin(column_stats_str_list, '\n  * ')
         return cachestats_str
 
     def print_cachestats_str(self):
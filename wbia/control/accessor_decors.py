@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import builtins
+import collections
 import logging
+import threading
 
 import utool as ut
 from utool._internal.meta_util_six import get_funcname
@@ -23,12 +25,10 @@ DEBUG_API_CACHE = False
 RELEASE_MODE = True
 
 if RELEASE_MODE:
-    # API Cache is only for when you can gaurentee one instance of the
-    # Controller will be running. This is not safe to use in production.  Use
-    # only for local testing.
-    # API_CACHE = ut.get_argflag('--api-cache')
-    # ASSERT_API_CACHE = not ut.get_argflag(('--noassert-api-cache', '--naac'))
-    API_CACHE = False
+    # Cached entries are validated against per-table versions stored in the
+    # database (bumped by every cache_invalidator), so the cache is safe to use
+    # with several controller processes sharing one database.
+    API_CACHE = ut.get_argflag('--api-cache')
     ASSERT_API_CACHE = False
 else:
     # API_CACHE = not ut.get_argflag('--no-api-cache')
@@ -36,6 +36,8 @@ else:
     API_CACHE = False
     ASSERT_API_CACHE = False
 
+#: Maximum number of cached rowid values per controller
+API_CACHE_SIZE = ut.get_argval('--api-cache-size', type_=int, default=100000)
 
 if ut.VERBOSE:
     if ut.in_main_process():
@@ -52,10 +54,126 @@ if ut.VERBOSE:
 # DECORATORS::ADDER
 
 
+_MISS = object()
+
+
+class TableCache(object):
+    """
+    Size bounded LRU cache of getter values keyed by
+    ``(tblname, colname, kwargs_hash, rowid)``.
+
+    Each value is stored with the version of its table at the time it was
+    read. A lookup with a different version is a miss, so bumping the version
+    of a table invalidates all of its cached values at once. The cache is
+    shared by the serving threads, so every access holds a lock.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.accessor_decors import *  # NOQA
+        >>> cache = TableCache(max_size=3)
+        >>> cache.set_many('annots', 'name', None, 0, [1, 2, 3], ['a', 'b', 'c'])
+        >>> cache.get_many('annots', 'name', None, 0, [1, 4])
+        ['a', None]
+        >>> cache.set_many('annots', 'name', None, 0, [4], ['d'])
+        >>> # 2 was the least recently used value
+        >>> cache.get_many('annots', 'name', None, 0, [2, 3, 4])
+        [None, 'c', 'd']
+        >>> # A new version invalidates the table
+        >>> cache.get_many('annots', 'name', None, 1, [3])
+        [None]
+        >>> print(ut.repr2(cache.get_stats(), sorted_=True))
+        {'evictions': 1, 'hits': 3, 'misses': 3, 'size': 3}
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = API_CACHE_SIZE
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # hits and misses of each (tblname, colname)
+        self.column_stats = ut.ddict(lambda: [0, 0])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<TableCache(size={}, hits={}, misses={})>'.format(
+            len(self), self.hits, self.misses
+        )
+
+    def get_many(
+        self, tblname, colname, kwargs_hash, version, rowid_list, default=None
+    ):
+        """Returns the cached values of the rowids (``default`` for misses)"""
+        entries = self._entries
+        vals_list = []
+        num_hit = 0
+        with self._lock:
+            for rowid in rowid_list:
+                key = (tblname, colname, kwargs_hash, rowid)
+                entry = entries.get(key, _MISS)
+                if entry is not _MISS and entry[0] == version:
+                    entries.move_to_end(key)
+                    vals_list.append(entry[1])
+                    num_hit += 1
+                else:
+                    vals_list.append(default)
+            num_miss = len(vals_list) - num_hit
+            self.hits += num_hit
+            self.misses += num_miss
+            colstats = self.column_stats[(tblname, colname)]
+            colstats[0] += num_hit
+            colstats[1] += num_miss
+        return vals_list
+
+    def set_many(self, tblname, colname, kwargs_hash, version, rowid_list, vals_list):
+        entries = self._entries
+        with self._lock:
+            for rowid, val in zip(rowid_list, vals_list):
+                key = (tblname, colname, kwargs_hash, rowid)
+                entries[key] = (version, val)
+                entries.move_to_end(key)
+            num_evict = len(entries) - self.max_size
+            for _ in range(max(num_evict, 0)):
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, tblname=None):
+        """Drops all cached values (or only those of one table)"""
+        with self._lock:
+            if tblname is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == tblname]:
+                    del self._entries[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def get_cache_table_version(ibs, tblname):
+    """
+    Version used to validate cached values of a table. It combines the
+    persistent version bumped by cache invalidators in any process with the
+    write counters of this controller, which also cover undecorated writes.
+    """
+    return (ibs.db.get_cache_version(tblname), ibs.db.get_table_version(tblname))
+
+
 def init_tablecache():
     r"""
     Returns:
-       defaultdict: tablecache
+       TableCache: tablecache
 
     CommandLine:
         python -m wbia.control.accessor_decors --test-init_tablecache
@@ -65,10 +183,9 @@ def init_tablecache():
         >>> from wbia.control.accessor_decors import *  # NOQA
         >>> result = init_tablecache()
         >>> print(result)
+        <TableCache(size=0, hits=0, misses=0)>
     """
-    # 4 levels of dictionaries
-    # tablename, colname, kwargs, and then rowids
-    tablecache = ut.ddict(lambda: ut.ddict(lambda: ut.ddict(dict)))
+    tablecache = TableCache()
     return tablecache
 
 
@@ -117,10 +234,15 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
         >>> ut.assert_eq(val_list1, val_list2, 'run1')
         >>> ut.assert_eq(val_list1, val_list2, 'run2')
         >>> print(ut.repr2(ibs.table_cache))
+        >>> assert ibs.table_cache.hits > 0
+        >>> print(ut.repr2(ibs.table_cache))
         >>> ### Test Setter (invalidates)
         >>> setter_func = ibs.set_name_texts
         >>> wrp_cache_invalidator = cache_invalidator(tblname, force=True)(lambda *a: None)
         >>> wrp_cache_invalidator(ibs, rowid_list1)
+        >>> num_miss = ibs.table_cache.misses
+        >>> val_list6 = wrp_getter_cacher(ibs, rowid_list1)
+        >>> assert ibs.table_cache.misses == num_miss + len(rowid_list1)
         >>> print(ut.repr2(ibs.table_cache))
 
     Example:
@@ -164,11 +286,9 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 % (tblname, colname, num_hit, num_total)
             )
 
-        def assert_cache_hits(ibs, ismiss_list, rowid_list, kwargs_hash, **kwargs):
+        def assert_cache_hits(ibs, ismiss_list, rowid_list, vals_list, **kwargs):
             cached_rowid_list = ut.filterfalse_items(rowid_list, ismiss_list)
-            cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-            # Load cached values for each rowid
-            cache_vals_list = ut.dict_take_list(cache_, cached_rowid_list, None)
+            cache_vals_list = ut.filterfalse_items(vals_list, ismiss_list)
             db_vals_list = getter_func(ibs, cached_rowid_list, **kwargs)
             # Assert everything is valid
             msg_fmt = ut.codeblock(
@@ -180,81 +300,34 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 """
             )
             msg = msg_fmt % (tblname, colname, cfgkeys, cache_vals_list, db_vals_list)
-            try:
-                list1 = cache_vals_list
-                list2 = db_vals_list
-                assert ut.lists_eq(list1, list2), msg
-                # if isinstance(db_vals_list, list):
-                #    assert cache_vals_list == db_vals_list, msg
-                # else:
-                #    assert np.all(cache_vals_list == db_vals_list), msg
-            except AssertionError as ex:
-                raise ex
-            except Exception as ex2:
-                logger.info(type(cache_vals_list))
-                logger.info(type(db_vals_list))
-                ut.printex(ex2)
-                ut.embed()
-                raise
-
-        if False:
-            # @profile cannot profile this because it is alrady being profiled by
-            def wrp_getter_cacher(ibs, rowid_list, **kwargs):
-                """
-                Wrapper function that caches rowid values in a dictionary
-                """
-                # HACK TAKE OUT GETTING DEBUG OUT OF KWARGS
-                debug_ = kwargs.pop('debug', False)
-                if cfgkeys is not None:
-                    # kwargs_hash = ut.get_dict_hashid(ut.dict_take_list(kwargs, cfgkeys, None))
-                    kwargs_hash = ut.get_dict_hashid(
-                        [kwargs.get(key, None) for key in cfgkeys]
-                    )
-                    # ut.dict_take_list(kwargs, cfgkeys, None))
-                else:
-                    kwargs_hash = None
-                # +----------------------------
-                # There are 3 levels of caches
-                # +----------------------------
-                # All caches for this table
-                # colscache_ = ibs.table_cache[tblname]
-                # # All caches for the this column
-                # kwargs_cache_ = colscache_[colname]
-                # # All caches for this kwargs configuration
-                # cache_ = kwargs_cache_[kwargs_hash]
-                cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-                # L____________________________
-
-                # Load cached values for each rowid
-                # vals_list = ut.dict_take_list(cache_, rowid_list, None)
-                vals_list = [cache_.get(rowid, None) for rowid in rowid_list]
-                # Mark rowids with cache misses
-                ismiss_list = [val is None for val in vals_list]
-                if debug or debug_:
-                    debug_cache_hits(ismiss_list, rowid_list)
-                    # logger.info('[cache_getter] "debug_cache_hits" turned off')
-                # HACK !!! DEBUG THESE GETTERS BY ASSERTING INFORMATION IN CACHE IS CORRECT
-                if ASSERT_API_CACHE:
-                    assert_cache_hits(ibs, ismiss_list, rowid_list, kwargs_hash, **kwargs)
-                # END HACK
-                if any(ismiss_list):
-                    miss_indices = ut.list_where(ismiss_list)
-                    miss_rowids = ut.compress(rowid_list, ismiss_list)
-                    # call wrapped function
-                    miss_vals = getter_func(ibs, miss_rowids, **kwargs)
-                    # overwrite missed output
-                    for index, val in zip(miss_indices, miss_vals):
-                        vals_list[index] = val  # Output write
-                    # cache save
-                    for rowid, val in zip(miss_rowids, miss_vals):
-                        cache_[rowid] = val  # Cache write
-                return vals_list
-
-        else:
-
-            def handle_cache_misses(
-                ibs, getter_func, rowid_list, ismiss_list, vals_list, cache_, kwargs
-            ):
+            assert ut.lists_eq(cache_vals_list, db_vals_list), msg
+
+        def wrp_getter_cacher(ibs, rowid_list, **kwargs):
+            """
+            Wrapper function that caches rowid values in the controller
+            table cache
+            """
+            debug_ = kwargs.pop('debug', False)
+            kwargs_hash = (
+                None
+                if cfgkeys is None
+                else ut.get_dict_hashid([kwargs.get(key, None) for key in cfgkeys])
+            )
+            cache_ = ibs.table_cache
+            # Read the version before the values so a concurrent write can
+            # only make the cached values look older than they are
+            version = get_cache_table_version(ibs, tblname)
+            # Load cached values for each rowid
+            vals_list = cache_.get_many(
+                tblname, colname, kwargs_hash, version, rowid_list, default=_MISS
+            )
+            # Mark rowids with cache misses
+            ismiss_list = [val is _MISS for val in vals_list]
+            if debug or debug_:
+                debug_cache_hits(ismiss_list, rowid_list)
+            if ASSERT_API_CACHE:
+                assert_cache_hits(ibs, ismiss_list, rowid_list, vals_list, **kwargs)
+            if any(ismiss_list):
                 miss_indices = ut.list_where(ismiss_list)
                 miss_rowids = ut.compress(rowid_list, ismiss_list)
                 # call wrapped function
@@ -262,39 +335,10 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 # overwrite missed output
                 for index, val in zip(miss_indices, miss_vals):
                     vals_list[index] = val  # Output write
-                # cache save
-                for rowid, val in zip(miss_rowids, miss_vals):
-                    cache_[rowid] = val  # Cache write
-
-            def wrp_getter_cacher(ibs, rowid_list, **kwargs):
-                """
-                Wrapper function that caches rowid values in a dictionary
-                """
-                kwargs.pop('debug', False)
-                kwargs_hash = (
-                    None
-                    if cfgkeys is None
-                    else ut.get_dict_hashid([kwargs.get(key, None) for key in cfgkeys])
+                cache_.set_many(
+                    tblname, colname, kwargs_hash, version, miss_rowids, miss_vals
                 )
-                # There are 3 levels of caches
-                # All caches for this table, caches for the this column, and caches for this kwargs configuration
-                cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-                # Load cached values for each rowid
-                vals_list = [cache_.get(rowid, None) for rowid in rowid_list]
-                # Mark rowids with cache misses
-                ismiss_list = [val is None for val in vals_list]
-                # END HACK
-                if any(ismiss_list):
-                    handle_cache_misses(
-                        ibs,
-                        getter_func,
-                        rowid_list,
-                        ismiss_list,
-                        vals_list,
-                        cache_,
-                        kwargs,
-                    )
-                return vals_list
+            return vals_list
 
         wrp_getter_cacher = ut.preserve_sig(wrp_getter_cacher, getter_func)
         return wrp_getter_cacher
@@ -305,13 +349,19 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
 def cache_invalidator(tblname, colnames=None, rowidx=None, force=False):
     """cacher decorator
 
+    Bumps the persistent cache version of the table after the wrapped writer
+    runs, which invalidates the cached values of the table in every process
+    using the database.
+
     Args:
         tablename (str): the table that the owns the underlying cache
-        colnames (list): the list of cached column that this function will invalidate
+        colnames (list): the list of cached column that this function will
+                         invalidate. Kept for documentation, the whole table
+                         is invalidated.
         rowidx (int): the position (not including self) of the invalidated
                       table's native rowid in the writer function's argument
-                      signature. If this does not exist you should use None.
-                      (default=None)
+                      signature. Kept for documentation, the whole table is
+                      invalidated. (default=None)
     """
     colnames = [colnames] if isinstance(colnames, str) else colnames
 
@@ -324,45 +374,16 @@ def cache_invalidator(tblname, colnames=None, rowidx=None, force=False):
             return writer_func
 
         def wrp_cache_invalidator(self, *args, **kwargs):
-            # the class must have a table_cache property
-            colscache_ = self.table_cache[tblname]
-            colnames_ = list(colscache_.keys()) if colnames is None else colnames
+            # Preform set/delete action before bumping the version. Readers
+            # that see the old version can then only have cached values read
+            # before the bump.
+            writer_result = writer_func(self, *args, **kwargs)
+            self.db.bump_cache_version(tblname)
             if DEBUG_API_CACHE:
-                logger.info('+------')
                 logger.info(
-                    'INVALIDATING tblname=%r, colnames=%r, rowidx=%r, force=%r'
-                    % (tblname, colnames, rowidx, force)
+                    'INVALIDATED tblname=%r, colnames=%r, version=%r'
+                    % (tblname, colnames, get_cache_table_version(self, tblname))
                 )
-                logger.info('self = {!r}'.format(self))
-                logger.info('args = {!r}'.format(args))
-                logger.info('kwargs = {!r}'.format(kwargs))
-                logger.info('colscache_ = ' + ut.repr2(colscache_, truncate=1))
-
-            # Clear the cache of any specified colname
-            # when the invalidator is called
-            if rowidx is None:
-                for colname in colnames_:
-                    kwargs_cache_ = colscache_[colname]
-                    # We dont know the rowsids so clear everything
-                    for cache_ in kwargs_cache_.values():
-                        cache_.clear()
-            else:
-                rowid_list = args[rowidx]
-                for colname in colnames_:
-                    kwargs_cache_ = colscache_[colname]
-                    # We know the rowids to delete
-                    # iterate over all getter kwargs values
-                    for cache_ in kwargs_cache_.values():
-                        ut.delete_dict_keys(cache_, rowid_list)
-
-            # Preform set/delete action
-            if DEBUG_API_CACHE:
-                logger.info('After:')
-                logger.info('colscache_ = ' + ut.repr2(colscache_, truncate=1))
-                logger.info('L__________')
-
-            writer_result = writer_func(self, *args, **kwargs)
-
             return writer_result
 
         wrp_cache_invalidator = ut.preserve_sig(wrp_cache_invalidator, writer_func)
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar snapshot of the annotation table used by ``get_valid_aids``.
+
+The snapshot holds one numpy array per filterable column, loaded with a single
+query, and evaluates the get_valid_aids filters as vectorized masks instead of
+one getter round-trip per filter. It is tagged with the write counters of the
+annotation and image tables (see ``SQLDatabaseController.get_table_version``)
+and is rebuilt after any write made through this controller.
+
+Writes made by other processes are not seen by the counters. Callers that need
+a fresh view use :func:`get_filtered_aids_sql`, which pushes the same filters
+down into one SQL WHERE clause.
+"""
+import logging
+
+import numpy as np
+import utool as ut
+from sqlalchemy.sql import text
+
+from wbia import constants as const
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+# Filters of get_valid_aids that only depend on the annotation row and the
+# image timestamp (the remaining ones are evaluated on the filtered aids)
+COLUMN_FILTER_KEYS = [
+    'include_only_gid_list',
+    'yaw',
+    'is_exemplar',
+    'is_staged',
+    'is_canonical',
+    'species',
+    'is_known',
+    'minqual',
+    'has_timestamp',
+]
+
+
+def _as_float_array(values):
+    values = [np.nan if val is None else val for val in values]
+    return np.array(values, dtype=np.float64)
+
+
+def _as_flag_array(values):
+    return np.array([bool(val) for val in values], dtype=bool)
+
+
+def get_snapshot_version(ibs):
+    return (
+        ibs.db.get_table_version(const.ANNOTATION_TABLE),
+        ibs.db.get_table_version(const.IMAGE_TABLE),
+    )
+
+
+class AnnotSnapshot(object):
+    """
+    In-memory columns of the annotation table.
+
+    Attributes:
+        version (tuple): table write counters the snapshot was loaded at
+        aids (ndarray): sorted annotation rowids, all columns align with it
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.annot_snapshot import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb('testdb1')
+        >>> snapshot = AnnotSnapshot.load(ibs)
+        >>> aid_list = snapshot.filter(ibs, is_known=True, is_staged=False)
+        >>> assert aid_list == ibs.filter_annotation_set(
+        >>>     ibs._get_all_aids(), is_known=True, is_staged=False)
+        >>> assert snapshot.is_current(ibs)
+    """
+
+    def __init__(self, version, aids, columns):
+        self.version = version
+        self.aids = aids
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.aids)
+
+    def __repr__(self):
+        return '<AnnotSnapshot(num_annots={}, version={})>'.format(
+            len(self), self.version
+        )
+
+    @classmethod
+    def load(cls, ibs):
+        """Reads the snapshot columns with one query on the annotation table"""
+        version = get_snapshot_version(ibs)
+        colnames = [
+            'rowid',
+            'image_rowid',
+            'name_rowid',
+            'species_rowid',
+            'annot_exemplar_flag',
+            'annot_staged_flag',
+            'annot_toggle_canonical',
+            'annot_quality',
+            'annot_yaw',
+        ]
+        # Old databases may lack some of the flag columns
+        existing = set(ibs.db.get_column_names(const.ANNOTATION_TABLE)) | {'rowid'}
+        select_list = [
+            colname if colname in existing else 'NULL' for colname in colnames
+        ]
+        operation = 'SELECT {} FROM {} ORDER BY rowid ASC'.format(
+            ', '.join(select_list), const.ANNOTATION_TABLE
+        )
+        rows = ibs.db.executeone(text(operation), keepwrap=True)
+        values = list(zip(*rows)) if len(rows) > 0 else [[]] * len(colnames)
+        raw = dict(zip(colnames, values))
+
+        aids = np.array(raw['rowid'], dtype=np.int64)
+        gids = np.array(
+            [-1 if gid is None else gid for gid in raw['image_rowid']], dtype=np.int64
+        )
+        yaws = _as_float_array(raw['annot_yaw'])
+        # Negative yaws are reported as unknown by get_annot_yaws
+        with np.errstate(invalid='ignore'):
+            yaws[yaws < 0] = np.nan
+        # Same test as filter_aids_without_timestamps
+        unique_gids, gidxs = np.unique(gids, return_inverse=True)
+        unixtimes = ibs.get_image_unixtime(unique_gids.tolist())
+        has_timestamp = np.array([t != -1 for t in unixtimes], dtype=bool)[gidxs]
+
+        columns = {
+            'gids': gids,
+            'nids': _as_float_array(raw['name_rowid']),
+            'species_rowids': _as_float_array(raw['species_rowid']),
+            'exemplar_flags': _as_flag_array(raw['annot_exemplar_flag']),
+            'staged_flags': _as_flag_array(raw['annot_staged_flag']),
+            'canonical_flags': _as_flag_array(raw['annot_toggle_canonical']),
+            'qualities': _as_float_array(raw['annot_quality']),
+            'yaws': yaws,
+            'has_timestamp': has_timestamp,
+        }
+        return cls(version, aids, columns)
+
+    def is_current(self, ibs):
+        return self.version == get_snapshot_version(ibs)
+
+    def filter_mask(
+        self,
+        ibs,
+        include_only_gid_list=None,
+        yaw='no-filter',
+        is_exemplar=None,
+        is_staged=False,
+        is_canonical=None,
+        species=None,
+        is_known=None,
+        minqual=None,
+        has_timestamp=None,
+    ):
+        """
+        Returns a mask over ``self.aids`` with the same semantics as the
+        corresponding filters of ``filter_annotation_set``
+        """
+        cols = self.columns
+        mask = np.ones(len(self.aids), dtype=bool)
+        for flag, key in [
+            (is_exemplar, 'exemplar_flags'),
+            (is_staged, 'staged_flags'),
+            (is_canonical, 'canonical_flags'),
+        ]:
+            if flag is True:
+                mask &= cols[key]
+            elif flag is False:
+                mask &= ~cols[key]
+        if include_only_gid_list is not None:
+            mask &= np.isin(cols['gids'], np.asarray(list(include_only_gid_list)))
+        if yaw != 'no-filter':
+            if yaw is None:
+                mask &= np.isnan(cols['yaws'])
+            else:
+                mask &= cols['yaws'] == yaw
+        with np.errstate(invalid='ignore'):
+            if species is not None:
+                species_rowid = ibs.get_species_rowids_from_text(species)
+                if species_rowid is None:
+                    mask[:] = False
+                else:
+                    mask &= cols['species_rowids'] == species_rowid
+            if is_known is True:
+                mask &= cols['nids'] > 0
+            elif is_known is False:
+                mask &= cols['nids'] <= 0
+            if minqual is not None:
+                quals = cols['qualities']
+                minqual_int = const.QUALITY_TEXT_TO_INT[minqual]
+                mask &= np.isnan(quals) | (quals == -1) | (quals >= minqual_int)
+        if has_timestamp is True:
+            mask &= cols['has_timestamp']
+        elif has_timestamp is False:
+            mask &= ~cols['has_timestamp']
+        return mask
+
+    def filter(self, ibs, aid_list=None, **filters):
+        """
+        Returns the aids (all of them or those in ``aid_list``, in order) that
+        pass the column filters. Aids that are not in the table are dropped.
+        """
+        mask = self.filter_mask(ibs, **filters)
+        if aid_list is None:
+            return self.aids[mask].tolist()
+        aid_arr = np.asarray(list(aid_list), dtype=np.int64)
+        if len(self.aids) == 0 or len(aid_arr) == 0:
+            return []
+        idxs = np.searchsorted(self.aids, aid_arr).clip(max=len(self.aids) - 1)
+        keep = (self.aids[idxs] == aid_arr) & mask[idxs]
+        return aid_arr[keep].tolist()
+
+
+def get_filtered_aids_sql(
+    ibs,
+    aid_list=None,
+    include_only_gid_list=None,
+    yaw='no-filter',
+    is_exemplar=None,
+    is_staged=False,
+    is_canonical=None,
+    species=None,
+    is_known=None,
+    minqual=None,
+    has_timestamp=None,
+):
+    """
+    Evaluates the column filters of get_valid_aids in one SQL query, for
+    callers that must see writes made by other processes.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.annot_snapshot import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb('testdb1')
+        >>> filters = dict(is_exemplar=True, minqual='ok', has_timestamp=True)
+        >>> aid_list1 = get_filtered_aids_sql(ibs, **filters)
+        >>> aid_list2 = AnnotSnapshot.load(ibs).filter(ibs, **filters)
+        >>> assert aid_list1 == aid_list2
+    """
+
+    def flag_clause(colname, flag):
+        if flag is True:
+            return '({0} IS NOT NULL AND {0} != 0)'.format(colname)
+        else:
+            return '({0} IS NULL OR {0} = 0)'.format(colname)
+
+    existing = set(ibs.db.get_column_names(const.ANNOTATION_TABLE))
+    clauses = []
+    params = {}
+    for flag, colname in [
+        (is_exemplar, 'annot_exemplar_flag'),
+        (is_staged, 'annot_staged_flag'),
+        (is_canonical, 'annot_toggle_canonical'),
+    ]:
+        if flag is not None:
+            if colname in existing:
+                clauses.append(flag_clause(colname, flag))
+            elif flag is True:
+                clauses.append('0 = 1')
+    if include_only_gid_list is not None:
+        gids = sorted(set(int(gid) for gid in include_only_gid_list))
+        clauses.append('image_rowid IN ({})'.format(','.join(map(str, gids)) or 'NULL'))
+    if yaw != 'no-filter':
+        if yaw is None:
+            clauses.append('(annot_yaw IS NULL OR annot_yaw < 0)')
+        else:
+            clauses.append('annot_yaw = :yaw')
+            params['yaw'] = yaw
+    if species is not None:
+        clauses.append('species_rowid = :species_rowid')
+        params['species_rowid'] = ibs.get_species_rowids_from_text(species)
+    if is_known is True:
+        clauses.append('name_rowid > 0')
+    elif is_known is False:
+        clauses.append('name_rowid <= 0')
+    if minqual is not None:
+        clauses.append(
+            '(annot_quality IS NULL OR annot_quality = -1 OR annot_quality >= :minqual)'
+        )
+        params['minqual'] = const.QUALITY_TEXT_TO_INT[minqual]
+    if has_timestamp is not None:
+        # Same test as filter_aids_without_timestamps
+        timed_gids = (
+            'SELECT rowid FROM {} WHERE (COALESCE(image_time_posix, -1) + '
+            'COALESCE(image_timedelta_posix, 0)) != -1'.format(const.IMAGE_TABLE)
+        )
+        if has_timestamp:
+            clauses.append('image_rowid IN ({})'.format(timed_gids))
+        else:
+            clauses.append(
+                '(image_rowid IS NULL OR image_rowid NOT IN ({}))'.format(timed_gids)
+            )
+    where_clause = ' AND '.join(clauses) if clauses else '1 = 1'
+    valid_aids = ibs.db.get_all_rowids_where(
+        const.ANNOTATION_TABLE, where_clause, params
+    )
+    if aid_list is not None:
+        valid_set = set(valid_aids)
+        valid_aids = [aid for aid in aid_list if aid in valid_set]
+    return valid_aids
@@ -129,6 +129,14 @@ STRICT_VERSION_API = (
 )
 
 
+def _pin_request_connections():
+    dtool.sql_control.pin_request_connections()
+
+
+def _release_request_connections(exc=None):
+    dtool.sql_control.release_request_connections()
+
+
 def get_flask_app(templates_auto_reload=True):
     # TODO this should be initialized explicity in entry_points.py only if needed
     global GLOBAL_APP
@@ -168,6 +176,11 @@ def get_flask_app(templates_auto_reload=True):
         GLOBAL_APP.QUERY_OBJECT_FEEDBACK_BUFFER = []
         GLOBAL_APP.GRAPH_CLIENT_DICT = {}
 
+        # Each request reuses one connection per database, returned to the
+        # pool (and rolled back) when the request ends
+        GLOBAL_APP.before_request(_pin_request_connections)
+        GLOBAL_APP.teardown_request(_release_request_connections)
+
         if HAS_FLASK_CORS:
             GLOBAL_CORS = CORS(
                 GLOBAL_APP, resources={r'/api/*': {'origins': '*'}}
@@ -14,7 +14,7 @@ import requests
 import utool as ut
 
 from wbia import constants as const
-from wbia.control import accessor_decors, controller_inject
+from wbia.control import accessor_decors, annot_snapshot, controller_inject
 from wbia.control.controller_inject import make_ibs_register_decorator
 from wbia.other import ibsfuncs
 
@@ -697,10 +697,15 @@ def get_valid_aids(
     minqual=None,
     has_timestamp=None,
     min_timedelta=None,
+    fresh=False,
 ):
     r"""
     High level function for getting all annotation ids according a set of filters.
 
+    The column filters are evaluated on the in-process annotation snapshot
+    (see :func:`get_annot_snapshot`). Pass ``fresh=True`` to evaluate them in
+    SQL instead, e.g. to see annotations added by another process.
+
     Note: The yaw value cannot be None as a default because None is used as a
           filtering value
 
@@ -714,6 +719,7 @@ def get_valid_aids(
         is_known (bool): (default = None)
         min_timedelta (int): minimum timedelta between annots of known individuals
         hasgt (bool): (default = None)
+        fresh (bool): query the database instead of the snapshot (default = False)
 
     Returns:
         list: aid_list - a list of valid ANNOTATION unique ids
@@ -761,6 +767,7 @@ def get_valid_aids(
         >>> ut.assert_eq(len(aid_list1), 9)
         >>> ut.assert_eq(len(aid_list2), 4)
         >>> ut.assert_eq(len(intersect_aids), 0)
+        >>> ut.assert_eq(get_valid_aids(ibs, is_exemplar=True, fresh=True), aid_list1)
 
     Ignore:
         import utool as ut
@@ -787,29 +794,66 @@ def get_valid_aids(
     """
     # exemplar "imageset" (image group)
     if imgsetid is None:
-        aid_list = ibs._get_all_aids()
+        aid_list = None
     else:
         imagesettext = ibs.get_imageset_text(imgsetid)
         if imagesettext == const.EXEMPLAR_IMAGESETTEXT:
             is_exemplar = True
         aid_list = ibs.get_imageset_aids(imgsetid)
 
-    aid_list = ibs.filter_annotation_set(
-        aid_list,
+    column_filters = dict(
         include_only_gid_list=include_only_gid_list,
         yaw=yaw,
         is_exemplar=is_exemplar,
         is_staged=is_staged,
         species=species,
         is_known=is_known,
-        hasgt=hasgt,
         minqual=minqual,
         has_timestamp=has_timestamp,
+    )
+    if fresh:
+        aid_list = annot_snapshot.get_filtered_aids_sql(ibs, aid_list, **column_filters)
+    else:
+        snapshot = ibs.get_annot_snapshot()
+        aid_list = snapshot.filter(ibs, aid_list, **column_filters)
+
+    aid_list = ibs.filter_annotation_set(
+        aid_list,
+        is_staged=None,
+        hasgt=hasgt,
         min_timedelta=min_timedelta,
     )
     return aid_list
 
 
+@register_ibs_method
+def get_annot_snapshot(ibs):
+    r"""
+    Returns the columnar snapshot of the annotation table, reloading it if
+    this controller wrote to the annotation or image tables since it was
+    taken.
+
+    Returns:
+        wbia.control.annot_snapshot.AnnotSnapshot: snapshot
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.manual_annot_funcs import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb('testdb1')
+        >>> snapshot = ibs.get_annot_snapshot()
+        >>> assert ibs.get_annot_snapshot() is snapshot
+        >>> aid = ibs.get_valid_aids()[0]
+        >>> ibs.set_annot_exemplar_flags([aid], ibs.get_annot_exemplar_flags([aid]))
+        >>> assert ibs.get_annot_snapshot() is not snapshot
+    """
+    snapshot = getattr(ibs, '_annot_snapshot', None)
+    if snapshot is None or not snapshot.is_current(ibs):
+        snapshot = annot_snapshot.AnnotSnapshot.load(ibs)
+        ibs._annot_snapshot = snapshot
+    return snapshot
+
+
 @register_ibs_method
 @register_api('/api/annot/<rowid>/', methods=['GET'])
 def annotation_src_api(rowid=None):
@@ -307,7 +307,15 @@ def get_num_images(ibs, **kwargs):
 
 
 @register_ibs_method
-def _compute_image_uuids(ibs, gpath_list, sanitize=True, ensure=True, **kwargs):
+def _compute_image_uuids(
+    ibs, gpath_list, sanitize=True, ensure=True, header_only=None, **kwargs
+):
+    """
+    Args:
+        header_only (bool): parse the images from their headers in a process
+            pool, also in production (see preproc_image.parse_imageinfo).
+            Defaults to the --header-only-ingest flag.
+    """
     from wbia.algo.preproc import preproc_image
     from wbia.other import ibsfuncs
 
@@ -316,19 +324,28 @@ def _compute_image_uuids(ibs, gpath_list, sanitize=True, ensure=True, **kwargs):
     if sanitize:
         gpath_list = ibsfuncs.ensure_unix_gpaths(gpath_list)
 
+    if header_only is None:
+        header_only = preproc_image.HEADER_ONLY
+
     # Create param_iter
     # params_list = list(preproc_image.add_images_params_gen(gpath_list))
-    force_serial = ibs.force_serial or ibs.production
-    params_list = list(
-        ut.generate2(
-            preproc_image.parse_imageinfo,
-            list(zip(gpath_list)),
-            nTasks=len(gpath_list),
-            ordered=True,
-            force_serial=force_serial,
-            futures_threaded=True,
+    if header_only:
+        max_workers = 1 if ibs.force_serial else None
+        params_list = preproc_image.parse_imageinfo_list(
+            gpath_list, header_only=True, max_workers=max_workers
+        )
+    else:
+        force_serial = ibs.force_serial or ibs.production
+        params_list = list(
+            ut.generate2(
+                preproc_image.parse_imageinfo,
+                list(zip(gpath_list)),
+                nTasks=len(gpath_list),
+                ordered=True,
+                force_serial=force_serial,
+                futures_threaded=True,
+            )
         )
-    )
 
     # Error reporting
     failed_list = [
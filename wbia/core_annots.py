@@ -68,6 +68,9 @@ derived_attribute = register_preprocs['annot']
 register_subprop = register_subprops['annot']
 # dtool.Config.register_func = derived_attribute
 
+# Compute chips with one work item per source image instead of per annotation
+GROUP_CHIPS_BY_IMAGE = not ut.get_argflag('--nogroup-chips')
+
 
 def testdata_core(defaultdb='testdb1', size=2):
     import wbia
@@ -274,6 +277,8 @@ class ChipConfig(dtool.Config):
         # ---
         ut.ParamInfo('pad', 0, hideif=0, type_=eval),
         ut.ParamInfo('ext', '.png', hideif='.png'),
+        # Decode JPEGs at 1/2, 1/4 or 1/8 scale when the chips are much smaller
+        ut.ParamInfo('reduced_decode', False, hideif=False),
     ]
 
 
@@ -488,7 +493,24 @@ def gen_chip_configure_and_compute(
 
     _parallel_chips = getattr(ibs, '_parallel_chips', True)
 
-    if _parallel_chips:
+    if GROUP_CHIPS_BY_IMAGE or config['reduced_decode']:
+        gen = gen_chips_grouped_by_image(
+            ibs,
+            gid_list,
+            M_list,
+            newsize_list,
+            filter_list,
+            warpkw,
+            reduced_decode=config['reduced_decode'],
+            force_serial=ibs.force_serial or not _parallel_chips,
+        )
+        for chipBGR, width, height, M in gen:
+            if greyscale:
+                chipBGR = cv2.cvtColor(chipBGR, cv2.COLOR_BGR2GRAY)
+            if flip_horizontal:
+                chipBGR = cv2.flip(chipBGR, 1)
+            yield chipBGR, width, height, M
+    elif _parallel_chips:
         gpath_list = ibs.get_image_paths(gid_list)
         orient_list = ibs.get_image_orientation(gid_list)
         args_gen = zip(gpath_list, orient_list, M_list, newsize_list)
@@ -538,6 +560,11 @@ def gen_chip_configure_and_compute(
 
 def gen_chip_worker(gpath, orient, M, new_size, filter_list, warpkw):
     imgBGR = vt.imread(gpath, orient=orient)
+    chipBGR, width, height = warp_chip(imgBGR, M, new_size, filter_list, warpkw)
+    return (chipBGR, width, height, M)
+
+
+def warp_chip(imgBGR, M, new_size, filter_list, warpkw):
     # Warp chip
     new_size = tuple(int(np.around(val)) for val in new_size)
     chipBGR = cv2.warpAffine(imgBGR, M[0:2], new_size, **warpkw)
@@ -546,7 +573,114 @@ def gen_chip_worker(gpath, orient, M, new_size, filter_list, warpkw):
         ipreproc = image_filters.IntensityPreproc()
         chipBGR = ipreproc.preprocess(chipBGR, filter_list)
     width, height = vt.get_size(chipBGR)
-    return (chipBGR, width, height, M)
+    return chipBGR, width, height
+
+
+# OpenCV flags that decode a JPEG directly at a reduced scale
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def get_decode_reduction(gpath, M_list, margin=2.0):
+    r"""
+    Returns the largest JPEG decode reduction factor (1, 2, 4 or 8) that still
+    leaves ``margin`` source pixels per chip pixel for every chip of an image.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.core_annots import *  # NOQA
+        >>> M_small = np.diag([0.1, 0.1, 1.0])
+        >>> M_large = np.diag([0.3, 0.3, 1.0])
+        >>> get_decode_reduction('a.jpg', [M_small])
+        4
+        >>> get_decode_reduction('a.JPEG', [M_small, M_large])
+        1
+        >>> get_decode_reduction('a.png', [M_small])
+        1
+    """
+    if not gpath.lower().endswith(('.jpg', '.jpeg')):
+        return 1
+    # Chip pixels per source pixel of the most detailed chip
+    scale = max(np.sqrt(abs(np.linalg.det(M[0:2, 0:2]))) for M in M_list)
+    factor = 1
+    while factor < 8 and (factor * 2) * scale * margin <= 1.0:
+        factor *= 2
+    return factor
+
+
+def gen_image_chips_worker(
+    gpath, orient, M_list, newsize_list, filter_list, warpkw, reduced_decode=False
+):
+    """Decodes one source image and warps all of its chips from it"""
+    factor = get_decode_reduction(gpath, M_list) if reduced_decode else 1
+    if factor == 1:
+        imgBGR = vt.imread(gpath, orient=orient)
+        src_M_list = M_list
+    else:
+        flags = REDUCED_DECODE_FLAGS[factor] | cv2.IMREAD_IGNORE_ORIENTATION
+        imgBGR = vt.imread(gpath, orient=orient, flags=flags)
+        # Maps reduced pixel centers back to full resolution coordinates
+        offset = (factor - 1) / 2.0
+        S = np.array([[factor, 0, offset], [0, factor, offset], [0, 0, 1]])
+        src_M_list = [M.dot(S) for M in M_list]
+    result_list = []
+    for M, src_M, new_size in zip(M_list, src_M_list, newsize_list):
+        chipBGR, width, height = warp_chip(imgBGR, src_M, new_size, filter_list, warpkw)
+        result_list.append((chipBGR, width, height, M))
+    return result_list
+
+
+def gen_chips_grouped_by_image(
+    ibs,
+    gid_list,
+    M_list,
+    newsize_list,
+    filter_list,
+    warpkw,
+    reduced_decode=False,
+    force_serial=False,
+):
+    """
+    Computes chips with one work item per source image, so each image is read
+    and decoded once no matter how many of its annotations need chips. Yields
+    ``(chipBGR, width, height, M)`` in the order of the inputs.
+    """
+    unique_gids, groupxs = vt.group_indices(np.array(gid_list))
+    unique_gids = unique_gids.tolist()
+    groupxs = [xs.tolist() for xs in groupxs]
+    # Process the images in order of their first annotation so results can be
+    # yielded as soon as the preceding ones are done
+    order = ut.argsort([xs[0] for xs in groupxs])
+    unique_gids = ut.take(unique_gids, order)
+    groupxs = ut.take(groupxs, order)
+    gpath_list = ibs.get_image_paths(unique_gids)
+    orient_list = ibs.get_image_orientation(unique_gids)
+    args_gen = (
+        (gpath, orient, ut.take(M_list, xs), ut.take(newsize_list, xs))
+        for gpath, orient, xs in zip(gpath_list, orient_list, groupxs)
+    )
+    gen_kw = {
+        'filter_list': filter_list,
+        'warpkw': warpkw,
+        'reduced_decode': reduced_decode,
+    }
+    gen = ut.generate2(
+        gen_image_chips_worker,
+        args_gen,
+        gen_kw,
+        nTasks=len(unique_gids),
+        force_serial=force_serial,
+    )
+    finished = {}
+    next_index = 0
+    for xs, result_list in zip(groupxs, gen):
+        finished.update(zip(xs, result_list))
+        while next_index in finished:
+            yield finished.pop(next_index)
+            next_index += 1
 
 
 @register_subprop('chips', 'dlen_sqrd')
@@ -1087,14 +1221,29 @@ class FeatConfig(dtool.Config):
 #         pass
 
 
+if const.FEAT_MMAP:
+    # Keypoints and descriptors are appended to per-config shard files and
+    # read back as np.memmap slices (see wbia.dtool.shard_store). This uses
+    # its own database so it does not conflict with the SQL blob schema.
+    FEAT_COLTYPES = [
+        int,
+        dtool.ShardedArrayType(np.float32, (6,)),
+        dtool.ShardedArrayType(np.uint8, (128,)),
+    ]
+    FEAT_FNAME = 'featcache_mmap'
+else:
+    FEAT_COLTYPES = [int, np.ndarray, np.ndarray]
+    FEAT_FNAME = 'featcache'
+
+
 @derived_attribute(
     tablename='feat',
     parents=['chips'],
     colnames=['num_feats', 'kpts', 'vecs'],
-    coltypes=[int, np.ndarray, np.ndarray],
+    coltypes=FEAT_COLTYPES,
     configclass=FeatConfig,
     rm_extern_on_delete=True,
-    fname='featcache',
+    fname=FEAT_FNAME,
     chunksize=1024,
 )
 def compute_feats(depc, cid_list, config=None):
@@ -1183,21 +1332,18 @@ def compute_feats(depc, cid_list, config=None):
 
     ibs = depc.controller
     if feat_type == 'hesaff+sift':
-        # Multiprocessing parallelization
-        dictargs_iter = (hesaff_params for _ in range(nInput))
-        arg_iter = zip(chip_fpath_list, probchip_fpath_list, dictargs_iter)
-        # eager evaluation.
-        # TODO: Check if there is any benefit to just passing in the iterator.
-        arg_list = list(arg_iter)
-        featgen = ut.generate2(
-            gen_feat_worker,
-            arg_list,
-            nTasks=nInput,
-            ordered=True,
-            force_serial=ibs.force_serial,
-            progkw={'freq': 1},
-            futures_threaded=True,
+        # Stream the chips through a persistent process pool. Arguments are
+        # generated lazily and results are yielded in order as they finish.
+        from wbia.algo.preproc import preproc_feat
+
+        max_workers = 1 if ibs.force_serial else None
+        featgen = preproc_feat.stream_feats(
+            chip_fpath_list,
+            probchip_fpath_list,
+            hesaff_params,
+            max_workers=max_workers,
         )
+        featgen = ut.ProgIter(featgen, length=nInput, lbl='compute feats', freq=1)
     elif feat_type == 'hesaff+siam128':
         from wbia_cnn import _plugin
 
@@ -1290,7 +1436,7 @@ class FeatWeightConfig(dtool.Config):
     coltypes=[np.ndarray],
     configclass=FeatWeightConfig,
     rm_extern_on_delete=True,
-    fname='featcache',
+    fname=FEAT_FNAME,
     chunksize=64 if const.CONTAINERIZED else 512,
 )
 def compute_fgweights(depc, fid_list, pcid_list, config=None):
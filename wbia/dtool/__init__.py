@@ -20,5 +20,6 @@ from wbia.dtool.base import (
 )
 from wbia.dtool.depcache_control import DependencyCache, make_depcache_decors
 from wbia.dtool.depcache_table import ExternalStorageException, ExternType
+from wbia.dtool.shard_store import ShardedArrayType
 from wbia.dtool.sql_control import SQLDatabaseController
 from wbia.dtool.types import TYPE_TO_SQLTYPE
@@ -28,6 +28,10 @@ Args:
     colnames (list): data returned by this table
     coltypes (list): types of data returned by this table
     chunksize (int): (default = None)
+    executor (str): computes chunks with a 'serial', 'thread' or 'process'
+        executor. Pooled executors overlap computing the next chunk with
+        writing the current one. (default = None)
+    executor_workers (int): size of the executor pool (default = None)
     configclass (dtool.TableConfig): derivative of dtool.TableConfig.
         if None, a default class will be constructed for you. (default = None)
     docstr (str): (default = None)
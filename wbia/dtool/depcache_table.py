@@ -22,6 +22,7 @@ FIXME:
 """
 import itertools as it
 import logging
+import pickle
 import random
 import re
 import time
@@ -32,7 +33,10 @@ import tqdm
 import ubelt as ub
 import utool as ut
 
+from wbia.dtool import executors
 from wbia.dtool import sqlite3 as lite
+from wbia.dtool import tracing
+from wbia.dtool.shard_store import ShardedArrayType, is_shard_uri, split_shard_uri
 from wbia.dtool.sql_control import SQLDatabaseController, compare_coldef_lists
 from wbia.dtool.types import TYPE_TO_SQLTYPE
 
@@ -129,6 +133,21 @@ def predrop_grace_period(tablename, seconds=None):
     return ut.grace_period(warnmsg, seconds)
 
 
+def _extern_uri_fpath(uri_full):
+    """The file that holds an external value (sharded uris point into a shard)"""
+    if is_shard_uri(uri_full):
+        return split_shard_uri(uri_full)[0]
+    return uri_full
+
+
+def _extern_write_flags(col_attrs):
+    """Flags the columns whose values are stored outside of SQL"""
+    return [
+        bool(colattr.get('write_func', False)) or colattr.get('is_sharded', False)
+        for colattr in col_attrs
+    ]
+
+
 def make_extern_io_funcs(table, cls):
     """Hack in read/write defaults for pickleable classes"""
 
@@ -525,6 +544,7 @@ class _TableDebugHelper(object):
         logger.info('self.tablename = {!r}'.format(self.tablename))
         logger.info('self.rm_extern_on_delete = {!r}'.format(self.rm_extern_on_delete))
         logger.info('self.chunksize = {!r}'.format(self.chunksize))
+        logger.info('self.executor = {!r}'.format(self.executor))
         logger.info('self.fname = {!r}'.format(self.fname))
         logger.info('self.docstr = {!r}'.format(self.docstr))
         logger.info('self.data_colnames = {!r}'.format(self.data_colnames))
@@ -688,7 +708,8 @@ class _TableInternalSetup(ub.NiceRepr):
             is_func = ut.is_func_or_method(coltype)
             is_externtup = is_tuple and coltype[0] == 'extern'
             is_functup = is_tuple and ut.is_func_or_method(coltype[0])
-            is_exttype = isinstance(coltype, ExternType)
+            is_sharded = isinstance(coltype, ShardedArrayType)
+            is_exttype = isinstance(coltype, ExternType) or is_sharded
             # Check column input main types
             is_normal = coltype in TYPE_TO_SQLTYPE
             # is_normal   = not (is_tuple or is_func)
@@ -718,7 +739,12 @@ class _TableInternalSetup(ub.NiceRepr):
             elif is_external:
                 # Nested external funcs
                 write_func = None
-                if is_exttype:
+                if is_sharded:
+                    # Rows are appended to shared shard files, there is no
+                    # per-row write function
+                    read_func = coltype.read_func
+                    colattr['is_sharded'] = True
+                elif is_exttype:
                     read_func = coltype.read_func
                     write_func = coltype.write_func
                     if coltype.extern_ext is not None:
@@ -986,6 +1012,8 @@ class _TableInternalSetup(ub.NiceRepr):
                     colattr['is_external_pointer'] = True
                     colattr['write_func'] = data_colattr['write_func']
                     colattr['read_func'] = data_colattr['read_func']
+                    if data_colattr.get('is_sharded', False):
+                        colattr['is_sharded'] = True
                 internal_col_attrs.append(colattr)
 
         # Append extra columns
@@ -1382,7 +1410,7 @@ class _TableComputeHelper(object):
         if any(self.get_data_col_attr('isnested')):
             proptup_gen = self._prepare_storage_nested(proptup_gen)
         # Write external columns
-        if any(self.get_data_col_attr('write_func')):
+        if any(_extern_write_flags(self.data_col_attrs)):
             proptup_gen = self._prepare_storage_extern(
                 dirty_parent_ids, config_rowid, config, proptup_gen
             )
@@ -1541,7 +1569,7 @@ class _TableComputeHelper(object):
         Writes external data to disk if write function is specified.
         """
         internal_data_col_attrs = self.internal_data_col_attrs
-        writable_flags = ut.dict_take_column(internal_data_col_attrs, 'write_func', False)
+        writable_flags = _extern_write_flags(internal_data_col_attrs)
         extern_colattrs = ut.compress(internal_data_col_attrs, writable_flags)
         # extern_colnames = ut.dict_take_column(extern_colattrs, 'colname')
         extern_writers = ut.dict_take_column(extern_colattrs, 'write_func')
@@ -1559,6 +1587,21 @@ class _TableComputeHelper(object):
                 ]
             )
         )
+        # Sharded columns append to one file per config instead
+        extern_shard_coltypes = [
+            self.data_col_attrs[colattr['data_colx']]['coltype']
+            if colattr.get('is_sharded', False)
+            else None
+            for colattr in extern_colattrs
+        ]
+        if any(coltype is not None for coltype in extern_shard_coltypes):
+            config_hashid = self.get_config_hashid([config_rowid])[0]
+            extern_shard_prefixes = [
+                '{}_{}_{}'.format(self.tablename, colattr['colname'], config_hashid)
+                for colattr in extern_colattrs
+            ]
+        else:
+            extern_shard_prefixes = [None] * len(extern_colattrs)
         # get extern cache directory and fpaths
         extern_dpath = self.extern_dpath
         ut.ensuredir(extern_dpath)
@@ -1579,8 +1622,23 @@ class _TableComputeHelper(object):
                 raise
             # Write external data to disk
             try:
-                _iter = zip(extern_data, extern_fpaths, extern_writers)
-                for obj, fpath, write_func in _iter:
+                extern_fpaths = list(extern_fpaths)
+                _iter = enumerate(
+                    zip(
+                        extern_data,
+                        extern_fpaths,
+                        extern_writers,
+                        extern_shard_coltypes,
+                        extern_shard_prefixes,
+                    )
+                )
+                for count, (obj, fpath, write_func, shard_coltype, prefix) in _iter:
+                    if shard_coltype is not None:
+                        # The uri points into the shard instead of a file
+                        extern_fpaths[count] = shard_coltype.append(
+                            extern_dpath, prefix, obj
+                        )
+                        continue
                     abs_fpath = join(extern_dpath, fpath)
                     # logger.info('WRITE fpath = %r, abs_fpath = %r' % (fpath, abs_fpath, ))
                     write_func(abs_fpath, obj)
@@ -1617,7 +1675,7 @@ class _TableComputeHelper(object):
         config_rowid = self.get_config_rowid(config)
         # depc.get_rowids(tablename, root_rowids, config)
         internal_data_col_attrs = self.internal_data_col_attrs
-        writable_flags = ut.dict_take_column(internal_data_col_attrs, 'write_func', False)
+        writable_flags = _extern_write_flags(internal_data_col_attrs)
         extern_colattrs = ut.compress(internal_data_col_attrs, writable_flags)
         extern_colattr = extern_colattrs[extern_col_index]
         fname_list = self._get_extern_fnames(
@@ -1679,44 +1737,30 @@ class _TableComputeHelper(object):
         dirty_parent_ids = parent_rowids
         config_ = config
         """
-        nInput = len(dirty_parent_ids)
-        # if verbose:
-        #     logger.info('[deptbl.compute] nInput = %r' % (nInput,))
-
-        # Pack arguments into column-wise order to send to the func
-        argsT = zip(*dirty_preproc_args)
-        argsT = list(argsT)  # TODO: remove
-
         # HACK extract config if given a request
         config_ = config.config if hasattr(config, 'config') else config
 
         # call registered worker function
-        if self.vectorized:
-            # Function is written in a way that only accepts multiple inputs at
-            # once and generates output
-            proptup_gen = self.preproc_func(self.depc, *argsT, config=config_)
-        else:
-            # Function is written in a way that only accepts a single row of
-            # input at a time
-            proptup_gen = (
-                self.preproc_func(self.depc, *argrow, config=config_)
-                for argrow in zip(*argsT)
-            )
+        proptup_gen = compute_preproc_chunk(
+            self.preproc_func, self.depc, self.vectorized, dirty_preproc_args, config_
+        )
+        return self._prepare_dirty_rows(
+            dirty_parent_ids, proptup_gen, dirty_preproc_args, config_rowid, config_
+        )
 
-        DEBUG_LIST_MODE = True
-        if DEBUG_LIST_MODE:
-            proptup_gen = list(proptup_gen)
-            num_output = len(proptup_gen)
-            assert (
-                num_output == nInput
-            ), 'Input and output sizes do not agree. ' 'num_output=%r, num_input=%r' % (
-                num_output,
-                nInput,
-            )
+    def _prepare_dirty_rows(
+        self, dirty_parent_ids, proptup_gen, dirty_preproc_args, config_rowid, config_
+    ):
+        """
+        Converts the output of a chunk of ``preproc_func`` calls into the rows
+        that are stored in SQL. External columns are written to disk here.
+        """
+        nInput = len(dirty_parent_ids)
         # Append rowids and rectify nested and external columns
         dirty_params_iter = self.prepare_storage(
             dirty_parent_ids, proptup_gen, dirty_preproc_args, config_rowid, config_
         )
+        DEBUG_LIST_MODE = True
         if DEBUG_LIST_MODE:
             dirty_params_iter = list(dirty_params_iter)
             assert len(dirty_params_iter) == nInput
@@ -1730,6 +1774,11 @@ class _TableComputeHelper(object):
         Executes registered functions, does external storage and yeilds results
         to be stored internally in SQL.
 
+        Chunks are computed by the executor registered for this table (see
+        :mod:`wbia.dtool.executors`). Pooled executors compute the next
+        chunks while the caller writes the current one. Chunks are always
+        yielded in input order.
+
         CommandLine:
             python -m dtool.depcache_table _chunk_compute_dirty_rows
 
@@ -1742,13 +1791,29 @@ class _TableComputeHelper(object):
             >>> data = depc.get('labeler', [1, 2, 3], 'data')
             >>> data = depc.get('indexer', [[1, 2, 3]], 'data')
             >>> depc.print_all_tables()
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.depcache_table import *  # NOQA
+            >>> from wbia.dtool.example_depcache2 import *  # NOQA
+            >>> depc = testdata_depc3(in_memory=False)
+            >>> depc.clear_all()
+            >>> table = depc['labeler']
+            >>> table.chunksize = 2
+            >>> rowids = list(range(1, 8))
+            >>> serial_data = depc.get('labeler', rowids, 'data')
+            >>> depc.clear_all()
+            >>> table.executor = 'thread'
+            >>> thread_data = depc.get('labeler', rowids, 'data')
+            >>> table.executor = None
+            >>> assert serial_data == thread_data
         """
         nInput = len(dirty_parent_ids)
         chunksize = nInput if self.chunksize is None else self.chunksize
 
         logger.info(
-            '[deptbl.compute] nInput={}, chunksize={}, tbl={}'.format(
-                nInput, self.chunksize, self.tablename
+            '[deptbl.compute] nInput={}, chunksize={}, tbl={}, executor={}'.format(
+                nInput, self.chunksize, self.tablename, self.executor
             )
         )
 
@@ -1762,31 +1827,69 @@ class _TableComputeHelper(object):
         )
         # These are the colnames that we expect to be computed
         colnames = self.computable_colnames()
-        # CALL EXTERNAL PREPROCESSING / GENERATION FUNCTION
-        try:
-            # prog_iter = list(prog_iter)
+
+        # HACK extract config if given a request
+        config_ = config.config if hasattr(config, 'config') else config
+
+        if nInput <= chunksize:
+            # There is nothing to overlap with a single chunk
+            executor = executors.SerialExecutor()
+        else:
+            executor = executors.make_executor(self.executor, self.executor_workers)
+
+        if executor.mode == 'process':
+            config_state = _make_config_state(config_, self.tablename)
+
+        def _gen_chunk_args():
             for dirty_chunk in tqdm.tqdm(prog_iter):
-                nChunkInput = len(dirty_chunk)
-                if nChunkInput == 0:
+                if len(dirty_chunk) == 0:
                     return
                 dirty_parent_ids_chunk, dirty_preproc_args_chunk = zip(*dirty_chunk)
+                if executor.mode == 'process':
+                    # The depc cannot be sent to another process
+                    yield (
+                        self.preproc_func,
+                        None,
+                        self.vectorized,
+                        dirty_preproc_args_chunk,
+                        config_state,
+                        dirty_parent_ids_chunk,
+                    )
+                else:
+                    yield (
+                        dirty_parent_ids_chunk,
+                        dirty_preproc_args_chunk,
+                        config_rowid,
+                        config,
+                    )
 
-                dirty_params_iter = self._compute_dirty_rows(
-                    dirty_parent_ids_chunk,
-                    dirty_preproc_args_chunk,
-                    config_rowid,
-                    config,
-                )
+        if executor.mode == 'process':
+            chunk_worker = _compute_preproc_chunk_worker
+        else:
+            chunk_worker = self._compute_dirty_rows
 
-                DEBUG_LIST_MODE = True
-                if DEBUG_LIST_MODE:
-                    dirty_params_iter = list(dirty_params_iter)
-                    assert len(dirty_params_iter) == nChunkInput
-                # TODO: Separate into func which can be specified as a callback.
-                # None data means that there was an error for a specific row
-                dirty_params_iter = ut.filter_Nones(dirty_params_iter)
-                nChunkInput = len(dirty_params_iter)
-                yield colnames, dirty_params_iter, nChunkInput
+        # CALL EXTERNAL PREPROCESSING / GENERATION FUNCTION
+        try:
+            with executor:
+                for result in executor.imap(chunk_worker, _gen_chunk_args()):
+                    if executor.mode == 'process':
+                        # Storage preparation and extern writes happen here
+                        # while the pool keeps computing the next chunks
+                        dirty_parent_ids_chunk, dirty_preproc_args_chunk, proptups = result
+                        dirty_params_iter = self._prepare_dirty_rows(
+                            dirty_parent_ids_chunk,
+                            proptups,
+                            dirty_preproc_args_chunk,
+                            config_rowid,
+                            config_,
+                        )
+                    else:
+                        dirty_params_iter = result
+                    # TODO: Separate into func which can be specified as a callback.
+                    # None data means that there was an error for a specific row
+                    dirty_params_iter = ut.filter_Nones(dirty_params_iter)
+                    nChunkInput = len(dirty_params_iter)
+                    yield colnames, dirty_params_iter, nChunkInput
         except Exception as ex:
             ut.printex(
                 ex,
@@ -1805,6 +1908,69 @@ class _TableComputeHelper(object):
             raise
 
 
+def compute_preproc_chunk(preproc_func, depc, vectorized, dirty_preproc_args, config_):
+    """
+    Calls a registered ``preproc_func`` on one chunk of rows and returns the
+    list of property tuples it produced (one per input row).
+    """
+    nInput = len(dirty_preproc_args)
+
+    # Pack arguments into column-wise order to send to the func
+    argsT = zip(*dirty_preproc_args)
+    argsT = list(argsT)  # TODO: remove
+
+    if vectorized:
+        # Function is written in a way that only accepts multiple inputs at
+        # once and generates output
+        proptup_gen = preproc_func(depc, *argsT, config=config_)
+    else:
+        # Function is written in a way that only accepts a single row of
+        # input at a time
+        proptup_gen = (
+            preproc_func(depc, *argrow, config=config_) for argrow in zip(*argsT)
+        )
+
+    DEBUG_LIST_MODE = True
+    if DEBUG_LIST_MODE:
+        proptup_gen = list(proptup_gen)
+        num_output = len(proptup_gen)
+        assert (
+            num_output == nInput
+        ), 'Input and output sizes do not agree. ' 'num_output=%r, num_input=%r' % (
+            num_output,
+            nInput,
+        )
+    return proptup_gen
+
+
+def _make_config_state(config_, tablename):
+    """
+    Configs built on the fly by ``make_configclass`` have local classes that
+    cannot be pickled, so those are sent to worker processes as a dict.
+    """
+    try:
+        pickle.dumps(config_)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return (None, config_.asdict(), tablename)
+    else:
+        return (config_, None, None)
+
+
+def _compute_preproc_chunk_worker(
+    preproc_func, depc, vectorized, dirty_preproc_args, config_state, dirty_parent_ids
+):
+    """Process pool entry point, passes the chunk ids through with the result"""
+    config_, cfgdict, tablename = config_state
+    if config_ is None:
+        from wbia.dtool import base
+
+        config_ = base.make_configclass(cfgdict, tablename)()
+    proptups = compute_preproc_chunk(
+        preproc_func, depc, vectorized, dirty_preproc_args, config_
+    )
+    return dirty_parent_ids, dirty_preproc_args, proptups
+
+
 @ut.reloadable_class
 class DependencyCacheTable(
     _TableGeneralHelper,
@@ -1836,6 +2002,10 @@ class DependencyCacheTable(
             process multiple inputs at once.
         taggable (bool): specifies if a computed object can be disconected from
             its ancestors and accessed via a tag.
+        executor (str): how dirty chunks are computed. One of 'serial',
+            'thread' or 'process' (see dtool.executors). Defaults to serial.
+        executor_workers (int): pool size for the 'thread' and 'process'
+            executors.
 
     CommandLine:
         python -m dtool.depcache_table --exec-DependencyCacheTable
@@ -1870,6 +2040,8 @@ class DependencyCacheTable(
         rm_extern_on_delete=False,
         vectorized=True,
         taggable=False,
+        executor=None,
+        executor_workers=None,
     ):
         """
         recieves kwargs from depc._register_prop
@@ -1905,6 +2077,8 @@ class DependencyCacheTable(
         # self.store_delete_time = True
 
         self.chunksize = chunksize
+        self.executor = executor
+        self.executor_workers = executor_workers
         # SQL Internals
         self.sqldb_fpath = None
         self.rm_extern_on_delete = rm_extern_on_delete
@@ -1937,6 +2111,8 @@ class DependencyCacheTable(
         rm_extern_on_delete=False,
         vectorized=True,
         taggable=False,
+        executor=None,
+        executor_workers=None,
     ):
         """Build the instance based on a database and table name."""
         self = cls.__new__(cls)
@@ -1959,6 +2135,10 @@ class DependencyCacheTable(
         self.preproc_func = preproc_func
         #: Optional specification of the amount of blobs to modify in one SQL operation
         self.chunksize = chunksize
+        #: Name of the chunk executor (see wbia.dtool.executors), None is serial
+        self.executor = executor
+        #: Optional number of workers used by a pooled chunk executor
+        self.executor_workers = executor_workers
 
         # FIXME (20-Oct-12020) This definition of behavior by external means is a scope issue
         #       Another object should not be directly manipulating this object.
@@ -2171,16 +2351,17 @@ class DependencyCacheTable(
 
                 # Gives the function a hacky cache to use between chunks
                 self._hack_chunk_cache = {}
-                gen = self._chunk_compute_dirty_rows(
-                    dirty_parent_ids, dirty_preproc_args, config_rowid, config
-                )
-                for colnames, dirty_params_iter, nChunkInput in gen:
-                    self.db._add(
-                        self.tablename,
-                        colnames,
-                        dirty_params_iter,
-                        nInput=nChunkInput,
+                with tracing.stage('depcache.compute', self.tablename):
+                    gen = self._chunk_compute_dirty_rows(
+                        dirty_parent_ids, dirty_preproc_args, config_rowid, config
                     )
+                    for colnames, dirty_params_iter, nChunkInput in gen:
+                        self.db._add(
+                            self.tablename,
+                            colnames,
+                            dirty_params_iter,
+                            nInput=nChunkInput,
+                        )
 
                 # Remove cache when main add is done
                 self._hack_chunk_cache = None
@@ -2456,6 +2637,11 @@ class DependencyCacheTable(
         logger.info('Clearing data in {!r}'.format(self))
         self.db.drop_table(self.tablename)
         self.db.add_table(**self._get_addtable_kw())
+        for colattr in self.data_col_attrs:
+            if colattr.get('is_sharded', False):
+                # No rows point into the shards anymore
+                prefix = '{}_{}_'.format(self.tablename, colattr['colname'])
+                colattr['coltype'].remove_shards(self.extern_dpath, prefix)
 
     # @profile
     def delete_rows(self, rowid_list, delete_extern=None, dry=False, verbose=None):
@@ -2530,6 +2716,7 @@ class DependencyCacheTable(
                     uri = [uri]
                 for uri_ in uri:
                     absuris.append(join(self.extern_dpath, uri_))
+            # Sharded uris never match a file, shards are append-only
             fpaths = [fpath for fpath in absuris if exists(fpath)]
             if delete_extern:
                 if ut.VERBOSE or len(fpaths) > 0:
@@ -2736,6 +2923,8 @@ class DependencyCacheTable(
 
         generator_version = not eager
 
+        # Lazy reads are not timed, their timer is never stopped
+        read_timer = tracing.start('depcache.read', self.tablename)
         raw_prop_list = self.get_internal_columns(
             nonNone_tbl_rowids,
             flat_intern_colnames,
@@ -2787,7 +2976,7 @@ class DependencyCacheTable(
                             else:
                                 data = uri_full
                                 if ensure:
-                                    ut.assertpath(uri_full)
+                                    ut.assertpath(_extern_uri_fpath(uri_full))
                             exprop[extern_colx] = data
                         # nestprop = ut.unflat_take(exprop, nesting_xs)
                         nestprop = tup_unflat_take(exprop, nesting_xs)
@@ -2840,6 +3029,7 @@ class DependencyCacheTable(
             prop_list = ut.ungroup(
                 [prop_list, [None] * len(idxs2)], [idxs1, idxs2], len(tbl_rowids) - 1
             )
+        read_timer.stop()
         return prop_list
 
     def _resolve_any_external_data(
@@ -2872,7 +3062,7 @@ class DependencyCacheTable(
                         data = read_func(uri_full)
                     else:
                         if ensure:
-                            ut.assertpath(uri_full)
+                            ut.assertpath(_extern_uri_fpath(uri_full))
                         data = uri_full
                 except Exception as ex:
                     ut.printex(
@@ -2920,6 +3110,10 @@ class DependencyCacheTable(
         This DOES NOT modify the depcache internals.
         """
         logger.info('Recomputing external data (_recompute_external_storage)')
+        if any(self.get_data_col_attr('is_sharded')):
+            # Re-appended rows get new shard uris, so the rows must be updated
+            self._recompute_and_store(tbl_rowids)
+            return
         # TODO: need to rectify parent ids?
 
         parent_rowids = self.get_parent_rowids(tbl_rowids)
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import time
 from pathlib import Path
 
+import numpy as np
 import utool as ut
 
 from wbia.dtool.depcache_control import DependencyCache
@@ -203,3 +205,77 @@ def testdata_custom_annot_depc(dummy_dependencies, in_memory=True):
 
     depc.initialize()
     return depc
+
+
+def _bench_preproc(depc, annot_rowids, config=None):
+    """
+    Module level so that the process executor can pickle it. Does a bit of
+    numerical work per row so the executors have something to overlap.
+    """
+    size = config['bench_size']
+    for rowid in annot_rowids:
+        rng = np.random.RandomState(rowid)
+        data = rng.rand(size, size)
+        yield (float(np.linalg.svd(data, compute_uv=False)[0]),)
+
+
+def testdata_depc_bench(executor=None, chunksize=64, executor_workers=None):
+    """
+    A single table cache used to benchmark the chunk executors
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.example_depcache2 import *  # NOQA
+        >>> depc = testdata_depc_bench(executor='thread', chunksize=2)
+        >>> depc.clear_all()
+        >>> data = depc.get('bench', [1, 2, 3, 4, 5], 'data')
+        >>> assert len(data) == 5 and all(d > 0 for d in data)
+    """
+    from wbia.dtool import base
+
+    depc = _depc_factory('annot', 'DEPCACHE_BENCH')
+    configclass = base.make_configclass({'bench_size': 64}, 'bench')
+    depc.register_preproc(
+        tablename='bench',
+        parents=['annot'],
+        colnames=['data'],
+        coltypes=[float],
+        configclass=configclass,
+        chunksize=chunksize,
+        executor=executor,
+        executor_workers=executor_workers,
+    )(_bench_preproc)
+    depc.initialize()
+    return depc
+
+
+def benchmark_depc_executors(num=2000, chunksize=64, executor_workers=None):
+    """
+    Times a cold backfill of a table with each chunk executor and checks that
+    all of them produce the same rows in the same order
+
+    CommandLine:
+        python -m wbia.dtool.example_depcache2 benchmark_depc_executors
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.dtool.example_depcache2 import *  # NOQA
+        >>> results = benchmark_depc_executors(num=500)
+        >>> print(ut.repr4(results))
+    """
+    rowids = list(range(1, num + 1))
+    results = {}
+    expected = None
+    for executor in ['serial', 'thread', 'process']:
+        depc = testdata_depc_bench(
+            executor=executor, chunksize=chunksize, executor_workers=executor_workers
+        )
+        depc.clear_all()
+        start = time.time()
+        data = depc.get('bench', rowids, 'data')
+        results[executor] = time.time() - start
+        if expected is None:
+            expected = data
+        assert data == expected, 'executor={!r} changed the results'.format(executor)
+        print('executor={!r} took {:.3f}s for {} rows'.format(executor, results[executor], num))
+    return results
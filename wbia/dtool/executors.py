@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Chunk executors used by DependencyCacheTable to compute dirty rows.
+
+An executor maps a worker function over a stream of chunks and yields the
+results in the same order as the input. The pooled executors keep a bounded
+number of chunks in flight, so computing chunk N+1 overlaps with the caller
+writing the results of chunk N to SQL, while memory stays bounded by the
+``lookahead``.
+
+The executor for a table is selected through ``register_preproc``::
+
+    @register_preproc('chips', ..., chunksize=256, executor='thread')
+
+Valid modes are ``'serial'`` (the default), ``'thread'`` and ``'process'``.
+In ``'process'`` mode only the registered ``preproc_func`` runs in the worker
+processes. It must be a picklable module-level function and it receives
+``depc=None``, so it cannot read other tables through the cache.
+External storage and SQL writes always happen in the parent process.
+
+An ``initializer`` runs once in each worker before its first chunk (once in
+the calling thread for the serial executor), so workers can load state that
+every chunk needs, like an open database, instead of receiving it with each
+chunk.
+"""
+import collections
+import concurrent.futures
+import functools
+import logging
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia.dtool')
+
+
+class SerialExecutor(object):
+    """
+    Computes chunks one after another in the calling thread
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.executors import *  # NOQA
+        >>> calls = []
+        >>> with SerialExecutor(initializer=calls.append, initargs=('init',)) as executor:
+        >>>     result = list(executor.imap(pow, [(2, 1), (2, 2), (2, 3)]))
+        >>>     result += list(executor.imap(pow, [(2, 4)]))
+        >>> print(result, calls)
+        [2, 4, 8, 16] ['init']
+    """
+
+    mode = 'serial'
+
+    def __init__(self, max_workers=None, lookahead=None, initializer=None, initargs=()):
+        self.max_workers = 1
+        self.lookahead = 0
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.shutdown()
+
+    def imap(self, func, args_iter, discard=None):
+        if self.initializer is not None:
+            initializer, self.initializer = self.initializer, None
+            initializer(*self.initargs)
+        for args in args_iter:
+            yield func(*args)
+
+    def shutdown(self):
+        pass
+
+
+class _PoolExecutor(SerialExecutor):
+    """
+    Base class for executors backed by a ``concurrent.futures`` pool
+    """
+
+    pool_class = None
+
+    def __init__(self, max_workers=None, lookahead=None, initializer=None, initargs=()):
+        if max_workers is None:
+            max_workers = ut.num_cpus()
+        if lookahead is None:
+            lookahead = max_workers
+        self.max_workers = max(int(max_workers), 1)
+        self.lookahead = max(int(lookahead), 1)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self._pool = None
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            self._pool = self.pool_class(
+                max_workers=self.max_workers,
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        return self._pool
+
+    def imap(self, func, args_iter, discard=None):
+        """
+        Submits ``func(*args)`` for each item and yields results in order.
+
+        At most ``lookahead + 1`` chunks are pending at any time. The first
+        exception raised by a worker is re-raised here and all remaining
+        pending work is cancelled.
+
+        Args:
+            discard (func): if the consumer stops early, called with the
+                result of each pending chunk that was already running, once
+                it finishes, so resources held by results that are never
+                yielded (e.g. files) can be released
+        """
+        pool = self._ensure_pool()
+        pending = collections.deque()
+        try:
+            for args in args_iter:
+                pending.append(pool.submit(func, *args))
+                if len(pending) > self.lookahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                if not future.cancel() and discard is not None:
+                    future.add_done_callback(functools.partial(_discard_result, discard))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def _discard_result(discard, future):
+    if not future.cancelled() and future.exception() is None:
+        discard(future.result())
+
+
+class ThreadExecutor(_PoolExecutor):
+    """
+    Computes chunks in a thread pool.
+
+    Useful when the preproc function spends its time in code that releases
+    the GIL (numpy, OpenCV, file IO, network).
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.executors import *  # NOQA
+        >>> with ThreadExecutor(max_workers=2, lookahead=1) as executor:
+        >>>     result = list(executor.imap(pow, [(2, x) for x in range(8)]))
+        >>> print(result)
+        [1, 2, 4, 8, 16, 32, 64, 128]
+    """
+
+    mode = 'thread'
+    pool_class = concurrent.futures.ThreadPoolExecutor
+
+
+class ProcessExecutor(_PoolExecutor):
+    """
+    Computes chunks in a process pool. The worker function and its arguments
+    must be picklable.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.executors import *  # NOQA
+        >>> with ProcessExecutor(max_workers=2) as executor:
+        >>>     result = list(executor.imap(pow, [(3, x) for x in range(5)]))
+        >>> print(result)
+        [1, 3, 9, 27, 81]
+    """
+
+    mode = 'process'
+    pool_class = concurrent.futures.ProcessPoolExecutor
+
+
+EXECUTOR_CLASSES = {
+    cls.mode: cls for cls in [SerialExecutor, ThreadExecutor, ProcessExecutor]
+}
+
+
+def make_executor(
+    executor=None, max_workers=None, lookahead=None, initializer=None, initargs=()
+):
+    """
+    Builds a chunk executor from a mode name
+
+    Args:
+        executor (str or SerialExecutor): one of ``'serial'``, ``'thread'``,
+            ``'process'`` or an executor class. None means serial.
+        max_workers (int): size of the pool (default = number of cpus)
+        lookahead (int): number of chunks that may be computed ahead of the
+            consumer (default = max_workers)
+        initializer (func): called as ``initializer(*initargs)`` once in each
+            worker before its first chunk
+        initargs (tuple): arguments of the initializer
+
+    Returns:
+        SerialExecutor: executor
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.executors import *  # NOQA
+        >>> print(make_executor(None).mode)
+        serial
+        >>> print(make_executor('thread', max_workers=3).lookahead)
+        3
+        >>> make_executor('gpu')
+        Traceback (most recent call last):
+        ...
+        ValueError: unknown executor='gpu', expected one of ['serial', 'thread', 'process']
+    """
+    if executor is None:
+        executor = SerialExecutor.mode
+    if isinstance(executor, type) and issubclass(executor, SerialExecutor):
+        executor_class = executor
+    else:
+        try:
+            executor_class = EXECUTOR_CLASSES[executor]
+        except KeyError:
+            raise ValueError(
+                'unknown executor={!r}, expected one of {!r}'.format(
+                    executor, list(EXECUTOR_CLASSES.keys())
+                )
+            )
+    return executor_class(
+        max_workers=max_workers,
+        lookahead=lookahead,
+        initializer=initializer,
+        initargs=initargs,
+    )
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only shard storage for fixed width array columns.
+
+A column declared with :class:`ShardedArrayType` is stored like other
+external columns (the SQL table keeps a ``<colname>_extern_uri`` text
+column), but instead of writing one file per row, all rows computed with the
+same config are appended to a few large raw shard files::
+
+    extern_<tablename>/<tablename>_<colname>_<config_hashid>_shard0000.bin
+
+Each row stores a uri of the form ``<shard fname>#<row offset>:<num rows>``,
+which is the row offset index into the shard. Reading a row returns a
+read-only ``np.memmap`` slice of the shard, so nothing is deserialized, and
+:func:`stack_rows` returns a single mapped view when the requested rows are
+consecutive in one shard.
+
+Shards are append-only. Deleting rows only drops their uris, the space is
+reclaimed when the table is cleared.
+"""
+import logging
+import os
+import re
+import threading
+from os.path import basename, exists, join
+
+import numpy as np
+import utool as ut
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia.dtool')
+
+
+SHARD_URI_SEP = '#'
+#: Start a new shard once the current one reaches this size
+DEFAULT_SHARD_NBYTES = 2 ** 31
+SHARD_FNAME_FMT = '{prefix}_shard{index:04d}.bin'
+
+# Open memory maps keyed by shard fpath, with the (st_dev, st_ino) of the
+# file they map
+_MMAP_CACHE = {}
+_MMAP_LOCK = threading.Lock()
+
+
+def is_shard_uri(uri):
+    return uri is not None and SHARD_URI_SEP in uri
+
+
+def split_shard_uri(uri):
+    """
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.shard_store import *  # NOQA
+        >>> print(split_shard_uri('/cache/feat_vecs_abc_shard0001.bin#1024:37'))
+        ('/cache/feat_vecs_abc_shard0001.bin', 1024, 37)
+    """
+    fpath, span = uri.rsplit(SHARD_URI_SEP, 1)
+    offset, num_rows = span.split(':')
+    return fpath, int(offset), int(num_rows)
+
+
+def _get_memmap(fpath, dtype, row_shape, min_rows):
+    """
+    Returns a cached read-only map of a shard that covers ``min_rows`` rows.
+    The shard is mapped again when it grew or when the file was replaced
+    (e.g. the table was cleared and the shard recreated).
+    """
+    stat = os.stat(fpath)
+    file_id = (stat.st_dev, stat.st_ino)
+    with _MMAP_LOCK:
+        mmap_, mapped_id = _MMAP_CACHE.get(fpath, (None, None))
+        if (
+            mmap_ is None
+            or mapped_id != file_id
+            or mmap_.nbytes > stat.st_size
+            or len(mmap_) < min_rows
+        ):
+            row_nbytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+            num_rows = stat.st_size // row_nbytes
+            mmap_ = np.memmap(
+                fpath, dtype=dtype, mode='r', shape=(num_rows,) + tuple(row_shape)
+            )
+            _MMAP_CACHE[fpath] = (mmap_, file_id)
+    return mmap_
+
+
+def release_memmaps(dpath=None):
+    """Drops cached memory maps (all of them or only those inside ``dpath``)"""
+    with _MMAP_LOCK:
+        for fpath in list(_MMAP_CACHE.keys()):
+            if dpath is None or fpath.startswith(dpath):
+                del _MMAP_CACHE[fpath]
+
+
+class ShardedArrayType(object):
+    """
+    Column type for arrays whose rows all have the same ``row_shape`` and
+    ``dtype`` (e.g. keypoints or descriptors).
+
+    Args:
+        dtype (np.dtype): dtype of the stored arrays
+        row_shape (tuple): shape of one row, arrays have shape (N,) + row_shape
+        shard_nbytes (int): size at which a new shard file is started
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.shard_store import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('dtool', 'test_shard_store')
+        >>> ut.delete(dpath)
+        >>> ut.ensuredir(dpath)
+        >>> coltype = ShardedArrayType(np.uint8, (4,), shard_nbytes=30)
+        >>> rng = np.random.RandomState(0)
+        >>> arrs = [rng.randint(0, 255, (n, 4)).astype(np.uint8) for n in [3, 0, 5, 2]]
+        >>> uris = [coltype.append(dpath, 'feat_vecs_abc', arr) for arr in arrs]
+        >>> print(uris)
+        ['feat_vecs_abc_shard0000.bin#0:3', 'feat_vecs_abc_shard0000.bin#3:0', 'feat_vecs_abc_shard0000.bin#3:5', 'feat_vecs_abc_shard0001.bin#0:2']
+        >>> loaded = [coltype.read_func(join(dpath, uri)) for uri in uris]
+        >>> assert all(np.all(a == b) for a, b in zip(arrs, loaded))
+        >>> assert isinstance(loaded[0], np.memmap)
+        >>> stacked = stack_rows(loaded[0:3])
+        >>> assert isinstance(stacked, np.memmap) and stacked.shape == (8, 4)
+        >>> assert np.all(stacked == np.vstack(arrs[0:3]))
+        >>> # Rows in different shards still stack (with a copy)
+        >>> assert np.all(stack_rows(loaded) == np.vstack(arrs))
+        >>> release_memmaps(dpath)
+    """
+
+    def __init__(self, dtype, row_shape, shard_nbytes=DEFAULT_SHARD_NBYTES):
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.shard_nbytes = shard_nbytes
+        num_items = int(np.prod(self.row_shape, dtype=np.int64))
+        self.row_nbytes = num_items * self.dtype.itemsize
+        # Current shard index per (dpath, prefix)
+        self._shard_index = {}
+
+    def __repr__(self):
+        return '<ShardedArrayType({}, {})>'.format(self.dtype, self.row_shape)
+
+    def _current_shard(self, dpath, prefix):
+        key = (dpath, prefix)
+        index = self._shard_index.get(key, None)
+        if index is None:
+            pattern = re.compile(re.escape(prefix) + r'_shard(\d+)\.bin$')
+            indices = [
+                int(match.group(1))
+                for match in map(pattern.match, os.listdir(dpath))
+                if match is not None
+            ]
+            index = max(indices) if indices else 0
+        fpath = join(dpath, SHARD_FNAME_FMT.format(prefix=prefix, index=index))
+        if exists(fpath) and os.path.getsize(fpath) >= self.shard_nbytes:
+            index += 1
+            fpath = join(dpath, SHARD_FNAME_FMT.format(prefix=prefix, index=index))
+        self._shard_index[key] = index
+        return fpath
+
+    def append(self, dpath, prefix, arr):
+        """
+        Appends the rows of ``arr`` to the current shard and returns the uri
+        (relative to ``dpath``) that locates them.
+        """
+        arr = np.asarray(arr)
+        if arr.shape[1:] != self.row_shape:
+            if arr.size == 0:
+                arr = arr.reshape((0,) + self.row_shape)
+            else:
+                raise ValueError(
+                    'Expected rows with shape {}, got array of shape {}'.format(
+                        self.row_shape, arr.shape
+                    )
+                )
+        buf = np.ascontiguousarray(arr, dtype=self.dtype)
+        fpath = self._current_shard(dpath, prefix)
+        with open(fpath, 'ab') as file_:
+            if fcntl is not None:
+                # Other processes may be appending to the same shard
+                fcntl.flock(file_, fcntl.LOCK_EX)
+            try:
+                file_.seek(0, os.SEEK_END)
+                nbytes = file_.tell()
+                if nbytes % self.row_nbytes != 0:
+                    raise IOError('Shard {} is corrupted'.format(fpath))
+                offset = nbytes // self.row_nbytes
+                file_.write(buf.tobytes())
+                file_.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file_, fcntl.LOCK_UN)
+        uri = '{}{}{}:{}'.format(basename(fpath), SHARD_URI_SEP, offset, len(buf))
+        return uri
+
+    def remove_shards(self, dpath, prefix):
+        """
+        Deletes the shards whose name starts with ``prefix`` and forgets their
+        maps and current shard index
+        """
+        if exists(dpath):
+            fpaths = [
+                join(dpath, fname)
+                for fname in os.listdir(dpath)
+                if fname.startswith(prefix) and fname.endswith('.bin')
+            ]
+            for fpath in fpaths:
+                os.remove(fpath)
+        release_memmaps(join(dpath, prefix))
+        for key in list(self._shard_index.keys()):
+            if key[0] == dpath and key[1].startswith(prefix):
+                del self._shard_index[key]
+
+    def read_func(self, uri_full):
+        """Returns a read-only memory mapped view of the rows at ``uri_full``"""
+        fpath, offset, num_rows = split_shard_uri(uri_full)
+        if num_rows == 0:
+            return np.empty((0,) + self.row_shape, dtype=self.dtype)
+        mmap_ = _get_memmap(fpath, self.dtype, self.row_shape, offset + num_rows)
+        return mmap_[offset : offset + num_rows]
+
+
+def _data_address(arr):
+    return arr.__array_interface__['data'][0]
+
+
+def stack_rows(arr_list):
+    """
+    Like ``np.vstack``, but when the arrays are consecutive rows of the same
+    memory mapped shard the result is a single view of the shard and nothing
+    is copied.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.shard_store import *  # NOQA
+        >>> arrs = [np.ones((2, 3)), np.zeros((1, 3))]
+        >>> print(stack_rows(arrs).shape)
+        (3, 3)
+    """
+    nonempty = [arr for arr in arr_list if len(arr) > 0]
+    if len(nonempty) > 0 and isinstance(nonempty[0], np.memmap):
+        mmap_ = nonempty[0].base
+        is_consecutive = isinstance(mmap_, np.memmap)
+        if is_consecutive:
+            for prev, arr in zip(nonempty[:-1], nonempty[1:]):
+                if arr.base is not mmap_ or (
+                    _data_address(arr) != _data_address(prev) + prev.nbytes
+                ):
+                    is_consecutive = False
+                    break
+        if is_consecutive:
+            row_nbytes = nonempty[0].nbytes // len(nonempty[0])
+            start = (_data_address(nonempty[0]) - _data_address(mmap_)) // row_nbytes
+            num_rows = sum(map(len, nonempty))
+            return mmap_[start : start + num_rows]
+    return np.vstack(arr_list)
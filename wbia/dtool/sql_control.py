@@ -10,11 +10,14 @@ import functools
 import logging
 import os
 import re
+import threading
+import time
 import uuid
 from collections.abc import Mapping, MutableMapping
 from contextlib import contextmanager
 from os.path import exists, join
 
+import numpy as np
 import parse
 import sqlalchemy
 import utool as ut
@@ -30,7 +33,14 @@ from sqlalchemy.sql import ClauseElement, bindparam, text
 
 from wbia.dtool import lite
 from wbia.dtool.dump import dumps
-from wbia.dtool.types import TYPE_TO_SQLTYPE, Integer, initialize_postgresql_types
+from wbia.dtool.types import (
+    TYPE_TO_SQLTYPE,
+    Integer,
+    decode_ndarray,
+    encode_ndarray,
+    initialize_postgresql_types,
+    is_legacy_ndarray_blob,
+)
 
 # TYPE_INITIALIZED_CACHE = {}
 
@@ -47,8 +57,15 @@ VERBOSE = ut.VERBOSE
 VERYVERBOSE = ut.VERYVERBOSE
 
 TIMEOUT = 600  # Wait for up to 600 seconds for the database to return from a locked state
+# Seconds a persistent cache version read from a Postgres database is reused.
+# SQLite databases reuse it until PRAGMA data_version reports a commit.
+CACHE_VERSION_TTL = 1.0
 
 BATCH_SIZE = int(1e4)
+# Number of distinct rowids sent to the database at once by get_by_rowids
+BULK_BATCH_SIZE = int(1e5)
+# Temporary table used to join against when bulk getting rows on sqlite
+BULK_ROWID_TABLE_NAME = '_bulk_rowids'
 
 SQLColumnRichInfo = collections.namedtuple(
     'SQLColumnRichInfo', ('column_id', 'name', 'type_', 'notnull', 'dflt_value', 'pk')
@@ -104,6 +121,73 @@ def create_engine(uri, POSTGRESQL_POOL_SIZE=20, ENGINES={}, timeout=TIMEOUT):
     return ENGINES[uri]
 
 
+# Connections reused by the controllers during the current request, see
+# pin_request_connections
+_THREAD_STATE = threading.local()
+# Number of pinned connections of each engine (by id), see _reserve_pin
+_PINNED_COUNTS = collections.Counter()
+_PINNED_LOCK = threading.Lock()
+
+
+def pin_request_connections():
+    """
+    Makes every controller used by the calling thread reuse one connection
+    per engine and schema until release_request_connections, instead of
+    opening a new connection for every statement. The web server pins the
+    connections of each request (see controller_inject.get_flask_app).
+    Connections are opened lazily.
+    """
+    if getattr(_THREAD_STATE, 'connections', None) is None:
+        _THREAD_STATE.connections = {}
+
+
+def release_request_connections():
+    """
+    Rolls back the open transactions of the connections pinned by the
+    calling thread and returns them to their pool
+    """
+    connections = getattr(_THREAD_STATE, 'connections', None)
+    _THREAD_STATE.connections = None
+    for engine, conn in (connections or {}).values():
+        _release_pinned_connection(engine, conn)
+
+
+def _reserve_pin(engine):
+    """
+    Counts a new pinned connection of engine. Pinned connections are capped
+    at the pool size of the engine (POSTGRESQL_POOL_SIZE), so the overflow
+    connections remain for unpinned threads and nested blocks.
+
+    Returns:
+        bool: False if the cap is reached and the connection must not be pinned
+    """
+    pool = engine.pool
+    max_pinned = pool.size() if isinstance(pool, sqlalchemy.pool.QueuePool) else None
+    with _PINNED_LOCK:
+        if max_pinned is not None and _PINNED_COUNTS[id(engine)] >= max_pinned:
+            return False
+        _PINNED_COUNTS[id(engine)] += 1
+    return True
+
+
+def _unreserve_pin(engine):
+    with _PINNED_LOCK:
+        _PINNED_COUNTS[id(engine)] -= 1
+        if _PINNED_COUNTS[id(engine)] <= 0:
+            del _PINNED_COUNTS[id(engine)]
+
+
+def _release_pinned_connection(engine, conn):
+    try:
+        if not conn.closed and not conn.invalidated:
+            transaction = conn.get_transaction()
+            if transaction is not None:
+                transaction.rollback()
+        conn.close()
+    finally:
+        _unreserve_pin(engine)
+
+
 def compare_coldef_lists(coldef_list1, coldef_list2):
     def normalize(coldef_list):
         for name, coldef in coldef_list:
@@ -529,6 +613,16 @@ class SQLDatabaseController(object):
         self._sa_metadata.reflect(bind=self._engine)
 
         self._tablenames = None
+        # Statements used by get_by_rowids keyed by (tablename, colnames)
+        self._bulk_get_stmts = {}
+        # Write counters keyed by tablename (None counts raw SQL writes)
+        self._table_versions = collections.defaultdict(int)
+        # Persistent cache versions keyed by tablename, with the data version
+        # they were read at
+        self._cache_versions = {}
+        # (pid, connection) that only reads PRAGMA data_version
+        self._data_version_conn = None
+        self._data_version_lock = threading.Lock()
 
         if not self.readonly:
             # Ensure the metadata table is initialized.
@@ -583,9 +677,43 @@ class SQLDatabaseController(object):
 
         # TYPE_INITIALIZED_CACHE[type_cache_tag] = type_cache_flag
 
+    def _pinned_connection(self, connections):
+        """
+        Returns the connection pinned to this request for this engine and
+        schema, or None when it is in a transaction or the engine has too
+        many pinned connections
+        """
+        key = (id(self._engine), self.schema_name)
+        engine, conn = connections.pop(key, (None, None))
+        if engine is self._engine and not conn.closed and not conn.invalidated:
+            connections[key] = (engine, conn)
+            if conn.in_transaction():
+                # A nested block gets its own connection, as without pinning
+                return None
+            return conn
+        if engine is not None:
+            _release_pinned_connection(engine, conn)
+        if not _reserve_pin(self._engine):
+            return None
+        try:
+            conn = self._engine.connect()
+        except Exception:
+            _unreserve_pin(self._engine)
+            raise
+        # Released with the request even if the schema setup fails
+        connections[key] = (self._engine, conn)
+        self.ensure_postgresql_types(conn)
+        return conn
+
     @contextmanager
     def connect(self):
         """Create a connection instance to wrap a SQL execution block as a context manager"""
+        connections = getattr(_THREAD_STATE, 'connections', None)
+        if connections is not None:
+            conn = self._pinned_connection(connections)
+            if conn is not None:
+                yield conn
+                return
         with self._engine.connect() as conn:
             self.ensure_postgresql_types(conn)
             yield conn
@@ -698,6 +826,7 @@ class SQLDatabaseController(object):
     def reboot(self):
         logger.info('[sql] reboot')
         self._engine.dispose()
+        self._close_data_version_conn()
         # Re-initialize the engine
         self.__init_engine()
 
@@ -770,6 +899,94 @@ class SQLDatabaseController(object):
         self.shrink_memory()
         self.vacuum()
 
+    def reencode_ndarray_columns(self, tablenames=None, batch_size=BATCH_SIZE):
+        """
+        Rewrites ``np.save`` encoded NDARRAY / NUMPY values with the raw codec
+        (see :func:`wbia.dtool.types.encode_ndarray`).
+
+        Rows that are already raw, NULL or hold object arrays are left alone,
+        so this is safe to run more than once.
+
+        Args:
+            tablenames (list): tables to migrate (default = all tables)
+            batch_size (int): number of rows read and written per transaction
+
+        Returns:
+            dict: number of rewritten values for each (tablename, colname)
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.sql_control import *  # NOQA
+            >>> import io
+            >>> import numpy as np
+            >>> db = SQLDatabaseController('sqlite:///', 'testing')
+            >>> db.add_table('arrs', [('arr_rowid', 'INTEGER PRIMARY KEY'),
+            >>>                       ('arr', 'NDARRAY')], superkeys=None)
+            >>> blobs = []
+            >>> for x in range(5):
+            >>>     out = io.BytesIO()
+            >>>     np.save(out, np.full((x, 3), x, dtype=np.float32))
+            >>>     blobs.append(out.getvalue())
+            >>> with db.connect() as conn:
+            >>>     _ = conn.execute(text('INSERT INTO arrs (arr) VALUES (:arr)'),
+            >>>                      [{'arr': blob} for blob in blobs])
+            >>> counts = db.reencode_ndarray_columns(batch_size=2)
+            >>> print(counts)
+            {('arrs', 'arr'): 5}
+            >>> print(db.reencode_ndarray_columns())
+            {('arrs', 'arr'): 0}
+            >>> arrs = db.get('arrs', ('arr',), [1, 2, 3, 4, 5])
+            >>> assert [arr.shape for arr in arrs] == [(x, 3) for x in range(5)]
+        """
+        if tablenames is None:
+            tablenames = self.get_table_names()
+        counts = {}
+        for tablename in tablenames:
+            colnames = [
+                column.name
+                for column in self.get_columns(tablename)
+                if str(column.type_).upper() in ('NDARRAY', 'NUMPY')
+            ]
+            for colname in colnames:
+                select_stmt = text(
+                    f'SELECT rowid, {colname} FROM {tablename} '
+                    f'WHERE rowid > :last_rowid AND {colname} IS NOT NULL '
+                    'ORDER BY rowid ASC LIMIT :batch_size'
+                )
+                update_stmt = text(
+                    f'UPDATE {tablename} SET {colname} = :value WHERE rowid = :rowid'
+                )
+                num_rewritten = 0
+                last_rowid = -1
+                with self.connect() as conn:
+                    while True:
+                        # Select without a column type so the raw blobs come back
+                        rows = conn.execute(
+                            select_stmt, last_rowid=last_rowid, batch_size=batch_size
+                        ).fetchall()
+                        if len(rows) == 0:
+                            break
+                        last_rowid = rows[-1][0]
+                        params = []
+                        for rowid, value in rows:
+                            if not is_legacy_ndarray_blob(value):
+                                continue
+                            new_value = encode_ndarray(decode_ndarray(value))
+                            if is_legacy_ndarray_blob(new_value):
+                                # Object arrays must stay pickled
+                                continue
+                            params.append({'rowid': rowid, 'value': new_value})
+                        if params:
+                            with conn.begin():
+                                conn.execute(update_stmt, params)
+                            num_rewritten += len(params)
+                logger.info(
+                    '[sql] reencoded %d values in %s.%s'
+                    % (num_rewritten, tablename, colname)
+                )
+                counts[(tablename, colname)] = num_rewritten
+        return counts
+
     def _reflect_table(self, table_name):
         """Produces a SQLAlchemy Table object from the given ``table_name``"""
         # Note, this on introspects once. Repeated calls will pull the Table object
@@ -785,6 +1002,116 @@ class SQLDatabaseController(object):
     # API INTERFACE
     # ==============
 
+    def get_table_version(self, tblname):
+        """
+        Returns a value that changes whenever this controller writes to the
+        table, so in-process caches of table data can detect stale copies.
+        Writes issued by other processes are not seen.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.sql_control import *  # NOQA
+            >>> db = SQLDatabaseController('sqlite:///', 'testing')
+            >>> db.add_table('dummy', [('dummy_rowid', 'INTEGER PRIMARY KEY'), ('x', 'INTEGER')])
+            >>> version0 = db.get_table_version('dummy')
+            >>> rowids = db._add('dummy', ('x',), [(1,), (2,)])
+            >>> version1 = db.get_table_version('dummy')
+            >>> db.set('dummy', ('x',), [3], [rowids[0]])
+            >>> version2 = db.get_table_version('dummy')
+            >>> db.delete_rowids('dummy', rowids[1:])
+            >>> assert len({version0, version1, version2, db.get_table_version('dummy')}) == 4
+            >>> assert db.get_table_version('other')[0] == 0
+        """
+        return (self._table_versions[tblname], self._table_versions[None])
+
+    def _bump_table_version(self, tblname=None):
+        self._table_versions[tblname] += 1
+
+    def _get_data_version(self):
+        """
+        Returns a value that changes whenever another connection (of any
+        process) may have committed to the database.
+
+        On SQLite this is ``PRAGMA data_version`` of a dedicated connection
+        that never writes, so every commit made through the other connections
+        changes it. Only this controller can write to an in memory database.
+        Postgres has no such counter, so the value changes every
+        ``CACHE_VERSION_TTL`` seconds instead.
+        """
+        if not self.is_using_sqlite:
+            return int(time.monotonic() / CACHE_VERSION_TTL)
+        database = self._engine.url.database
+        if not database or database == ':memory:':
+            return 0
+        pid = os.getpid()
+        with self._data_version_lock:
+            if self._data_version_conn is None or self._data_version_conn[0] != pid:
+                # Connections inherited from a parent process are not reused
+                conn = lite.connect(
+                    database, timeout=self.timeout, check_same_thread=False
+                )
+                self._data_version_conn = (pid, conn)
+            conn = self._data_version_conn[1]
+            return conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _close_data_version_conn(self):
+        with self._data_version_lock:
+            pid_conn, self._data_version_conn = self._data_version_conn, None
+        if pid_conn is not None and pid_conn[0] == os.getpid():
+            pid_conn[1].close()
+
+    def get_cache_version(self, tblname):
+        """
+        Returns the persistent cache version of a table. Unlike
+        ``get_table_version`` this counter lives in the metadata table, so
+        bumps made by any process sharing the database are seen. The stored
+        value is only read again after the database changed (see
+        ``_get_data_version``), so checking an unchanged table is cheap.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.sql_control import *  # NOQA
+            >>> db = SQLDatabaseController('sqlite:///', 'testing')
+            >>> assert db.get_cache_version('dummy') == 0
+            >>> db.bump_cache_version('dummy')
+            >>> db.bump_cache_version('dummy')
+            >>> assert db.get_cache_version('dummy') == 2
+            >>> assert db.get_cache_version('other') == 0
+        """
+        # Read the data version first, so a commit made during the read makes
+        # the next call read the value again
+        data_version = self._get_data_version()
+        cached = self._cache_versions.get(tblname, None)
+        if cached is not None and cached[0] == data_version:
+            return cached[1]
+        stmt = text(
+            f'SELECT metadata_value FROM {METADATA_TABLE_NAME} WHERE metadata_key = :key'
+        )
+        row = self.executeone(
+            stmt, {'key': f'{tblname}_cache_version'}, use_fetchone_behavior=True
+        )
+        version = 0 if row is None else int(row[0])
+        self._cache_versions[tblname] = (data_version, version)
+        return version
+
+    def bump_cache_version(self, tblname):
+        """Atomically increments the persistent cache version of a table"""
+        stmt = text(
+            f"""\
+            INSERT INTO {METADATA_TABLE_NAME}
+                (metadata_key, metadata_value)
+            VALUES (:key, '1')
+            ON CONFLICT (metadata_key) DO UPDATE
+                SET metadata_value = CAST(
+                    CAST({METADATA_TABLE_NAME}.metadata_value AS INTEGER) + 1 AS TEXT
+                )"""
+        )
+        # Not executeone, which would count the upsert as a raw write to every
+        # table and invalidate the in-process caches of all of them
+        with self.connect() as conn:
+            conn.execute(stmt, {'key': f'{tblname}_cache_version'})
+        self._cache_versions.pop(tblname, None)
+
     def get_row_count(self, tblname):
         fmtdict = {
             'tblname': tblname,
@@ -872,6 +1199,7 @@ class SQLDatabaseController(object):
                         # Therefore, we can assume the primary key is a single column value.
                         pk = pk[0]
                     primary_keys.append(pk)
+        self._bump_table_version(tblname)
         return primary_keys
 
     def add_cleanly(
@@ -1308,6 +1636,7 @@ class SQLDatabaseController(object):
         eager=True,
         assume_unique=False,
         batch_size=BATCH_SIZE,
+        bulk=True,
         **kwargs,
     ):
         """Get rows of data by ID
@@ -1319,6 +1648,8 @@ class SQLDatabaseController(object):
             id_colname (str): column to be used as the search key (default: rowid)
             eager (bool): use eager evaluation
             assume_unique (bool): default False. Experimental feature that could result in a 10x speedup
+            bulk (bool): default True. Selecting by rowid goes through
+                :meth:`get_by_rowids` (``assume_unique`` is then implied)
             unpack_scalars (bool): default True
 
         Example:
@@ -1343,6 +1674,15 @@ class SQLDatabaseController(object):
         if not isinstance(colnames, (tuple, list)):
             raise TypeError('colnames must be a sequence type of strings')
 
+        if bulk and id_iter is not None and id_colname == 'rowid':
+            return self.get_by_rowids(
+                tblname,
+                colnames,
+                id_iter,
+                unpack_scalars=kwargs.get('unpack_scalars', True),
+                keepwrap=kwargs.get('keepwrap', False),
+            )
+
         # ??? Getting a single column of unique values that is matched on rowid?
         #     And sorts the results after the query?
         # ??? This seems oddly specific for a generic method.
@@ -1359,7 +1699,6 @@ class SQLDatabaseController(object):
             operation = f'SELECT {columns} FROM {tblname} WHERE rowid in ({ids_listing}) ORDER BY rowid ASC'
             with self.connect() as conn:
                 results = conn.execute(operation).fetchall()
-            import numpy as np
 
             # ??? Why order the results if they are going to be sorted here?
             sortx = np.argsort(np.argsort(id_iter))
@@ -1443,6 +1782,149 @@ class SQLDatabaseController(object):
 
             return results
 
+    def _get_bulk_stmt(self, tblname, colnames):
+        """
+        Returns the (cached) statement that selects ``rowid`` followed by
+        ``colnames`` for a batch of rowids.
+
+        On sqlite the rowids are loaded into a temporary table that is joined
+        against. On postgres they are bound as a single array parameter and
+        matched with ``rowid = ANY(:rowids)``.
+        """
+        key = (tblname, tuple(colnames))
+        stmt = self._bulk_get_stmts.get(key, None)
+        if stmt is None:
+            table = self._reflect_table(tblname)
+            if 'rowid' in table.c:
+                rowid_column = table.c['rowid']
+            else:
+                # rowid isn't an actual column in sqlite
+                rowid_column = sqlalchemy.sql.column(
+                    'rowid', Integer, _selectable=table
+                )
+            columns = [table.c[c] for c in colnames]
+            if self.is_using_postgres:
+                from sqlalchemy.dialects.postgresql import ARRAY
+
+                stmt = sqlalchemy.select([rowid_column] + columns).where(
+                    rowid_column
+                    == sqlalchemy.any_(
+                        bindparam('rowids', type_=ARRAY(sqlalchemy.BigInteger))
+                    )
+                )
+            else:
+                bulk_table = sqlalchemy.table(
+                    BULK_ROWID_TABLE_NAME, sqlalchemy.column('rowid_', Integer)
+                )
+                stmt = sqlalchemy.select([bulk_table.c.rowid_] + columns).select_from(
+                    bulk_table.join(table, rowid_column == bulk_table.c.rowid_)
+                )
+            self._bulk_get_stmts[key] = stmt
+        return stmt
+
+    def _fetch_bulk_rows(self, stmt, unique_rowids, batch_size):
+        """Returns the (rowid, *values) rows for the sorted ``unique_rowids``"""
+        rows = []
+        with self.connect() as conn:
+            if self.is_using_postgres:
+                for start in range(0, len(unique_rowids), batch_size):
+                    batch = unique_rowids[start : start + batch_size].tolist()
+                    rows.extend(conn.execute(stmt, {'rowids': batch}).fetchall())
+                return rows
+            with conn.begin():
+                conn.exec_driver_sql(
+                    f'CREATE TEMP TABLE IF NOT EXISTS {BULK_ROWID_TABLE_NAME} '
+                    '(rowid_ INTEGER PRIMARY KEY)'
+                )
+                try:
+                    for start in range(0, len(unique_rowids), batch_size):
+                        batch = unique_rowids[start : start + batch_size]
+                        conn.exec_driver_sql(f'DELETE FROM {BULK_ROWID_TABLE_NAME}')
+                        conn.exec_driver_sql(
+                            f'INSERT INTO {BULK_ROWID_TABLE_NAME} VALUES (?)',
+                            [(rowid,) for rowid in batch.tolist()],
+                        )
+                        rows.extend(conn.execute(stmt).fetchall())
+                finally:
+                    conn.exec_driver_sql(f'DELETE FROM {BULK_ROWID_TABLE_NAME}')
+        return rows
+
+    def get_by_rowids(
+        self,
+        tblname,
+        colnames,
+        rowid_iter,
+        unpack_scalars=True,
+        keepwrap=False,
+        batch_size=BULK_BATCH_SIZE,
+    ):
+        """Gets ``colnames`` for each rowid in ``rowid_iter``
+
+        This is the fast path of :meth:`get` for the common case of fetching
+        columns by integer rowids. Each distinct rowid is sent to the database
+        once and the results are scattered back with numpy indexing, so the
+        output preserves the input order and duplicates. ``None`` or missing
+        rowids result in ``None``.
+
+        Args:
+            tblname (str): table name to get from
+            colnames (tuple of str): column names to grab from
+            rowid_iter (iterable): rowids (may contain duplicates and None)
+            unpack_scalars (bool): if False each result is wrapped in a list
+                (empty for missing rows) like :meth:`get`
+            keepwrap (bool): return 1-tuples when a single column is requested
+            batch_size (int): number of distinct rowids per query
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.sql_control import *  # NOQA
+            >>> db = SQLDatabaseController('sqlite:///:memory:', 'testing')
+            >>> db.executeone(text('CREATE TABLE foo (id INTEGER PRIMARY KEY, x TEXT)'))
+            >>> for x in 'abc':
+            >>>     _ = db.executeone(text('INSERT INTO foo (x) VALUES (:x)'), {'x': x})
+            >>> print(db.get_by_rowids('foo', ('x',), [3, 1, None, 3, 7]))
+            ['c', 'a', None, 'c', None]
+            >>> print(db.get_by_rowids('foo', ('id', 'x'), [2, 2]))
+            [(2, 'b'), (2, 'b')]
+        """
+        if not isinstance(colnames, (tuple, list)):
+            raise TypeError('colnames must be a sequence type of strings')
+        rowid_list = list(rowid_iter)
+        num_input = len(rowid_list)
+        if num_input == 0:
+            return []
+        valid_flags = np.array([rowid is not None for rowid in rowid_list])
+        if valid_flags.all():
+            valid_rowids = np.asarray(rowid_list, dtype=np.int64)
+        else:
+            valid_rowids = np.array(ut.compress(rowid_list, valid_flags), dtype=np.int64)
+        unique_rowids, inverse = np.unique(valid_rowids, return_inverse=True)
+
+        # sqlalchemy drops duplicate columns from a select
+        unique_colnames = ut.unique_ordered(colnames)
+        colxs = [unique_colnames.index(c) + 1 for c in colnames]
+        stmt = self._get_bulk_stmt(tblname, unique_colnames)
+        rows = self._fetch_bulk_rows(stmt, unique_rowids, batch_size)
+
+        unpack_single = len(colnames) == 1 and not keepwrap
+        unique_values = np.empty(len(unique_rowids), dtype=object)
+        if rows:
+            found_rowids = np.array([row[0] for row in rows], dtype=np.int64)
+            found_idxs = np.searchsorted(unique_rowids, found_rowids)
+            for idx, row in zip(found_idxs.tolist(), rows):
+                if unpack_single:
+                    value = row[colxs[0]]
+                else:
+                    value = tuple(row[colx] for colx in colxs)
+                unique_values[idx] = value if unpack_scalars else [value]
+
+        results = np.empty(num_input, dtype=object)
+        results[valid_flags] = unique_values[inverse]
+        results = results.tolist()
+        if not unpack_scalars:
+            results = [[] if value is None else value for value in results]
+        return results
+
     def set(
         self,
         tblname,
@@ -1591,6 +2073,7 @@ class SQLDatabaseController(object):
                     params = {id_param_name: id}
                     params.update({f'e{e}': p for e, p in enumerate(val_list[i])})
                     conn.execute(stmt, **params)
+        self._bump_table_version(tblname)
 
     def delete(self, tblname, id_list, id_colname='rowid', **kwargs):
         """Deletes rows from a SQL table (``tblname``) by ID,
@@ -1616,6 +2099,7 @@ class SQLDatabaseController(object):
             with conn.begin():
                 for id in id_list:
                     conn.execute(stmt, {id_param_name: id})
+        self._bump_table_version(tblname)
 
     def delete_rowids(self, tblname, rowid_list, **kwargs):
         """deletes the the rows in rowid_list"""
@@ -1685,6 +2169,9 @@ class SQLDatabaseController(object):
         # FIXME (12-Sept-12020) Allows passing through '?' (question mark) parameters.
         with self.connect() as conn:
             results = conn.execute(operation, params)
+            if not str(operation).lstrip().upper().startswith('SELECT'):
+                # Raw SQL may write to any table
+                self._bump_table_version()
 
             # BBB (12-Sept-12020) Retaining insertion rowid result
             # FIXME postgresql (12-Sept-12020) This won't work in postgres.
@@ -2500,6 +2987,7 @@ class SQLDatabaseController(object):
         """
         self._tablenames = None
         self._sa_metadata = sqlalchemy.MetaData()
+        self._bulk_get_stmts = {}
         self.get_table_names()
 
     def get_table_names(self, lazy=False):
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timing instrumentation.
+
+Code marks the stages it wants timed with ``stage`` (a context manager) or
+``start`` (a timer with a ``stop`` method). A stage has a name (e.g.
+``'query.knn'``) and an optional detail (e.g. a table name or a job lane).
+Durations are handed to the registered sinks, for example the Prometheus
+exporter (see ``wbia.web.prometheus``) or a ``StageRecorder``.
+
+Without sinks ``stage`` and ``start`` return a shared no-op object, so
+instrumented code costs one global lookup per stage when tracing is off.
+
+Stage names used by wbia:
+
+    query.impossible_daids, query.knn, query.filter, query.weighting,
+    query.chipmatch, query.sver, query.scoring - request_wbia_query_L0
+    depcache.compute, depcache.read - per depcache table
+    job.wait, job.run - per job engine lane
+
+Example:
+    >>> # ENABLE_DOCTEST
+    >>> from wbia.dtool.tracing import *  # NOQA
+    >>> with record_stages() as recorder:
+    ...     with stage('example.outer'):
+    ...         with stage('example.inner', 'detail'):
+    ...             pass
+    ...     observe('example.wait', 1.5)
+    >>> print([obs[0:2] for obs in recorder.observations])
+    [['example.inner', 'detail'], ['example.outer', ''], ['example.wait', '']]
+    >>> print(stage('example.outer'))
+    <NullStage>
+"""
+import contextlib
+import logging
+import time
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+#: Whether the stages of web requests and engine jobs are exported
+TRACE_STAGES = not ut.get_argflag('--no-stage-tracing')
+
+# Callables sink(name, detail, seconds) that receive every stage duration
+_SINKS = []
+
+
+class NullStage(object):
+    """Stage timer returned while tracing is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def stop(self):
+        return None
+
+    def __repr__(self):
+        return '<NullStage>'
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage(object):
+    """Times one stage and reports it to the sinks when stopped"""
+
+    __slots__ = ('name', 'detail', 'start_time')
+
+    def __init__(self, name, detail=''):
+        self.name = name
+        self.detail = detail
+        self.start_time = time.perf_counter()
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+        return False
+
+    def stop(self):
+        seconds = time.perf_counter() - self.start_time
+        observe(self.name, seconds, self.detail)
+        return seconds
+
+
+def is_enabled():
+    return bool(_SINKS)
+
+
+def stage(name, detail=''):
+    """
+    Returns a context manager that reports the time spent in its block as
+    the stage name (with detail)
+    """
+    if not _SINKS:
+        return NULL_STAGE
+    return Stage(name, detail)
+
+
+def start(name, detail=''):
+    """
+    Starts timing the stage name and returns the timer, whose ``stop``
+    method reports the stage. Timers that are never stopped report nothing.
+    """
+    if not _SINKS:
+        return NULL_STAGE
+    return Stage(name, detail)
+
+
+def observe(name, seconds, detail=''):
+    """Reports a duration measured by the caller"""
+    for sink in _SINKS:
+        try:
+            sink(name, detail, seconds)
+        except Exception as ex:
+            logger.warning('Stage sink {!r} failed: {!r}'.format(sink, ex))
+
+
+def add_sink(sink):
+    if sink not in _SINKS:
+        _SINKS.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _SINKS:
+        _SINKS.remove(sink)
+
+
+class StageRecorder(object):
+    """
+    Sink that keeps the [name, detail, seconds] of every observation, e.g.
+    to send the stages of an engine job to the process that exports them
+    """
+
+    def __init__(self):
+        self.observations = []
+
+    def __call__(self, name, detail, seconds):
+        self.observations.append([name, detail, seconds])
+
+    def totals(self):
+        """Returns the total seconds of each (name, detail)"""
+        totals = {}
+        for name, detail, seconds in self.observations:
+            key = (name, detail)
+            totals[key] = totals.get(key, 0.0) + seconds
+        return totals
+
+    def total_observations(self):
+        """
+        Returns one [name, detail, seconds] per (name, detail) with its total
+        seconds, in the order the stages were first reported
+        """
+        totals = self.totals()
+        return [[name, detail, seconds] for (name, detail), seconds in totals.items()]
+
+
+@contextlib.contextmanager
+def record_stages(enabled=True):
+    """
+    Records the stages reported in the block with a StageRecorder. When not
+    enabled the recorder stays empty.
+    """
+    recorder = StageRecorder()
+    if not enabled:
+        yield recorder
+        return
+    add_sink(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_sink(recorder)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """Mapping of Python types to SQL types"""
 import io
+import struct
 import uuid
 
 import numpy as np
@@ -13,7 +14,9 @@ from sqlalchemy.types import TypeDecorator, UserDefinedType
 from utool.util_cache import from_json, to_json
 
 __all__ = (
+    'decode_ndarray',
     'Dict',
+    'encode_ndarray',
     'Integer',
     'List',
     'NDArray',
@@ -71,6 +74,119 @@ class JSONCodeableType(UserDefinedType):
         return process
 
 
+#: Blobs written by ``np.save`` start with the npy magic string
+NPY_MAGIC_PREFIX = b'\x93NUMPY'
+#: First byte of blobs written with the raw codec (never collides with ``\x93``)
+RAW_CODEC_VERSION = 1
+#: When False, new values are written with ``np.save`` like before the raw codec
+WRITE_RAW_NDARRAYS = True
+# version, ndim, length of the dtype descr string
+_RAW_HEADER = struct.Struct('<BBB')
+# The array buffer starts on a multiple of this offset
+_RAW_ALIGN = 16
+
+
+def _encode_npy(arr):
+    out = io.BytesIO()
+    np.save(out, arr)
+    out.seek(0)
+    return out.read()
+
+
+def _decode_npy(value):
+    out = io.BytesIO(value)
+    out.seek(0)
+    arr = np.load(out, allow_pickle=True)
+    out.close()
+    return arr
+
+
+def encode_ndarray(value):
+    """
+    Encodes an array (or numpy scalar) as a blob for storage in SQL
+
+    The raw format is a small header followed by the C-contiguous buffer::
+
+        version (uint8) | ndim (uint8) | len(descr) (uint8) | descr (ascii)
+        | shape (ndim x int64) | zero padding to 16 bytes | data
+
+    Object and structured dtypes cannot be represented by a descr string and
+    are still written with ``np.save``.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.types import *  # NOQA
+        >>> arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+        >>> blob = encode_ndarray(arr)
+        >>> print(blob[0], len(blob))
+        1 80
+        >>> arr2 = decode_ndarray(blob)
+        >>> assert arr2.dtype == arr.dtype and np.all(arr2 == arr)
+        >>> assert encode_ndarray(np.array([None])).startswith(NPY_MAGIC_PREFIX)
+    """
+    arr = np.asarray(value)
+    dtype = arr.dtype
+    if not WRITE_RAW_NDARRAYS or dtype.hasobject or dtype.fields is not None:
+        return _encode_npy(arr)
+    descr = dtype.str.encode('ascii')
+    header = _RAW_HEADER.pack(RAW_CODEC_VERSION, arr.ndim, len(descr))
+    header += descr + struct.pack('<%dq' % (arr.ndim,), *arr.shape)
+    header += b'\x00' * (-len(header) % _RAW_ALIGN)
+    # np.require keeps 0-d arrays 0-d, unlike np.ascontiguousarray
+    data = np.require(arr, requirements='C')
+    return b''.join([header, data.data])
+
+
+def decode_ndarray(value):
+    """
+    Decodes a blob written by :func:`encode_ndarray` or by ``np.save``
+
+    Raw blobs are decoded with ``np.frombuffer`` instead of being parsed and
+    unpickled. The data is copied once out of ``value``, so like arrays read
+    from ``np.save`` blobs the result is writable and owns its memory.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.types import *  # NOQA
+        >>> import io
+        >>> arr = np.random.rand(5, 128).astype(np.uint8)
+        >>> out = io.BytesIO()
+        >>> np.save(out, arr)
+        >>> legacy_blob = out.getvalue()
+        >>> assert np.all(decode_ndarray(legacy_blob) == arr)
+        >>> raw = decode_ndarray(encode_ndarray(arr))
+        >>> assert np.all(raw == arr) and raw.flags.writeable
+        >>> empty = decode_ndarray(encode_ndarray(np.empty((0, 6), np.float32)))
+        >>> print(empty.shape, empty.dtype)
+        (0, 6) float32
+        >>> print(repr(decode_ndarray(encode_ndarray(np.int16(-7)))))
+        array(-7, dtype=int16)
+    """
+    version = value[0]
+    if version == RAW_CODEC_VERSION:
+        _, ndim, descr_len = _RAW_HEADER.unpack_from(value, 0)
+        offset = _RAW_HEADER.size
+        descr = bytes(value[offset : offset + descr_len]).decode('ascii')
+        offset += descr_len
+        shape = struct.unpack_from('<%dq' % (ndim,), value, offset)
+        offset += 8 * ndim
+        offset += -offset % _RAW_ALIGN
+        count = int(np.prod(shape, dtype=np.int64))
+        arr = np.frombuffer(value, dtype=np.dtype(descr), count=count, offset=offset)
+        # frombuffer views of the immutable blob are read-only, callers modify
+        # the decoded arrays in place
+        return arr.reshape(shape).copy()
+    elif version == NPY_MAGIC_PREFIX[0]:
+        return _decode_npy(value)
+    else:
+        raise ValueError('Unknown ndarray blob version={!r}'.format(version))
+
+
+def is_legacy_ndarray_blob(value):
+    """True if the blob was written by ``np.save`` instead of the raw codec"""
+    return value is not None and bytes(value[: len(NPY_MAGIC_PREFIX)]) == NPY_MAGIC_PREFIX
+
+
 class NumPyPicklableType(UserDefinedType):
 
     # Abstract properties
@@ -88,10 +204,7 @@ class NumPyPicklableType(UserDefinedType):
                 return value
             else:
                 if isinstance(value, self.base_py_types):
-                    out = io.BytesIO()
-                    np.save(out, value)
-                    out.seek(0)
-                    return out.read()
+                    return encode_ndarray(value)
                 else:
                     return value
 
@@ -103,11 +216,7 @@ class NumPyPicklableType(UserDefinedType):
                 return value
             else:
                 if not isinstance(value, self.base_py_types):
-                    out = io.BytesIO(value)
-                    out.seek(0)
-                    arr = np.load(out, allow_pickle=True)
-                    out.close()
-                    return arr
+                    return decode_ndarray(value)
                 else:
                     return value
 
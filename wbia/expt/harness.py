@@ -3,12 +3,18 @@
 Runs many queries and keeps track of some results
 """
 import logging
+import multiprocessing
+import os
+import pickle
 import sys
+import tempfile
 import textwrap
 
 import numpy as np  # NOQA
 import utool as ut
 
+from wbia.algo.hots import pipeline
+from wbia.dtool import executors
 from wbia.expt import experiment_helpers, test_result
 
 print, rrr, profile = ut.inject2(__name__)
@@ -27,6 +33,11 @@ TEST_INFO = True
 
 # dont actually query. Just print labels and stuff
 DRY_RUN = ut.get_argflag(('--dryrun', '--dry'))
+#: Whether pipeline configs that compute the same nearest neighbors share them
+SHARE_NEIGHBORS = not ut.get_argflag('--no-share-neighbors')
+#: Number of processes that run the configs sharing the neighbors of a group
+#: (None or 1 runs them in the calling process)
+PIPE_WORKERS = ut.get_argval('--pipe-workers', type_=int, default=None)
 
 
 def run_expt(
@@ -168,10 +179,29 @@ def make_single_testres(
     testnameid,
     use_cache=None,
     subindexer_partial=ut.ProgIter,
+    share_neighbors=None,
+    pipe_workers=None,
 ):
     """
+    Runs each pipeline config on the same query and database annotations.
+
+    Configs that only differ after the nearest neighbor step (e.g. in their
+    weighting, spatial verification or scoring params) are grouped, see
+    group_pipecfgs. The first config of a group computes the neighbors and
+    the others reuse them through a NeighborShare, so a sweep over those
+    params costs about one nearest neighbor pass. Results stay in the order
+    of pipecfg_list.
+
+    Args:
+        share_neighbors (bool): group configs by their nearest neighbors
+            (default = not --no-share-neighbors)
+        pipe_workers (int): number of processes that run the remaining
+            configs of a group once its neighbors are computed
+            (default = --pipe-workers or serial)
+
     CommandLine:
         python -m wbia run_expt
+        python -m wbia run_expt --pipe-workers=4
     """
     cfgslice = None
     if cfgslice is not None:
@@ -212,13 +242,89 @@ def make_single_testres(
         # HACK
         prev_feat_cfgstr = None
 
-    cfgx2_cmsinfo = []
+    if share_neighbors is None:
+        share_neighbors = SHARE_NEIGHBORS
+    if pipe_workers is None:
+        pipe_workers = PIPE_WORKERS
+    if share_neighbors and not DRY_RUN:
+        cfgx_groups = group_pipecfgs(cfgx2_qreq_)
+    else:
+        cfgx_groups = [[cfgx] for cfgx in range(len(cfgx2_qreq_))]
+    cfgx2_group = {cfgx: group for group in cfgx_groups for cfgx in group}
+    if ut.NOT_QUIET and len(cfgx_groups) < len(cfgx2_qreq_):
+        logger.info(
+            '[harn] {} share nearest neighbors in {}'.format(
+                ut.quantstr('pipeline config', len(cfgx2_qreq_)),
+                ut.quantstr('group', len(cfgx_groups)),
+            )
+        )
+    if pipe_workers is None or len(cfgx_groups) == len(cfgx2_qreq_):
+        pipe_workers = 1
+    if multiprocessing.current_process().daemon:
+        # Daemon processes (e.g. pool workers) cannot start a pool
+        pipe_workers = 1
+    if pipe_workers <= 1:
+        executor = executors.make_executor('serial')
+    else:
+        # Each pipe worker opens the database once and keeps the indexer of
+        # its current group, the tasks only carry the config and the neighbors
+        executor = executors.make_executor(
+            'process',
+            max_workers=pipe_workers,
+            initializer=_init_pipe_worker,
+            initargs=(ibs.get_dbdir(),),
+        )
+
+    # Pipe workers can finish configs out of order, so results are stored by
+    # index. Nothing is kept in memory savings mode.
+    cfgx2_cmsinfo = [] if NOMEMORY else [None] * len(cfgx2_qreq_)
+
+    def _store_cmsinfo(cfgx, cmsinfo, save_cache):
+        if save_cache:
+            st_cfgstr = cfgx2_qreq_[cfgx].get_cfgstr(with_input=True)
+            ut.save_cache(st_cachedir, st_cachename, st_cfgstr, cmsinfo)
+        if not NOMEMORY:
+            # Store the results
+            cfgx2_cmsinfo[cfgx] = cmsinfo
+        else:
+            cfgx2_qreq_[cfgx] = None
+
+    # Configs of the current group that wait for the pipe workers
+    deferred_cfgxs = []
+
+    def _finish_group():
+        if deferred_cfgxs:
+            # The neighbors go to each pipe worker once through a file,
+            # instead of being pickled with every task
+            share_fpath = _dump_neighbor_share(neighbor_share)
+            try:
+                args_iter = (
+                    (qaids, daids, pipecfg_list[cfgx], share_fpath)
+                    for cfgx in deferred_cfgxs
+                )
+                cmsinfo_iter = executor.imap(_execute_pipecfg_worker, args_iter)
+                for cfgx, cmsinfo in zip(deferred_cfgxs, cmsinfo_iter):
+                    _store_cmsinfo(cfgx, cmsinfo, use_cache)
+            finally:
+                ut.delete(share_fpath, verbose=False)
+        del deferred_cfgxs[:]
+        if neighbor_share is not None:
+            if ut.NOT_QUIET:
+                logger.info('[harn] {}'.format(neighbor_share))
+            neighbor_share.clear()
+
+    neighbor_share = None
     cfgiter = subindexer_partial(
-        range(len(cfgx2_qreq_)), lbl='pipe config', freq=1, adjust=False
+        ut.flatten(cfgx_groups), lbl='pipe config', freq=1, adjust=False
     )
     # Run each pipeline configuration
     for cfgx in cfgiter:
         qreq_ = cfgx2_qreq_[cfgx]
+        group = cfgx2_group[cfgx]
+        if cfgx == group[0]:
+            # The first config of a group computes the shared neighbors
+            _finish_group()
+            neighbor_share = pipeline.NeighborShare() if len(group) > 1 else None
         cprint = ut.colorprint
         cprint('testnameid={!r}'.format(testnameid), 'green')
         cprint(
@@ -255,7 +361,13 @@ def make_single_testres(
                     _need_compute = True
                 else:
                     _need_compute = False
-            if _need_compute:
+            if not _need_compute:
+                _store_cmsinfo(cfgx, cmsinfo, False)
+            elif pipe_workers > 1 and len(neighbor_share or []) > 0:
+                # The neighbors are computed, the other steps of the group
+                # can run in the pipe workers
+                deferred_cfgxs.append(cfgx)
+            else:
                 assert not ibs.table_cache
                 if ibs.table_cache:
                     if len(
@@ -265,18 +377,13 @@ def make_single_testres(
                         # Clear features to preserve memory
                         ibs.clear_table_cache()
                         # qreq_.ibs.print_cachestats_str()
-                cm_list = qreq_.execute()
-                cmsinfo = test_result.build_cmsinfo(cm_list, qreq_)
+                cmsinfo = _execute_pipecfg(qreq_, neighbor_share)
                 # record previous feature configuration
                 if ibs.table_cache:
                     prev_feat_cfgstr = qreq_.qparams.feat_cfgstr
-                if use_cache:
-                    ut.save_cache(st_cachedir, st_cachename, st_cfgstr, cmsinfo)
-        if not NOMEMORY:
-            # Store the results
-            cfgx2_cmsinfo.append(cmsinfo)
-        else:
-            cfgx2_qreq_[cfgx] = None
+                _store_cmsinfo(cfgx, cmsinfo, use_cache)
+    _finish_group()
+    executor.shutdown()
     if ut.NOT_QUIET:
         ut.colorprint('[harn] Completed running test configurations', 'white')
     if DRY_RUN:
@@ -299,3 +406,88 @@ def make_single_testres(
             if ut.SUPER_STRICT:
                 raise
     return testres
+
+
+def group_pipecfgs(cfgx2_qreq_):
+    """
+    Groups the indices of the query requests that compute the same nearest
+    neighbors (see pipeline.nearest_neighbor_groupid). Requests that cannot
+    share neighbors are in groups of their own.
+
+    Returns:
+        list: cfgx_groups - config indices ordered by first appearance
+    """
+    groupid_to_cfgxs = {}
+    for cfgx, qreq_ in enumerate(cfgx2_qreq_):
+        groupid = pipeline.nearest_neighbor_groupid(qreq_)
+        key = ('cfgx', cfgx) if groupid is None else groupid
+        groupid_to_cfgxs.setdefault(key, []).append(cfgx)
+    return list(groupid_to_cfgxs.values())
+
+
+def _execute_pipecfg(qreq_, neighbor_share):
+    """
+    Executes qreq_ with the neighbors of its group and returns the cmsinfo.
+    """
+    qreq_.neighbor_share = neighbor_share
+    try:
+        cm_list = qreq_.execute()
+        return test_result.build_cmsinfo(cm_list, qreq_)
+    finally:
+        qreq_.neighbor_share = None
+
+
+# Database, indexer and neighbors of a pipe worker process, set by
+# _init_pipe_worker
+_PIPE_WORKER_STATE = {}
+
+
+def _init_pipe_worker(dbdir):
+    """
+    Initializer of the pipe worker processes. The database is opened once per
+    worker, instead of once per task by unpickling a query request.
+    """
+    import wbia
+
+    _PIPE_WORKER_STATE['ibs'] = wbia.opendb(dbdir=dbdir, web=False)
+    _PIPE_WORKER_STATE['indexer'] = (None, None)
+    _PIPE_WORKER_STATE['neighbor_share'] = (None, None)
+
+
+def _dump_neighbor_share(neighbor_share):
+    """Writes the neighbors of a group to a file read by the pipe workers"""
+    fd, share_fpath = tempfile.mkstemp(prefix='wbia_neighbor_share_', suffix='.pkl')
+    with os.fdopen(fd, 'wb') as file_:
+        pickle.dump(neighbor_share, file_, protocol=pickle.HIGHEST_PROTOCOL)
+    return share_fpath
+
+
+def _load_neighbor_share(share_fpath):
+    """Reads the neighbors of a group once per pipe worker"""
+    loaded_fpath, neighbor_share = _PIPE_WORKER_STATE['neighbor_share']
+    if loaded_fpath != share_fpath:
+        # Drop the neighbors of the previous group before loading
+        _PIPE_WORKER_STATE['neighbor_share'] = (None, None)
+        with open(share_fpath, 'rb') as file_:
+            neighbor_share = pickle.load(file_)
+        _PIPE_WORKER_STATE['neighbor_share'] = (share_fpath, neighbor_share)
+    return neighbor_share
+
+
+def _execute_pipecfg_worker(qaids, daids, pipe_cfg, share_fpath):
+    """
+    Executes a pipeline config in a pipe worker. The query request is built
+    against the database of the worker and the configs of a group reuse the
+    indexer loaded by the first one and the neighbors in share_fpath.
+    """
+    ibs = _PIPE_WORKER_STATE['ibs']
+    neighbor_share = _load_neighbor_share(share_fpath)
+    qreq_ = ibs.new_query_request(qaids, daids, verbose=False, query_cfg=pipe_cfg)
+    groupid = pipeline.nearest_neighbor_groupid(qreq_)
+    indexer_groupid, indexer = _PIPE_WORKER_STATE['indexer']
+    if groupid is not None and groupid == indexer_groupid:
+        qreq_.indexer = indexer
+    else:
+        qreq_.load_indexer(verbose=False)
+        _PIPE_WORKER_STATE['indexer'] = (groupid, qreq_.indexer)
+    return _execute_pipecfg(qreq_, neighbor_share)
@@ -9802,7 +9802,7 @@ def nms_boxes(
     verbose=False,
     **kwargs
 ):
-    from wbia.other import detectcore
+    from wbia.algo.detect.nms import batched_nms
 
     count_old = len(bboxes)
     if count_old > 0:
@@ -9859,7 +9859,28 @@ def nms_boxes(
             }
             nms_dict[nms_key] = nms_values
 
-        for nms_key in nms_dict:
+        # Suppress the boxes of all nms_keys in one call
+        nms_key_list = list(nms_dict.keys())
+        coord_list = []
+        group_list = []
+        for group, nms_key in enumerate(nms_key_list):
+            nms_bboxes = nms_dict[nms_key]['bboxes']
+            assert len(nms_bboxes) > 0
+            nms_bboxes = np.asarray(nms_bboxes)
+            coord_list.append(
+                np.hstack((nms_bboxes[:, 0:2], nms_bboxes[:, 0:2] + nms_bboxes[:, 2:4]))
+            )
+            group_list.append(np.full(len(nms_bboxes), group))
+        coords = np.vstack(coord_list)
+        groups = np.hstack(group_list)
+        group_offsets = np.cumsum([0] + [len(coord) for coord in coord_list])
+        confs_list = np.hstack([nms_dict[nms_key]['confs'] for nms_key in nms_key_list])
+        nms_thresh = 1.0 - nms_thresh
+        keep_all = batched_nms.batched_nms(
+            coords, confs_list, nms_thresh, groups=groups
+        )
+
+        for group, nms_key in enumerate(nms_key_list):
             nms_values = nms_dict[nms_key]
 
             nms_indices = nms_values['indices']
@@ -9869,19 +9890,7 @@ def nms_boxes(
             nms_classes = nms_values['classes']
 
             nms_count_old = len(nms_bboxes)
-            assert nms_count_old > 0
-
-            coord_list = []
-            for (xtl, ytl, width, height) in nms_bboxes:
-                xbr = xtl + width
-                ybr = ytl + height
-                coord_list.append([xtl, ytl, xbr, ybr])
-            coord_list = np.vstack(coord_list)
-            confs_list = np.array(nms_confs)
-
-            nms_thresh = 1.0 - nms_thresh
-            keep_indices_list = detectcore.nms(coord_list, confs_list, nms_thresh)
-            keep_list = np.array(keep_indices_list)
+            keep_list = keep_all[groups[keep_all] == group] - group_offsets[group]
 
             if len(keep_list) == 0:
                 nms_indices = np.array([])
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def benchmark_image_ingest(num_images=200, width=2048, height=1536, max_workers=None):
+    r"""
+    Reports the images per second parsed by the ingestion step of add_images
+    (parse_imageinfo) with a full decode, with header-only parsing in the
+    calling process and with header-only parsing in a process pool, on
+    synthetic JPEGs with EXIF tags.
+
+    CommandLine:
+        python -m wbia.tests.control.bench benchmark_image_ingest
+        python -m wbia.tests.control.bench benchmark_image_ingest --num_images=2000
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.control.bench import *  # NOQA
+        >>> num_images = ut.get_argval('--num_images', default=200)
+        >>> result = benchmark_image_ingest(num_images)
+        >>> print(ut.repr2(result, precision=1))
+    """
+    import tempfile
+    from os.path import join
+
+    import numpy as np
+    from PIL import Image
+
+    from wbia.algo.preproc import preproc_image
+
+    rng = np.random.RandomState(0)
+    # Smooth random pixels, so the JPEGs have a realistic size
+    small = (rng.rand(height // 16, width // 16, 3) * 255).astype(np.uint8)
+    pil_img = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    exif = Image.Exif()
+    exif[0x0132] = '2020:01:01 12:00:00'
+    with tempfile.TemporaryDirectory() as dpath:
+        gpath_list = []
+        for index in range(num_images):
+            gpath = join(dpath, 'img_%05d.jpg' % (index,))
+            pil_img.save(gpath, quality=90, exif=exif)
+            gpath_list.append(gpath)
+
+        def full_decode():
+            return [preproc_image.parse_imageinfo(gpath) for gpath in gpath_list]
+
+        def header_serial():
+            return preproc_image.parse_imageinfo_list(gpath_list, max_workers=1)
+
+        def header_pool():
+            return preproc_image.parse_imageinfo_list(
+                gpath_list, max_workers=max_workers
+            )
+
+        result = {}
+        expected = None
+        for name, func in [
+            ('full_decode', full_decode),
+            ('header_serial', header_serial),
+            ('header_pool', header_pool),
+        ]:
+            start = time.time()
+            params_list = func()
+            ellapsed = time.time() - start
+            if expected is None:
+                expected = params_list
+            assert params_list == expected
+            result[name] = {'images_per_sec': num_images / ellapsed}
+    return result
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m wbia.tests.control.bench
+    """
+    import xdoctest
+
+    xdoctest.doctest_module(__file__)
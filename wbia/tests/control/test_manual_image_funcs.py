@@ -133,3 +133,55 @@ def test_localize_images(request):
     assert ibs.set_image_uris.call_args_list == [
         mock.call([1, 2], [f'{image_uuid}.png' for image_uuid in IMAGE_UUIDS]),
     ]
+
+
+def _write_test_images(dpath):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.RandomState(0)
+    pixels = (rng.rand(60, 80, 3) * 255).astype(np.uint8)
+    rgb = Image.fromarray(pixels)
+    rotated_exif = Image.Exif()
+    rotated_exif[0x0112] = 6
+    rgb.save(dpath / 'plain.jpg')
+    rgb.save(dpath / 'plain.png')
+    rgb.save(dpath / 'rotated.jpg', exif=rotated_exif)
+    rgb.putalpha(128)
+    rgb.save(dpath / 'alpha.png')
+    data = (dpath / 'plain.jpg').read_bytes()
+    (dpath / 'truncated.jpg').write_bytes(data[: len(data) // 2])
+    return ['plain.jpg', 'plain.png', 'rotated.jpg', 'alpha.png', 'truncated.jpg']
+
+
+def test_compute_image_uuids_header_only(tmp_path):
+    import shutil
+
+    from wbia.control.manual_image_funcs import _compute_image_uuids
+
+    ibs = mock.Mock(force_serial=False)
+    names = _write_test_images(tmp_path)
+    results = {}
+    for header_only in [False, True]:
+        dpath = tmp_path / str(header_only)
+        dpath.mkdir()
+        gpath_list = []
+        for name in names:
+            shutil.copy(str(tmp_path / name), str(dpath / name))
+            gpath_list.append(str(dpath / name))
+        params_list = _compute_image_uuids(ibs, gpath_list, header_only=header_only)
+        # Drop the paths, they differ between the two directories
+        results[header_only] = [
+            None if params is None else params[:1] + params[3:]
+            for _, params in params_list
+        ]
+        if header_only:
+            # Rotated and RGBA images were normalized on disk as before
+            for name in names:
+                assert (dpath / name).read_bytes() == (
+                    tmp_path / 'False' / name
+                ).read_bytes()
+    assert results[True] == results[False]
+    # The rotated image was decoded and rewritten upright
+    assert results[True][2][3:5] == (60, 80)
+    assert results[True][2][-2] == 1
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from wbia.control.accessor_decors import TableCache
+
+
+def test_table_cache_concurrent_access():
+    # A small cache makes the threads evict each other's entries while they
+    # read, which corrupted the LRU order without the lock
+    cache = TableCache(max_size=16)
+    num_threads = 8
+    num_rounds = 200
+    rowid_list = list(range(32))
+    errors = []
+
+    def worker(colx):
+        colname = 'col%d' % (colx,)
+        try:
+            for _ in range(num_rounds):
+                cache.set_many('tbl', colname, None, 0, rowid_list, rowid_list)
+                vals_list = cache.get_many('tbl', colname, None, 0, rowid_list)
+                for rowid, val in zip(rowid_list, vals_list):
+                    assert val is None or val == rowid
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=worker, args=(x,)) for x in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stats = cache.get_stats()
+    assert stats['hits'] + stats['misses'] == num_threads * num_rounds * len(rowid_list)
+    assert stats['size'] <= cache.max_size
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _best_time(func, num_repeat):
+    best = float('inf')
+    for _ in range(num_repeat):
+        start = time.time()
+        func()
+        best = min(best, time.time() - start)
+    return best
+
+
+def benchmark_batched_nms(
+    num_images=200, num_dets=300, num_classes=4, thresh=0.2, num_repeat=3
+):
+    r"""
+    Compares one batched_nms call over all images and classes with the old
+    greedy Python loop (the body of py_cpu_nms before batched_nms) called for
+    every image and class, on synthetic tiled detections.
+
+    CommandLine:
+        python -m wbia.tests.detect.bench benchmark_batched_nms
+        python -m wbia.tests.detect.bench benchmark_batched_nms --num_dets=2000
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.detect.bench import *  # NOQA
+        >>> num_dets = ut.get_argval('--num_dets', default=300)
+        >>> result = benchmark_batched_nms(num_dets=num_dets)
+        >>> print(ut.repr2(result, precision=4))
+    """
+    from wbia.algo.detect.nms.batched_nms import batched_nms
+    from wbia.tests.detect.test_nms import _reference_nms
+
+    rng = np.random.RandomState(0)
+    # Tiled detectors produce many overlapping boxes around each object
+    num = num_images * num_dets
+    centers = rng.randint(0, 2000, size=(num // 10, 2)).repeat(10, axis=0)
+    xy = centers + rng.randint(-20, 20, size=(num, 2))
+    wh = rng.randint(40, 120, size=(num, 2))
+    dets = np.hstack((xy, xy + wh)).astype(np.float64)
+    scores = rng.rand(num)
+    image_ids = np.arange(num) // num_dets
+    class_ids = rng.randint(0, num_classes, size=num)
+    groups = image_ids * num_classes + class_ids
+    group_idxs = [np.flatnonzero(groups == group) for group in np.unique(groups)]
+
+    def loop():
+        return [
+            idxs[_reference_nms(dets[idxs], scores[idxs], thresh)]
+            for idxs in group_idxs
+        ]
+
+    def batched():
+        return batched_nms(dets, scores, thresh, groups)
+
+    assert np.all(np.hstack(loop()) == batched())
+    loop_sec = _best_time(loop, num_repeat)
+    batched_sec = _best_time(batched, num_repeat)
+    result = {
+        'num_boxes': num,
+        'num_groups': len(group_idxs),
+        'loop_sec': loop_sec,
+        'batched_sec': batched_sec,
+        'speedup': loop_sec / batched_sec,
+    }
+    return result
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m wbia.tests.detect.bench
+    """
+    import xdoctest
+
+    xdoctest.doctest_module(__file__)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _reference_nms(dets, scores, thresh):
+    """The greedy loop py_cpu_nms used before batched_nms"""
+    x1, y1, x2, y2 = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[np.where(ovr <= thresh)[0] + 1]
+    return keep
+
+
+def _random_dets(rng, num):
+    xy = rng.randint(0, 200, size=(num, 2)).astype(np.float64)
+    wh = rng.randint(5, 60, size=(num, 2)).astype(np.float64)
+    return np.hstack((xy, xy + wh)), rng.rand(num)
+
+
+def test_batched_nms_matches_reference():
+    from wbia.algo.detect.nms.batched_nms import batched_nms
+
+    rng = np.random.RandomState(0)
+    for trial in range(30):
+        num = rng.randint(1, 400)
+        dets, scores = _random_dets(rng, num)
+        groups = rng.randint(0, rng.randint(1, 6), size=num)
+        thresh = rng.choice([0.0, 0.2, 0.5, 0.8])
+        block_size = rng.choice([1, 7, 64, 256])
+        keep = batched_nms(dets, scores, thresh, groups, block_size=block_size)
+        for group in np.unique(groups):
+            idxs = np.flatnonzero(groups == group)
+            expected = idxs[_reference_nms(dets[idxs], scores[idxs], thresh)]
+            assert keep[groups[keep] == group].tolist() == expected.tolist()
+        # Without groups every box can suppress every other box
+        keep = batched_nms(dets, scores, thresh, block_size=block_size)
+        assert keep.tolist() == list(_reference_nms(dets, scores, thresh))
+
+
+def test_batched_nms_empty():
+    from wbia.algo.detect.nms.batched_nms import batched_nms, batched_soft_nms
+
+    dets = np.zeros((0, 4))
+    scores = np.zeros(0)
+    assert batched_nms(dets, scores, 0.5).tolist() == []
+    keep, new_scores = batched_soft_nms(dets, scores)
+    assert keep.tolist() == [] and new_scores.tolist() == []
+
+
+def test_batched_soft_nms():
+    from wbia.algo.detect.nms.batched_nms import batched_soft_nms
+
+    rng = np.random.RandomState(1)
+    dets, scores = _random_dets(rng, 200)
+    groups = rng.randint(0, 3, size=200)
+    keep, new_scores = batched_soft_nms(dets, scores, groups, score_thresh=0)
+    # Without a score threshold soft-NMS keeps every box and never raises a score
+    assert sorted(keep.tolist()) == list(range(200))
+    assert np.all(new_scores <= scores[keep] + 1e-12)
+    # The best box of every group keeps its score
+    for group in np.unique(groups):
+        idxs = np.flatnonzero(groups == group)
+        best = idxs[scores[idxs].argmax()]
+        assert new_scores[keep.tolist().index(best)] == scores[best]
+    # Boxes that do not overlap anything keep their scores
+    dets = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]])
+    keep, new_scores = batched_soft_nms(dets, np.array([0.2, 0.9, 0.5]))
+    assert keep.tolist() == [1, 2, 0]
+    assert new_scores.tolist() == [0.9, 0.5, 0.2]
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from os.path import join
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _time_per_item(func, items, num_repeat):
+    best = float('inf')
+    for _ in range(num_repeat):
+        start = time.time()
+        for item in items:
+            func(item)
+        best = min(best, time.time() - start)
+    return best
+
+
+def benchmark_ndarray_codec(ibs=None, tablenames=('feat', 'featweight'), num_repeat=3):
+    r"""
+    Compares the ``np.save`` codec with the raw ndarray codec on the arrays
+    stored in the feat and featweight depcache tables.
+
+    CommandLine:
+        python -m wbia.tests.dtool.bench benchmark_ndarray_codec --db PZ_MTEST
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.dtool.bench import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb(defaultdb='testdb1')
+        >>> results = benchmark_ndarray_codec(ibs)
+        >>> print(ut.repr4(results, precision=2))
+    """
+    import wbia
+    from wbia.dtool import types
+
+    if ibs is None:
+        ibs = wbia.opendb(defaultdb='testdb1')
+    aid_list = ibs.get_valid_aids()
+    # Make sure the tables are populated
+    ibs.depc_annot.get('featweight', aid_list, 'fwg')
+
+    results = {}
+    for tablename in tablenames:
+        table = ibs.depc_annot[tablename]
+        colnames = [
+            column.name
+            for column in table.db.get_columns(tablename)
+            if str(column.type_).upper() in ('NDARRAY', 'NUMPY')
+        ]
+        for colname in colnames:
+            arrs = [
+                arr
+                for arr in table.db.get_column(tablename, colname)
+                if arr is not None
+            ]
+            nbytes = sum(arr.nbytes for arr in arrs)
+            megabytes = nbytes / 2.0 ** 20
+
+            npy_blobs = [types._encode_npy(arr) for arr in arrs]
+            raw_blobs = [types.encode_ndarray(arr) for arr in arrs]
+
+            timings = {
+                'write_npy': _time_per_item(types._encode_npy, arrs, num_repeat),
+                'write_raw': _time_per_item(types.encode_ndarray, arrs, num_repeat),
+                'read_npy': _time_per_item(types.decode_ndarray, npy_blobs, num_repeat),
+                'read_raw': _time_per_item(types.decode_ndarray, raw_blobs, num_repeat),
+            }
+            key = '{}.{}'.format(tablename, colname)
+            results[key] = {
+                'num_rows': len(arrs),
+                'MB': megabytes,
+                # Throughput in MB/s
+                **{
+                    name + '_MBps': megabytes / max(duration, 1e-9)
+                    for name, duration in timings.items()
+                },
+            }
+            print(
+                '{}: {} rows, {:.1f} MB, read npy={:.1f} raw={:.1f} MB/s, '
+                'write npy={:.1f} raw={:.1f} MB/s'.format(
+                    key,
+                    len(arrs),
+                    megabytes,
+                    results[key]['read_npy_MBps'],
+                    results[key]['read_raw_MBps'],
+                    results[key]['write_npy_MBps'],
+                    results[key]['write_raw_MBps'],
+                )
+            )
+    return results
+
+
+def benchmark_bulk_get(
+    sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6), colnames=('x', 'y'), uri=None
+):
+    r"""
+    Compares ``SQLDatabaseController.get_by_rowids`` with the generic
+    ``SQLDatabaseController.get`` path when fetching columns by rowid.
+
+    The requested ids are a random sample (with duplicates) of the table rows.
+
+    CommandLine:
+        python -m wbia.tests.dtool.bench benchmark_bulk_get
+        python -m wbia.tests.dtool.bench benchmark_bulk_get --db-uri postgresql://wbia@localhost/wbia
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.dtool.bench import *  # NOQA
+        >>> results = benchmark_bulk_get(sizes=[10 ** 3, 10 ** 4])
+        >>> print(ut.repr4(results, precision=3))
+    """
+    import numpy as np
+    from sqlalchemy.sql import text
+
+    from wbia.dtool.sql_control import SQLDatabaseController
+
+    if uri is None:
+        uri = ut.get_argval('--db-uri', type_=str, default=None)
+    if uri is None:
+        dpath = ut.ensure_app_resource_dir('dtool', 'bench_bulk_get')
+        fpath = join(dpath, 'bench.sqlite')
+        ut.delete(fpath)
+        uri = 'sqlite:///{}'.format(fpath)
+    db = SQLDatabaseController(uri, 'bench_bulk_get')
+    tablename = 'bench_bulk_get'
+    db.executeone(text('DROP TABLE IF EXISTS {}'.format(tablename)))
+    db.executeone(
+        text(
+            'CREATE TABLE {} (rowid INTEGER PRIMARY KEY, x TEXT, y INTEGER, z REAL)'.format(
+                tablename
+            )
+            if db.is_using_postgres
+            else 'CREATE TABLE {} (x TEXT, y INTEGER, z REAL)'.format(tablename)
+        )
+    )
+    db.invalidate_tables_cache()
+
+    num_rows = max(sizes)
+    rng = np.random.RandomState(0)
+    with db.connect() as conn:
+        with conn.begin():
+            insert = text(
+                'INSERT INTO {} (x, y, z) VALUES (:x, :y, :z)'.format(tablename)
+            )
+            conn.execute(
+                insert,
+                [{'x': str(i), 'y': i, 'z': i * 0.5} for i in range(num_rows)],
+            )
+
+    # Warm up the reflected table and the cached statements
+    db.get(tablename, colnames, [1], bulk=False)
+    db.get_by_rowids(tablename, colnames, [1])
+
+    results = {}
+    for size in sizes:
+        rowids = (rng.randint(1, num_rows + 1, size=size)).tolist()
+        timings = {}
+        for key, func in [
+            ('generic', lambda: db.get(tablename, colnames, rowids, bulk=False)),
+            ('bulk', lambda: db.get_by_rowids(tablename, colnames, rowids)),
+        ]:
+            start = time.time()
+            data = func()
+            timings[key] = time.time() - start
+            timings[key + '_len'] = len(data)
+        assert timings['generic_len'] == timings['bulk_len'] == size
+        results[size] = {
+            'generic_sec': timings['generic'],
+            'bulk_sec': timings['bulk'],
+            'speedup': timings['generic'] / max(timings['bulk'], 1e-9),
+        }
+        print(
+            'size={}: generic={:.3f}s bulk={:.3f}s speedup={:.1f}x'.format(
+                size,
+                timings['generic'],
+                timings['bulk'],
+                results[size]['speedup'],
+            )
+        )
+    db.executeone(text('DROP TABLE IF EXISTS {}'.format(tablename)))
+    return results
+
+
+def benchmark_stage_overhead(num_stages=10 ** 6):
+    r"""
+    Reports the nanoseconds per ``tracing.stage`` block without sinks, with a
+    StageRecorder and around an empty block for reference.
+
+    CommandLine:
+        python -m wbia.tests.dtool.bench benchmark_stage_overhead
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.dtool.bench import *  # NOQA
+        >>> result = benchmark_stage_overhead()
+        >>> print(ut.repr2(result, precision=1))
+    """
+    from wbia.dtool import tracing
+
+    def empty(item):
+        pass
+
+    def traced(item):
+        with tracing.stage('bench.stage'):
+            pass
+
+    items = range(num_stages)
+    result = {
+        'empty_ns': _time_per_item(empty, items, 3),
+        'disabled_ns': _time_per_item(traced, items, 3),
+    }
+    with tracing.record_stages():
+        result['recorded_ns'] = _time_per_item(traced, items, 1)
+    return {key: 1e9 * value / num_stages for key, value in result.items()}
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m wbia.tests.dtool.bench <benchmark_funcname>
+    """
+    import sys
+
+    globals()[sys.argv[1]]()
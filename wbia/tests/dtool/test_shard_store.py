@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import os
+from os.path import join
+
+import numpy as np
+import pytest
+
+from wbia.dtool.shard_store import ShardedArrayType, release_memmaps
+
+
+def _rows(value, num_rows=3):
+    return np.full((num_rows, 4), value, dtype=np.uint8)
+
+
+def test_recreated_shard_is_mapped_again(tmp_path):
+    dpath = str(tmp_path)
+    coltype = ShardedArrayType(np.uint8, (4,))
+    uri = coltype.append(dpath, 'feat_vecs_abc', _rows(1))
+    assert np.all(coltype.read_func(join(dpath, uri)) == 1)
+    # The shard is deleted and recreated with other rows at the same offsets
+    os.remove(join(dpath, uri.split('#')[0]))
+    assert coltype.append(dpath, 'feat_vecs_abc', _rows(2)) == uri
+    assert np.all(coltype.read_func(join(dpath, uri)) == 2)
+    release_memmaps(dpath)
+
+
+def test_remove_shards(tmp_path):
+    dpath = str(tmp_path)
+    coltype = ShardedArrayType(np.uint8, (4,), shard_nbytes=12)
+    uris = [coltype.append(dpath, 'feat_vecs_abc', _rows(x)) for x in range(3)]
+    other_uri = coltype.append(dpath, 'feat_kpts_abc', _rows(7))
+    assert uris[-1].startswith('feat_vecs_abc_shard0002.bin')
+    coltype.read_func(join(dpath, uris[0]))
+    coltype.remove_shards(dpath, 'feat_vecs_')
+    assert os.listdir(dpath) == ['feat_kpts_abc_shard0000.bin']
+    # New rows start again from the first shard
+    assert coltype.append(dpath, 'feat_vecs_abc', _rows(5)) == uris[0]
+    assert np.all(coltype.read_func(join(dpath, uris[0])) == 5)
+    assert np.all(coltype.read_func(join(dpath, other_uri)) == 7)
+    release_memmaps(dpath)
+
+
+@pytest.fixture
+def sharded_depc(tmp_path):
+    from wbia.dtool.example_depcache2 import _depc_factory
+
+    state = {'value': 1}
+    depc = _depc_factory('annot', str(tmp_path))
+
+    @depc.register_preproc(
+        tablename='vecs',
+        parents=['annot'],
+        colnames=['vecs'],
+        coltypes=[ShardedArrayType(np.uint8, (4,))],
+    )
+    def compute_vecs(depc, annot_rowids, config=None):
+        for rowid in annot_rowids:
+            yield (_rows(state['value'], num_rows=rowid),)
+
+    depc.initialize()
+    yield depc, state
+    release_memmaps()
+
+
+def test_clear_sharded_table(sharded_depc):
+    depc, state = sharded_depc
+    vecs_list = depc.get('vecs', [1, 2, 3], 'vecs')
+    assert [vecs.shape for vecs in vecs_list] == [(1, 4), (2, 4), (3, 4)]
+    assert all(np.all(vecs == 1) for vecs in vecs_list)
+    table = depc['vecs']
+    table.clear_table()
+    assert os.listdir(table.extern_dpath) == []
+    # Rows added after the clear read back their own data
+    state['value'] = 2
+    vecs_list = depc.get('vecs', [3, 1], 'vecs')
+    assert [vecs.shape for vecs in vecs_list] == [(3, 4), (1, 4)]
+    assert all(np.all(vecs == 2) for vecs in vecs_list)
@@ -847,6 +847,57 @@ class TestGettingAPI(BaseAPITestCase):
         # Verify getting
         assert data == expected
 
+    def test_get_by_rowids(self):
+        # Make a table for records
+        table_name = 'test_getting'
+        self.make_table(table_name)
+        self.populate_table(table_name)
+
+        # Call the testing target
+        # Duplicates, unordered, missing and None ids
+        requested_ids = [7, 2, 2, None, 99, 1, 7]
+        data = self.ctrlr.get_by_rowids(table_name, ('x', 'z'), requested_ids)
+
+        # Build the expect results of the testing target
+        with self.ctrlr.connect() as conn:
+            results = conn.execute(f'SELECT id, x, z FROM {table_name}')
+            row_mapping = {row[0]: tuple(row[1:]) for row in results}
+        expected = [row_mapping.get(id) for id in requested_ids]
+        # Verify getting
+        assert data == expected
+
+        # Duplicate column names are retained
+        data = self.ctrlr.get_by_rowids(table_name, ('y', 'y'), [3, 1])
+        assert data == [(2, 2), (0, 0)]
+
+    def test_get_by_rowids_matches_generic_get(self):
+        # Make a table for records
+        table_name = 'test_getting'
+        self.make_table(table_name)
+        self.populate_table(table_name)
+
+        requested_ids = np.array([4, 9, 4, 1, 11, 3])
+        for colnames in [('x',), ('y', 'x'), ('id',)]:
+            for kw in [{}, {'unpack_scalars': False}, {'keepwrap': True}]:
+                generic = self.ctrlr.get(
+                    table_name, colnames, requested_ids, bulk=False, **kw
+                )
+                bulk = self.ctrlr.get(table_name, colnames, requested_ids, **kw)
+                assert bulk == [
+                    tuple(v) if isinstance(v, sqlalchemy.engine.Row) else v
+                    for v in generic
+                ]
+
+    def test_get_by_rowids_in_batches(self):
+        # Make a table for records
+        table_name = 'test_getting'
+        self.make_table(table_name)
+        self.populate_table(table_name)
+
+        requested_ids = [10, 1, 5, 3, 3, 8]
+        data = self.ctrlr.get_by_rowids(table_name, ('y',), requested_ids, batch_size=2)
+        assert data == [9, 0, 4, 2, 2, 7]
+
 
 class TestSettingAPI(BaseAPITestCase):
     def test_setting(self):
@@ -934,3 +985,139 @@ class TestDeletionAPI(BaseAPITestCase):
         with self.ctrlr.connect() as conn:
             results = conn.execute(f'SELECT rowid FROM {table_name}')
             assert sorted(r[0] for r in results) == remaining_ids
+
+
+def test_pinned_request_connections(tmp_path):
+    import threading
+
+    from wbia.dtool import sql_control
+
+    db_file = (tmp_path / 'testing.db').resolve()
+    ctrlr = SQLDatabaseController(f'sqlite:///{db_file}', 'testing')
+    ctrlr._engine.execute('CREATE TABLE pinned (id INTEGER PRIMARY KEY, y INTEGER)')
+    insert_stmt = text('INSERT INTO pinned (y) VALUES (:y)')
+    select_stmt = text('SELECT y FROM pinned ORDER BY id')
+
+    def _worker(index, results):
+        sql_control.pin_request_connections()
+        try:
+            with ctrlr.connect() as conn1:
+                with ctrlr.connect() as conn2:
+                    same_conn = conn1 is conn2
+            ctrlr.executeone(insert_stmt, {'y': index})
+            with ctrlr.connect() as conn:
+                with conn.begin():
+                    # Inside a transaction a nested block gets a new connection
+                    with ctrlr.connect() as nested_conn:
+                        nested = nested_conn is not conn
+            results[index] = (same_conn, nested, ctrlr.executeone(select_stmt))
+        finally:
+            sql_control.release_request_connections()
+
+    results = {}
+    threads = [threading.Thread(target=_worker, args=(i, results)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [0, 1, 2, 3]
+    for index, (same_conn, nested, rows) in results.items():
+        assert same_conn and nested
+        assert index in rows
+    # Unpinned threads open a connection per block, as before
+    with ctrlr.connect() as conn1:
+        with ctrlr.connect() as conn2:
+            assert conn1 is not conn2
+    assert sorted(ctrlr.executeone(select_stmt)) == [0, 1, 2, 3]
+    assert not sql_control._PINNED_COUNTS
+
+
+def test_release_request_connections_rolls_back(tmp_path):
+    from wbia.dtool import sql_control
+
+    db_file = (tmp_path / 'testing.db').resolve()
+    ctrlr = SQLDatabaseController(f'sqlite:///{db_file}', 'testing')
+    ctrlr._engine.execute('CREATE TABLE pinned (id INTEGER PRIMARY KEY, y INTEGER)')
+    sql_control.pin_request_connections()
+    try:
+        with ctrlr.connect() as conn:
+            # A request that fails in the middle of a transaction
+            conn.begin()
+            conn.execute(text('INSERT INTO pinned (y) VALUES (1)'))
+    finally:
+        sql_control.release_request_connections()
+    assert conn.closed
+    assert ctrlr._engine.execute('SELECT COUNT(*) FROM pinned').scalar() == 0
+    assert not sql_control._PINNED_COUNTS
+
+
+def test_pinned_connections_are_capped(tmp_path):
+    import threading
+
+    from sqlalchemy.pool import QueuePool
+
+    from wbia.dtool import sql_control
+
+    db_file = (tmp_path / 'testing.db').resolve()
+    ctrlr = SQLDatabaseController(f'sqlite:///{db_file}', 'testing')
+    ctrlr._engine = sqlalchemy.create_engine(
+        f'sqlite:///{db_file}', poolclass=QueuePool, pool_size=2, max_overflow=4
+    )
+    pinned = threading.Barrier(4)
+    done = threading.Barrier(4)
+
+    def _worker(index, results):
+        sql_control.pin_request_connections()
+        try:
+            with ctrlr.connect() as conn1:
+                pass
+            with ctrlr.connect() as conn2:
+                pass
+            results[index] = conn1 is conn2
+            pinned.wait()
+            done.wait()
+        finally:
+            sql_control.release_request_connections()
+
+    results = {}
+    threads = [threading.Thread(target=_worker, args=(i, results)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    pinned.wait()
+    # Only pool_size connections are pinned, the third request is unpinned
+    assert sorted(results.values()) == [False, True, True]
+    assert sql_control._PINNED_COUNTS[id(ctrlr._engine)] == 2
+    done.wait()
+    for thread in threads:
+        thread.join()
+    assert not sql_control._PINNED_COUNTS
+
+
+def test_cache_version_seen_across_connections(tmp_path):
+    db_file = (tmp_path / 'testing.db').resolve()
+    reader = SQLDatabaseController(f'sqlite:///{db_file}', 'testing')
+    writer = SQLDatabaseController(f'sqlite:///{db_file}', 'testing')
+    assert reader.get_cache_version('dummy') == 0
+    # An unchanged database is not read again
+    executeone = reader.executeone
+    calls = []
+    reader.executeone = lambda *args, **kw: calls.append(args) or executeone(*args, **kw)
+    assert reader.get_cache_version('dummy') == 0
+    assert calls == []
+    writer.bump_cache_version('dummy')
+    assert reader.get_cache_version('dummy') == 1
+    assert len(calls) == 1
+    # Bumps made through the controller itself are seen as well
+    reader.bump_cache_version('dummy')
+    assert writer.get_cache_version('dummy') == 2
+    assert reader.get_cache_version('dummy') == 2
+
+
+def test_bump_cache_version_leaves_table_versions(ctrlr):
+    ctrlr.add_table(**make_table_definition('annotations'))
+    ctrlr.add_table(**make_table_definition('names'))
+    versions = [ctrlr.get_table_version(t) for t in ['annotations', 'names']]
+    ctrlr.bump_cache_version('names')
+    assert ctrlr.get_cache_version('names') == 1
+    assert ctrlr.get_cache_version('annotations') == 0
+    assert [ctrlr.get_table_version(t) for t in ['annotations', 'names']] == versions
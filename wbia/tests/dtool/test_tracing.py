@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from wbia.dtool import tracing
+
+
+def test_stages_without_sinks():
+    assert not tracing.is_enabled()
+    assert tracing.stage('query.knn') is tracing.NULL_STAGE
+    assert tracing.start('query.knn').stop() is None
+
+
+def test_record_stages():
+    with tracing.record_stages() as recorder:
+        assert tracing.is_enabled()
+        with tracing.stage('outer'):
+            timer = tracing.start('inner', 'detail')
+            seconds = timer.stop()
+        tracing.observe('wait', 2.0, 'slow')
+        with pytest.raises(ValueError):
+            with tracing.stage('failed'):
+                raise ValueError()
+    assert not tracing.is_enabled()
+    assert [obs[0:2] for obs in recorder.observations] == [
+        ['inner', 'detail'],
+        ['outer', ''],
+        ['wait', 'slow'],
+        ['failed', ''],
+    ]
+    assert recorder.observations[0][2] == seconds
+    assert recorder.totals()[('wait', 'slow')] == 2.0
+    with tracing.record_stages() as recorder:
+        tracing.observe('read', 1.0, 'chips')
+        tracing.observe('wait', 0.5)
+        tracing.observe('read', 2.0, 'chips')
+        tracing.observe('read', 4.0, 'feat')
+    assert recorder.total_observations() == [
+        ['read', 'chips', 3.0],
+        ['wait', '', 0.5],
+        ['read', 'feat', 4.0],
+    ]
+    with tracing.record_stages(enabled=False) as recorder:
+        tracing.observe('wait', 1.0)
+    assert recorder.observations == []
+
+
+def test_failing_sink():
+    def _sink(name, detail, seconds):
+        raise RuntimeError()
+
+    tracing.add_sink(_sink)
+    try:
+        with tracing.record_stages() as recorder:
+            tracing.observe('wait', 1.0)
+    finally:
+        tracing.remove_sink(_sink)
+    assert recorder.observations == [['wait', '', 1.0]]
+
+
+def test_depcache_stages():
+    from wbia.dtool.example_depcache2 import testdata_depc3
+
+    depc = testdata_depc3()
+    depc.clear_all()
+    with tracing.record_stages() as recorder:
+        depc.get('labeler', [1, 2, 3], 'data')
+        depc.get('labeler', [1, 2, 3], 'data')
+    stages = [obs[0:2] for obs in recorder.observations]
+    assert stages.count(['depcache.compute', 'labeler']) == 1
+    assert stages.count(['depcache.read', 'labeler']) == 2
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import io
 import uuid
 
 import numpy as np
@@ -7,7 +8,17 @@ from sqlalchemy.engine import create_engine
 from sqlalchemy.sql import bindparam, text
 from sqlalchemy.types import Float
 
-from wbia.dtool.types import UUID, Dict, Integer, List, NDArray, Number
+from wbia.dtool.types import (
+    NPY_MAGIC_PREFIX,
+    RAW_CODEC_VERSION,
+    UUID,
+    Dict,
+    Integer,
+    List,
+    NDArray,
+    Number,
+    decode_ndarray,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -140,6 +151,45 @@ def test_numpy_ndarray(db):
     assert (selected_value == insert_value).all()
 
 
+def test_numpy_ndarray_raw_codec(db):
+    db.execute(text('CREATE TABLE test(x NDARRAY)'))
+
+    insert_value = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+    stmt = text('INSERT INTO test(x) VALUES (:x)')
+    stmt = stmt.bindparams(bindparam('x', type_=NDArray))
+    db.execute(stmt, x=insert_value)
+
+    # The stored blob uses the raw codec, not np.save
+    blob = db.execute(text('SELECT x FROM test')).fetchone()[0]
+    assert blob[0] == RAW_CODEC_VERSION
+
+    stmt = text('SELECT x FROM test').columns(x=NDArray)
+    selected_value = db.execute(stmt).fetchone()[0]
+    assert selected_value.dtype == insert_value.dtype
+    assert selected_value.shape == insert_value.shape
+    assert (selected_value == insert_value).all()
+    # Decoded arrays are writable copies, not views of the blob
+    assert selected_value.flags.writeable and selected_value.flags.owndata
+    selected_value[0, 0, 0] = -1
+    assert decode_ndarray(blob)[0, 0, 0] == 0
+
+
+def test_numpy_ndarray_legacy_blob(db):
+    db.execute(text('CREATE TABLE test(x NDARRAY)'))
+
+    # Insert a value the way it was stored before the raw codec
+    insert_value = np.array([[1, 2, 3], [4, 5, 6]], np.uint8)
+    out = io.BytesIO()
+    np.save(out, insert_value)
+    legacy_blob = out.getvalue()
+    assert legacy_blob.startswith(NPY_MAGIC_PREFIX)
+    db.execute(text('INSERT INTO test(x) VALUES (:x)'), x=legacy_blob)
+
+    stmt = text('SELECT x FROM test').columns(x=NDArray)
+    selected_value = db.execute(stmt).fetchone()[0]
+    assert (selected_value == insert_value).all()
+
+
 np_numbers = (
     np.int8(120),
     np.int16(32767),
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+class _ImageIBS(object):
+    """The parts of the controller used to extract chips"""
+
+    force_serial = True
+
+    def __init__(self, gpath_dict):
+        self.gpath_dict = gpath_dict
+
+    def get_image_paths(self, gid_list):
+        return [self.gpath_dict[gid] for gid in gid_list]
+
+    def get_image_orientation(self, gid_list):
+        return [0 for gid in gid_list]
+
+
+def _write_image(fpath, seed):
+    import cv2
+
+    rng = np.random.RandomState(seed)
+    imgBGR = np.full((600, 800, 3), 128, dtype=np.uint8)
+    for _ in range(40):
+        center = tuple(int(v) for v in rng.randint(0, 800, 2))
+        color = tuple(int(v) for v in rng.randint(0, 255, 3))
+        cv2.circle(imgBGR, center, int(rng.randint(20, 120)), color, -1)
+    # Smooth content, so a reduced decode stays close to a full decode
+    imgBGR = cv2.GaussianBlur(imgBGR, (0, 0), 8)
+    if fpath.endswith('.jpg'):
+        cv2.imwrite(fpath, imgBGR, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    else:
+        cv2.imwrite(fpath, imgBGR)
+    return fpath
+
+
+def _bbox_to_chip(bbox, scale):
+    x, y, w, h = bbox
+    M = np.array([[scale, 0, -x * scale], [0, scale, -y * scale], [0, 0, 1.0]])
+    return M, (w * scale, h * scale)
+
+
+def test_grouped_chips_match_per_annotation_chips(tmp_path):
+    import cv2
+
+    from wbia import core_annots
+
+    dpath = str(tmp_path)
+    gpath_dict = {
+        # Only small chips, so a reduced decode applies
+        1: _write_image(os.path.join(dpath, 'small.jpg'), 1),
+        # One large chip keeps the full decode
+        2: _write_image(os.path.join(dpath, 'large.jpg'), 2),
+        # Reduced decode only applies to JPEGs
+        3: _write_image(os.path.join(dpath, 'small.png'), 3),
+    }
+    ibs = _ImageIBS(gpath_dict)
+    annot_list = [
+        (2, (0, 0, 400, 300), 0.1),
+        (1, (100, 50, 500, 400), 0.1),
+        (3, (20, 30, 700, 500), 0.1),
+        (1, (300, 200, 480, 380), 0.12),
+        (2, (200, 100, 300, 300), 0.5),
+        (3, (0, 0, 800, 600), 0.1),
+        (1, (0, 0, 800, 600), 0.1),
+    ]
+    gid_list = [gid for gid, bbox, scale in annot_list]
+    M_list, newsize_list = zip(
+        *[_bbox_to_chip(bbox, scale) for gid, bbox, scale in annot_list]
+    )
+    factor_list = [
+        core_annots.get_decode_reduction(
+            gpath_dict[gid], [M for gid_, M in zip(gid_list, M_list) if gid_ == gid]
+        )
+        for gid in [1, 2, 3]
+    ]
+    assert factor_list == [4, 1, 1]
+    warpkw = dict(flags=cv2.INTER_LANCZOS4, borderMode=cv2.BORDER_CONSTANT)
+    expected_list = [
+        core_annots.gen_chip_worker(gpath_dict[gid], 0, M, new_size, [], warpkw)
+        for gid, M, new_size in zip(gid_list, M_list, newsize_list)
+    ]
+    for reduced_decode in [False, True]:
+        result_list = list(
+            core_annots.gen_chips_grouped_by_image(
+                ibs,
+                gid_list,
+                M_list,
+                newsize_list,
+                [],
+                warpkw,
+                reduced_decode=reduced_decode,
+                force_serial=True,
+            )
+        )
+        assert len(result_list) == len(expected_list)
+        for gid, result, expected in zip(gid_list, result_list, expected_list):
+            chipBGR, width, height, M = result
+            assert (width, height) == expected[1:3]
+            assert M is expected[3]
+            assert chipBGR.dtype == expected[0].dtype
+            if reduced_decode and gid == 1:
+                # Decoded at a quarter of the resolution
+                diff = np.abs(chipBGR.astype(np.float64) - expected[0])
+                assert diff.mean() < 4
+            else:
+                assert np.all(chipBGR == expected[0])
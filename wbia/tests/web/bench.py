@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+import logging
+import shelve
+import time
+from os.path import join
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _best_time(func, num_repeat):
+    best = float('inf')
+    for _ in range(num_repeat):
+        start = time.time()
+        func()
+        best = min(best, time.time() - start)
+    return best
+
+
+def benchmark_job_status(num_jobs=10 ** 4, num_repeat=3, num_single=1000):
+    r"""
+    Compares status polling in the SQLite job store with reading the legacy
+    per-job metadata shelve files, which is what the collector did for every
+    job missing from its in-memory status cache.
+
+    CommandLine:
+        python -m wbia.tests.web.bench benchmark_job_status
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.web.bench import *  # NOQA
+        >>> results = benchmark_job_status(num_jobs=1000)
+        >>> print(ut.repr4(results, precision=4))
+    """
+    from wbia.web.job_store import JOB_STORE_FNAME, JobStore
+
+    dpath = ut.ensure_app_resource_dir('wbia', 'bench_job_status')
+    ut.delete(dpath)
+    ut.ensuredir(dpath)
+
+    statuses = ['completed', 'working', 'queued', 'exception']
+    jobid_list = ['{:032x}'.format(index) for index in range(num_jobs)]
+    metadata_list = [
+        {
+            'jobcounter': index,
+            'action': 'query_chips_graph',
+            'lane': 'slow',
+            'request': {'endpoint': '/api/engine/query/graph/', 'function': 'start'},
+            'times': {'received': '2020-01-01 00:00:00 PST', 'runtime_sec': index},
+            'input': {'query_annot_uuid_list': [str(index)] * 10},
+        }
+        for index in range(num_jobs)
+    ]
+
+    start = time.time()
+    store = JobStore(join(dpath, JOB_STORE_FNAME))
+    for index, (jobid, metadata) in enumerate(zip(jobid_list, metadata_list)):
+        store.set_status(jobid, statuses[index % len(statuses)])
+        store.set_metadata(jobid, metadata)
+    store_write = time.time() - start
+
+    start = time.time()
+    shelve_fpath_list = []
+    for jobid, metadata in zip(jobid_list, metadata_list):
+        shelve_fpath = join(dpath, '{}.input.shelve'.format(jobid))
+        with shelve.open(shelve_fpath) as shelf:
+            shelf['metadata'] = metadata
+        shelve_fpath_list.append(shelve_fpath)
+    shelve_write = time.time() - start
+
+    def _poll_shelves():
+        for shelve_fpath in shelve_fpath_list:
+            with shelve.open(shelve_fpath, 'r') as shelf:
+                shelf.get('metadata')
+
+    single_jobids = jobid_list[:: max(1, num_jobs // num_single)]
+    timings = {
+        'status_dict_store': _best_time(store.get_status_dict, num_repeat),
+        'status_dict_shelve': _best_time(_poll_shelves, num_repeat),
+        'jobid_list_store': _best_time(store.get_jobid_list, num_repeat),
+        'job_status_store': _best_time(
+            lambda: [store.get_status(jobid) for jobid in single_jobids], num_repeat
+        )
+        / len(single_jobids),
+    }
+    assert len(store.get_status_dict()) == num_jobs
+    store.close()
+    ut.delete(dpath)
+
+    results = {
+        'num_jobs': num_jobs,
+        'store_write_sec': store_write,
+        'shelve_write_sec': shelve_write,
+        **{key + '_sec': value for key, value in timings.items()},
+        'status_dict_speedup': timings['status_dict_shelve']
+        / max(timings['status_dict_store'], 1e-9),
+    }
+    print(
+        'num_jobs={}: status dict store={:.3f}s shelve={:.3f}s ({:.1f}x), '
+        'jobid list={:.4f}s, single status={:.1f}us'.format(
+            num_jobs,
+            timings['status_dict_store'],
+            timings['status_dict_shelve'],
+            results['status_dict_speedup'],
+            timings['jobid_list_store'],
+            timings['job_status_store'] * 1e6,
+        )
+    )
+    return results
+
+
+def _serve_in_background(handler):
+    """
+    Serves a tornado handler on a free local port from a daemon thread.
+    Returns the base url and a function that stops the server.
+    """
+    import asyncio
+    import threading
+
+    import tornado.httpserver
+    import tornado.ioloop
+    import tornado.netutil
+
+    started = threading.Event()
+    info = {}
+
+    def _run():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        server = tornado.httpserver.HTTPServer(handler)
+        sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+        server.add_sockets(sockets)
+        info['port'] = sockets[0].getsockname()[1]
+        info['loop'] = tornado.ioloop.IOLoop.current()
+        started.set()
+        info['loop'].start()
+        server.stop()
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    started.wait()
+
+    def _stop():
+        info['loop'].add_callback(info['loop'].stop)
+        thread.join()
+
+    return 'http://127.0.0.1:{}'.format(info['port']), _stop
+
+
+def _run_mixed_load(baseurl, routes, num_clients, duration, seed=0):
+    """
+    Runs num_clients closed-loop clients for duration seconds. Each request
+    picks a route by weight. Returns the latencies in ms of every route.
+    """
+    import random
+    import threading
+
+    import requests
+
+    names = [name for name, _, _ in routes]
+    weights = [weight for _, _, weight in routes]
+    suffixes = {name: suffix for name, suffix, _ in routes}
+    latencies = {name: [] for name in names}
+    failures = {name: 0 for name in names}
+    lock = threading.Lock()
+    stop_time = time.time() + duration
+
+    def _client(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        while time.time() < stop_time:
+            name = rng.choices(names, weights)[0]
+            start = time.time()
+            response = session.get(baseurl + suffixes[name], timeout=120)
+            ellapsed = 1000.0 * (time.time() - start)
+            with lock:
+                if response.status_code < 400:
+                    latencies[name].append(ellapsed)
+                else:
+                    failures[name] += 1
+
+    threads = [
+        threading.Thread(target=_client, args=(index,)) for index in range(num_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def benchmark_web_latency(
+    db='testdb1', web_workers_list=(0, 8), num_clients=16, duration=20.0
+):
+    r"""
+    Load test of the web server: num_clients clients send a mix of heartbeat,
+    annotation list, image and chip requests to the Flask app of a local test
+    database for duration seconds, once for every number of serving threads
+    in web_workers_list (0 is the serial IO loop). Reports the p50 and p99
+    latency of every route and the overall throughput.
+
+    CommandLine:
+        python -m wbia.tests.web.bench benchmark_web_latency --db testdb1
+        python -m wbia.tests.web.bench benchmark_web_latency --db PZ_MTEST --duration=60
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.web.bench import *  # NOQA
+        >>> db = ut.get_argval('--db', default='testdb1')
+        >>> duration = ut.get_argval('--duration', type_=float, default=20.0)
+        >>> results = benchmark_web_latency(db, duration=duration)
+        >>> print(ut.repr4(results, precision=1))
+    """
+    import numpy as np
+
+    import wbia
+    from wbia.control.controller_inject import get_flask_app
+    from wbia.web import app as web_app
+
+    ibs = wbia.opendb(db=db)
+    gid = ibs.get_valid_gids()[0]
+    aid = ibs.get_valid_aids()[0]
+    routes = [
+        # (name, url suffix, weight)
+        ('heartbeat', '/api/test/heartbeat/', 1),
+        ('annot_list', '/api/annot/', 2),
+        ('image_src', '/api/image/src/{}/'.format(gid), 2),
+        ('annot_src', '/api/annot/src/{}/'.format(aid), 1),
+    ]
+    app = get_flask_app()
+    app.ibs = ibs
+
+    results = {}
+    for web_workers in web_workers_list:
+        handler = web_app.make_wsgi_handler(app, web_workers=web_workers)
+        baseurl, stop = _serve_in_background(handler)
+        try:
+            # Warm up the caches (e.g. chips) before measuring
+            _run_mixed_load(baseurl, routes, 1, 1.0)
+            latencies, failures = _run_mixed_load(
+                baseurl, routes, num_clients, duration
+            )
+        finally:
+            stop()
+        result = {}
+        for name, values in latencies.items():
+            values = np.array(values or [np.nan])
+            result[name] = {
+                'count': len(latencies[name]),
+                'failures': failures[name],
+                'p50_ms': np.percentile(values, 50),
+                'p99_ms': np.percentile(values, 99),
+            }
+        num_requests = sum(len(values) for values in latencies.values())
+        result['requests_per_sec'] = num_requests / duration
+        results['web_workers=%d' % (web_workers,)] = result
+    return results
+
+
+def benchmark_image_derivatives(num_images=50, width=2048, height=1536):
+    r"""
+    Reports the milliseconds per image request of the ajax image endpoints
+    (decode, resize to the web width and JPEG encode) against serving the
+    same derivative from the memory and disk levels of the DerivativeCache,
+    on synthetic JPEGs.
+
+    CommandLine:
+        python -m wbia.tests.web.bench benchmark_image_derivatives
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.tests.web.bench import *  # NOQA
+        >>> num_images = ut.get_argval('--num_images', default=50)
+        >>> result = benchmark_image_derivatives(num_images)
+        >>> print(ut.repr2(result, precision=2))
+    """
+    import tempfile
+
+    import cv2
+    import numpy as np
+
+    from wbia.web import appfuncs as appf
+    from wbia.web import image_cache
+
+    rng = np.random.RandomState(0)
+    small = (rng.rand(height // 16, width // 16, 3) * 255).astype(np.uint8)
+    image = cv2.resize(small, (width, height))
+    with tempfile.TemporaryDirectory() as dpath:
+        gpath_list = []
+        for index in range(num_images):
+            gpath = join(dpath, 'img_%05d.jpg' % (index,))
+            cv2.imwrite(gpath, image)
+            gpath_list.append(gpath)
+        keys = [image_cache.make_derivative_key('image', gpath) for gpath in gpath_list]
+        cache = image_cache.DerivativeCache(join(dpath, 'cache'))
+
+        def _compute_func(gpath):
+            def _compute():
+                imgBGR = cv2.imread(gpath)
+                return appf._resize(imgBGR, t_width=appf.TARGET_WIDTH)
+
+            return _compute
+
+        def uncached():
+            for gpath in gpath_list:
+                appf.encode_image_jpeg(_compute_func(gpath)())
+
+        def fill():
+            for key, gpath in zip(keys, gpath_list):
+                cache.get(key, _compute_func(gpath))
+
+        def disk_hits():
+            cache.clear_memory()
+            fill()
+
+        result = {
+            'uncached_ms': _best_time(uncached, 1),
+            'miss_ms': _best_time(fill, 1),
+            'memory_hit_ms': _best_time(fill, 3),
+            'disk_hit_ms': _best_time(disk_hits, 3),
+        }
+    return {key: 1000.0 * value / num_images for key, value in result.items()}
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m wbia.tests.web.bench <benchmark_funcname>
+    """
+    import sys
+
+    globals()[sys.argv[1]]()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+import urllib.request
+
+import pytest
+
+SLOW_SEC = 0.5
+
+
+def _make_flask_app():
+    import flask
+
+    app = flask.Flask(__name__)
+    state = {'active': 0, 'max_active': 0, 'threads': set()}
+    lock = threading.Lock()
+
+    @app.route('/slow/')
+    def slow():
+        with lock:
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+            state['threads'].add(threading.current_thread().name)
+        time.sleep(SLOW_SEC)
+        with lock:
+            state['active'] -= 1
+        return 'slow'
+
+    @app.route('/api/test/heartbeat/')
+    def heartbeat():
+        return threading.current_thread().name
+
+    return app, state
+
+
+@pytest.fixture
+def serve():
+    import tornado.httpserver
+    import tornado.ioloop
+    import tornado.netutil
+
+    servers = []
+
+    def _serve(handler):
+        started = threading.Event()
+        info = {}
+
+        def _run():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            server = tornado.httpserver.HTTPServer(handler)
+            sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+            server.add_sockets(sockets)
+            info['port'] = sockets[0].getsockname()[1]
+            info['loop'] = tornado.ioloop.IOLoop.current()
+            started.set()
+            info['loop'].start()
+
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
+        started.wait()
+        servers.append(info)
+        return 'http://127.0.0.1:{}'.format(info['port'])
+
+    yield _serve
+    for info in servers:
+        info['loop'].add_callback(info['loop'].stop)
+
+
+def _get(url):
+    start = time.time()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        body = response.read().decode('utf8')
+    return body, time.time() - start
+
+
+def test_concurrent_wsgi_handler(serve):
+    from wbia.web import app as web_app
+
+    if not web_app.WSGI_EXECUTOR_SUPPORTED:
+        pytest.skip('tornado < 6.3')
+
+    app, state = _make_flask_app()
+    url = serve(web_app.make_wsgi_handler(app, web_workers=4, fast_workers=1))
+    slow_results = []
+    threads = [
+        threading.Thread(target=lambda: slow_results.append(_get(url + '/slow/')))
+        for _ in range(4)
+    ]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(SLOW_SEC / 5)
+    # The heartbeat is answered by the fast lane while the slow requests run
+    thread_name, heartbeat_sec = _get(url + '/api/test/heartbeat/')
+    assert thread_name.startswith('wbia-web-fast')
+    assert heartbeat_sec < SLOW_SEC / 2
+    for thread in threads:
+        thread.join()
+    assert [body for body, _ in slow_results] == ['slow'] * 4
+    assert state['max_active'] > 1
+    assert all(name.startswith('wbia-web_') for name in state['threads'])
+    assert time.time() - start < 4 * SLOW_SEC
+
+
+def test_serial_wsgi_handler(serve):
+    from wbia.web import app as web_app
+
+    app, state = _make_flask_app()
+    url = serve(web_app.make_wsgi_handler(app, web_workers=0))
+    threads = [threading.Thread(target=_get, args=(url + '/slow/',)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state['max_active'] == 1
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+
+from wbia.web.image_cache import (
+    DerivativeCache,
+    make_derivative_key,
+    make_jpeg_response,
+)
+
+
+def _compute_func(calls, value=0):
+    def _compute():
+        calls.append(value)
+        return np.full((8, 12, 3), value, dtype=np.uint8)
+
+    return _compute
+
+
+def test_derivative_key():
+    key = make_derivative_key('image', 'uuid', width=100, orient=1)
+    assert key == make_derivative_key('image', 'uuid', orient=1, width=100)
+    assert key != make_derivative_key('image', 'uuid', width=100, orient=2)
+    assert key != make_derivative_key('annot', 'uuid', width=100, orient=1)
+
+
+def test_derivative_cache(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_items=2)
+    calls = []
+    keys = [make_derivative_key('image', index) for index in range(3)]
+    data_list = [cache.get(key, _compute_func(calls))[0] for key in keys]
+    assert len(calls) == 3
+    # The least recently used derivative was evicted from memory, not disk
+    assert keys[0] not in cache._memory
+    assert os.path.exists(cache.get_fpath(keys[0]))
+    assert cache.get(keys[0], _compute_func(calls)) == (data_list[0], keys[0])
+    assert cache.get(keys[2], _compute_func(calls)) == (data_list[2], keys[2])
+    assert len(calls) == 3
+    assert cache.stats == {'memory_hits': 1, 'disk_hits': 1, 'misses': 3}
+    # Fresh derivatives are recomputed and replace the cached ones
+    data, _ = cache.get(keys[2], _compute_func(calls, 255), fresh=True)
+    assert len(calls) == 4 and data != data_list[2]
+    cache.clear_memory()
+    assert cache.get(keys[2], None)[0] == data
+    assert not [fname for fname in os.listdir(tmp_path) if fname.endswith('.tmp')]
+
+
+def test_derivative_cache_max_bytes(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_bytes=1)
+    data, _ = cache.get('ab', _compute_func([]))
+    assert len(data) > 1 and not cache._memory
+
+
+def test_jpeg_response():
+    import flask
+
+    app = flask.Flask(__name__)
+
+    @app.route('/jpeg/')
+    def jpeg():
+        return make_jpeg_response(b'jpeg', 'etag', flask.request)
+
+    @app.route('/uncached/')
+    def uncached():
+        return make_jpeg_response(b'jpeg', None, flask.request)
+
+    client = app.test_client()
+    response = client.get('/jpeg/')
+    assert response.status_code == 200
+    assert response.data == b'jpeg'
+    assert response.headers['Content-Type'] == 'image/jpeg'
+    assert response.headers['ETag'] == '"etag"'
+    assert 'max-age' in response.headers['Cache-Control']
+    response = client.get('/jpeg/', headers={'If-None-Match': '"etag"'})
+    assert response.status_code == 304
+    assert response.data == b''
+    response = client.get('/uncached/', headers={'If-None-Match': '"etag"'})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_derivative_cache_max_disk_bytes(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_items=0)
+    calls = []
+    keys = [make_derivative_key('image', index) for index in range(10)]
+    nbytes = len(cache.get(keys[0], _compute_func(calls))[0])
+    cache.max_disk_bytes = 5 * nbytes
+    for index, key in enumerate(keys[1:], start=1):
+        cache.get(key, _compute_func(calls))
+        os.utime(cache.get_fpath(key), (index, index))
+        # Reading a derivative makes it the most recently used one
+        cache.get(keys[0], None)
+    kept = [key for key in keys if os.path.exists(cache.get_fpath(key))]
+    assert keys[0] in kept and keys[-1] in kept
+    assert 0 < len(kept) <= 5
+    assert cache._disk_bytes <= 5 * nbytes
+    # A pruned derivative is recomputed
+    assert len(calls) == 10
+    cache.get(keys[1], _compute_func(calls))
+    assert len(calls) == 11
+
+
+def test_derivative_cache_threads(tmp_path):
+    import threading
+
+    cache = DerivativeCache(str(tmp_path), max_items=4)
+    keys = [make_derivative_key('image', index) for index in range(8)]
+    num_threads, num_gets = 8, 200
+
+    def _worker(seed):
+        rng = np.random.RandomState(seed)
+        for index in rng.randint(0, len(keys), num_gets):
+            cache.get(keys[index], _compute_func([]))
+
+    threads = [threading.Thread(target=_worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(cache.stats.values()) == num_threads * num_gets
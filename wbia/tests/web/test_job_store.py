@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from os.path import join
+
+import pytest
+
+from wbia.web.job_store import JOB_STORE_FNAME, JobStore, get_job_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / JOB_STORE_FNAME))
+    yield store
+    store.close()
+
+
+def _metadata(jobcounter, **times):
+    return {
+        'jobcounter': jobcounter,
+        'action': 'query_chips_graph',
+        'lane': 'slow',
+        'request': {'endpoint': '/api/engine/query/graph/', 'function': 'start'},
+        'times': times,
+    }
+
+
+def test_status(store):
+    assert store.get_status('missing') == 'unknown'
+    assert not store.has_job('missing')
+    store.set_status('job1', 'received')
+    store.set_status('job1', 'working')
+    assert store.get_status('job1') == 'working'
+    store.add_job('job1', 'received')
+    assert store.get_status('job1') == 'working'
+    store.add_job('job0')
+    assert store.get_status('job0') == 'unknown'
+    assert store.get_jobid_list() == ['job0', 'job1']
+
+
+def test_status_dict(store):
+    store.set_status('done', 'completed')
+    store.set_metadata('done', _metadata(3, received='r', runtime_sec=12))
+    store.set_status('lost', 'completed')
+    store.set_status('pending', 'queued')
+
+    status_dict = store.get_status_dict()
+    assert status_dict['done'] == {
+        'status': 'completed',
+        'jobcounter': 3,
+        'action': 'query_chips_graph',
+        'endpoint': '/api/engine/query/graph/',
+        'function': 'start',
+        'lane': 'slow',
+        'time_received': 'r',
+        'time_started': None,
+        'time_runtime': None,
+        'time_updated': None,
+        'time_completed': None,
+        'time_turnaround': None,
+        'time_runtime_sec': 12,
+        'time_turnaround_sec': None,
+    }
+    # Completed jobs without metadata are reported as corrupted
+    assert status_dict['lost']['status'] == 'corrupted'
+    assert status_dict['lost']['jobcounter'] == -1
+    assert status_dict['pending']['status'] == 'queued'
+    assert status_dict['pending']['jobcounter'] == -1
+
+
+def test_metadata_and_result(store):
+    store.set_status('job1', 'working')
+    assert store.get_metadata('job1') is None
+    assert store.get_result('job1') is None
+
+    metadata = _metadata(1, received='r')
+    metadata['request'] = None  # legacy jobs
+    store.set_metadata('job1', metadata)
+    assert store.get_metadata('job1') == metadata
+    assert store.get_status_dict()['job1']['endpoint'] is None
+
+    engine_result = {
+        'exec_status': 'completed',
+        'json_result': '{"a": 1}',
+        'jobid': 'job1',
+    }
+    store.set_result('job1', engine_result)
+    assert store.has_result('job1')
+    assert store.get_result('job1') == engine_result
+    # Storing a result does not change the status
+    assert store.get_status('job1') == 'working'
+
+
+def test_move_job(store, tmp_path):
+    archive = JobStore(str(tmp_path / 'archive.sqlite3'))
+    store.set_status('job1', 'completed')
+    store.set_metadata('job1', _metadata(1))
+    store.set_result('job1', {'exec_status': 'completed', 'json_result': '1'})
+
+    store.move_job('job1', archive)
+
+    assert not store.has_job('job1')
+    assert not store.has_metadata('job1')
+    assert not store.has_result('job1')
+    assert archive.get_status('job1') == 'completed'
+    assert archive.get_metadata('job1') == _metadata(1)
+    assert archive.get_result('job1')['json_result'] == '1'
+    archive.close()
+
+
+def test_get_job_store_shares_file(tmp_path):
+    dpath = str(tmp_path / 'shelves')
+    store = get_job_store(dpath)
+    assert get_job_store(dpath) is store
+    store.set_status('job1', 'queued')
+
+    # Another connection (e.g. another process) sees the committed rows
+    other = JobStore(join(dpath, JOB_STORE_FNAME))
+    assert other.get_status('job1') == 'queued'
+    other.close()
+
+
+def test_collect_stages(store, tmp_path):
+    from wbia.web import job_engine
+
+    jobid = 'job-1'
+    store.set_metadata(jobid, _metadata(1))
+    stages = [['job.wait', 'slow', 0.5], ['query.knn', '', 2.0]]
+    engine_result = {
+        'exec_status': 'completed',
+        'json_result': '1',
+        'jobid': jobid,
+        'stages': stages,
+    }
+    collect_request = {
+        'action': 'store',
+        'jobid': jobid,
+        'engine_result': engine_result,
+    }
+    job_engine.on_collect_request(None, collect_request, store, str(tmp_path))
+    # The stages are kept for the exporter, not with the result
+    assert 'stages' not in store.get_result(jobid)
+    reply = job_engine.on_collect_request(
+        None, {'action': 'job_stages'}, store, str(tmp_path)
+    )
+    assert reply['json_result'] == stages
+    reply = job_engine.on_collect_request(
+        None, {'action': 'job_stages'}, store, str(tmp_path)
+    )
+    assert reply['json_result'] == []
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from wbia.web.review_render import (
+    ReviewRenderPool,
+    get_render_status_dict,
+    get_render_status_fpath,
+    render_review_image,
+    render_review_image_file,
+)
+
+
+def _render_args(seed=0):
+    rng = np.random.RandomState(seed)
+    chip1 = rng.randint(0, 255, size=(120, 90, 3)).astype(np.uint8)
+    chip2 = rng.randint(0, 255, size=(60, 80, 3)).astype(np.uint8)
+    kpts1 = np.zeros((10, 6))
+    kpts1[:, 0:2] = rng.rand(10, 2) * [90, 120]
+    kpts1[:, 2] = kpts1[:, 4] = 4.0
+    kpts2 = np.zeros((10, 6))
+    kpts2[:, 0:2] = rng.rand(10, 2) * [80, 60]
+    kpts2[:, 2] = kpts2[:, 4] = 3.0
+    fm = np.array([[idx, 9 - idx] for idx in range(10)])
+    fs = rng.rand(10)
+    return chip1, chip2, kpts1, kpts2, fm, fs
+
+
+def test_render_review_image_versions():
+    args = _render_args()
+    clean = render_review_image(*args, draw_matches=False)
+    matches = render_review_image(*args, draw_matches=True)
+    heatmask = render_review_image(*args, draw_matches=False, draw_heatmask=True)
+    assert clean.shape == matches.shape == heatmask.shape
+    assert clean.dtype == np.uint8
+    assert np.any(clean != matches)
+    assert np.any(clean != heatmask)
+    # Without feature matches every version is the clean image
+    chip1, chip2 = args[0:2]
+    empty = render_review_image(chip1, chip2, draw_heatmask=True)
+    assert np.all(empty == clean)
+    # Horizontal layouts are wider than they are high for square chips
+    chip = np.zeros((50, 50, 3), dtype=np.uint8)
+    image = render_review_image(chip, chip, view_orientation='horizontal')
+    assert image.shape[1] > image.shape[0]
+
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_review_render_pool(tmp_path, mode):
+    pool = ReviewRenderPool(mode=mode, max_workers=2)
+    filepath = str(tmp_path / 'match.png')
+    args = (filepath,) + _render_args()
+    try:
+        future1 = pool.submit(filepath, render_review_image_file, *args)
+        future2 = pool.submit(filepath, render_review_image_file, *args)
+        assert future1 is future2
+        assert pool.wait(filepath, timeout=60)
+        assert future1.result() == filepath
+        image = cv2.imread(filepath)
+        assert image.shape == render_review_image(*_render_args()).shape
+        # No temporary files are left behind
+        assert os.listdir(str(tmp_path)) == ['match.png']
+        bad_filepath = str(tmp_path / 'missing' / 'bad.png')
+        pool.submit(bad_filepath, render_review_image_file, bad_filepath, None, None)
+        assert not pool.wait(bad_filepath, timeout=60)
+    finally:
+        pool.shutdown()
+    assert pool.get_status(filepath) == 'done'
+    assert pool.get_status(bad_filepath) == 'error'
+    assert pool.get_error(bad_filepath) is not None
+    assert pool.get_status('never') == 'unknown'
+    status_dict = pool.get_status_dict()
+    assert status_dict['done'] == 1
+    assert status_dict['error'] == 1
+
+
+def test_review_render_pool_from_thread(tmp_path):
+    # Web servers create the pool in a request thread
+    import threading
+
+    pool = ReviewRenderPool(mode='process', max_workers=1)
+    filepath = str(tmp_path / 'match.png')
+    args = (filepath,) + _render_args()
+    thread = threading.Thread(
+        target=pool.submit, args=(filepath, render_review_image_file) + args
+    )
+    try:
+        thread.start()
+        thread.join()
+        assert pool.wait(filepath, timeout=60)
+    finally:
+        pool.shutdown()
+    assert os.path.exists(filepath)
+
+
+def _render_in_other_process(status_dpath, filepath, release_fpath):
+    import time
+
+    pool = ReviewRenderPool(
+        mode='thread',
+        max_workers=1,
+        status_fpath=get_render_status_fpath(status_dpath),
+    )
+    pool.submit(filepath, render_review_image_file, filepath, *_render_args())
+    pool.wait(filepath, timeout=60)
+    pool.submit('blocked', time.sleep, 60)
+    while not os.path.exists(release_fpath):
+        time.sleep(0.05)
+
+
+def test_render_status_of_other_process(tmp_path):
+    # The job engine renders the review images, the web server reports them
+    import multiprocessing
+    import time
+
+    status_dpath = str(tmp_path / 'query_match')
+    release_fpath = str(tmp_path / 'release')
+    args = (status_dpath, str(tmp_path / 'match.png'), release_fpath)
+    proc = multiprocessing.get_context('spawn').Process(
+        target=_render_in_other_process, args=args
+    )
+    proc.start()
+    try:
+        for _ in range(600):
+            status_dict = get_render_status_dict(status_dpath)
+            if status_dict['rendering'] + status_dict['queued'] == 1:
+                break
+            time.sleep(0.1)
+        assert status_dict['done'] == 1
+        assert status_dict['rendering'] + status_dict['queued'] == 1
+    finally:
+        open(release_fpath, 'w').close()
+        proc.terminate()
+        proc.join()
+    # The counts of exited processes are dropped
+    assert get_render_status_dict(status_dpath)['done'] == 0
+    assert os.listdir(status_dpath) == []
@@ -9,7 +9,8 @@ import logging
 import traceback
 import uuid
 from datetime import datetime
-from os.path import abspath, dirname, exists, join
+from os import readlink
+from os.path import abspath, dirname, exists, islink, join, normpath
 
 import cv2
 import numpy as np  # NOQA
@@ -34,9 +35,24 @@ register_route = controller_inject.get_wbia_flask_route(__name__)
 
 GRAPH_CLIENT_PEEK = 100
 
+# Seconds the match thumb endpoint waits for a background render
+MATCH_THUMB_RENDER_WAIT = 10.0
+
 
 RENDER_STATUS = None
 
+# Files written next to the review images of a query that is rendered in the
+# background, so any process can render a missing image on demand
+REVIEW_RENDER_CHIPMATCH_FNAME = 'chipmatch.cPkl'
+REVIEW_RENDER_CONFIG_FNAME = 'query_config.json'
+
+# (version, draw_matches, draw_heatmask) of the review images of a match
+REVIEW_IMAGE_VERSIONS = [
+    ('matches', True, False),
+    ('heatmask', False, True),
+    ('clean', False, False),
+]
+
 
 @register_ibs_method
 @register_api('/api/query/annot/rowid/', methods=['GET'])
@@ -204,6 +220,30 @@ def process_graph_match_html(ibs, **kwargs):
     )
 
 
+def get_review_image_filepath(
+    ibs,
+    aid,
+    cm,
+    qreq_,
+    view_orientation='vertical',
+    draw_matches=True,
+    draw_heatmask=False,
+):
+    """Path of the cached review image for a pair of annotations"""
+    from wbia.gui import id_review_api
+
+    match_thumb_path = ibs.get_match_thumbdir()
+    match_thumb_filename = id_review_api.get_match_thumb_fname(
+        cm,
+        aid,
+        qreq_,
+        view_orientation=view_orientation,
+        draw_matches=draw_matches,
+        draw_heatmask=draw_heatmask,
+    )
+    return normpath(join(match_thumb_path, match_thumb_filename))
+
+
 def ensure_review_image(
     ibs,
     aid,
@@ -217,6 +257,9 @@ def ensure_review_image(
     r""" "
     Create the review image for a pair of annotations
 
+    Hotspotter matches are composited with OpenCV (see
+    :mod:`wbia.web.review_render`), other pipelines are drawn with matplotlib.
+
     CommandLine:
         python -m wbia.web.apis_query ensure_review_image --show
 
@@ -238,19 +281,17 @@ def ensure_review_image(
         >>> pt.imshow(image)
         >>> ut.show_if_requested()
     """
-    from wbia.gui import id_review_api
+    from wbia.web import review_render
 
-    # Get thumb path
-    match_thumb_path = ibs.get_match_thumbdir()
-    match_thumb_filename = id_review_api.get_match_thumb_fname(
-        cm,
+    match_thumb_filepath = get_review_image_filepath(
+        ibs,
         aid,
+        cm,
         qreq_,
         view_orientation=view_orientation,
         draw_matches=draw_matches,
         draw_heatmask=draw_heatmask,
     )
-    match_thumb_filepath = join(match_thumb_path, match_thumb_filename)
     if verbose:
         logger.info('Checking: {!r}'.format(match_thumb_filepath))
 
@@ -282,7 +323,15 @@ def ensure_review_image(
             'white_background': True,
         }
 
-        if hasattr(qreq_, 'render_single_result'):
+        if review_render.can_render(cm, qreq_):
+            render_args = review_render.get_review_render_args(ibs, cm, qreq_, [aid])[0]
+            image = review_render.render_review_image(
+                *render_args,
+                view_orientation=view_orientation,
+                draw_matches=draw_matches,
+                draw_heatmask=draw_heatmask,
+            )
+        elif hasattr(qreq_, 'render_single_result'):
             image = qreq_.render_single_result(cm, aid, **render_config)
         elif hasattr(cm, 'render_single_annotmatch'):
             image = cm.render_single_annotmatch(qreq_, aid, **render_config)
@@ -870,6 +919,108 @@ def log_render_status(ibs, *args):
         logger.info('WRITE RENDER.LOG FAILED')
 
 
+def _enqueue_review_images(ibs, cm, qreq_, quuid, render_list):
+    """
+    Schedules the review images of a query_chips_graph match in the render
+    pool. Images refused by a full pool are rendered right away.
+
+    Args:
+        render_list (list): (daid, duuid, filepath, render_kw) of each image
+    """
+    from wbia.web import review_render
+
+    daid_list = ut.take_column(render_list, 0)
+    duuid_list = ut.take_column(render_list, 1)
+    filepath_list = ut.take_column(render_list, 2)
+    render_kw_list = ut.take_column(render_list, 3)
+    daid_to_duuid = dict(zip(daid_list, duuid_list))
+
+    def _log_render(daid, filepath, render_kw, extern_flag):
+        log_render_status(
+            ibs,
+            ut.timestamp(),
+            cm.qaid,
+            daid,
+            quuid,
+            daid_to_duuid[daid],
+            cm,
+            qreq_,
+            render_kw['view_orientation'],
+            render_kw['draw_matches'],
+            render_kw['draw_heatmask'],
+            filepath if extern_flag is True else None,
+            extern_flag,
+        )
+
+    status_list = review_render.enqueue_review_images(
+        ibs, cm, qreq_, daid_list, filepath_list, render_kw_list, callback=_log_render
+    )
+    for daid, filepath, render_kw, status in zip(
+        daid_list, filepath_list, render_kw_list, status_list
+    ):
+        if status == 'exists':
+            _log_render(daid, filepath, render_kw, True)
+        elif status == 'refused':
+            try:
+                ensure_review_image(ibs, daid, cm, qreq_, **render_kw)
+                extern_flag = True
+            except Exception as ex:
+                extern_flag = 'error'
+                ut.printex(ex, iswarning=True)
+            _log_render(daid, filepath, render_kw, extern_flag)
+
+
+def _save_review_render_request(qannot_path, cm, query_config_dict):
+    """
+    Saves what :func:`_render_missing_match_thumb` needs to render the review
+    images of cm in another process
+    """
+    cm.save_to_fpath(join(qannot_path, REVIEW_RENDER_CHIPMATCH_FNAME), verbose=False)
+    ut.save_json(join(qannot_path, REVIEW_RENDER_CONFIG_FNAME), query_config_dict)
+
+
+def _render_missing_match_thumb(ibs, qannot_path, dannot_uuid, version, version_path):
+    """
+    Renders a review image that was enqueued by another process (the job
+    engine) and points the version symlink at it.
+
+    Returns:
+        bool: True if the image was rendered
+    """
+    from wbia.algo.hots import chip_match
+
+    cm_fpath = join(qannot_path, REVIEW_RENDER_CHIPMATCH_FNAME)
+    config_fpath = join(qannot_path, REVIEW_RENDER_CONFIG_FNAME)
+    if not exists(cm_fpath) or not exists(config_fpath):
+        return False
+    daid = ibs.get_annot_aids_from_uuid(uuid.UUID(str(dannot_uuid)))
+    if daid is None:
+        return False
+    version_dict = {
+        version_: (draw_matches, draw_heatmask)
+        for version_, draw_matches, draw_heatmask in REVIEW_IMAGE_VERSIONS
+    }
+    draw_matches, draw_heatmask = version_dict[version]
+    try:
+        cm = chip_match.ChipMatch.load_from_fpath(cm_fpath, verbose=False)
+        query_config_dict = ut.load_json(config_fpath)
+        qreq_ = ibs.new_query_request([cm.qaid], [daid], cfgdict=query_config_dict)
+        _, filepath = ensure_review_image(
+            ibs,
+            daid,
+            cm,
+            qreq_,
+            view_orientation='horizontal',
+            draw_matches=draw_matches,
+            draw_heatmask=draw_heatmask,
+        )
+    except Exception as ex:
+        ut.printex(ex, 'on demand review image render failed', iswarning=True)
+        return False
+    ut.symlink(filepath, version_path, overwrite=True)
+    return True
+
+
 @register_ibs_method
 def _init_render_status(ibs):
     import os
@@ -909,10 +1060,13 @@ def query_chips_graph(
     n=20,
     view_orientation='horizontal',
     return_summary=True,
+    render_async=True,
     **kwargs,
 ):
     import uuid
 
+    from wbia.web import review_render
+
     import theano  # NOQA
 
     from wbia.unstable.orig_graph_iden import OrigAnnotInference
@@ -942,9 +1096,14 @@ def query_chips_graph(
     num_qaids = len(qaid_list)
     num_daids = len(daid_list)
 
-    valid_aid_list = ibs.get_valid_aids()
-    qaid_list = list(set(qaid_list) & set(valid_aid_list))
-    daid_list = list(set(daid_list) & set(valid_aid_list))
+    valid_aid_set = set(ibs.get_valid_aids())
+    if not valid_aid_set.issuperset(qaid_list) or not valid_aid_set.issuperset(
+        daid_list
+    ):
+        # The snapshot does not see annotations added by other processes
+        valid_aid_set = set(ibs.get_valid_aids(fresh=True))
+    qaid_list = list(set(qaid_list) & valid_aid_set)
+    daid_list = list(set(daid_list) & valid_aid_set)
 
     num_qaids_ = len(qaid_list)
     num_daids_ = len(daid_list)
@@ -1068,6 +1227,8 @@ def query_chips_graph(
             daid_set = list(set(daid_set))
             logger.info('Visualizing %d annots: %r' % (len(daid_set), daid_set))
 
+            render_async_ = render_async and review_render.can_render(cm, qreq_)
+            render_list = []
             extern_flag_list = []
             for daid in daid_list_:
                 extern_flag = daid in daid_set
@@ -1086,119 +1247,57 @@ def query_chips_graph(
                         dannot_cache_filepath, 'version_%s_orient_%s.png'
                     )
 
-                    try:
-                        _, filepath_matches = ensure_review_image(
-                            ibs,
-                            daid,
-                            cm,
-                            qreq_,
-                            view_orientation=view_orientation,
-                            draw_matches=True,
-                            draw_heatmask=False,
-                        )
-                    except Exception as ex:
-                        filepath_matches = None
-                        extern_flag = 'error'
-                        ut.printex(ex, iswarning=True)
-                    log_render_status(
-                        ibs,
-                        ut.timestamp(),
-                        cm.qaid,
-                        daid,
-                        quuid,
-                        duuid,
-                        cm,
-                        qreq_,
-                        view_orientation,
-                        True,
-                        False,
-                        filepath_matches,
-                        extern_flag,
-                    )
-                    try:
-                        _, filepath_heatmask = ensure_review_image(
-                            ibs,
-                            daid,
-                            cm,
-                            qreq_,
-                            view_orientation=view_orientation,
-                            draw_matches=False,
-                            draw_heatmask=True,
-                        )
-                    except Exception as ex:
-                        filepath_heatmask = None
-                        extern_flag = 'error'
-                        ut.printex(ex, iswarning=True)
-                    log_render_status(
-                        ibs,
-                        ut.timestamp(),
-                        cm.qaid,
-                        daid,
-                        quuid,
-                        duuid,
-                        cm,
-                        qreq_,
-                        view_orientation,
-                        False,
-                        True,
-                        filepath_heatmask,
-                        extern_flag,
-                    )
-                    try:
-                        _, filepath_clean = ensure_review_image(
-                            ibs,
-                            daid,
-                            cm,
-                            qreq_,
-                            view_orientation=view_orientation,
-                            draw_matches=False,
-                            draw_heatmask=False,
-                        )
-                    except Exception as ex:
-                        filepath_clean = None
-                        extern_flag = 'error'
-                        ut.printex(ex, iswarning=True)
-                    log_render_status(
-                        ibs,
-                        ut.timestamp(),
-                        cm.qaid,
-                        daid,
-                        quuid,
-                        duuid,
-                        cm,
-                        qreq_,
-                        view_orientation,
-                        False,
-                        False,
-                        filepath_clean,
-                        extern_flag,
-                    )
-
-                    if filepath_matches is not None:
-                        args = (
-                            'matches',
-                            view_orientation,
-                        )
-                        cache_filepath = cache_filepath_fmtstr % args
-                        ut.symlink(filepath_matches, cache_filepath, overwrite=True)
-
-                    if filepath_heatmask is not None:
-                        args = (
-                            'heatmask',
-                            view_orientation,
-                        )
-                        cache_filepath = cache_filepath_fmtstr % args
-                        ut.symlink(filepath_heatmask, cache_filepath, overwrite=True)
-
-                    if filepath_clean is not None:
-                        args = (
-                            'clean',
-                            view_orientation,
-                        )
-                        cache_filepath = cache_filepath_fmtstr % args
-                        ut.symlink(filepath_clean, cache_filepath, overwrite=True)
+                    for version, draw_matches, draw_heatmask in REVIEW_IMAGE_VERSIONS:
+                        render_kw = {
+                            'view_orientation': view_orientation,
+                            'draw_matches': draw_matches,
+                            'draw_heatmask': draw_heatmask,
+                        }
+                        if render_async_:
+                            # The image is rendered in the background, the
+                            # thumb endpoint waits for it or serves a placeholder
+                            filepath = get_review_image_filepath(
+                                ibs, daid, cm, qreq_, **render_kw
+                            )
+                            render_list.append((daid, duuid, filepath, render_kw))
+                        else:
+                            try:
+                                _, filepath = ensure_review_image(
+                                    ibs, daid, cm, qreq_, **render_kw
+                                )
+                            except Exception as ex:
+                                filepath = None
+                                extern_flag = 'error'
+                                ut.printex(ex, iswarning=True)
+                            log_render_status(
+                                ibs,
+                                ut.timestamp(),
+                                cm.qaid,
+                                daid,
+                                quuid,
+                                duuid,
+                                cm,
+                                qreq_,
+                                view_orientation,
+                                draw_matches,
+                                draw_heatmask,
+                                filepath,
+                                extern_flag,
+                            )
+
+                        if filepath is not None:
+                            args = (
+                                version,
+                                view_orientation,
+                            )
+                            cache_filepath = cache_filepath_fmtstr % args
+                            ut.symlink(filepath, cache_filepath, overwrite=True)
 
                 extern_flag_list.append(extern_flag)
+
+            if render_list:
+                _save_review_render_request(qannot_cache_filepath, cm, query_config_dict)
+                _enqueue_review_images(ibs, cm, qreq_, quuid, render_list)
         else:
             extern_flag_list = None
 
@@ -1287,11 +1386,7 @@ def query_chips_graph(
 def query_chips_graph_match_thumb(
     extern_reference, query_annot_uuid, database_annot_uuid, version
 ):
-    from io import BytesIO
-
     import vtool as vt
-    from flask import send_file
-    from PIL import Image  # NOQA
 
     ibs = current_app.ibs
     args = (
@@ -1336,6 +1431,26 @@ def query_chips_graph_match_thumb(
     assert version in ['clean', 'matches', 'heatmask']
 
     version_path = join(dannot_path, 'version_{}_orient_horizontal.png'.format(version))
+    if not exists(version_path) and islink(version_path):
+        from wbia.web import review_render
+
+        render_path = readlink(version_path)
+        render_pool = review_render.get_render_pool()
+        if render_pool.get_status(render_path) in ['queued', 'rendering']:
+            # The image is still rendered in the background by this process
+            render_pool.wait(render_path, timeout=MATCH_THUMB_RENDER_WAIT)
+            if render_pool.get_status(render_path) in ['queued', 'rendering']:
+                image = review_render.placeholder_image()
+                response = _send_jpeg(image)
+                response.status_code = 202
+                response.headers['Retry-After'] = '1'
+                return response
+        if not exists(version_path):
+            # The render was enqueued by another process (or lost when it
+            # exited), the pool of this process does not know about it
+            _render_missing_match_thumb(
+                ibs, qannot_path, database_annot_uuid, version, version_path
+            )
     if not exists(version_path):
         message = (
             'match thumb version is unknown for the given reference %s, query_annot_uuid %s, database_annot_uuid %s'
@@ -1345,16 +1460,45 @@ def query_chips_graph_match_thumb(
 
     # Load image
     image = vt.imread(version_path, orient='auto')
-    image = image[:, :, ::-1]
+    return _send_jpeg(image)
+
 
-    # Encode image
-    image_pil = Image.fromarray(image)
+def _send_jpeg(image):
+    """Sends a BGR image as a JPEG response"""
+    from io import BytesIO
+
+    from flask import send_file
+    from PIL import Image
+
+    image_pil = Image.fromarray(image[:, :, ::-1])
     img_io = BytesIO()
     image_pil.save(img_io, 'JPEG', quality=100)
     img_io.seek(0)
     return send_file(img_io, mimetype='image/jpeg')
 
 
+@register_api(
+    '/api/query/graph/match/thumb/status/',
+    methods=['GET'],
+    __api_plural_check__=False,
+)
+def query_chips_graph_match_thumb_status(ibs):
+    """
+    Returns the number of review images rendered in the background by status
+    (queued, rendering, done, error and refused), summed over the render
+    pools of all live processes of this database (the job engine renders the
+    images of its queries, not the web server)
+
+    RESTful:
+        Method: GET
+        URL:    /api/query/graph/match/thumb/status/
+    """
+    from wbia.web import review_render
+
+    status_dpath = join(ibs.cachedir, 'query_match')
+    return review_render.get_render_status_dict(status_dpath)
+
+
 @register_ibs_method
 @register_api('/api/query/chip/', methods=['GET'])
 def query_chips(
@@ -2,10 +2,13 @@
 """
 Dependencies: flask, tornado
 """
+import concurrent.futures
+import inspect
 import logging
 import socket
 
 import tornado.httpserver
+import tornado.web
 import tornado.wsgi
 import utool as ut
 from tornado.log import access_log
@@ -33,6 +36,23 @@ except ImportError:
     PROMETHEUS = False
 
 
+#: Number of threads running WSGI requests concurrently. With 0 every request
+#: runs on the IO loop thread, one at a time.
+WEB_WORKERS = ut.get_argval('--web-workers', type_=int, default=0)
+#: Number of threads serving the fast lane routes when WEB_WORKERS > 0
+WEB_FAST_WORKERS = ut.get_argval('--web-fast-workers', type_=int, default=2)
+#: Routes served by the fast lane, so they never wait behind slow requests
+FAST_LANE_ROUTES = [
+    r'/api/test/heartbeat/?',
+    r'/metrics/?',
+]
+
+# Tornado >= 6.3 can run the WSGI app on an executor
+WSGI_EXECUTOR_SUPPORTED = (
+    'executor' in inspect.signature(tornado.wsgi.WSGIContainer.__init__).parameters
+)
+
+
 class TimedWSGIContainer(tornado.wsgi.WSGIContainer):
     def _log(self, status_code, request):
         if status_code < 400:
@@ -69,10 +89,71 @@ def _init_api_v2():
     pass
 
 
+def make_wsgi_handler(app, web_workers=None, fast_workers=None):
+    """
+    Wraps a WSGI app for tornado.httpserver.HTTPServer.
+
+    With web_workers > 0 requests are dispatched to a pool of web_workers
+    threads, so the IO loop keeps accepting requests while a slow request
+    runs. The FAST_LANE_ROUTES (heartbeat and metrics) have their own pool
+    of fast_workers threads. Each request reuses one connection per database
+    (see sql_control.pin_request_connections).
+
+    Args:
+        app (callable): WSGI app
+        web_workers (int): defaults to --web-workers (0, serial)
+        fast_workers (int): defaults to --web-fast-workers (2)
+    """
+    if web_workers is None:
+        web_workers = WEB_WORKERS
+    if fast_workers is None:
+        fast_workers = WEB_FAST_WORKERS
+    if web_workers <= 0:
+        return TimedWSGIContainer(app)
+    if not WSGI_EXECUTOR_SUPPORTED:
+        logger.warning(
+            '[web] tornado %s cannot run WSGI apps concurrently (needs >= 6.3), '
+            'serving requests on the IO loop' % (tornado.version,)
+        )
+        return TimedWSGIContainer(app)
+    logger.info(
+        '[web] Serving requests with %d threads (%d fast lane threads)'
+        % (web_workers, fast_workers)
+    )
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=web_workers,
+        thread_name_prefix='wbia-web',
+    )
+    fast_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(fast_workers, 1),
+        thread_name_prefix='wbia-web-fast',
+    )
+    container = TimedWSGIContainer(app, executor=executor)
+    fast_container = TimedWSGIContainer(app, executor=fast_executor)
+    handlers = [
+        (route, tornado.web.FallbackHandler, {'fallback': fast_container})
+        for route in FAST_LANE_ROUTES
+    ]
+    handlers.append((r'.*', tornado.web.FallbackHandler, {'fallback': container}))
+    return tornado.web.Application(handlers)
+
+
 def start_tornado(
-    ibs, port=None, browser=None, url_suffix=None, start_web_loop=True, fallback=True
+    ibs,
+    port=None,
+    browser=None,
+    url_suffix=None,
+    start_web_loop=True,
+    fallback=True,
+    web_workers=None,
 ):
-    """Initialize the web server"""
+    """
+    Initialize the web server
+
+    Args:
+        web_workers (int): number of threads serving requests concurrently,
+            defaults to --web-workers (see make_wsgi_handler)
+    """
     if browser is None:
         browser = ut.get_argflag('--browser')
     if url_suffix is None:
@@ -140,7 +221,7 @@ def start_tornado(
         # Start the tornado web handler
         # WSGI = Web Server Gateway Interface
         # WSGI is Python standard described in detail in PEP 3333
-        wsgi_container = TimedWSGIContainer(app)
+        wsgi_container = make_wsgi_handler(app, web_workers=web_workers)
 
         # # Try wrapping with newrelic performance monitoring
         # try:
@@ -167,6 +248,7 @@ def start_tornado(
                     url_suffix=url_suffix,
                     start_web_loop=start_web_loop,
                     fallback=False,
+                    web_workers=web_workers,
                 )
             else:
                 raise RuntimeError(
@@ -278,6 +360,10 @@ def start_from_wbia(
         ibs.initialize_job_manager()
         # time.sleep(10)
 
+    if PROMETHEUS:
+        # After the engines are started, so they do not inherit the sink
+        ibs.prometheus_enable_tracing()
+
     logger.info('[web] starting tornado')
     try:
         start_tornado(ibs, port, browser, url_suffix, start_web_loop)
@@ -122,22 +122,30 @@ def resize_via_web_parameters(image):
 
 def embed_image_html(imgBGR, target_width=TARGET_WIDTH, target_height=TARGET_HEIGHT):
     """Creates an image embedded in HTML base64 format."""
-    import cv2
-    from PIL import Image
-
     if target_width is not None:
         imgBGR = _resize(imgBGR, t_width=target_width)
     elif target_height is not None:
         imgBGR = _resize(imgBGR, t_height=target_height)
-    imgRGB = cv2.cvtColor(imgBGR, cv2.COLOR_BGR2RGB)
-    pil_img = Image.fromarray(imgRGB)
+    return embed_jpeg_html(encode_image_jpeg(imgBGR))
+
+
+def encode_image_jpeg(imgBGR):
+    """Encodes an image as JPEG bytes."""
     import io
 
+    import cv2
+    from PIL import Image
+
+    imgRGB = cv2.cvtColor(imgBGR, cv2.COLOR_BGR2RGB)
+    pil_img = Image.fromarray(imgRGB)
     byte_buf = io.BytesIO()
     pil_img.save(byte_buf, format='jpeg')
-    byte_buf.seek(0)
-    img_bytes = base64.b64encode(byte_buf.read())
-    data = img_bytes.decode('ascii')
+    return byte_buf.getvalue()
+
+
+def embed_jpeg_html(jpeg_bytes):
+    """Creates an image embedded in HTML base64 format from JPEG bytes."""
+    data = base64.b64encode(jpeg_bytes).decode('ascii')
     return 'data:image/jpeg;base64,' + data
 
 
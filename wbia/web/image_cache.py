@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the resized JPEG derivatives served to the web interface.
+
+The ajax image endpoints used to decode the full image (or chip), resize it
+and re-encode it on every request. A derivative is identified by a key built
+from what determines its pixels: the uuid of the source (image uuids are
+file hashes and annot visual uuids change with the bbox), its size,
+orientation and config. ``DerivativeCache`` keeps the encoded JPEGs
+
+    in memory - a bounded LRU of the hot derivatives
+    on disk    - one file per key under the database cache directory, the
+                 least recently used files are removed when the directory
+                 outgrows its size limit
+
+so a repeat load costs a dictionary lookup or a file read, and clients that
+already have the derivative get a 304 through its ETag (the key).
+
+Example:
+    >>> # ENABLE_DOCTEST
+    >>> from wbia.web.image_cache import *  # NOQA
+    >>> import numpy as np
+    >>> dpath = ut.ensure_app_resource_dir('wbia', 'test_image_cache')
+    >>> ut.delete(dpath)
+    >>> cache = DerivativeCache(dpath, max_items=2)
+    >>> key = make_derivative_key('image', 'uuid', width=100)
+    >>> compute = lambda: np.zeros((10, 20, 3), dtype=np.uint8)
+    >>> data1, etag1 = cache.get(key, compute)
+    >>> data2, etag2 = cache.get(key, compute)
+    >>> assert data1 == data2 and etag1 == etag2 == key
+    >>> cache.clear_memory()
+    >>> data3, _ = cache.get(key, None)  # read back from disk
+    >>> assert data3 == data1
+    >>> print(ut.repr2(cache.stats))
+    {'disk_hits': 1, 'memory_hits': 1, 'misses': 1}
+"""
+import collections
+import hashlib
+import logging
+import os
+import threading
+from os.path import exists, join
+
+import utool as ut
+
+from wbia.web import appfuncs as appf
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+#: Maximum number of derivatives kept in memory
+CACHE_MAX_ITEMS = 512
+#: Maximum total size in bytes of the derivatives kept in memory
+CACHE_MAX_BYTES = 64 * 2 ** 20
+#: Maximum total size in bytes of the derivative files
+CACHE_MAX_DISK_BYTES = ut.get_argval(
+    '--web-derivative-disk-bytes', type_=int, default=2 * 2 ** 30
+)
+#: Fraction of the disk limit the derivative files are pruned down to, so
+#: the directory is not scanned again on the next write
+CACHE_PRUNE_FRAC = 0.8
+#: Cache-Control header of the derivative responses. Derivatives never
+#: change for a key, but the key of a URL changes when its source changes.
+CACHE_CONTROL = 'private, max-age=3600'
+#: Name of the derivative directory in the database cache directory
+CACHE_DNAME = 'web_derivatives'
+
+
+def make_derivative_key(kind, uuid, **params):
+    """
+    Returns the hex digest identifying a derivative of kind (e.g. 'image')
+    of the source uuid with the given size, orientation and config params
+    """
+    items = sorted((key, repr(value)) for key, value in params.items())
+    text = repr((kind, str(uuid), items))
+    return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+
+class DerivativeCache(ut.NiceRepr):
+    """
+    Thread-safe two level cache of JPEG derivatives keyed by
+    make_derivative_key.
+
+    Args:
+        dpath (str): directory of the derivative files
+        max_items (int): maximum number of derivatives in memory
+        max_bytes (int): maximum total size of the derivatives in memory
+        max_disk_bytes (int): maximum total size of the derivative files
+    """
+
+    def __init__(
+        self,
+        dpath,
+        max_items=CACHE_MAX_ITEMS,
+        max_bytes=CACHE_MAX_BYTES,
+        max_disk_bytes=CACHE_MAX_DISK_BYTES,
+    ):
+        self.dpath = dpath
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        # Estimate of the size of the derivative files, None until scanned.
+        # Other processes write to the same directory, so it is recomputed
+        # whenever the files are pruned.
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def __nice__(self):
+        return 'items=%d, bytes=%d' % (len(self._memory), self._memory_bytes)
+
+    def get_fpath(self, key):
+        return join(self.dpath, key[0:2], key + '.jpg')
+
+    def _remember(self, key, data):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory and (
+                len(self._memory) > self.max_items
+                or self._memory_bytes > self.max_bytes
+            ):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _write(self, fpath, data):
+        """Writes through a temporary file, so readers never see part of it"""
+        ut.ensuredir(os.path.dirname(fpath))
+        temp_fpath = '{}.{}.{}.tmp'.format(
+            fpath, os.getpid(), threading.get_ident()
+        )
+        with open(temp_fpath, 'wb') as file_:
+            file_.write(data)
+        os.replace(temp_fpath, fpath)
+
+    def _scan_disk(self):
+        """Returns the (mtime, nbytes, fpath) of every derivative file"""
+        file_list = []
+        if not exists(self.dpath):
+            return file_list
+        for dname in os.listdir(self.dpath):
+            sub_dpath = join(self.dpath, dname)
+            if not os.path.isdir(sub_dpath):
+                continue
+            for fname in os.listdir(sub_dpath):
+                if not fname.endswith('.jpg'):
+                    continue
+                fpath = join(sub_dpath, fname)
+                try:
+                    stat = os.stat(fpath)
+                except OSError:
+                    # Removed by another process
+                    continue
+                file_list.append((stat.st_mtime, stat.st_size, fpath))
+        return file_list
+
+    def _add_disk_bytes(self, nbytes):
+        """
+        Counts a written derivative and removes the least recently used files
+        when the derivatives outgrow max_disk_bytes
+        """
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += nbytes
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+        # Only one thread scans, the others keep serving
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self.prune_disk()
+        finally:
+            self._prune_lock.release()
+
+    def prune_disk(self):
+        """
+        Removes the least recently used derivative files until they take at
+        most CACHE_PRUNE_FRAC of max_disk_bytes if they exceed it
+
+        Returns:
+            int: number of removed files
+        """
+        file_list = self._scan_disk()
+        disk_bytes = sum(nbytes for _, nbytes, _ in file_list)
+        num_removed = 0
+        if disk_bytes > self.max_disk_bytes:
+            target_bytes = self.max_disk_bytes * CACHE_PRUNE_FRAC
+            for _, nbytes, fpath in sorted(file_list):
+                if disk_bytes <= target_bytes:
+                    break
+                try:
+                    os.remove(fpath)
+                except OSError:
+                    # Removed by another process
+                    pass
+                disk_bytes -= nbytes
+                num_removed += 1
+            logger.info(
+                'Removed %d web derivatives, %s remain'
+                % (num_removed, ut.byte_str2(disk_bytes))
+            )
+        with self._lock:
+            self._disk_bytes = disk_bytes
+        return num_removed
+
+    def get(self, key, compute_func, fresh=False):
+        """
+        Returns the JPEG bytes and ETag of the derivative key
+
+        Args:
+            key (str): see make_derivative_key
+            compute_func (func): returns the BGR image of the derivative when
+                it is in neither level of the cache
+            fresh (bool): recomputes the derivative and replaces the cached one
+
+        Returns:
+            tuple: (data, etag)
+        """
+        if not fresh:
+            with self._lock:
+                data = self._memory.get(key, None)
+                if data is not None:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return data, key
+        fpath = self.get_fpath(key)
+        data = None
+        if not fresh and exists(fpath):
+            try:
+                with open(fpath, 'rb') as file_:
+                    data = file_.read()
+            except IOError:
+                data = None
+            else:
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                try:
+                    # Pruning removes the files with the oldest mtime first
+                    os.utime(fpath)
+                except OSError:
+                    pass
+        if data is None:
+            data = appf.encode_image_jpeg(compute_func())
+            self._write(fpath, data)
+            with self._lock:
+                self.stats['misses'] += 1
+            self._add_disk_bytes(len(data))
+        self._remember(key, data)
+        return data, key
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_derivative_cache(ibs):
+    """Returns the derivative cache of the database of ibs"""
+    dpath = join(ibs.get_cachedir(), CACHE_DNAME)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(dpath, None)
+        if cache is None:
+            cache = DerivativeCache(dpath)
+            _CACHES[dpath] = cache
+        return cache
+
+
+def make_jpeg_response(data, etag, request):
+    """
+    Returns an image/jpeg flask response with ETag and Cache-Control headers,
+    or a 304 when the request's If-None-Match has the ETag. Responses without
+    an ETag (derivatives that are not cached) are not cached by clients.
+    """
+    from flask import make_response
+
+    response = make_response(data)
+    response.headers['Content-Type'] = 'image/jpeg'
+    if etag is None:
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.set_etag(etag)
+    return response.make_conditional(request)
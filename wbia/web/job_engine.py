@@ -50,6 +50,7 @@ Notes:
     And then running the forground process
     python -m wbia.web.job_engine job_engine_tester --fg
 """
+import collections
 import multiprocessing
 import random
 import re
@@ -72,7 +73,9 @@ import utool as ut
 import zmq
 
 from wbia.control import controller_inject
+from wbia.dtool import tracing
 from wbia.utils import call_houston
+from wbia.web.job_store import get_job_store
 
 print, rrr, profile = ut.inject2(__name__)  # NOQA
 # logger = logging.getLogger('wbia')
@@ -103,8 +106,14 @@ GLOBAL_SHELVE_LOCK = multiprocessing.Lock()
 TIMESTAMP_FMTSTR = '%Y-%m-%d %H:%M:%S %Z'
 TIMESTAMP_TIMEZONE = 'US/Pacific'
 
+# Collector actions after which the garbage collector is run explicitly
+GC_COLLECT_ACTIONS = {'store', 'job_input', 'job_result', 'job_status_dict'}
 
-JOB_STATUS_CACHE = {}
+#: Maximum number of engine stage timings the collector keeps until the
+#: Prometheus exporter reads them, the oldest are dropped first
+MAX_COLLECTED_STAGES = 100000
+# Stage timings of completed jobs, only used in the collector process
+COLLECTED_STAGES = collections.deque(maxlen=MAX_COLLECTED_STAGES)
 
 
 def update_proctitle(procname, dbname=None):
@@ -333,6 +342,18 @@ def get_job_status(ibs, jobid=None):
     return status
 
 
+@register_ibs_method
+def get_job_stages(ibs):
+    """
+    Returns and forgets the [name, detail, seconds] stage timings (see
+    :mod:`wbia.dtool.tracing`) reported by the engines since the last call.
+    Each job reports the total seconds of each of its stages. The Prometheus
+    exporter is the only consumer.
+    """
+    reply = ibs.job_manager.jobiface.get_job_stages()
+    return reply.get('json_result', None) or []
+
+
 # @register_ibs_method
 # @register_api('/api/engine/job/terminate/', methods=['GET', 'POST'])
 # def send_job_terminate(ibs, jobid):
@@ -729,6 +750,27 @@ def get_shelve_filepaths(ibs, jobid):
     return shelve_input_filepath, shelve_output_filepath
 
 
+def migrate_shelve_job(job_store, jobid, shelve_input_filepath, shelve_output_filepath):
+    """
+    Copies the metadata and result of a job stored in the legacy per-job
+    shelve files into the job store. Returns the metadata (or None).
+    """
+    # dbm may add its own extensions to the shelve filepaths
+    shelve_filepath_list = list(ut.iglob('{}*'.format(shelve_input_filepath)))
+    shelve_filepath_list += list(ut.iglob('{}*'.format(shelve_output_filepath)))
+    if len(shelve_filepath_list) == 0:
+        return None
+    metadata = get_shelve_value(shelve_input_filepath, 'metadata')
+    engine_result = get_shelve_value(shelve_output_filepath, 'result')
+    if metadata is not None:
+        job_store.set_metadata(jobid, metadata)
+    if engine_result is not None:
+        job_store.set_result(jobid, engine_result)
+    if metadata is not None or engine_result is not None:
+        print('Migrated legacy shelve files for jobid = {!r}'.format(jobid))
+    return metadata
+
+
 def initialize_process_record(
     record_filepath,
     shelve_input_filepath,
@@ -767,7 +809,12 @@ def initialize_process_record(
     corrupted = engine_request is None
 
     # Load metadata
-    metadata = get_shelve_value(shelve_input_filepath, 'metadata')
+    job_store = get_job_store(shelve_path)
+    metadata = job_store.get_metadata(jobid)
+    if metadata is None:
+        metadata = migrate_shelve_job(
+            job_store, jobid, shelve_input_filepath, shelve_output_filepath
+        )
 
     if metadata is None:
         print('Missing metadata...corrupted')
@@ -806,6 +853,7 @@ def initialize_process_record(
                 color = 'brightmagenta'
                 print_ = partial(ut.colorprint, color=color)
                 print_('ARCHIVING JOB (AGE: %d SECONDS)' % (job_age,))
+                job_store.move_job(jobid, get_job_store(shelve_archive_path))
                 job_scr_filepath_list = list(
                     ut.iglob(join(shelve_path, '{}*'.format(jobid)))
                 )
@@ -1183,6 +1231,13 @@ class JobInterface(object):
         reply = jobiface.collect_recieve_socket.recv_json()
         return reply
 
+    def get_job_stages(jobiface):
+        pair_msg = dict(action='job_stages')
+        # CALLS: collector_request_status
+        jobiface.collect_recieve_socket.send_json(pair_msg)
+        reply = jobiface.collect_recieve_socket.recv_json()
+        return reply
+
     def get_job_metadata(jobiface, jobid):
         if jobiface.verbose >= 1:
             print('----')
@@ -1499,6 +1554,8 @@ def engine_queue_loop(port_dict, engine_lanes):
                 if VERBOSE_JOBS:
                     print('... notifying backend engine to start')
                 # CALL: engine_
+                # The engine reports the queue wait from this epoch time
+                engine_request['queued_at'] = time.time()
                 engine_send_socket = engine_send_socket_dict[lane]
                 send_multipart_json(engine_send_socket, idents, engine_request)
 
@@ -1599,6 +1656,11 @@ def engine_loop(id_, port_dict, dbdir, containerized, lane):
     ibs = wbia.opendb(dbdir=dbdir, use_cache=False, web=False, daily_backup=False)
     update_proctitle('engine_loop.{}.{}'.format(lane, id_), dbname=ibs.dbname)
 
+    # All engines attach to the same memory mapped neighbor index support
+    from wbia.algo.hots import neighbor_index_cache
+
+    neighbor_index_cache.USE_SHARED_SUPPORT = not ut.get_argflag('--noshared-nnindex')
+
     try:
         while True:
             try:
@@ -1630,7 +1692,18 @@ def engine_loop(id_, port_dict, dbdir, containerized, lane):
                 }
                 collect_recieve_socket.send_json(reply_notify)
 
-                engine_result = on_engine_request(ibs, jobid, action, args, kwargs)
+                queued_at = engine_request.get('queued_at', None)
+                with tracing.record_stages(tracing.TRACE_STAGES) as recorder:
+                    if queued_at is not None:
+                        tracing.observe('job.wait', time.time() - queued_at, lane_)
+                    with tracing.stage('job.run', lane_):
+                        engine_result = on_engine_request(
+                            ibs, jobid, action, args, kwargs
+                        )
+                # The collector keeps the stage timings for the exporter. A
+                # job can time thousands of depcache reads, so only the total
+                # of each stage is sent
+                engine_result['stages'] = recorder.total_observations()
                 exec_status = engine_result['exec_status']
 
                 # Notify start working
@@ -1812,7 +1885,7 @@ def collector_loop(port_dict, dbdir, containerized):
     shelve_path = ibs.get_shelves_path()
     ut.ensuredir(shelve_path)
 
-    collector_data = {}
+    job_store = get_job_store(shelve_path)
 
     try:
         while True:
@@ -1827,7 +1900,7 @@ def collector_loop(port_dict, dbdir, containerized):
                 reply = on_collect_request(
                     ibs,
                     collect_request,
-                    collector_data,
+                    job_store,
                     shelve_path,
                     containerized=containerized,
                 )
@@ -1841,21 +1914,26 @@ def collector_loop(port_dict, dbdir, containerized):
 
             send_multipart_json(collect_rout_sock, idents, reply)
 
+            action = collect_request.get('action', None)
             idents = None
             collect_request = None
+            reply = None
 
-            # Explicitly release Python memory
-            try:
-                import gc
+            # Explicitly release Python memory after requests that handled
+            # results, status polling does not allocate anything large
+            if action in GC_COLLECT_ACTIONS:
+                try:
+                    import gc
 
-                gc.collect()
-            except Exception:
-                pass
+                    gc.collect()
+                except Exception:
+                    pass
     except KeyboardInterrupt:
         print('Caught ctrl+c in collector loop. Gracefully exiting')
 
     collect_rout_sock.disconnect(port_dict['collect_push_url'])
     collect_rout_sock.close()
+    job_store.close()
 
     if VERBOSE_JOBS:
         print('Exiting collector')
@@ -1868,19 +1946,6 @@ def _timestamp():
     return timestamp
 
 
-def invalidate_global_cache(jobid):
-    global JOB_STATUS_CACHE
-    JOB_STATUS_CACHE.pop(jobid, None)
-
-
-def get_collector_shelve_filepaths(collector_data, jobid):
-    if jobid is None:
-        return None, None
-    shelve_input_filepath = collector_data.get(jobid, {}).get('input', None)
-    shelve_output_filepath = collector_data.get(jobid, {}).get('output', None)
-    return shelve_input_filepath, shelve_output_filepath
-
-
 def convert_to_date(timestamp):
     TIMESTAMP_FMTSTR_ = ' '.join(TIMESTAMP_FMTSTR.split(' ')[:-1])
     timestamp_ = ' '.join(timestamp.split(' ')[:-1])
@@ -1906,9 +1971,14 @@ def calculate_timedelta(start, end):
 
 
 def on_collect_request(
-    ibs, collect_request, collector_data, shelve_path, containerized=False
+    ibs, collect_request, job_store, shelve_path, containerized=False
 ):
-    """Run whenever the collector recieves a message"""
+    """
+    Run whenever the collector recieves a message
+
+    The status, metadata and result of every job are kept in ``job_store``
+    (see :class:`wbia.web.job_store.JobStore`).
+    """
     import requests
 
     action = collect_request.get('action', None)
@@ -1920,7 +1990,7 @@ def on_collect_request(
         'jobid': jobid,
     }
 
-    # Ensure we have a collector record for the jobid
+    # Ensure the jobid is valid
     if jobid is not None:
         try:
             assert isinstance(jobid, str)
@@ -1936,19 +2006,10 @@ def on_collect_request(
             reply['status'] = 'error'
             return reply
 
-        if jobid not in collector_data:
-            collector_data[jobid] = {
-                'status': None,
-                'input': None,
-                'output': None,
-            }
         runtime_lock_filepath = join(shelve_path, '{}.lock'.format(jobid))
     else:
         runtime_lock_filepath = None
 
-    args = get_collector_shelve_filepaths(collector_data, jobid)
-    collector_shelve_input_filepath, collector_shelve_output_filepath = args
-
     if jobid is not None:
         print(
             'on_collect_request action = %r, jobid = %r, status = %r'
@@ -1972,16 +2033,13 @@ def on_collect_request(
         # suppressed
         # corrupted
 
-        current_status = collector_data[jobid].get('status', None)
+        current_status = job_store.get_status(jobid, default=None)
         print(
             'Updating jobid = {!r} status {!r} -> {!r}'.format(
                 jobid, current_status, status
             )
         )
-        collector_data[jobid]['status'] = status
-
-        print('Notify %s' % ut.repr3(collector_data[jobid]))
-        invalidate_global_cache(jobid)
+        job_store.set_status(jobid, status)
 
         if status == 'received':
             ut.touch(runtime_lock_filepath)
@@ -1998,11 +2056,8 @@ def on_collect_request(
             ut.save_cPkl(record_filepath, record, verbose=False)
             record = None
 
-        # Update relevant times in the shelf
-        if collector_shelve_input_filepath is None:
-            metadata = None
-        else:
-            metadata = get_shelve_value(collector_shelve_input_filepath, 'metadata')
+        # Update relevant times in the metadata
+        metadata = job_store.get_metadata(jobid)
 
         if metadata is not None:
             times = metadata.get('times', {})
@@ -2048,51 +2103,32 @@ def on_collect_request(
                 times['turnaround_sec'] = total_seconds
 
             metadata['times'] = times
-            set_shelve_value(collector_shelve_input_filepath, 'metadata', metadata)
+            job_store.set_metadata(jobid, metadata)
 
             metadata = None  # Release memory
 
     elif action == 'register':
         assert None not in [jobid]
 
-        invalidate_global_cache(jobid)
-
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        metadata = get_shelve_value(shelve_input_filepath, 'metadata')
-        engine_result = get_shelve_value(shelve_output_filepath, 'result')
-
         if status == 'completed':
-            # Ensure we can read the data we expect out of a completed job
-            if None in [metadata, engine_result]:
+            # Ensure we have the data we expect out of a completed job
+            if not job_store.has_metadata(jobid) or not job_store.has_result(jobid):
                 status = 'corrupted'
 
-        collector_data[jobid] = {
-            'status': status,
-            'input': shelve_input_filepath,
-            'output': shelve_output_filepath,
-        }
-        print('Register %s' % ut.repr3(collector_data[jobid]))
-
-        metadata, engine_result = None, None  # Release memory
+        job_store.set_status(jobid, status)
+        print('Register jobid = {!r} status = {!r}'.format(jobid, status))
 
     elif action == 'metadata':
-        invalidate_global_cache(jobid)
-
         # From the Engine
         metadata = collect_request.get('metadata', None)
 
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        collector_data[jobid]['input'] = shelve_input_filepath
+        job_store.set_metadata(jobid, metadata)
 
-        set_shelve_value(shelve_input_filepath, 'metadata', metadata)
-
-        print('Stored Metadata %s' % ut.repr3(collector_data[jobid]))
+        print('Stored Metadata jobid = {!r}'.format(jobid))
 
         metadata = None  # Release memory
 
     elif action == 'store':
-        invalidate_global_cache(jobid)
-
         # From the Engine
         engine_result = collect_request.get('engine_result', None)
         callback_url = collect_request.get('callback_url', None)
@@ -2101,14 +2137,15 @@ def on_collect_request(
 
         # Get the engine result jobid
         jobid = engine_result.get('jobid', jobid)
-        assert jobid in collector_data
+        assert job_store.has_job(jobid)
 
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        collector_data[jobid]['output'] = shelve_output_filepath
+        stages = engine_result.pop('stages', None)
+        if stages:
+            COLLECTED_STAGES.extend(stages)
 
-        set_shelve_value(shelve_output_filepath, 'result', engine_result)
+        job_store.set_result(jobid, engine_result)
 
-        print('Stored Result %s' % ut.repr3(collector_data[jobid]))
+        print('Stored Result jobid = {!r}'.format(jobid))
 
         engine_result = None  # Release memory
 
@@ -2131,10 +2168,12 @@ def on_collect_request(
                 data_dict = {'jobid': jobid}
 
                 if callback_detailed:
-                    shelve_value = get_shelve_value(shelve_output_filepath, 'result')
-                    data_dict['status'] = shelve_value['exec_status']
-                    data_dict['json_result'] = ut.from_json(shelve_value['json_result'])
-                    shelve_value = None  # Release memory
+                    stored_result = job_store.get_result(jobid)
+                    data_dict['status'] = stored_result['exec_status']
+                    data_dict['json_result'] = ut.from_json(
+                        stored_result['json_result']
+                    )
+                    stored_result = None  # Release memory
 
                 args = (
                     callback_url,
@@ -2192,79 +2231,24 @@ def on_collect_request(
                 print('Callback FAILED!')
 
     elif action == 'job_status':
-        reply['jobstatus'] = collector_data.get(jobid, {}).get('status', 'unknown')
+        reply['jobstatus'] = job_store.get_status(jobid)
 
     elif action == 'job_status_dict':
-        json_result = {}
-
-        for jobid in collector_data:
-
-            if jobid in JOB_STATUS_CACHE:
-                job_status_data = JOB_STATUS_CACHE.get(jobid, None)
-            else:
-                status = collector_data[jobid]['status']
-
-                shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(
-                    ibs, jobid
-                )
-                metadata = get_shelve_value(shelve_input_filepath, 'metadata')
-
-                cache = True
-                if metadata is None:
-                    if status in ['corrupted']:
-                        status = 'corrupted'
-                    elif status in ['suppressed']:
-                        status = 'suppressed'
-                    elif status in ['completed']:
-                        status = 'corrupted'
-                    else:
-                        # status = 'pending'
-                        cache = False
-                    metadata = {
-                        'jobcounter': -1,
-                    }
-
-                times = metadata.get('times', {})
-                request = metadata.get('request', {})
-
-                # Support legacy jobs
-                if request is None:
-                    request = {}
-
-                job_status_data = {
-                    'status': status,
-                    'jobcounter': metadata.get('jobcounter', None),
-                    'action': metadata.get('action', None),
-                    'endpoint': request.get('endpoint', None),
-                    'function': request.get('function', None),
-                    'time_received': times.get('received', None),
-                    'time_started': times.get('started', None),
-                    'time_runtime': times.get('runtime', None),
-                    'time_updated': times.get('updated', None),
-                    'time_completed': times.get('completed', None),
-                    'time_turnaround': times.get('turnaround', None),
-                    'time_runtime_sec': times.get('runtime_sec', None),
-                    'time_turnaround_sec': times.get('turnaround_sec', None),
-                    'lane': metadata.get('lane', None),
-                }
-                if cache:
-                    JOB_STATUS_CACHE[jobid] = job_status_data
-
-            json_result[jobid] = job_status_data
-
-        reply['json_result'] = json_result
-
-        metadata = None  # Release memory
+        reply['json_result'] = job_store.get_status_dict()
 
     elif action == 'job_id_list':
-        reply['jobid_list'] = sorted(list(collector_data.keys()))
+        reply['jobid_list'] = job_store.get_jobid_list()
+
+    elif action == 'job_stages':
+        reply['json_result'] = list(COLLECTED_STAGES)
+        COLLECTED_STAGES.clear()
 
     elif action == 'job_input':
-        if jobid not in collector_data:
+        if not job_store.has_job(jobid):
             reply['status'] = 'invalid'
             metadata = None
         else:
-            metadata = get_shelve_value(collector_shelve_input_filepath, 'metadata')
+            metadata = job_store.get_metadata(jobid)
             if metadata is None:
                 reply['status'] = 'corrupted'
 
@@ -2273,13 +2257,13 @@ def on_collect_request(
         metadata = None  # Release memory
 
     elif action == 'job_result':
-        if jobid not in collector_data:
+        if not job_store.has_job(jobid):
             reply['status'] = 'invalid'
             result = None
         else:
-            status = collector_data[jobid]['status']
+            status = job_store.get_status(jobid, default=None)
 
-            engine_result = get_shelve_value(collector_shelve_output_filepath, 'result')
+            engine_result = job_store.get_result(jobid)
 
             if engine_result is None:
                 if status in ['corrupted']:
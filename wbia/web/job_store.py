@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent store for the state of the engine jobs.
+
+All jobs live in one SQLite database (in WAL mode, so the collector can
+write while other processes read) with three tables:
+
+    jobs         - one indexed row per job with its status and the summary
+                   fields returned by the job status endpoints
+    job_metadata - the metadata dict of each job (JSON)
+    job_results  - the engine result of each job (JSON), only loaded when a
+                   result is requested
+
+This replaces the per-job ``<jobid>.input.shelve`` and
+``<jobid>.output.shelve`` files and their lock files. Polling the status of
+all jobs is a single query that never touches the metadata or result blobs.
+"""
+import os
+import sqlite3
+import threading
+
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+
+
+JOB_STORE_FNAME = 'jobs.sqlite3'
+#: Seconds to wait for a lock held by another process
+JOB_STORE_TIMEOUT = 600
+
+# Summary columns of the jobs table and their location in the metadata
+TIME_COLNAMES = [
+    'received',
+    'started',
+    'runtime',
+    'updated',
+    'completed',
+    'turnaround',
+    'runtime_sec',
+    'turnaround_sec',
+]
+STATUS_COLNAMES = ['jobcounter', 'action', 'endpoint', 'function', 'lane'] + [
+    'time_{}'.format(name) for name in TIME_COLNAMES
+]
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        jobid TEXT PRIMARY KEY,
+        status TEXT,
+        has_metadata INTEGER NOT NULL DEFAULT 0,
+        jobcounter INTEGER,
+        action TEXT,
+        endpoint TEXT,
+        function TEXT,
+        lane TEXT,
+        time_received TEXT,
+        time_started TEXT,
+        time_runtime TEXT,
+        time_updated TEXT,
+        time_completed TEXT,
+        time_turnaround TEXT,
+        time_runtime_sec INTEGER,
+        time_turnaround_sec INTEGER
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)',
+    'CREATE INDEX IF NOT EXISTS jobs_jobcounter ON jobs (jobcounter)',
+    """
+    CREATE TABLE IF NOT EXISTS job_metadata (
+        jobid TEXT PRIMARY KEY,
+        metadata TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_results (
+        jobid TEXT PRIMARY KEY,
+        exec_status TEXT,
+        json_result TEXT
+    )
+    """,
+]
+
+
+def metadata_status_values(metadata):
+    """Returns the jobs table summary values stored in a metadata dict"""
+    times = metadata.get('times', {}) or {}
+    request = metadata.get('request', {}) or {}
+    values = [
+        metadata.get('jobcounter', None),
+        metadata.get('action', None),
+        request.get('endpoint', None),
+        request.get('function', None),
+        metadata.get('lane', None),
+    ] + [times.get(name, None) for name in TIME_COLNAMES]
+    return values
+
+
+class JobStore(object):
+    """
+    SQLite backed job status, metadata and result store.
+
+    A store object can be shared by the threads of a process. Connections are
+    reopened after a fork.
+
+    Args:
+        fpath (str): path to the database file
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.job_store import *  # NOQA
+        >>> from os.path import join
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'test_job_store')
+        >>> ut.delete(join(dpath, JOB_STORE_FNAME))
+        >>> store = JobStore(join(dpath, JOB_STORE_FNAME))
+        >>> store.set_status('job-a', 'received')
+        >>> store.set_metadata('job-a', {
+        >>>     'jobcounter': 1, 'action': 'helloworld', 'lane': 'fast',
+        >>>     'request': {'endpoint': '/api/test/'},
+        >>>     'times': {'received': '2020-01-01 00:00:00 PST'}})
+        >>> store.set_status('job-a', 'completed')
+        >>> store.set_result('job-a', {'exec_status': 'completed',
+        >>>                            'json_result': '"hello"', 'jobid': 'job-a'})
+        >>> store.set_status('job-b', 'queued')
+        >>> print(store.get_jobid_list())
+        ['job-a', 'job-b']
+        >>> print(store.get_status('job-a'), store.get_status('job-c'))
+        completed unknown
+        >>> status_dict = store.get_status_dict()
+        >>> keys = ['status', 'action', 'endpoint']
+        >>> print(ut.repr2(ut.dict_subset(status_dict['job-a'], keys)))
+        {'status': 'completed', 'action': 'helloworld', 'endpoint': '/api/test/'}
+        >>> print(status_dict['job-b']['jobcounter'])
+        -1
+        >>> print(store.get_result('job-a')['json_result'])
+        "hello"
+        >>> store.close()
+    """
+
+    def __init__(self, fpath, timeout=JOB_STORE_TIMEOUT):
+        self.fpath = fpath
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pid = None
+        self._ensure_schema()
+
+    def __repr__(self):
+        return '<JobStore({!r})>'.format(self.fpath)
+
+    @property
+    def connection(self):
+        if self._pid != os.getpid():
+            # Never reuse the connections of a parent process
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.fpath, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self):
+        conn = self.connection
+        with conn:
+            for stmt in SCHEMA:
+                conn.execute(stmt)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- jobs ----
+
+    def has_job(self, jobid):
+        cursor = self.connection.execute(
+            'SELECT 1 FROM jobs WHERE jobid = ?', (jobid,)
+        )
+        return cursor.fetchone() is not None
+
+    def add_job(self, jobid, status=None):
+        """Adds a job if it does not exist yet"""
+        with self.connection as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO jobs (jobid, status) VALUES (?, ?)',
+                (jobid, status),
+            )
+
+    def set_status(self, jobid, status):
+        with self.connection as conn:
+            conn.execute(
+                'INSERT INTO jobs (jobid, status) VALUES (?, ?) '
+                'ON CONFLICT (jobid) DO UPDATE SET status = excluded.status',
+                (jobid, status),
+            )
+
+    def get_status(self, jobid, default='unknown'):
+        cursor = self.connection.execute(
+            'SELECT status FROM jobs WHERE jobid = ?', (jobid,)
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            return default
+        return row[0]
+
+    def get_jobid_list(self):
+        cursor = self.connection.execute('SELECT jobid FROM jobs ORDER BY jobid')
+        return [row[0] for row in cursor]
+
+    def get_status_dict(self):
+        """
+        Returns the status summary of every job without loading any metadata
+        or result blobs.
+        """
+        colnames = ['jobid', 'status', 'has_metadata'] + STATUS_COLNAMES
+        cursor = self.connection.execute(
+            'SELECT {} FROM jobs'.format(', '.join(colnames))
+        )
+        status_dict = {}
+        for row in cursor:
+            jobid, status, has_metadata = row[0:3]
+            job_status_data = dict(zip(STATUS_COLNAMES, row[3:]))
+            if not has_metadata:
+                if status == 'completed':
+                    status = 'corrupted'
+                job_status_data['jobcounter'] = -1
+            job_status_data['status'] = status
+            status_dict[jobid] = job_status_data
+        return status_dict
+
+    def delete_job(self, jobid):
+        with self.connection as conn:
+            for tablename in ['jobs', 'job_metadata', 'job_results']:
+                conn.execute(
+                    'DELETE FROM {} WHERE jobid = ?'.format(tablename), (jobid,)
+                )
+
+    def move_job(self, jobid, other):
+        """Moves everything stored for a job into another store"""
+        status = self.get_status(jobid, default=None)
+        metadata = self.get_metadata(jobid)
+        engine_result = self.get_result(jobid)
+        other.set_status(jobid, status)
+        if metadata is not None:
+            other.set_metadata(jobid, metadata)
+        if engine_result is not None:
+            other.set_result(jobid, engine_result)
+        self.delete_job(jobid)
+
+    # ---- metadata ----
+
+    def has_metadata(self, jobid):
+        cursor = self.connection.execute(
+            'SELECT 1 FROM job_metadata WHERE jobid = ?', (jobid,)
+        )
+        return cursor.fetchone() is not None
+
+    def get_metadata(self, jobid):
+        cursor = self.connection.execute(
+            'SELECT metadata FROM job_metadata WHERE jobid = ?', (jobid,)
+        )
+        row = cursor.fetchone()
+        return None if row is None else ut.from_json(row[0])
+
+    def set_metadata(self, jobid, metadata):
+        """Stores the metadata dict and updates the status summary of the job"""
+        values = metadata_status_values(metadata)
+        assignments = ', '.join('{} = ?'.format(name) for name in STATUS_COLNAMES)
+        with self.connection as conn:
+            conn.execute('INSERT OR IGNORE INTO jobs (jobid) VALUES (?)', (jobid,))
+            conn.execute(
+                'UPDATE jobs SET has_metadata = 1, {} WHERE jobid = ?'.format(
+                    assignments
+                ),
+                values + [jobid],
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO job_metadata (jobid, metadata) VALUES (?, ?)',
+                (jobid, ut.to_json(metadata)),
+            )
+
+    # ---- results ----
+
+    def has_result(self, jobid):
+        cursor = self.connection.execute(
+            'SELECT 1 FROM job_results WHERE jobid = ?', (jobid,)
+        )
+        return cursor.fetchone() is not None
+
+    def get_result(self, jobid):
+        """Returns the engine result dict of a job (or None)"""
+        cursor = self.connection.execute(
+            'SELECT exec_status, json_result FROM job_results WHERE jobid = ?',
+            (jobid,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        exec_status, json_result = row
+        engine_result = {
+            'exec_status': exec_status,
+            'json_result': json_result,
+            'jobid': jobid,
+        }
+        return engine_result
+
+    def set_result(self, jobid, engine_result):
+        with self.connection as conn:
+            conn.execute('INSERT OR IGNORE INTO jobs (jobid) VALUES (?)', (jobid,))
+            conn.execute(
+                'INSERT OR REPLACE INTO job_results (jobid, exec_status, json_result) '
+                'VALUES (?, ?, ?)',
+                (
+                    jobid,
+                    engine_result.get('exec_status', None),
+                    engine_result.get('json_result', None),
+                ),
+            )
+
+
+# Open stores keyed by database path
+_JOB_STORES = {}
+
+
+def get_job_store(dpath):
+    """
+    Returns the (cached) job store of a shelve directory, creating it if
+    needed. The returned store may be shared by all threads of a process.
+    """
+    fpath = os.path.abspath(os.path.join(dpath, JOB_STORE_FNAME))
+    store = _JOB_STORES.get(fpath, None)
+    if store is None:
+        ut.ensuredir(dpath)
+        store = JobStore(fpath)
+        _JOB_STORES[fpath] = store
+    return store
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 import logging
+from functools import partial
 
 import utool as ut
 from prometheus_client import Counter, Enum, Gauge, Histogram, Info  # NOQA
 
 import wbia.constants as const
 from wbia.control import controller_inject
+from wbia.dtool import tracing
 from wbia.web.apis_query import RENDER_STATUS  # NOQA
 
 (print, rrr, profile) = ut.inject2(__name__)
@@ -20,6 +22,28 @@ register_api = controller_inject.get_wbia_flask_api(__name__)
 PROMETHEUS_COUNTER = 0
 PROMETHEUS_LIMIT = 1
 
+# Upper bounds of the stage latency buckets, from sub-millisecond depcache
+# reads to multi-minute identification jobs
+PROMETHEUS_STAGE_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+    600.0,
+    float('inf'),
+)
+
 
 PROMETHEUS_DATA = {
     'info': Info(
@@ -106,9 +130,18 @@ PROMETHEUS_DATA = {
         'Number of web exceptions',
         ['name', 'tag'],
     ),
+    'stage': Histogram(
+        'wbia_stage_seconds',
+        'Number of seconds spent per query, depcache and job engine stage',
+        ['name', 'stage', 'detail'],
+        buckets=PROMETHEUS_STAGE_BUCKETS,
+    ),
 }
 
 
+PROMETHEUS_STAGE_SINK = None
+
+
 PROMETHUS_JOB_CACHE_DICT = {}
 
 
@@ -151,6 +184,35 @@ def prometheus_increment_exception(ibs, tag):
         pass
 
 
+def _prometheus_observe_stage(container_name, stage, detail, seconds):
+    PROMETHEUS_DATA['stage'].labels(
+        name=container_name, stage=stage, detail=detail
+    ).observe(seconds)
+
+
+@register_ibs_method
+def prometheus_enable_tracing(ibs):
+    """
+    Exports the stages timed in this process (see :mod:`wbia.dtool.tracing`)
+    as the wbia_stage_seconds histogram. The stages of engine jobs are read
+    from the collector by prometheus_update, as one total per job and stage.
+    """
+    global PROMETHEUS_STAGE_SINK
+
+    if ibs.containerized:
+        container_name = const.CONTAINER_NAME
+    else:
+        container_name = ibs.dbname
+
+    if PROMETHEUS_STAGE_SINK is not None:
+        tracing.remove_sink(PROMETHEUS_STAGE_SINK)
+    PROMETHEUS_STAGE_SINK = None
+
+    if tracing.TRACE_STAGES:
+        PROMETHEUS_STAGE_SINK = partial(_prometheus_observe_stage, container_name)
+        tracing.add_sink(PROMETHEUS_STAGE_SINK)
+
+
 @register_ibs_method
 @register_api(
     '/api/test/prometheus/',
@@ -376,6 +438,14 @@ def prometheus_update(ibs, *args, **kwargs):
                 except Exception:
                     pass
 
+                try:
+                    for stage, detail, seconds in ibs.get_job_stages():
+                        _prometheus_observe_stage(
+                            container_name, stage, detail, seconds
+                        )
+                except Exception:
+                    pass
+
                 try:
                     for status in RENDER_STATUS:
                         number = RENDER_STATUS[status]
@@ -0,0 +1,630 @@
+# -*- coding: utf-8 -*-
+"""
+Background rendering of the match images shown to reviewers.
+
+Review images used to be drawn with a 300 dpi matplotlib figure inside the
+request that needed them, so the web worker was blocked for every top-n
+match of every query. This module provides:
+
+    render_review_image - composites a match image directly with OpenCV
+                          (side by side chips, keypoint ellipses, match
+                          lines and the match heatmask)
+    ReviewRenderPool    - a bounded pool that renders review images in the
+                          background, deduplicates identical render keys
+                          (the output file path) and reports their status
+    get_render_pool     - the render pool of this process
+    get_render_status_dict - the render counts of the pools of all live
+                          processes of a database
+
+``query_chips_graph(render_async=True)`` enqueues the top-k review images of
+a query as soon as the query finishes. The pool belongs to the process that
+ran the query, usually the job engine, so the match thumb endpoint only
+waits for renders that its own pool knows about. Images that are missing
+otherwise (rendered by another process, or lost when it exited) are
+rendered on demand by the endpoint. Each pool publishes its status counts to
+a small file in the query_match cache directory, so the status endpoint of
+the web server reports the renders of the job engine as well.
+
+Only hotspotter matches are rendered by the OpenCV path (see
+:func:`can_render`); plugin pipelines keep their own matplotlib renderers.
+"""
+import collections
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from os.path import dirname, join
+
+import cv2
+import numpy as np
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+#: Pool used by get_render_pool: 'process' or 'thread'
+RENDER_POOL_MODE = 'process'
+#: Number of render workers of get_render_pool
+RENDER_NUM_WORKERS = 2
+#: Maximum number of queued or running renders, further renders are refused
+RENDER_MAX_PENDING = 512
+#: Number of finished render keys remembered for status queries
+RENDER_MAX_FINISHED = 4096
+#: Prefix of the files the render pools publish their status counts to
+RENDER_STATUS_PREFIX = 'render_status_'
+
+# Gap between the two chips and the white background around them
+RENDER_PAD = 8
+# Opacity of the heatmask overlay
+HEATMASK_ALPHA = 0.5
+
+
+def can_render(cm, qreq_):
+    """
+    True if the review images of cm can be composited by
+    :func:`render_review_image` instead of a matplotlib figure
+    """
+    if qreq_ is None or hasattr(qreq_, 'render_single_result'):
+        return False
+    if getattr(qreq_, '_isnewreq', False):
+        return False
+    return getattr(cm, 'fm_list', None) is not None and hasattr(cm, 'daid2_idx')
+
+
+def get_review_render_args(ibs, cm, qreq_, daid_list):
+    """
+    Loads the chips, keypoints and feature matches needed to render the
+    review images of cm against each daid in one batch
+
+    Returns:
+        list: (chip1, chip2, kpts1, kpts2, fm, fs) for each daid
+    """
+    query_config2_ = qreq_.extern_query_config2
+    data_config2_ = qreq_.extern_data_config2
+    chip1 = ibs.get_annot_chips([cm.qaid], config2_=query_config2_)[0]
+    kpts1 = ibs.get_annot_kpts([cm.qaid], config2_=query_config2_)[0]
+    chip2_list = ibs.get_annot_chips(daid_list, config2_=data_config2_)
+    kpts2_list = ibs.get_annot_kpts(daid_list, config2_=data_config2_)
+    args_list = []
+    for daid, chip2, kpts2 in zip(daid_list, chip2_list, kpts2_list):
+        idx = cm.daid2_idx.get(daid, None)
+        if idx is None:
+            fm = np.empty((0, 2), dtype=np.int64)
+            fs = np.empty(0)
+        else:
+            fm = np.asarray(cm.fm_list[idx])
+            fsv = None if cm.fsv_list is None else cm.fsv_list[idx]
+            fs = np.ones(len(fm)) if fsv is None else np.asarray(fsv).prod(axis=1)
+        args_list.append((chip1, chip2, kpts1, kpts2, fm, fs))
+    return args_list
+
+
+def _kpts_ellipses(kpts):
+    """
+    Returns the centers, the semi-axes and the angles (in degrees) of the
+    ellipses of (x, y, a, c, d, ...) keypoints
+    """
+    kpts = np.asarray(kpts, dtype=np.float64)
+    invV = np.zeros((len(kpts), 2, 2))
+    invV[:, 0, 0] = kpts[:, 2]
+    invV[:, 1, 0] = kpts[:, 3]
+    invV[:, 1, 1] = kpts[:, 4]
+    U, S, _ = np.linalg.svd(invV)
+    angles = np.degrees(np.arctan2(U[:, 1, 0], U[:, 0, 0]))
+    return kpts[:, 0:2], S, angles
+
+
+def _score_colors(fs):
+    """BGR colors of the match scores on the jet colormap"""
+    fs = np.asarray(fs, dtype=np.float64)
+    if len(fs) == 0:
+        return np.empty((0, 3), dtype=np.uint8)
+    span = fs.max() - fs.min()
+    normed = (fs - fs.min()) / span if span > 0 else np.ones(len(fs))
+    levels = np.round(normed * 255).astype(np.uint8).reshape(-1, 1)
+    return cv2.applyColorMap(levels, cv2.COLORMAP_JET).reshape(-1, 3)
+
+
+def overlay_heatmask(chip, kpts, weights=None, alpha=HEATMASK_ALPHA):
+    """
+    Overlays a blurred jet colored mask of the keypoint ellipses on chip
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.review_render import *  # NOQA
+        >>> chip = np.full((60, 80, 3), 128, dtype=np.uint8)
+        >>> kpts = np.array([[20.0, 30.0, 5.0, 0.0, 5.0, 0.0]])
+        >>> out = overlay_heatmask(chip, kpts)
+        >>> assert out.shape == chip.shape and out.dtype == np.uint8
+        >>> assert np.any(out[30, 20] != 128) and np.all(out[5, 75] == 128)
+    """
+    height, width = chip.shape[0:2]
+    if len(kpts) == 0:
+        return chip.copy()
+    if weights is None:
+        weights = np.ones(len(kpts))
+    centers, axes, angles = _kpts_ellipses(kpts)
+    mask = np.zeros((height, width), dtype=np.float32)
+    # Draw the heaviest ellipses last, so each pixel keeps its maximum weight
+    for idx in np.argsort(weights):
+        cv2.ellipse(
+            mask,
+            (tuple(centers[idx]), tuple(2 * axes[idx]), angles[idx]),
+            float(weights[idx]),
+            -1,
+        )
+    sigma = max(1.0, float(np.median(axes)))
+    mask = cv2.GaussianBlur(mask, (0, 0), sigma)
+    if mask.max() > 0:
+        mask /= mask.max()
+    colors = cv2.applyColorMap(np.round(mask * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    if chip.ndim == 2:
+        chip = cv2.cvtColor(chip, cv2.COLOR_GRAY2BGR)
+    blend = (alpha * mask)[:, :, None]
+    out = chip * (1 - blend) + colors * blend
+    return np.round(out).astype(np.uint8)
+
+
+def stack_chips(chip1, chip2, vert=True, pad=RENDER_PAD):
+    """
+    Places chip2 below (vert) or right of chip1 on a white canvas. chip2 is
+    resized to the width (vert) or height of chip1.
+
+    Returns:
+        tuple: (canvas, offset1, offset2, scale2)
+    """
+    if chip1.ndim == 2:
+        chip1 = cv2.cvtColor(chip1, cv2.COLOR_GRAY2BGR)
+    if chip2.ndim == 2:
+        chip2 = cv2.cvtColor(chip2, cv2.COLOR_GRAY2BGR)
+    h1, w1 = chip1.shape[0:2]
+    h2, w2 = chip2.shape[0:2]
+    scale2 = w1 / w2 if vert else h1 / h2
+    dsize2 = (max(1, int(round(w2 * scale2))), max(1, int(round(h2 * scale2))))
+    chip2 = cv2.resize(chip2, dsize2, interpolation=cv2.INTER_AREA)
+    h2, w2 = chip2.shape[0:2]
+    offset1 = np.array([pad, pad])
+    if vert:
+        offset2 = np.array([pad, 2 * pad + h1])
+        canvas_shape = (3 * pad + h1 + h2, 2 * pad + max(w1, w2), 3)
+    else:
+        offset2 = np.array([2 * pad + w1, pad])
+        canvas_shape = (2 * pad + max(h1, h2), 3 * pad + w1 + w2, 3)
+    canvas = np.full(canvas_shape, 255, dtype=np.uint8)
+    canvas[pad : pad + h1, pad : pad + w1] = chip1
+    x2, y2 = offset2
+    canvas[y2 : y2 + h2, x2 : x2 + w2] = chip2
+    return canvas, offset1, offset2, scale2
+
+
+@profile
+def render_review_image(
+    chip1,
+    chip2,
+    kpts1=None,
+    kpts2=None,
+    fm=None,
+    fs=None,
+    view_orientation='vertical',
+    draw_matches=True,
+    draw_heatmask=False,
+):
+    """
+    Composites the review image of a pair of annotations with OpenCV.
+
+    Args:
+        chip1 (ndarray): BGR query chip
+        chip2 (ndarray): BGR database chip
+        kpts1 (ndarray): keypoints of chip1
+        kpts2 (ndarray): keypoints of chip2
+        fm (ndarray): M x 2 feature matches (index into kpts1, kpts2)
+        fs (ndarray): M feature match scores
+        view_orientation (str): 'vertical' or 'horizontal'
+        draw_matches (bool): draws the matched keypoints and match lines
+        draw_heatmask (bool): overlays the heatmask of the matched keypoints
+
+    Returns:
+        ndarray: BGR uint8 image
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.review_render import *  # NOQA
+        >>> chip1 = np.full((100, 80, 3), 200, dtype=np.uint8)
+        >>> chip2 = np.full((50, 40, 3), 100, dtype=np.uint8)
+        >>> kpts1 = np.array([[10.0, 10.0, 4.0, 0.0, 4.0, 0.0]])
+        >>> kpts2 = np.array([[30.0, 20.0, 2.0, 0.0, 2.0, 0.0]])
+        >>> fm, fs = np.array([[0, 0]]), np.array([1.0])
+        >>> image = render_review_image(chip1, chip2, kpts1, kpts2, fm, fs)
+        >>> print(image.shape)
+        (224, 96, 3)
+        >>> image = render_review_image(chip1, chip2, view_orientation='horizontal',
+        >>>                             draw_matches=False)
+        >>> print(image.shape)
+        (116, 184, 3)
+    """
+    vert = view_orientation == 'vertical'
+    if fm is None:
+        fm = np.empty((0, 2), dtype=np.int64)
+    fm = np.asarray(fm, dtype=np.int64).reshape(-1, 2)
+    if fs is None:
+        fs = np.ones(len(fm))
+    has_kpts = kpts1 is not None and kpts2 is not None and len(fm) > 0
+    if draw_heatmask and has_kpts:
+        chip1 = overlay_heatmask(chip1, kpts1[fm[:, 0]], fs)
+        chip2 = overlay_heatmask(chip2, kpts2[fm[:, 1]], fs)
+    canvas, offset1, offset2, scale2 = stack_chips(chip1, chip2, vert=vert)
+    if draw_matches and has_kpts:
+        thickness = max(1, int(round(max(canvas.shape[0:2]) / 600)))
+        centers1, axes1, angles1 = _kpts_ellipses(kpts1[fm[:, 0]])
+        centers2, axes2, angles2 = _kpts_ellipses(kpts2[fm[:, 1]])
+        centers1 = centers1 + offset1
+        centers2 = centers2 * scale2 + offset2
+        axes2 = axes2 * scale2
+        colors = _score_colors(fs)
+        # Draw the best matches on top
+        for idx in np.argsort(fs):
+            color = tuple(int(c) for c in colors[idx])
+            pt1 = tuple(int(round(v)) for v in centers1[idx])
+            pt2 = tuple(int(round(v)) for v in centers2[idx])
+            cv2.line(canvas, pt1, pt2, color, thickness, cv2.LINE_AA)
+            for center, axes, angle in [
+                (centers1[idx], axes1[idx], angles1[idx]),
+                (centers2[idx], axes2[idx], angles2[idx]),
+            ]:
+                cv2.ellipse(
+                    canvas,
+                    (tuple(center), tuple(2 * axes), angle),
+                    color,
+                    thickness,
+                    cv2.LINE_AA,
+                )
+    return canvas
+
+
+def render_review_image_file(filepath, *args, **kwargs):
+    """
+    Renders a review image and writes it to filepath. The image is written to
+    a temporary file first, so readers never see a partially written image.
+    """
+    image = render_review_image(*args, **kwargs)
+    root, ext = os.path.splitext(filepath)
+    temp_filepath = '{}.{}.tmp{}'.format(root, os.getpid(), ext)
+    ut.ensuredir(dirname(filepath))
+    if not cv2.imwrite(temp_filepath, image):
+        raise IOError('Could not write review image {!r}'.format(filepath))
+    os.replace(temp_filepath, filepath)
+    return filepath
+
+
+def placeholder_image(shape=(256, 256), text='rendering'):
+    """A light gray BGR image with text, served while a render is pending"""
+    image = np.full(tuple(shape) + (3,), 235, dtype=np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = shape[1] / 400.0
+    (text_w, text_h), _ = cv2.getTextSize(text, font, scale, 1)
+    org = ((shape[1] - text_w) // 2, (shape[0] + text_h) // 2)
+    cv2.putText(image, text, org, font, scale, (128, 128, 128), 1, cv2.LINE_AA)
+    return image
+
+
+class ReviewRenderPool(object):
+    """
+    Renders review images in the background.
+
+    Renders are keyed by their output file path. Submitting a key that is
+    already queued or running returns the pending future instead of
+    rendering the image twice. At most ``max_pending`` renders are queued
+    or running at once; submissions beyond that are refused and the caller
+    can render on demand later. Finished renders are forgotten (their file
+    is the result) and failed ones are remembered for status queries. If
+    ``status_fpath`` is set, the status counts are written to it whenever
+    they change.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.review_render import *  # NOQA
+        >>> import threading
+        >>> event = threading.Event()
+        >>> pool = ReviewRenderPool(mode='thread', max_workers=1, max_pending=2)
+        >>> future1 = pool.submit('a.jpg', event.wait)
+        >>> assert pool.submit('a.jpg', event.wait) is future1
+        >>> future2 = pool.submit('b.jpg', event.wait)
+        >>> assert pool.submit('c.jpg', event.wait) is None
+        >>> print(pool.get_status('b.jpg'))
+        queued
+        >>> event.set()
+        >>> assert pool.wait('b.jpg', timeout=10)
+        >>> future3 = pool.submit('c.jpg', int, 'x')
+        >>> pool.shutdown()
+        >>> print(pool.get_status('a.jpg'), pool.get_status('c.jpg'))
+        done error
+        >>> print(ut.repr2(pool.get_status_dict(), sorted_=True))
+        {'done': 2, 'error': 1, 'queued': 0, 'refused': 1, 'rendering': 0}
+    """
+
+    def __init__(
+        self,
+        mode=RENDER_POOL_MODE,
+        max_workers=RENDER_NUM_WORKERS,
+        max_pending=RENDER_MAX_PENDING,
+        status_fpath=None,
+    ):
+        assert mode in ['process', 'thread'], 'unknown render pool mode'
+        self.mode = mode
+        self.max_workers = max(int(max_workers), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}
+        # Finished keys mapped to None or to their error message
+        self._finished = collections.OrderedDict()
+        self._counts = {'done': 0, 'error': 0, 'refused': 0}
+        self.status_fpath = status_fpath
+        self._status_lock = threading.Lock()
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                # The pool can be created by a request thread of a threaded
+                # server, so the workers are spawned instead of forked
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers
+                )
+        return self._executor
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Schedules ``func(*args, **kwargs)`` under key
+
+        Returns:
+            Future: the pending future of key, or None if the pool is full
+        """
+        with self._lock:
+            future = self._pending.get(key, None)
+            if future is not None:
+                return future
+            if len(self._pending) >= self.max_pending:
+                self._counts['refused'] += 1
+                future = None
+            else:
+                self._finished.pop(key, None)
+                future = self._ensure_executor().submit(func, *args, **kwargs)
+                self._pending[key] = future
+        if future is not None:
+            future.add_done_callback(lambda future_: self._finish(key, future_))
+        self.publish_status()
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._pending.get(key, None) is future:
+                del self._pending[key]
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                self._counts['done'] += 1
+                self._finished[key] = None
+            else:
+                self._counts['error'] += 1
+                self._finished[key] = '{}: {}'.format(type(error).__name__, error)
+            if len(self._finished) > RENDER_MAX_FINISHED:
+                self._finished.popitem(last=False)
+        self.publish_status()
+        if error is not None:
+            logger.info('Review image render of %r failed: %r' % (key, error))
+
+    def get_status(self, key):
+        """
+        Returns one of 'queued', 'rendering', 'done', 'error' or 'unknown' (never
+        submitted, or finished too long ago)
+        """
+        with self._lock:
+            future = self._pending.get(key, None)
+            if future is not None:
+                return 'rendering' if future.running() else 'queued'
+            if key in self._finished:
+                return 'done' if self._finished[key] is None else 'error'
+        return 'unknown'
+
+    def get_error(self, key):
+        """Returns the error message of a failed render or None"""
+        return self._finished.get(key, None)
+
+    def get_status_dict(self):
+        """Counts of the renders by status"""
+        with self._lock:
+            num_running = sum(future.running() for future in self._pending.values())
+            status_dict = dict(self._counts)
+            status_dict['rendering'] = num_running
+            status_dict['queued'] = len(self._pending) - num_running
+        return status_dict
+
+    def publish_status(self):
+        """Writes the status counts to status_fpath, if it is set"""
+        status_fpath = self.status_fpath
+        if status_fpath is None:
+            return
+        status_dict = self.get_status_dict()
+        temp_fpath = '{}.tmp'.format(status_fpath)
+        try:
+            with self._status_lock:
+                ut.ensuredir(dirname(status_fpath))
+                with open(temp_fpath, 'w') as file_:
+                    json.dump(status_dict, file_)
+                os.replace(temp_fpath, status_fpath)
+        except OSError as ex:
+            logger.info('Could not publish the render status: %r' % (ex,))
+
+    def wait(self, key, timeout=None):
+        """
+        Waits up to timeout seconds for the pending render of key
+
+        Returns:
+            bool: True if the render finished successfully
+        """
+        with self._lock:
+            future = self._pending.get(key, None)
+        if future is None:
+            return self.get_status(key) == 'done'
+        try:
+            future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            return False
+        except Exception:
+            return False
+        return True
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_RENDER_POOL = None
+_RENDER_POOL_LOCK = threading.Lock()
+
+
+def get_render_pool():
+    """Returns the review render pool of this process, creating it if needed"""
+    global _RENDER_POOL
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is None:
+            _RENDER_POOL = ReviewRenderPool()
+        return _RENDER_POOL
+
+
+def get_render_status_fpath(status_dpath, pid=None):
+    """The file the render pool of process pid publishes its status to"""
+    if pid is None:
+        pid = os.getpid()
+    return join(status_dpath, '{}{}.json'.format(RENDER_STATUS_PREFIX, pid))
+
+
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_render_status_dict(status_dpath):
+    """
+    Sums the status counts published by the render pools of all live
+    processes to status_dpath. The files of exited processes are removed.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.review_render import *  # NOQA
+        >>> status_dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'render_status')
+        >>> ut.delete(status_dpath)
+        >>> pool = ReviewRenderPool(mode='thread', max_workers=1,
+        >>>                         status_fpath=get_render_status_fpath(status_dpath))
+        >>> future = pool.submit('a.jpg', int, '1')
+        >>> pool.shutdown()
+        >>> stale_fpath = get_render_status_fpath(status_dpath, pid=2 ** 22 + 1)
+        >>> ut.save_json(stale_fpath, {'done': 5})
+        >>> print(ut.repr2(get_render_status_dict(status_dpath), sorted_=True))
+        {'done': 1, 'error': 0, 'queued': 0, 'refused': 0, 'rendering': 0}
+        >>> assert not os.path.exists(stale_fpath)
+    """
+    status_dict = {'queued': 0, 'rendering': 0, 'done': 0, 'error': 0, 'refused': 0}
+    if not os.path.isdir(status_dpath):
+        return status_dict
+    for fname in os.listdir(status_dpath):
+        if not fname.startswith(RENDER_STATUS_PREFIX) or not fname.endswith('.json'):
+            continue
+        fpath = join(status_dpath, fname)
+        try:
+            pid = int(fname[len(RENDER_STATUS_PREFIX) : -len('.json')])
+        except ValueError:
+            continue
+        if not _pid_exists(pid):
+            ut.delete(fpath, verbose=False)
+            continue
+        try:
+            with open(fpath, 'r') as file_:
+                pid_status_dict = json.load(file_)
+        except (OSError, ValueError):
+            continue
+        for status, count in pid_status_dict.items():
+            status_dict[status] = status_dict.get(status, 0) + count
+    return status_dict
+
+
+def enqueue_review_images(
+    ibs, cm, qreq_, daid_list, filepath_list, render_kw_list, callback=None
+):
+    """
+    Schedules the review images of cm against daid_list that are not on disk
+    yet in the render pool. The pool publishes its status to the query_match
+    cache directory of ibs.
+
+    Args:
+        filepath_list (list): output file path of each render
+        render_kw_list (list): keyword arguments of render_review_image for
+            each render (view_orientation, draw_matches, draw_heatmask)
+        callback (func): called as ``callback(daid, filepath, render_kw,
+            status)`` when each render finishes, where status is True or
+            'error'
+
+    Returns:
+        list: status of each render: 'exists', 'queued' or 'refused'
+    """
+    pool = get_render_pool()
+    if pool.status_fpath is None:
+        status_dpath = join(ibs.cachedir, 'query_match')
+        pool.status_fpath = get_render_status_fpath(status_dpath)
+    todo = [
+        idx
+        for idx, filepath in enumerate(filepath_list)
+        if not os.path.exists(filepath)
+    ]
+    status_list = ['exists'] * len(filepath_list)
+    if len(todo) == 0:
+        return status_list
+    todo_daids = ut.take(daid_list, todo)
+    unique_daids = list(ut.unique(todo_daids))
+    args_list = get_review_render_args(ibs, cm, qreq_, unique_daids)
+    daid_to_args = dict(zip(unique_daids, args_list))
+
+    def _make_done(daid, filepath, render_kw):
+        def _done(future):
+            if callback is not None and not future.cancelled():
+                status = True if future.exception() is None else 'error'
+                callback(daid, filepath, render_kw, status)
+
+        return _done
+
+    for idx, daid in zip(todo, todo_daids):
+        filepath = filepath_list[idx]
+        render_kw = render_kw_list[idx]
+        if pool.get_status(filepath) in ['queued', 'rendering']:
+            # Already scheduled by an earlier query with the same config
+            status_list[idx] = 'queued'
+            continue
+        future = pool.submit(
+            filepath,
+            render_review_image_file,
+            filepath,
+            *daid_to_args[daid],
+            **render_kw
+        )
+        if future is None:
+            status_list[idx] = 'refused'
+        else:
+            status_list[idx] = 'queued'
+            future.add_done_callback(_make_done(daid, filepath, render_kw))
+    return status_list
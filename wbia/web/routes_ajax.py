@@ -10,6 +10,7 @@ from flask import current_app, make_response, request
 
 from wbia.control import controller_inject
 from wbia.web import appfuncs as appf
+from wbia.web import image_cache
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -29,16 +30,19 @@ def set_cookie(**kwargs):
     return response
 
 
-def _resize_src(image, resize=False, **kwargs):
-    # Load image
+def _resize_image(image, resize=False):
     if resize is None:
-        image_src = appf.embed_image_html(image, target_width=None, target_height=None)
+        return image
     elif resize:
-        image = appf.resize_via_web_parameters(image)
-        image_src = appf.embed_image_html(image, target_width=None, target_height=None)
+        return appf.resize_via_web_parameters(image)
     else:
-        image_src = appf.embed_image_html(image)
+        return appf._resize(image, t_width=appf.TARGET_WIDTH)
 
+
+def _resize_src(image, resize=False, **kwargs):
+    # Load image
+    image = _resize_image(image, resize=resize)
+    image_src = appf.embed_image_html(image, target_width=None, target_height=None)
     return image_src
 
 
@@ -51,11 +55,20 @@ def image_src_ext(*args, **kwargs):
 
 @register_route('/ajax/image/src/<gid>/', methods=['GET'])
 def image_src(gid=None, thumbnail=False, ibs=None, **kwargs):
+    data, etag = image_jpeg(gid, thumbnail=thumbnail, ibs=ibs, **kwargs)
+    return appf.embed_jpeg_html(data)
+
+
+def image_jpeg(gid=None, thumbnail=False, ibs=None, **kwargs):
+    """
+    Returns the JPEG bytes of image_src and their ETag, from the derivative
+    cache. Derivatives resized by web parameters or drawn with annotations
+    are not cached and have no ETag.
+    """
     if ibs is None:
         ibs = current_app.ibs
 
     gid = int(gid)
-    gpath = None
 
     if 'thumbsize' not in kwargs:
         kwargs['thumbsize'] = max(int(appf.TARGET_WIDTH), int(appf.TARGET_HEIGHT))
@@ -63,22 +76,45 @@ def image_src(gid=None, thumbnail=False, ibs=None, **kwargs):
     if 'draw_annots' not in kwargs:
         kwargs['draw_annots'] = False
 
-    if thumbnail:
-        try:
-            gpath = ibs.get_image_thumbpath(gid, ensure_paths=True, **kwargs)
-            orient = ibs.get_image_orientation(gid)
-            image = vt.imread(gpath, orient=orient)
-            h, w = image.shape[:2]
-            assert h > 0, 'Invalid image thumbnail'
-            assert w > 0, 'Invalid image thumbnail'
-        except AssertionError:
-            gpath = None
-
-    if gpath is None:
-        gpath = ibs.get_image_paths(gid)
-
-    image_src = image_src_path(gpath, **kwargs)
-    return image_src
+    def _compute():
+        gpath = None
+        if thumbnail:
+            try:
+                gpath = ibs.get_image_thumbpath(gid, ensure_paths=True, **kwargs)
+                orient = ibs.get_image_orientation(gid)
+                image = vt.imread(gpath, orient=orient)
+                h, w = image.shape[:2]
+                assert h > 0, 'Invalid image thumbnail'
+                assert w > 0, 'Invalid image thumbnail'
+            except AssertionError:
+                gpath = None
+
+        if gpath is None:
+            gpath = ibs.get_image_paths(gid)
+
+        image = vt.imread(gpath, orient='auto')
+        return _resize_image(image, resize=kwargs.get('resize', False))
+
+    if kwargs.get('resize', False) or kwargs['draw_annots']:
+        return appf.encode_image_jpeg(_compute()), None
+
+    cache = image_cache.get_derivative_cache(ibs)
+    key = image_cache.make_derivative_key(
+        'image',
+        ibs.get_image_uuids(gid),
+        thumbnail=bool(thumbnail),
+        thumbsize=kwargs['thumbsize'],
+        orient=ibs.get_image_orientation(gid),
+        resize=kwargs.get('resize', False),
+    )
+    return cache.get(key, _compute, fresh=kwargs.get('fresh', False))
+
+
+@register_route('/ajax/image/jpeg/<gid>/', methods=['GET'])
+def image_jpeg_api(gid=None, thumbnail=False, **kwargs):
+    """Returns image_src as a binary image/jpeg response"""
+    data, etag = image_jpeg(gid, thumbnail=thumbnail, **kwargs)
+    return image_cache.make_jpeg_response(data, etag, request)
 
 
 def image_src_path(gpath, orient='auto', **kwargs):
@@ -89,36 +125,82 @@ def image_src_path(gpath, orient='auto', **kwargs):
 
 @register_route('/ajax/annot/src/<aid>/', methods=['GET'])
 def annotation_src(aid=None, ibs=None, **kwargs):
+    data, etag = annotation_jpeg(aid, ibs=ibs, **kwargs)
+    return appf.embed_jpeg_html(data)
+
+
+def annotation_jpeg(aid=None, ibs=None, **kwargs):
+    """Returns the JPEG bytes of annotation_src and their ETag"""
     if ibs is None:
         ibs = current_app.ibs
 
+    aid = int(aid)
+
     if 'dim_size' not in kwargs:
         kwargs['dim_size'] = max(int(appf.TARGET_WIDTH), int(appf.TARGET_HEIGHT))
-    image = ibs.get_annot_chips(aid, config2_=kwargs)
 
-    # image_src = _resize_src(image, **kwargs)
-    image_src = appf.embed_image_html(image, target_height=300)
-    return image_src
+    def _compute():
+        image = ibs.get_annot_chips(aid, config2_=kwargs)
+        return _resize_image(image)
+
+    cache = image_cache.get_derivative_cache(ibs)
+    # The visual uuid changes with the image, bbox and theta of the annotation
+    key = image_cache.make_derivative_key(
+        'annot', ibs.get_annot_visual_uuids(aid), width=appf.TARGET_WIDTH, **kwargs
+    )
+    return cache.get(key, _compute)
+
+
+@register_route('/ajax/annot/jpeg/<aid>/', methods=['GET'])
+def annotation_jpeg_api(aid=None, **kwargs):
+    """Returns annotation_src as a binary image/jpeg response"""
+    data, etag = annotation_jpeg(aid, **kwargs)
+    return image_cache.make_jpeg_response(data, etag, request)
 
 
 @register_route('/ajax/background/src/<aid>/', methods=['GET'])
 def probchip_src(aid=None, ibs=None, **kwargs):
+    data, etag = probchip_jpeg(aid, ibs=ibs, **kwargs)
+    return appf.embed_jpeg_html(data)
+
+
+def probchip_jpeg(aid=None, ibs=None, **kwargs):
+    """Returns the JPEG bytes of probchip_src and their ETag"""
     import cv2
 
     if ibs is None:
         ibs = current_app.ibs
 
+    aid = int(aid)
+
     if 'dim_size' not in kwargs:
         kwargs['dim_size'] = max(int(appf.TARGET_WIDTH), int(appf.TARGET_HEIGHT))
 
-    image_filepath = ibs.get_annot_probchip_fpath(aid, config2_=kwargs)
-    image = cv2.imread(image_filepath)
-    x, y, w, h = ibs.get_annot_bboxes(aid)
+    def _compute():
+        image_filepath = ibs.get_annot_probchip_fpath(aid, config2_=kwargs)
+        image = cv2.imread(image_filepath)
+        x, y, w, h = ibs.get_annot_bboxes(aid)
+
+        image = cv2.resize(image, (w, h))
+        return _resize_image(image)
+
+    cache = image_cache.get_derivative_cache(ibs)
+    # The background model depends on the species
+    key = image_cache.make_derivative_key(
+        'background',
+        ibs.get_annot_visual_uuids(aid),
+        species=ibs.get_annot_species_texts(aid),
+        width=appf.TARGET_WIDTH,
+        **kwargs,
+    )
+    return cache.get(key, _compute)
+
 
-    image = cv2.resize(image, (w, h))
-    # image_src = _resize_src(image, **kwargs)
-    image_src = appf.embed_image_html(image, target_height=300)
-    return image_src
+@register_route('/ajax/background/jpeg/<aid>/', methods=['GET'])
+def probchip_jpeg_api(aid=None, **kwargs):
+    """Returns probchip_src as a binary image/jpeg response"""
+    data, etag = probchip_jpeg(aid, **kwargs)
+    return image_cache.make_jpeg_response(data, etag, request)
 
 
 @register_route('/ajax/part/src/<part_rowid>/', methods=['GET'])